@@ -1,14 +1,21 @@
 """
 Asynchronous conversion job management
+
+With several worker processes (SHARED_JOB_STATE), jobs are also published to a
+JobSnapshotStore so any worker can report their status or cancel them.
 """
 import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional
 from enum import Enum
 import logging
 
+from config import MAX_CONCURRENT_CONVERSIONS
+from app.job_store import OWNER_GONE_ERROR, JobSnapshotStore, get_job_store, owner_is_live
+
 logger = logging.getLogger('media_converter.job')
 
 
@@ -31,7 +38,8 @@ class FileStatus(Enum):
 class ConversionJob:
     """Manages asynchronous conversion jobs"""
     
-    def __init__(self, job_id: str, files: List[Dict], settings: Dict):
+    def __init__(self, job_id: str, files: List[Dict], settings: Dict, max_workers: int = 1,
+                 store: Optional[JobSnapshotStore] = None):
         self.job_id = job_id
         self.files = files  # List of {type: 'video'|'image', path: str, ...}
         self.settings = settings  # {video: {...}, image: {...}}
@@ -44,6 +52,8 @@ class ConversionJob:
         self.end_time = None
         self.thread = None
         self.cancelled = False
+        self.max_workers = max(1, max_workers)  # Files converted concurrently
+        self.store = store  # shared with other worker processes, if any
         self.lock = threading.Lock()
     
     def start(self, converter_func):
@@ -55,54 +65,57 @@ class ConversionJob:
         self.start_time = time.time()
         self.thread = threading.Thread(target=self._run, args=(converter_func,), daemon=True)
         self.thread.start()
+        if self.store:
+            self.store.start_publisher(self.job_id, self.get_status, lambda: self.end_time is not None,
+                                       on_cancel=self.cancel)
         logger.info(f"Job {self.job_id} started with {len(self.files)} files")
     
-    def _run(self, converter_func):
-        """Run conversion in background"""
+    def _process_file(self, file_info: Dict, converter_func) -> bool:
+        """Convert one file and record its outcome; returns False to stop the job"""
+        file_path = file_info['path']
+        
+        with self.lock:
+            if self.cancelled:
+                if self.status != JobStatus.FAILED:
+                    self.status = JobStatus.CANCELLED
+                self.file_statuses[file_path] = FileStatus.CANCELLED
+                return False
+            self.file_statuses[file_path] = FileStatus.PROCESSING
+        
+        logger.debug(f"Processing file: {file_path}")
+        
         try:
-            total_files = len(self.files)
-            completed = 0
+            # Call converter function
+            result = converter_func(file_info, self.settings)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {e}", exc_info=True)
+            result = {'success': False, 'error': str(e)}
+        
+        with self.lock:
+            if result.get('success'):
+                self.file_statuses[file_path] = FileStatus.COMPLETED
+                self.results[file_path] = result
+                completed = sum(1 for s in self.file_statuses.values() if s == FileStatus.COMPLETED)
+                self.progress = completed / len(self.files)
+                return True
             
-            for file_info in self.files:
-                if self.cancelled:
-                    self.status = JobStatus.CANCELLED
-                    self.file_statuses[file_info['path']] = FileStatus.CANCELLED
-                    break
-                
-                file_path = file_info['path']
-                
-                with self.lock:
-                    self.file_statuses[file_path] = FileStatus.PROCESSING
-                
-                logger.debug(f"Processing file: {file_path}")
-                
-                try:
-                    # Call converter function
-                    result = converter_func(file_info, self.settings)
-                    
-                    with self.lock:
-                        if result.get('success'):
-                            self.file_statuses[file_path] = FileStatus.COMPLETED
-                            self.results[file_path] = result
-                            completed += 1
-                        else:
-                            self.file_statuses[file_path] = FileStatus.FAILED
-                            self.errors[file_path] = result.get('error', 'Unknown error')
-                            # Stop on failure (as per requirements)
-                            self.status = JobStatus.FAILED
-                            self.cancelled = True
-                            break
-                        
-                        self.progress = completed / total_files
-                
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {e}", exc_info=True)
-                    with self.lock:
-                        self.file_statuses[file_path] = FileStatus.FAILED
-                        self.errors[file_path] = str(e)
-                        self.status = JobStatus.FAILED
-                        self.cancelled = True
-                    break
+            self.file_statuses[file_path] = FileStatus.FAILED
+            self.errors[file_path] = result.get('error', 'Unknown error')
+            # Stop on failure (as per requirements)
+            self.status = JobStatus.FAILED
+            self.cancelled = True
+            return False
+    
+    def _run(self, converter_func):
+        """Run conversion in background (max_workers files at a time)"""
+        try:
+            if self.max_workers <= 1:
+                for file_info in self.files:
+                    if not self._process_file(file_info, converter_func):
+                        break
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    list(executor.map(lambda f: self._process_file(f, converter_func), self.files))
             
             if not self.cancelled:
                 self.status = JobStatus.COMPLETED
@@ -115,6 +128,9 @@ class ConversionJob:
             logger.error(f"Job {self.job_id} failed: {e}", exc_info=True)
             self.status = JobStatus.FAILED
             self.end_time = time.time()
+        
+        if self.store:
+            self.store.save(self.job_id, self.get_status())
     
     def cancel(self):
         """Cancel running conversion"""
@@ -137,6 +153,7 @@ class ConversionJob:
                 'total_files': len(self.files),
                 'completed_files': sum(1 for s in self.file_statuses.values() if s == FileStatus.COMPLETED),
                 'failed_files': sum(1 for s in self.file_statuses.values() if s == FileStatus.FAILED),
+                'skipped_files': sum(1 for r in self.results.values() if r.get('skipped')),
                 'file_statuses': file_statuses,
                 'results': self.results,
                 'errors': self.errors,
@@ -146,27 +163,58 @@ class ConversionJob:
             }
 
 
+class SharedConversionJob:
+    """A conversion job owned by another worker process, read from its latest published snapshot"""
+    
+    def __init__(self, store: JobSnapshotStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+    
+    def get_status(self) -> Dict:
+        """Get job status as last published by its worker (failed if that worker has exited mid-job)"""
+        snapshot = self.store.load(self.job_id)
+        if snapshot is None:
+            return {'job_id': self.job_id, 'status': JobStatus.FAILED.value}
+        if snapshot.get('end_time') is None and not owner_is_live(snapshot):
+            snapshot = {**snapshot, 'status': JobStatus.FAILED.value, 'error': OWNER_GONE_ERROR,
+                        'end_time': time.time()}
+            self.store.save(self.job_id, snapshot)
+        snapshot.pop('owner_pid', None)
+        snapshot.pop('owner_token', None)
+        return snapshot
+    
+    def cancel(self):
+        """Ask the owning worker to cancel the job"""
+        self.store.request_cancel(self.job_id)
+
+
 class JobManager:
     """Manages all conversion jobs"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[JobSnapshotStore] = None):
         self.jobs: Dict[str, ConversionJob] = {}
         self.lock = threading.Lock()
+        self.store = store
     
-    def create_job(self, files: List[Dict], settings: Dict) -> str:
+    def create_job(self, files: List[Dict], settings: Dict, max_workers: int = 1) -> str:
         """Create a new conversion job"""
         job_id = str(uuid.uuid4())
-        job = ConversionJob(job_id, files, settings)
+        job = ConversionJob(job_id, files, settings, max_workers, store=self.store)
         
         with self.lock:
             self.jobs[job_id] = job
+        if self.store:
+            self.store.save(job_id, job.get_status())
         
         return job_id
     
     def get_job(self, job_id: str) -> Optional[ConversionJob]:
-        """Get job by ID"""
+        """Get job by ID (a SharedConversionJob when another worker process runs it)"""
         with self.lock:
-            return self.jobs.get(job_id)
+            job = self.jobs.get(job_id)
+        if job is None and self.store and self.store.load(job_id) is not None:
+            return SharedConversionJob(self.store, job_id)
+        return job
     
     def cancel_job(self, job_id: str) -> bool:
         """Cancel a job"""
@@ -188,10 +236,15 @@ class JobManager:
             for job_id in to_remove:
                 del self.jobs[job_id]
                 logger.debug(f"Cleaned up old job: {job_id}")
+        if self.store:
+            self.store.cleanup(max(max_age_seconds, 60))
 
 
 # Global job manager instance
-job_manager = JobManager()
+job_manager = JobManager(get_job_store('conversion'))
+
+# Limits concurrent FFmpeg video conversions across all jobs (each FFmpeg is already multi-threaded)
+video_conversion_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CONVERSIONS)
 
 
 
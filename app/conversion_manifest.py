@@ -0,0 +1,319 @@
+"""
+Conversion manifest: skip/dedupe cache for media conversions
+
+Records (input fingerprint, effective settings) -> output path so that
+re-running a conversion on an unchanged file with the same settings reports
+the existing output instead of encoding again. An identical copy of an input
+stored elsewhere (another learner's folder) gets its own output, linked or
+copied from the recorded one.
+
+The manifest file is shared by the gunicorn workers: every read-modify-write
+holds an exclusive lock on <manifest>.lock, and entries are reloaded whenever
+another process has rewritten the file.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes (single-process server only)
+    fcntl = None
+
+from app.metrics import record_cache
+from config import CONVERSION_MANIFEST_FILE
+
+logger = logging.getLogger('media_converter.manifest')
+
+# Read size for hashing inputs
+HASH_CHUNK_BYTES = 1024 * 1024
+# Remembered input digests ((path, size, mtime_ns) -> sha256), oldest dropped first
+FINGERPRINT_MEMO_SIZE = 1024
+_fingerprints: Dict[tuple, str] = {}
+_fingerprint_lock = threading.Lock()
+
+
+def settings_fingerprint(settings: Dict) -> str:
+    """Stable digest of effective conversion settings (key order independent)"""
+    canonical = json.dumps(settings, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def content_fingerprint(file_path: Path, stat: Optional[os.stat_result] = None) -> str:
+    """
+    SHA-256 of the whole file.
+
+    Only needed when the path/size/mtime match fails (new, moved or edited
+    inputs), and reading the file is small next to re-encoding it. Digests
+    are remembered per (path, size, mtime_ns), so lookup and record of one
+    conversion read the file once.
+    """
+    stat = stat or file_path.stat()
+    memo_key = (str(file_path), stat.st_size, stat.st_mtime_ns)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(memo_key)
+    if cached is not None:
+        return cached
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    with _fingerprint_lock:
+        if len(_fingerprints) >= FINGERPRINT_MEMO_SIZE:
+            _fingerprints.pop(next(iter(_fingerprints)))
+        _fingerprints[memo_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """File-backed manifest of completed conversions"""
+
+    def __init__(self, manifest_file: Path):
+        self.manifest_file = Path(manifest_file)
+        self.lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._mtime: Optional[int] = None  # mtime_ns of the file as this process last read or wrote it
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return self.manifest_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    @contextmanager
+    def _locked(self):
+        """Hold self.lock and an exclusive lock on the manifest's lock file (other worker processes)"""
+        with self.lock:
+            lock_file = None
+            if fcntl is not None:
+                try:
+                    self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+                    lock_file = open(self.manifest_file.with_suffix('.lock'), 'a')
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except OSError as e:
+                    logger.warning(f"Could not lock conversion manifest: {e}")
+                    if lock_file is not None:
+                        lock_file.close()
+                    lock_file = None
+            try:
+                yield
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def _load(self) -> Dict[str, Dict]:
+        """Entries, (re)loaded from disk when another process changed the file (caller holds _locked())"""
+        mtime = self._file_mtime()
+        if self._entries is not None and mtime == self._mtime:
+            return self._entries
+        self._entries = {}
+        self._mtime = mtime
+        if mtime is not None:
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('entries', {})
+            except (json.JSONDecodeError, IOError) as e:
+                logger.warning(f"Error loading conversion manifest, starting empty: {e}")
+        return self._entries
+
+    def _save(self):
+        """Write entries atomically (caller holds _locked())"""
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.manifest_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self._entries}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.manifest_file)
+        self._mtime = self._file_mtime()
+
+    @staticmethod
+    def _key(input_path: str, settings_hash: str) -> str:
+        return f"{input_path}:{settings_hash}"
+
+    def _output_valid(self, entry: Dict) -> bool:
+        """The recorded output must still exist with the size we wrote"""
+        output_path = Path(entry['output_path'])
+        try:
+            return output_path.is_file() and output_path.stat().st_size == entry.get('output_size')
+        except OSError:
+            return False
+
+    def lookup(self, input_path: Path, settings: Dict) -> Optional[Dict]:
+        """
+        Find a previous conversion of this input with these settings.
+
+        An entry recorded for the same path with unchanged size and mtime is
+        accepted without hashing; otherwise the content fingerprint is used,
+        which also matches identical copies of a file stored elsewhere. Such
+        an entry's output belongs to the other input (compare its
+        'input_path'); run_with_manifest gives this input its own copy.
+
+        Returns:
+            Manifest entry dict, or None if the input must be converted
+        """
+        input_path = Path(input_path)
+        try:
+            stat = input_path.stat()
+        except OSError:
+            return None
+        settings_hash = settings_fingerprint(settings)
+
+        with self._locked():
+            entry = self._load().get(self._key(str(input_path), settings_hash))
+            if (entry is not None and entry['input_size'] == stat.st_size
+                    and entry['input_mtime_ns'] == stat.st_mtime_ns and self._output_valid(entry)):
+                return dict(entry)
+
+        content_hash = content_fingerprint(input_path, stat)
+        with self._locked():
+            entries = self._load()
+            matches = [(key, entry) for key, entry in entries.items()
+                       if entry.get('content_hash') == content_hash and entry['settings_hash'] == settings_hash]
+            stale = [key for key, entry in matches if not self._output_valid(entry)]
+            for key in stale:
+                logger.debug(f"Manifest entry stale (output missing or changed): {entries[key]['output_path']}")
+                del entries[key]
+            if stale:
+                self._save()
+            valid = [entry for key, entry in matches if key not in stale]
+            if not valid:
+                return None
+            # This input's own entry (content unchanged, only touched) before a copy's
+            valid.sort(key=lambda entry: entry['input_path'] != str(input_path))
+            return dict(valid[0])
+
+    def record(self, input_path: Path, settings: Dict, output_path: Path, result: Optional[Dict] = None) -> Dict:
+        """Record a completed conversion and return the stored entry"""
+        input_path = Path(input_path)
+        output_path = Path(output_path)
+        stat = input_path.stat()
+        settings_hash = settings_fingerprint(settings)
+        content_hash = content_fingerprint(input_path, stat)
+        entry = {
+            'input_path': str(input_path),
+            'input_size': stat.st_size,
+            'input_mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash,
+            'settings': settings,
+            'settings_hash': settings_hash,
+            'output_path': str(output_path),
+            'output_size': output_path.stat().st_size,
+            'result': result or {},
+            'recorded_at': datetime.now().isoformat(),
+        }
+        with self._locked():
+            self._load()[self._key(str(input_path), settings_hash)] = entry
+            self._save()
+        return dict(entry)
+
+    def query(self, input_path: Optional[str] = None, output_path: Optional[str] = None) -> List[Dict]:
+        """List manifest entries, optionally filtered by input or output path"""
+        with self._locked():
+            entries = list(self._load().values())
+        if input_path:
+            entries = [e for e in entries if e['input_path'] == str(input_path)]
+        if output_path:
+            entries = [e for e in entries if e['output_path'] == str(output_path)]
+        return sorted(entries, key=lambda e: e['recorded_at'], reverse=True)
+
+    def remove(self, input_path: str) -> int:
+        """Forget all entries for an input path; returns number removed"""
+        with self._locked():
+            entries = self._load()
+            keys = [k for k, e in entries.items() if e['input_path'] == str(input_path)]
+            for key in keys:
+                del entries[key]
+            if keys:
+                self._save()
+        return len(keys)
+
+
+def _copy_output(source: Path, destination: Path) -> None:
+    """Copy a recorded output over destination atomically (a copy, not a hardlink: outputs are edited in place)"""
+    tmp_path = destination.with_name(f'.{destination.name}.tmp')
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def run_with_manifest(input_path: Path, settings: Dict, convert_func, force: bool = False,
+                      manifest: Optional[ConversionManifest] = None,
+                      reserve_output: Optional[Callable[[], Path]] = None) -> Dict:
+    """
+    Run a conversion unless an identical one is already recorded.
+
+    Args:
+        input_path: Source file
+        settings: Effective settings (everything that affects the output)
+        convert_func: Callable with no arguments returning a converter result dict
+        force: Convert even if the manifest has a valid output
+        manifest: Manifest to use (defaults to the global one)
+        reserve_output: Callable claiming this input's own output path; when an
+            identical copy stored elsewhere was converted, its output is copied
+            there (without it, such a match is converted again)
+
+    Returns:
+        Converter result dict; skipped conversions have 'skipped': True and
+        report the existing (or copied) output
+    """
+    manifest = manifest or conversion_manifest
+    input_path = Path(input_path)
+
+    if not force:
+        entry = manifest.lookup(input_path, settings)
+        if entry and entry['input_path'] != str(input_path):
+            entry = _copy_for_input(manifest, entry, input_path, settings, reserve_output)
+        record_cache('conversion_manifest', hit=bool(entry))
+        if entry:
+            logger.info(f"Skipping unchanged input {input_path.name}: output exists at {entry['output_path']}")
+            result = dict(entry.get('result') or {})
+            result.update({
+                'success': True,
+                'skipped': True,
+                'output_path': entry['output_path'],
+                'output_size': entry['output_size'],
+                'processing_time': 0,
+            })
+            return result
+
+    result = convert_func()
+    if result.get('success') and result.get('output_path'):
+        try:
+            manifest.record(input_path, settings, Path(result['output_path']), result)
+        except OSError as e:
+            logger.warning(f"Could not record conversion in manifest: {e}")
+    result['skipped'] = False
+    return result
+
+
+def _copy_for_input(manifest: ConversionManifest, entry: Dict, input_path: Path, settings: Dict,
+                    reserve_output: Optional[Callable[[], Path]]) -> Optional[Dict]:
+    """Give input_path its own copy of another input's recorded output; None to convert instead"""
+    if reserve_output is None:
+        return None
+    output_path = reserve_output()
+    try:
+        _copy_output(Path(entry['output_path']), output_path)
+        result = dict(entry.get('result') or {}, output_path=str(output_path))
+        copied = manifest.record(input_path, settings, output_path, result)
+    except OSError as e:
+        logger.warning(f"Could not copy converted output {entry['output_path']} for {input_path.name}: {e}")
+        from app.utils import release_media_output_path
+        release_media_output_path(output_path)
+        return None
+    logger.info(f"Identical input {input_path.name} already converted: copied {entry['output_path']} to {output_path}")
+    return copied
+
+
+# Global manifest instance
+conversion_manifest = ConversionManifest(CONVERSION_MANIFEST_FILE)
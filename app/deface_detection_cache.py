@@ -0,0 +1,170 @@
+"""
+Face detection cache for deface
+
+Stores the boxes deface anonymized (per frame: x1, y1, x2, y2, score) for a
+file, keyed by its content fingerprint plus the settings that change
+detection (thresh, scale and, for videos, the stride/tracking settings).
+Re-running deface on the same file with only a different style
+(replacewith, mosaicsize, boxes, draw_scores) re-renders from the cached
+boxes without running the model. The manual deface editor also uses the
+cached boxes as suggested regions.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.conversion_manifest import content_fingerprint, settings_fingerprint
+from app.metrics import record_cache
+from config import DEFACE_DETECTION_CACHE_DIR, DEFACE_DETECTION_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+
+def image_params(thresh: float, scale: Optional[Tuple[int, int]]) -> Dict:
+    """Settings that determine an image's detections"""
+    return {'kind': 'image', 'thresh': float(thresh), 'scale': list(scale) if scale else None}
+
+
+def video_params(thresh: float, scale: Optional[Tuple[int, int]], detection_stride: int,
+                 scene_threshold: float, margin: float) -> Dict:
+    """Settings that determine a video's per-frame boxes (detection plus tracking)"""
+    params = image_params(thresh, scale)
+    params.update({
+        'kind': 'video',
+        'detection_stride': int(detection_stride),
+        'scene_threshold': float(scene_threshold),
+        'margin': float(margin),
+    })
+    return params
+
+
+class DetectionCache:
+    """Directory of .npz files, one per (content, detection settings), pruned oldest-first past max_bytes"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_path(self, input_path: Path, params: Dict) -> Path:
+        # content_fingerprint remembers digests per (path, size, mtime_ns), so unchanged files are hashed once
+        return self.cache_dir / f"{content_fingerprint(Path(input_path))}_{settings_fingerprint(params)[:16]}.npz"
+
+    def get(self, input_path: Path, params: Dict) -> Optional[Dict]:
+        """
+        Cached detections for this file and settings.
+
+        Returns:
+            Dict with 'detections' (list of (N, 5) arrays, one per frame) and
+            'meta' (e.g. fps for videos), or None on a miss
+        """
+        if not self.enabled:
+            return None
+        try:
+            entry_path = self._entry_path(input_path, params)
+            if not entry_path.exists():
+                record_cache('deface_detections', hit=False)
+                return None
+            with np.load(entry_path) as data:
+                boxes, counts = data['boxes'], data['counts']
+                meta = json.loads(str(data['meta']))
+            os.utime(entry_path)  # mark as recently used for pruning
+        except Exception as e:
+            logger.warning(f"Could not read deface detection cache for {Path(input_path).name}: {e}")
+            record_cache('deface_detections', hit=False)
+            return None
+        record_cache('deface_detections', hit=True)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return {
+            'detections': [boxes[offsets[i]:offsets[i + 1]] for i in range(len(counts))],
+            'meta': meta,
+        }
+
+    def put(self, input_path: Path, params: Dict, detections: List[np.ndarray], meta: Optional[Dict] = None) -> None:
+        """Store per-frame detections for this file and settings (errors are logged, not raised)"""
+        if not self.enabled:
+            return
+        try:
+            entry_path = self._entry_path(input_path, params)
+            boxes = [np.asarray(d, dtype=np.float32).reshape(-1, 5) for d in detections]
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = entry_path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(
+                    f,
+                    boxes=np.concatenate(boxes) if boxes else np.empty((0, 5), dtype=np.float32),
+                    counts=np.asarray([len(b) for b in boxes], dtype=np.int32),
+                    meta=np.asarray(json.dumps(dict(meta or {}, params=params, source=str(input_path))))
+                )
+            os.replace(tmp_path, entry_path)
+        except Exception as e:
+            logger.warning(f"Could not write deface detection cache for {Path(input_path).name}: {e}")
+            return
+        self.prune()
+
+    def invalidate(self, input_path: Path, params: Dict) -> None:
+        """Drop the entry for this file and settings (e.g. it no longer matches the file)"""
+        try:
+            self._entry_path(input_path, params).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            try:
+                entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.cache_dir.glob('*.npz')]
+            except OSError:
+                return
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+
+
+def suggested_regions(dets: np.ndarray, frame_size: Tuple[int, int], mask_scale: float) -> List[Dict]:
+    """
+    Manual-deface-style areas (x, y, width, height) covering the regions deface anonymized.
+
+    Args:
+        dets: (N, 5) detections for one frame
+        frame_size: (width, height) of the image/frame
+        mask_scale: Box enlargement deface applied (DEFACE_MASK_SCALE)
+    """
+    from deface.deface import scale_bb
+
+    width, height = frame_size
+    regions = []
+    for det in dets:
+        x1, y1, x2, y2 = scale_bb(*det[:4].astype(int), mask_scale)
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(width - 1, int(x2)), min(height - 1, int(y2))
+        if x2 <= x1 or y2 <= y1:
+            continue
+        regions.append({
+            'x': x1,
+            'y': y1,
+            'width': x2 - x1,
+            'height': y2 - y1,
+            'shape': 'rectangular',
+            'score': round(float(det[4]), 3),
+        })
+    return regions
+
+
+# Global cache instance
+detection_cache = DetectionCache(DEFACE_DETECTION_CACHE_DIR, DEFACE_DETECTION_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,207 @@
+"""
+In-process face detection engine for image deface
+
+Loads the CenterFace model from the deface package once per (scale, backend,
+execution provider) and reuses it across images, instead of starting a
+`deface` subprocess (Python + OpenCV/onnxruntime import + model load) per
+image. Detection and anonymization call the same deface functions the CLI
+uses, so output files match the CLI path.
+"""
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# deface CLI defaults that deface_image never overrides
+DEFACE_MASK_SCALE = 1.3
+
+_engines: Dict[Tuple, 'FaceDetectionEngine'] = {}
+_engines_lock = threading.Lock()
+
+
+def is_available() -> bool:
+    """True if the deface package can be imported into this process"""
+    try:
+        import deface.centerface  # noqa: F401
+        import deface.deface  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+class FaceDetectionEngine:
+    """CenterFace model loaded once, with batched detection and CLI-identical anonymization"""
+
+    def __init__(self, scale: Optional[Tuple[int, int]] = None, backend: str = 'auto',
+                 execution_provider: Optional[str] = None):
+        from deface.centerface import CenterFace
+
+        start_time = time.time()
+        self.scale = tuple(scale) if scale else None
+        self.centerface = CenterFace(in_shape=self.scale, backend=backend,
+                                     override_execution_provider=execution_provider)
+        self.backend = self.centerface.backend
+        # Neither cv2.dnn nets nor our batching are safe to share between threads
+        self.lock = threading.Lock()
+        logger.info(f"Deface engine loaded (backend={self.backend}, scale={self.scale}) "
+                    f"in {time.time() - start_time:.2f}s")
+
+    def _forward(self, blob):
+        """Run the network on an NCHW blob; returns heatmap, scale, offset, landmarks"""
+        cf = self.centerface
+        if cf.backend == 'opencv':
+            cf.net.setInput(blob)
+            return cf.net.forward(cf.onnx_output_names)
+        return cf.sess.run(cf.onnx_output_names, {cf.onnx_input_name: blob})
+
+    def detect(self, frames: List, thresh: float = 0.2) -> List:
+        """
+        Detect faces in RGB frames (numpy arrays), batching frames of equal size.
+
+        Mirrors CenterFace.__call__ per frame: each frame gets the same resize
+        and decode, only the forward pass is shared.
+
+        Returns:
+            List of (N, 5) detection arrays (x1, y1, x2, y2, score), one per frame
+        """
+        import cv2
+        import numpy as np
+        from deface.centerface import ensure_rgb
+
+        cf = self.centerface
+        frames = [ensure_rgb(f) for f in frames]
+        results = [None] * len(frames)
+
+        groups: Dict[Tuple, List[int]] = {}
+        for i, frame in enumerate(frames):
+            orig_shape = frame.shape[:2]
+            in_shape = orig_shape[::-1] if cf.in_shape is None else cf.in_shape
+            groups.setdefault((tuple(in_shape), orig_shape), []).append(i)
+
+        with self.lock:
+            for (in_shape, orig_shape), indices in groups.items():
+                w_new, h_new, scale_w, scale_h = cf.shape_transform(in_shape, orig_shape)
+                blob = cv2.dnn.blobFromImages(
+                    [frames[i] for i in indices], scalefactor=1.0, size=(w_new, h_new),
+                    mean=(0, 0, 0), swapRB=False, crop=False
+                )
+                heatmap, scale, offset, lms = self._forward(blob)
+                for n, i in enumerate(indices):
+                    dets, _ = cf.decode(heatmap[n:n + 1], scale[n:n + 1], offset[n:n + 1], lms[n:n + 1],
+                                        (h_new, w_new), threshold=thresh)
+                    if len(dets) > 0:
+                        dets[:, 0:4:2], dets[:, 1:4:2] = dets[:, 0:4:2] / scale_w, dets[:, 1:4:2] / scale_h
+                    else:
+                        dets = np.empty(shape=[0, 5], dtype=np.float32)
+                    results[i] = dets
+        return results
+
+    def anonymize_files(
+        self,
+        items: List[Tuple[Path, Path]],
+        replacewith: str = 'blur',
+        boxes: bool = False,
+        thresh: float = 0.2,
+        mosaicsize: int = 20,
+        draw_scores: bool = False,
+        batch_size: int = 8,
+        detection_cache=None
+    ) -> List[Dict]:
+        """
+        Anonymize image files, running detection batch_size images at a time.
+
+        Args:
+            items: (input_path, output_path) pairs
+            replacewith, boxes, thresh, mosaicsize, draw_scores: as deface_image
+            detection_cache: DetectionCache; images with cached detections for
+                (thresh, scale) skip the model, new detections are stored
+
+        Returns:
+            List of deface_image-style result dicts, same order as items
+            (with 'cached' True when the detections came from the cache)
+        """
+        import imageio
+        import imageio.v2 as iio
+        from deface.deface import anonymize_frame
+
+        # deface_image only forwards solid/mosaic; everything else is the CLI default (blur)
+        if replacewith not in ('solid', 'mosaic'):
+            replacewith = 'blur'
+
+        results: List[Optional[Dict]] = [None] * len(items)
+        cache_params = None
+        if detection_cache is not None:
+            from app.deface_detection_cache import image_params
+            cache_params = image_params(thresh, self.scale)
+        batch_size = max(1, int(batch_size))
+        for batch_start in range(0, len(items), batch_size):
+            batch = []
+            cached = {}
+            for i in range(batch_start, min(batch_start + batch_size, len(items))):
+                input_path, output_path = items[i]
+                try:
+                    if not Path(input_path).exists():
+                        results[i] = {'success': False, 'error': f'Input image not found: {input_path}'}
+                        continue
+                    batch.append((i, iio.imread(str(input_path))))
+                    if cache_params is not None:
+                        entry = detection_cache.get(input_path, cache_params)
+                        if entry is not None:
+                            cached[i] = entry['detections'][0]
+                except Exception as e:
+                    logger.error(f"Error reading {input_path} for deface: {e}", exc_info=True)
+                    results[i] = {'success': False, 'error': str(e)}
+            if not batch:
+                continue
+
+            to_detect = [(i, frame) for i, frame in batch if i not in cached]
+            try:
+                detected = self.detect([frame for _, frame in to_detect], thresh=thresh) if to_detect else []
+            except Exception as e:
+                logger.error(f"Deface engine detection failed: {e}", exc_info=True)
+                for i, _ in to_detect:
+                    results[i] = {'success': False, 'error': f'Deface processing failed: {e}'}
+                batch = [(i, frame) for i, frame in batch if i in cached]
+                detected = []
+            new_dets = {i: dets for (i, _), dets in zip(to_detect, detected)}
+            if cache_params is not None:
+                frames = dict(to_detect)
+                for i, dets in new_dets.items():
+                    height, width = frames[i].shape[:2]
+                    detection_cache.put(items[i][0], cache_params, [dets], meta={'size': [width, height]})
+
+            for i, frame in batch:
+                dets = cached[i] if i in cached else new_dets[i]
+                output_path = Path(items[i][1])
+                try:
+                    anonymize_frame(
+                        dets, frame, mask_scale=DEFACE_MASK_SCALE,
+                        replacewith=replacewith, ellipse=not boxes, draw_scores=draw_scores,
+                        replaceimg=None, mosaicsize=mosaicsize
+                    )
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    imageio.imsave(str(output_path), frame)
+                    results[i] = {'success': True, 'output_path': str(output_path), 'faces': len(dets),
+                                  'cached': i in cached}
+                except Exception as e:
+                    logger.error(f"Error writing deface output {output_path}: {e}", exc_info=True)
+                    results[i] = {'success': False, 'error': str(e)}
+        return results
+
+
+def get_engine(scale: Optional[Tuple[int, int]] = None,
+               execution_provider: Optional[str] = None) -> FaceDetectionEngine:
+    """Shared engine for these settings (model loaded on first use)"""
+    from config import DEFACE_ENGINE_BACKEND
+
+    key = (tuple(scale) if scale else None, DEFACE_ENGINE_BACKEND, execution_provider)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = FaceDetectionEngine(scale=scale, backend=DEFACE_ENGINE_BACKEND,
+                                         execution_provider=execution_provider)
+            _engines[key] = engine
+        return engine
@@ -0,0 +1,227 @@
+"""
+Asynchronous deface job management
+
+/apply_deface validates the request, then hands processing to a DefaceJob so
+the HTTP request returns immediately. Each job owns its own progress state
+(bound for the job's thread via app.deface_video_log), so concurrent jobs and
+their status/event streams do not see each other's progress.
+
+With several worker processes (SHARED_JOB_STATE), each job is also published
+to a JobSnapshotStore, and a worker that does not own a job answers for it
+through a SharedDefaceJob read from the latest snapshot.
+"""
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from config import DEFACE_MAX_CONCURRENT_JOBS, DEFACE_JOB_RETENTION_SECONDS
+from app.deface_video_log import (
+    bind_deface_progress, copy_deface_progress, get_deface_completed_items, get_deface_progress,
+    new_deface_progress, unbind_deface_progress
+)
+from app.job_store import OWNER_GONE_ERROR, JobSnapshotStore, get_job_store, owner_is_live
+
+logger = logging.getLogger('deface.job')
+
+# Limits deface jobs processing at once in this process (each already runs detection on all cores)
+deface_job_slots = threading.BoundedSemaphore(max(1, DEFACE_MAX_CONCURRENT_JOBS))
+
+
+class DefaceJobStatus(Enum):
+    PENDING = 'pending'  # waiting for a job slot
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+
+def _status_dict(fields: Dict, progress: Dict) -> Dict:
+    """Job status payload from a job's fields and its raw progress state"""
+    start_time, end_time = fields['start_time'], fields['end_time']
+    return {
+        'job_id': fields['job_id'],
+        'session_id': fields['session_id'],
+        'status': fields['status'],
+        'progress': get_deface_progress(progress),
+        'result': fields['result'],
+        'status_code': fields['status_code'],
+        'error': fields['error'],
+        'start_time': start_time,
+        'end_time': end_time,
+        'elapsed_time': round((end_time or time.time()) - start_time, 2) if start_time else 0
+    }
+
+
+class DefaceJob:
+    """One /apply_deface run in a background thread"""
+
+    def __init__(self, job_id: str, session_id: Optional[str] = None, store: Optional[JobSnapshotStore] = None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.status = DefaceJobStatus.PENDING
+        self.progress = new_deface_progress()
+        self.result: Optional[Dict] = None  # response payload, same shape as the synchronous /apply_deface
+        self.status_code: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_time = time.time()
+        self.start_time = None
+        self.end_time = None
+        self.thread = None
+        self.store = store  # shared with other worker processes, if any
+        self.lock = threading.Lock()
+
+    def start(self, run_func: Callable[[], Tuple[Dict, int]]):
+        """Run run_func in a background thread; it returns (payload, status_code)"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, args=(run_func,), daemon=True)
+        self.thread.start()
+        logger.info(f"Deface job {self.job_id} queued")
+
+    def run(self, run_func: Callable[[], Tuple[Dict, int]]):
+        """Run run_func in the calling thread (after waiting for a job slot)"""
+        if self.store:
+            self.store.start_publisher(self.job_id, self.snapshot, lambda: self.done)
+        with deface_job_slots:
+            token = bind_deface_progress(self.progress)
+            with self.lock:
+                self.status = DefaceJobStatus.PROCESSING
+                self.start_time = time.time()
+            try:
+                payload, status_code = run_func()
+            except Exception as e:
+                logger.error(f"Deface job {self.job_id} failed: {e}", exc_info=True)
+                payload, status_code = {'success': False, 'error': str(e)}, 500
+            finally:
+                unbind_deface_progress(token)
+
+        with self.lock:
+            self.result = payload
+            self.status_code = status_code
+            if payload.get('success'):
+                self.status = DefaceJobStatus.COMPLETED
+            else:
+                self.status = DefaceJobStatus.FAILED
+                self.error = payload.get('error', 'Unknown error')
+            self.end_time = time.time()
+        if self.store:
+            self.store.save(self.job_id, self.snapshot())
+        logger.info(f"Deface job {self.job_id} finished: {self.status.value}")
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DefaceJobStatus.COMPLETED, DefaceJobStatus.FAILED)
+
+    def _fields(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'status': self.status.value,
+            'result': self.result,
+            'status_code': self.status_code,
+            'error': self.error,
+            'start_time': self.start_time,
+            'end_time': self.end_time
+        }
+
+    def get_status(self) -> Dict:
+        """Get current job status, with the run's progress and (when done) its result"""
+        with self.lock:
+            return _status_dict(self._fields(), self.progress)
+
+    def snapshot(self) -> Dict:
+        """Job fields and raw progress state, as published for other worker processes"""
+        with self.lock:
+            return {**self._fields(), 'progress_state': copy_deface_progress(self.progress)}
+
+    def get_items(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Processed items published so far (in input order), from offset"""
+        return get_deface_completed_items(self.progress, offset, limit)
+
+
+class SharedDefaceJob:
+    """A deface job owned by another worker process, read from its latest published snapshot"""
+
+    def __init__(self, store: JobSnapshotStore, snapshot: Dict):
+        self.store = store
+        self.job_id = snapshot['job_id']
+        self.session_id = snapshot.get('session_id')
+        self._snapshot = snapshot
+
+    def _latest(self) -> Dict:
+        snapshot = self.store.load(self.job_id) or self._snapshot
+        if snapshot['status'] in (DefaceJobStatus.PENDING.value, DefaceJobStatus.PROCESSING.value) \
+                and not owner_is_live(snapshot):
+            # Its worker was killed: the job will never finish, so record it as failed for every worker
+            snapshot = {**snapshot, 'status': DefaceJobStatus.FAILED.value, 'error': OWNER_GONE_ERROR,
+                        'result': {'success': False, 'error': OWNER_GONE_ERROR}, 'status_code': 500,
+                        'end_time': time.time()}
+            self.store.save(self.job_id, snapshot)
+        self._snapshot = snapshot
+        return self._snapshot
+
+    @property
+    def status(self) -> DefaceJobStatus:
+        return DefaceJobStatus(self._latest()['status'])
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DefaceJobStatus.COMPLETED, DefaceJobStatus.FAILED)
+
+    @property
+    def progress(self) -> Dict:
+        return self._latest()['progress_state']
+
+    def get_status(self) -> Dict:
+        snapshot = self._latest()
+        return _status_dict(snapshot, snapshot['progress_state'])
+
+    def get_items(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        return get_deface_completed_items(self.progress, offset, limit)
+
+
+class DefaceJobManager:
+    """Manages all deface jobs"""
+
+    def __init__(self, store: Optional[JobSnapshotStore] = None):
+        self.jobs: Dict[str, DefaceJob] = {}
+        self.lock = threading.Lock()
+        self.store = store
+
+    def create_job(self, session_id: Optional[str] = None) -> DefaceJob:
+        """Create a new deface job (finished jobs past retention are dropped first)"""
+        self.cleanup_old_jobs()
+        job = DefaceJob(str(uuid.uuid4()), session_id, store=self.store)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        if self.store:
+            self.store.save(job.job_id, job.snapshot())
+        return job
+
+    def get_job(self, job_id: str) -> Optional[DefaceJob]:
+        """Get job by ID (a SharedDefaceJob when another worker process runs it)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None and self.store:
+            snapshot = self.store.load(job_id)
+            if snapshot:
+                return SharedDefaceJob(self.store, snapshot)
+        return job
+
+    def cleanup_old_jobs(self, max_age_seconds: int = DEFACE_JOB_RETENTION_SECONDS):
+        """Remove finished jobs older than max_age_seconds"""
+        current_time = time.time()
+        with self.lock:
+            to_remove = [job_id for job_id, job in self.jobs.items()
+                         if job.end_time and (current_time - job.end_time) > max_age_seconds]
+            for job_id in to_remove:
+                del self.jobs[job_id]
+                logger.debug(f"Cleaned up old deface job: {job_id}")
+        if self.store:
+            self.store.cleanup(max(max_age_seconds, 60))
+
+
+# Global deface job manager instance
+deface_job_manager = DefaceJobManager(get_job_store('deface'))
@@ -3,17 +3,21 @@ Deface processor for face anonymization in images and videos
 Uses the deface command-line tool to anonymize faces in images and videos
 Also supports manual deface areas for precise control
 """
+import contextvars
 import json
+import os
 import re
 import subprocess
 import logging
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional, Tuple, List, Dict
+from typing import Callable, Optional, Tuple, List, Dict
 import tempfile
 import shutil
+from app.metrics import subprocess_timer
 
 logger = logging.getLogger(__name__)
 
@@ -92,10 +96,21 @@ def _get_ffmpeg_config(use_default_codec: bool = False) -> Optional[str]:
     return json.dumps({'codec': codec.strip()})
 
 
+def _opencv_dnn_threads() -> int:
+    """Threads OpenCV DNN (deface's fallback backend) runs inference on"""
+    try:
+        import cv2
+        return max(1, cv2.getNumThreads())
+    except Exception:
+        return os.cpu_count() or 1
+
+
 def get_onnx_runtime_status() -> Dict:
     """
     Detect available ONNX Runtime execution providers (same env as deface).
-    Returns dict with 'summary' (e.g. 'GPU (CUDA)' or 'CPU') and 'providers' list.
+    Returns dict with 'summary' (e.g. 'GPU (CUDA)' or 'CPU'), 'providers' list and
+    'inference_threads' (CPU threads one model inference keeps busy: 1 on a GPU provider,
+    else one per core as onnxruntime / OpenCV DNN use by default).
     """
     try:
         import onnxruntime as ort
@@ -104,19 +119,21 @@ def get_onnx_runtime_status() -> Dict:
         return {
             'summary': 'Not installed',
             'providers': [],
+            'inference_threads': _opencv_dnn_threads(),
             'error': 'onnxruntime not installed',
             'install_hint': 'pip install onnx onnxruntime-gpu  (optional, for faster video)',
         }
     except Exception as e:
-        return {'summary': 'Unknown', 'providers': [], 'error': str(e)}
+        return {'summary': 'Unknown', 'providers': [], 'inference_threads': os.cpu_count() or 1, 'error': str(e)}
     # Prefer first non-CPU provider for label
     gpu_like = ('CUDAExecutionProvider', 'TensorrtExecutionProvider', 'DmlExecutionProvider',
                 'CoreMLExecutionProvider', 'ROCMExecutionProvider', 'OpenVINOExecutionProvider')
+    override = _get_execution_provider()
     for p in providers:
-        if p in gpu_like:
+        if p in gpu_like and override in (None, p):
             short = p.replace('ExecutionProvider', '').replace('Dml', 'DirectML').replace('Rocm', 'ROCm')
-            return {'summary': f'GPU ({short})', 'providers': providers}
-    return {'summary': 'CPU', 'providers': providers}
+            return {'summary': f'GPU ({short})', 'providers': providers, 'inference_threads': 1}
+    return {'summary': 'CPU', 'providers': providers, 'inference_threads': os.cpu_count() or 1}
 
 
 def _video_debug(stage: str, msg: str) -> None:
@@ -150,6 +167,46 @@ def _find_deface_cmd() -> Optional[str]:
     return shutil.which('deface')
 
 
+def _get_inprocess_engine(scale: Optional[Tuple[int, int]] = None, kind: str = 'image'):
+    """
+    Shared in-process deface engine, or None to use the deface CLI.
+    None when DEFACE_IMAGE_ENGINE / DEFACE_VIDEO_ENGINE (per kind) is 'cli'
+    or the model cannot be loaded here.
+    """
+    try:
+        import config
+        if getattr(config, f'DEFACE_{kind.upper()}_ENGINE', 'inprocess') != 'inprocess':
+            return None
+    except Exception:
+        pass
+    try:
+        from app.deface_engine import get_engine, is_available
+        if not is_available():
+            return None
+        return get_engine(scale=scale, execution_provider=_get_execution_provider())
+    except Exception as e:
+        logger.warning(f"In-process deface engine unavailable, using deface CLI: {e}")
+        return None
+
+
+def _get_detection_cache():
+    """Shared detection cache, or None when disabled (DEFACE_DETECTION_CACHE_MAX_MB = 0) or unavailable"""
+    try:
+        from app.deface_detection_cache import detection_cache
+        return detection_cache if detection_cache.enabled else None
+    except Exception as e:
+        logger.warning(f"Deface detection cache unavailable: {e}")
+        return None
+
+
+def _deface_output_path(img_path: Path, output_dir: Path, output_prefix: str) -> Path:
+    """Output path with prefix (avoid double deface_ if input already has it)"""
+    filename = img_path.name
+    if filename.startswith('deface_'):
+        filename = filename[7:]
+    return output_dir / f"{output_prefix}{filename}"
+
+
 def deface_image(
     input_path: Path,
     output_path: Path,
@@ -163,6 +220,8 @@ def deface_image(
     """
     Anonymize faces in an image using the deface tool
     
+    Uses the in-process engine when available, otherwise runs the deface CLI.
+    
     Args:
         input_path: Path to input image
         output_path: Path to output image
@@ -183,6 +242,21 @@ def deface_image(
         # Ensure output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
+        engine = _get_inprocess_engine(scale, 'image')
+        if engine is not None:
+            result = engine.anonymize_files(
+                [(input_path, output_path)],
+                replacewith=replacewith,
+                boxes=boxes,
+                thresh=thresh,
+                mosaicsize=mosaicsize,
+                draw_scores=draw_scores,
+                detection_cache=_get_detection_cache()
+            )[0]
+            if result.get('success'):
+                logger.info(f"Deface processing successful: {output_path}")
+            return result
+        
         # Build deface command (venv bin same as Python, then PATH)
         deface_cmd_path = _find_deface_cmd()
         if not deface_cmd_path:
@@ -221,12 +295,13 @@ def deface_image(
         logger.info(f"Running deface: {' '.join(cmd)}")
         
         # Run deface command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
+        with subprocess_timer('deface', 'image'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=300  # 5 minute timeout
+            )
         
         if result.returncode != 0:
             error_msg = result.stderr or result.stdout or 'Unknown error'
@@ -247,6 +322,29 @@ def deface_image(
         return {'success': False, 'error': str(e)}
 
 
+def _image_pool_size(jobs: int, inprocess: bool) -> int:
+    """
+    Worker threads for deface_images: DEFACE_IMAGE_WORKERS, or derived from the CPU count.
+    With the in-process engine one worker per core: inference is serialised on the engine's
+    lock, so the pool is sized for the decode, anonymize and encode work around it, not for
+    the threads inference uses. CLI processes each load and run their own model, so there
+    the pool is the CPU count divided by the threads one inference uses (get_onnx_runtime_status).
+    """
+    try:
+        from config import DEFACE_IMAGE_WORKERS
+    except Exception:
+        DEFACE_IMAGE_WORKERS = 0
+    cpus = os.cpu_count() or 1
+    if DEFACE_IMAGE_WORKERS > 0:
+        workers = DEFACE_IMAGE_WORKERS
+    elif inprocess:
+        workers = cpus
+    else:
+        threads = max(1, int(get_onnx_runtime_status().get('inference_threads') or 1))
+        workers = cpus // threads
+    return max(1, min(workers, jobs))
+
+
 def deface_images(
     image_paths: List[Path],
     output_dir: Path,
@@ -256,10 +354,12 @@ def deface_images(
     scale: Optional[Tuple[int, int]] = None,
     mosaicsize: int = 20,
     draw_scores: bool = False,
-    output_prefix: str = 'deface_'
+    output_prefix: str = 'deface_',
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    item_callback: Optional[Callable[[int, dict], None]] = None
 ) -> dict:
     """
-    Anonymize faces in multiple images
+    Anonymize faces in multiple images (on a bounded worker pool, see _image_pool_size)
     
     Args:
         image_paths: List of input image paths
@@ -271,6 +371,11 @@ def deface_images(
         mosaicsize: Size of mosaic tiles
         draw_scores: Show detection scores
         output_prefix: Prefix to add to output filenames
+        progress_callback: Called from the calling thread with (done, total), where done
+            counts the images finished in input order (never decreases)
+        item_callback: Called from the calling thread with (index, result) for each image
+            as soon as it and all images before it are finished (result has 'output_path'
+            on success), so callers can publish results progressively and in order
     
     Returns:
         dict with 'success' (bool), 'processed' (list of output paths), 'errors' (list)
@@ -280,16 +385,35 @@ def deface_images(
     processed = []
     errors = []
     
-    for img_path in image_paths:
-        try:
-            # Generate output filename with prefix (avoid double deface_ if input already has it)
-            filename = img_path.name
-            if filename.startswith('deface_'):
-                filename = filename[7:]
-            output_filename = f"{output_prefix}{filename}"
-            output_path = output_dir / output_filename
-            
-            result = deface_image(
+    items = [(img_path, _deface_output_path(img_path, output_dir, output_prefix))
+             for img_path in image_paths]
+    results: List[Optional[dict]] = [None] * len(items)
+    
+    # One model load for the whole batch instead of one deface process per image
+    engine = _get_inprocess_engine(scale, 'image')
+    if engine is not None:
+        from config import DEFACE_ENGINE_BATCH_SIZE
+        batch_size = max(1, DEFACE_ENGINE_BATCH_SIZE)
+        detection_cache = _get_detection_cache()
+        chunks = [list(range(i, min(i + batch_size, len(items)))) for i in range(0, len(items), batch_size)]
+        
+        def run(indices):
+            return engine.anonymize_files(
+                [items[i] for i in indices],
+                replacewith=replacewith,
+                boxes=boxes,
+                thresh=thresh,
+                mosaicsize=mosaicsize,
+                draw_scores=draw_scores,
+                batch_size=batch_size,
+                detection_cache=detection_cache
+            )
+    else:
+        chunks = [[i] for i in range(len(items))]
+        
+        def run(indices):
+            img_path, output_path = items[indices[0]]
+            return [deface_image(
                 img_path,
                 output_path,
                 replacewith=replacewith,
@@ -298,21 +422,46 @@ def deface_images(
                 scale=scale,
                 mosaicsize=mosaicsize,
                 draw_scores=draw_scores
-            )
-            
-            if result.get('success'):
-                processed.append(str(output_path))
-            else:
-                errors.append({
-                    'input': str(img_path),
-                    'error': result.get('error', 'Unknown error')
-                })
-        
-        except Exception as e:
-            logger.error(f"Error processing {img_path}: {e}", exc_info=True)
+            )]
+    
+    workers = _image_pool_size(len(chunks), inprocess=engine is not None)
+    if len(chunks) > 1:
+        logger.info(f"Deface: {len(items)} image(s) in {len(chunks)} job(s) on {workers} worker(s)")
+    done_in_order = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='deface-image') as pool:
+        futures = {pool.submit(run, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                chunk_results = future.result()
+            except Exception as e:
+                logger.error(f"Error processing {items[chunk[0]][0]}: {e}", exc_info=True)
+                chunk_results = [{'success': False, 'error': str(e)} for _ in chunk]
+            for i, result in zip(chunk, chunk_results):
+                results[i] = result
+            # Report the finished prefix, so progress only moves forward and in queue order
+            done = done_in_order
+            while done < len(results) and results[done] is not None:
+                if results[done].get('success'):
+                    results[done].setdefault('output_path', str(items[done][1]))
+                if item_callback:
+                    item_callback(done, results[done])
+                done += 1
+            if progress_callback and done > done_in_order:
+                progress_callback(done, len(items))
+            done_in_order = done
+    
+    n_cached = sum(1 for r in results if r.get('cached'))
+    if n_cached:
+        logger.info(f"Deface: reused cached detections for {n_cached}/{len(items)} image(s)")
+    
+    for (img_path, output_path), result in zip(items, results):
+        if result.get('success'):
+            processed.append(str(output_path))
+        else:
             errors.append({
                 'input': str(img_path),
-                'error': str(e)
+                'error': result.get('error', 'Unknown error')
             })
     
     return {
@@ -325,6 +474,191 @@ def deface_images(
     }
 
 
+def _get_detection_stride(detection_stride: Optional[int]) -> int:
+    """Requested stride, or DEFACE_DETECTION_STRIDE; clamped to 1..DEFACE_DETECTION_STRIDE_MAX"""
+    try:
+        from config import DEFACE_DETECTION_STRIDE, DEFACE_DETECTION_STRIDE_MAX
+    except Exception:
+        DEFACE_DETECTION_STRIDE, DEFACE_DETECTION_STRIDE_MAX = 1, 30
+    if detection_stride is None:
+        detection_stride = DEFACE_DETECTION_STRIDE
+    return max(1, min(int(detection_stride), int(DEFACE_DETECTION_STRIDE_MAX)))
+
+
+def _plan_video_segments(video_path: Path) -> List[float]:
+    """Keyframe split times for parallel segment processing, or [] to process the video whole"""
+    try:
+        from config import DEFACE_SEGMENT_WORKERS, DEFACE_SEGMENT_MIN_SECONDS
+        if DEFACE_SEGMENT_WORKERS <= 1:
+            return []
+        from app.video_processor import get_video_info
+        info = get_video_info(video_path) or {}
+        duration = float(info.get('duration') or 0)
+        if duration < 2 * DEFACE_SEGMENT_MIN_SECONDS:
+            return []
+        from app.video_converter import get_keyframe_times
+        from app.deface_video_pipeline import plan_segments
+        return plan_segments(get_keyframe_times(video_path), duration,
+                             DEFACE_SEGMENT_WORKERS, DEFACE_SEGMENT_MIN_SECONDS)
+    except Exception as e:
+        logger.warning(f"Deface segment planning failed for {video_path.name}, processing whole video: {e}")
+        return []
+
+
+def _deface_video_inprocess(
+    video_path: Path,
+    output_path: Path,
+    engine,
+    replacewith: str,
+    boxes: bool,
+    thresh: float,
+    mosaicsize: int,
+    draw_scores: bool,
+    detection_stride: int
+) -> dict:
+    """
+    Run the in-process video pipeline with progress, timeout and hw-encode fallback.
+    Long videos are split at keyframes and processed as parallel segments
+    (DEFACE_SEGMENT_WORKERS); if segmenting fails the whole video is processed in one go.
+    With cached detections for these detection settings the video is only
+    re-rendered (single pass, no model); new detections are cached.
+    """
+    from app.deface_video_pipeline import anonymize_video, anonymize_video_segmented
+    from config import DEFACE_SCENE_CHANGE_THRESHOLD, DEFACE_TRACK_MARGIN
+
+    def failure(error: str) -> dict:
+        return {
+            'success': False,
+            'processed': [],
+            'errors': [{'input': str(video_path), 'error': error}],
+            'total': 1,
+            'successful': 0,
+            'failed': 1
+        }
+
+    try:
+        from config import DEFACE_FFMPEG_CODEC
+        codec = (DEFACE_FFMPEG_CODEC or 'libx264').strip()
+    except Exception:
+        codec = 'libx264'
+    video_timeout = _get_deface_video_timeout()
+    start = time.monotonic()
+    last_log = [start]
+
+    def on_progress(done: int, total: int) -> None:
+        try:
+            from app.deface_video_log import set_deface_current_item_pct, set_deface_elapsed
+            if total > 0:
+                set_deface_current_item_pct(int(round(100 * done / total)))
+            set_deface_elapsed(int(time.monotonic() - start))
+        except Exception:
+            pass
+        if time.monotonic() - last_log[0] >= 5:
+            last_log[0] = time.monotonic()
+            _video_debug("5_run", f"{video_path.name}: {done}/{total or '?'} frames "
+                                  f"({int(last_log[0] - start)}s elapsed)")
+
+    def on_segment_progress(pcts: List[int]) -> None:
+        try:
+            from app.deface_video_log import set_deface_segment_progress
+            set_deface_segment_progress(pcts)
+        except Exception:
+            pass
+
+    cache = _get_detection_cache()
+    cache_params = None
+    cached = None
+    if cache is not None:
+        from app.deface_detection_cache import video_params
+        cache_params = video_params(thresh, engine.scale, detection_stride,
+                                    DEFACE_SCENE_CHANGE_THRESHOLD, DEFACE_TRACK_MARGIN)
+        cached = cache.get(video_path, cache_params)
+
+    split_times = [] if cached else _plan_video_segments(video_path)
+    _video_debug("5_run", f"in-process pipeline backend={engine.backend} stride={detection_stride} codec={codec} "
+                          f"segments={len(split_times) + 1} cached_detections={cached is not None} "
+                          f"(timeout={video_timeout}s)")
+    codecs = list(dict.fromkeys([codec, 'libx264']))
+    while codecs:
+        attempt_codec = codecs[0]
+        options = dict(
+            replacewith=replacewith,
+            boxes=boxes,
+            thresh=thresh,
+            mosaicsize=mosaicsize,
+            draw_scores=draw_scores,
+            detection_stride=detection_stride,
+            scene_threshold=DEFACE_SCENE_CHANGE_THRESHOLD,
+            margin=DEFACE_TRACK_MARGIN,
+            codec=attempt_codec,
+            progress_callback=on_progress,
+            timeout=video_timeout
+        )
+        if cached:
+            options['detections'] = cached['detections']
+        try:
+            if split_times:
+                result = anonymize_video_segmented(
+                    video_path, output_path, split_times,
+                    scale=engine.scale,
+                    execution_provider=_get_execution_provider(),
+                    segment_progress_callback=on_segment_progress,
+                    **options
+                )
+            else:
+                result = anonymize_video(video_path, output_path, engine, **options)
+        except TimeoutError:
+            output_path.unlink(missing_ok=True)
+            mins = video_timeout // 60
+            _video_debug("5_run", f"FAIL timeout after {video_timeout}s")
+            return failure(f'Processing timed out (exceeded {mins} minute{"s" if mins != 1 else ""}). Try a shorter video or use Detection Scale 640×360 for faster processing.')
+        except Exception as e:
+            output_path.unlink(missing_ok=True)
+            _video_debug("5_run", f"FAIL codec={attempt_codec} error={str(e)[:500]}")
+            if attempt_codec != 'libx264' and _is_codec_encode_error(str(e)):
+                _video_debug("5_run", "Retrying with default codec (libx264) after hardware encode failure...")
+                codecs.pop(0)
+                continue
+            if split_times:
+                _video_debug("5_run", "Segmented processing failed; retrying as a single segment...")
+                split_times = []
+                continue
+            if cached:
+                _video_debug("5_run", "Cached detections unusable; retrying with detection...")
+                cache.invalidate(video_path, cache_params)
+                cached = None
+                continue
+            logger.error(f"Deface video processing failed: {e}", exc_info=True)
+            return failure(f'Deface processing failed: {_user_facing_deface_error(str(e))}')
+        if not result.get('success'):
+            _video_debug("5_run", f"FAIL {result.get('error')}")
+            return failure(f"Deface processing failed: {_user_facing_deface_error(result.get('error', ''))}")
+        break
+
+    if not output_path.exists():
+        _video_debug("6_verify", "FAIL output file was not created")
+        return failure('Output video file was not created')
+    if cache is not None and not cached:
+        cache.put(video_path, cache_params, result['detections'],
+                  meta={'fps': result.get('video_fps'), 'size': result.get('video_size')})
+    _video_debug("6_verify", f"OK output size={output_path.stat().st_size} bytes frames={result['frames']} "
+                             f"detected={result['detected_frames']} fps={result['fps']}")
+    _video_debug("7_done", f"success output={output_path}")
+    return {
+        'success': True,
+        'processed': [str(output_path)],
+        'errors': [],
+        'total': 1,
+        'successful': 1,
+        'failed': 0,
+        'frames': result['frames'],
+        'detected_frames': result['detected_frames'],
+        'cached_detections': bool(cached),
+        'segments': result.get('segments', 1),
+        'processing_time': result['processing_time']
+    }
+
+
 def deface_video(
     video_path: Path,
     output_dir: Path,
@@ -334,11 +668,16 @@ def deface_video(
     scale: Optional[Tuple[int, int]] = None,
     mosaicsize: int = 20,
     draw_scores: bool = False,
-    output_prefix: str = 'deface_'
+    output_prefix: str = 'deface_',
+    detection_stride: Optional[int] = None
 ) -> dict:
     """
     Process video directly with deface tool and save as MP4 format
 
+    Uses the in-process pipeline (detection every detection_stride frames,
+    boxes tracked in between) when available, otherwise the deface CLI,
+    which always detects on every frame.
+
     Returns:
         dict with 'success' (bool), 'processed' (list with single MP4 path), 'errors' (list)
     """
@@ -386,6 +725,19 @@ def deface_video(
         output_path.parent.mkdir(parents=True, exist_ok=True)
         _video_debug("2_output", f"output={output_path.name} dir={output_dir}")
 
+        # Stage 3: In-process pipeline (model already loaded, supports detection stride)
+        engine = _get_inprocess_engine(scale, 'video')
+        if engine is not None:
+            return _deface_video_inprocess(
+                video_path, output_path, engine,
+                replacewith=replacewith,
+                boxes=boxes,
+                thresh=thresh,
+                mosaicsize=mosaicsize,
+                draw_scores=draw_scores,
+                detection_stride=_get_detection_stride(detection_stride)
+            )
+
         # Stage 3: Find deface command
         _video_debug("3_cmd_lookup", "finding deface executable...")
         deface_cmd_path = _find_deface_cmd()
@@ -484,12 +836,14 @@ def deface_video(
                     except Exception:
                         pass
 
-            reader = threading.Thread(target=read_stderr, daemon=True)
+            # Run under a copy of this context so progress goes to the calling job
+            reader = threading.Thread(target=contextvars.copy_context().run, args=(read_stderr,), daemon=True)
             reader.start()
-            heart = threading.Thread(target=heartbeat, daemon=True)
+            heart = threading.Thread(target=contextvars.copy_context().run, args=(heartbeat,), daemon=True)
             heart.start()
             try:
-                stdout_raw, stderr_raw = proc.communicate(timeout=video_timeout)
+                with subprocess_timer('deface', 'video'):
+                    stdout_raw, stderr_raw = proc.communicate(timeout=video_timeout)
             except subprocess.TimeoutExpired:
                 proc.kill()
                 proc.communicate()
@@ -589,33 +943,98 @@ def deface_video(
         }
 
 
+def get_detection_suggestions(
+    input_path: Path,
+    settings: Dict,
+    time_point: Optional[float] = None
+) -> dict:
+    """
+    Suggested manual deface areas from the detections cached for a file
+
+    Args:
+        input_path: Original image/video that was defaced
+        settings: Deface settings the file was processed with (thresh, scale, detection_stride)
+        time_point: Time in seconds (videos only)
+
+    Returns:
+        dict with 'success', 'cached' (bool) and 'suggestions' (list of areas
+        with x, y, width, height, shape and score); empty when nothing is cached
+    """
+    from app.deface_detection_cache import image_params, suggested_regions, video_params
+    from app.deface_engine import DEFACE_MASK_SCALE
+
+    cache = _get_detection_cache()
+    if cache is None or not input_path.exists():
+        return {'success': True, 'cached': False, 'suggestions': []}
+
+    scale = None
+    scale_str = settings.get('scale') or ''
+    if scale_str and scale_str != 'original':
+        try:
+            width, height = scale_str.split('x')
+            scale = (int(width), int(height))
+        except ValueError:
+            pass
+    thresh = float(settings.get('thresh', 0.2))
+
+    if time_point is None:
+        entry = cache.get(input_path, image_params(thresh, scale))
+        frame_index = 0
+    else:
+        from config import DEFACE_SCENE_CHANGE_THRESHOLD, DEFACE_TRACK_MARGIN
+        entry = cache.get(input_path, video_params(
+            thresh, scale, _get_detection_stride(settings.get('detection_stride')),
+            DEFACE_SCENE_CHANGE_THRESHOLD, DEFACE_TRACK_MARGIN
+        ))
+        frame_index = int(round(float(time_point) * float((entry or {}).get('meta', {}).get('fps') or 0)))
+    if not entry or not entry['detections']:
+        return {'success': True, 'cached': False, 'suggestions': []}
+
+    detections = entry['detections']
+    frame_index = max(0, min(frame_index, len(detections) - 1))
+    size = entry['meta'].get('size') or [1 << 30, 1 << 30]
+    return {
+        'success': True,
+        'cached': True,
+        'suggestions': suggested_regions(detections[frame_index], tuple(size), DEFACE_MASK_SCALE)
+    }
+
+
 def apply_manual_deface(
     image_path: Path,
     output_path: Path,
     deface_areas: List[Dict],
-    mosaicsize: int = 20
+    mosaicsize: int = 20,
+    quality: int = 95
 ) -> dict:
     """
     Apply manual deface areas to an image
     
+    All areas are rendered in one pass on the pixel array (see
+    app.manual_deface_renderer). A JPEG input saved as JPEG keeps its own
+    quantization tables, so the manual edit does not change its quality.
+    
     Args:
         image_path: Path to input image (should already be defaced with automated deface)
-        output_path: Path to save image with manual defaces applied
+        output_path: Path to save image with manual defaces applied (format from its extension)
         deface_areas: List of deface area definitions, each with:
             - x (int): X coordinate (top-left corner)
             - y (int): Y coordinate (top-left corner)
             - width (int): Width of deface area
             - height (int): Height of deface area
-            - shape (str): 'square' or 'rectangular'
+            - shape (str): 'square', 'rectangular' or 'ellipse'
             - method (str): 'blur', 'solid', or 'mosaic'
             - mosaicsize (int, optional): Mosaic tile size (if method is 'mosaic')
         mosaicsize: Default mosaic tile size
+        quality: JPEG quality when the input is not a JPEG
     
     Returns:
         dict with 'success' (bool) and optional 'error' (str)
     """
     try:
-        from PIL import Image, ImageFilter, ImageDraw
+        import numpy as np
+        from PIL import Image, JpegImagePlugin
+        from app.manual_deface_renderer import render_areas
         
         if not image_path.exists():
             return {'success': False, 'error': f'Input image not found: {image_path}'}
@@ -623,62 +1042,24 @@ def apply_manual_deface(
         # Ensure output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Load image
-        img = Image.open(image_path)
-        
-        # Convert to RGB if necessary (for JPEG compatibility)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        with Image.open(image_path) as src:
+            save_options = {}
+            if src.format == 'JPEG':
+                save_options = {
+                    'qtables': src.quantization,
+                    'subsampling': JpegImagePlugin.get_sampling(src)
+                }
+            frame = np.array(src.convert('RGB'))
         
-        # Apply each deface area
-        for area in deface_areas:
-            x = int(area.get('x', 0))
-            y = int(area.get('y', 0))
-            width = int(area.get('width', 0))
-            height = int(area.get('height', 0))
-            shape = area.get('shape', 'square')
-            method = area.get('method', 'blur')
-            area_mosaicsize = area.get('mosaicsize', mosaicsize)
-            
-            # Validate coordinates (ensure within image bounds)
-            img_width, img_height = img.size
-            x = max(0, min(x, img_width - 1))
-            y = max(0, min(y, img_height - 1))
-            width = max(1, min(width, img_width - x))
-            height = max(1, min(height, img_height - y))
-            
-            # Extract region
-            region = img.crop((x, y, x + width, y + height))
-            
-            # Apply deface method
-            if method == 'blur':
-                # Apply Gaussian blur
-                blurred_region = region.filter(ImageFilter.GaussianBlur(radius=15))
-                img.paste(blurred_region, (x, y))
-            
-            elif method == 'solid':
-                # Draw solid black box
-                draw = ImageDraw.Draw(img)
-                draw.rectangle([x, y, x + width, y + height], fill='black')
-            
-            elif method == 'mosaic':
-                # Apply mosaic effect (pixelation)
-                # Downscale then upscale to create pixelation
-                small_size = (max(1, width // area_mosaicsize), max(1, height // area_mosaicsize))
-                if small_size[0] > 0 and small_size[1] > 0:
-                    small_region = region.resize(small_size, Image.Resampling.NEAREST)
-                    mosaic_region = small_region.resize((width, height), Image.Resampling.NEAREST)
-                    img.paste(mosaic_region, (x, y))
-                else:
-                    # If too small, just use solid black
-                    draw = ImageDraw.Draw(img)
-                    draw.rectangle([x, y, x + width, y + height], fill='black')
-            
-            else:
-                logger.warning(f"Unknown deface method: {method}, skipping area")
+        render_areas(frame, deface_areas, mosaicsize=mosaicsize)
         
-        # Save image
-        img.save(output_path, 'JPEG', quality=95)
+        img = Image.fromarray(frame)
+        if output_path.suffix.lower() in ('.jpg', '.jpeg'):
+            if not save_options or save_options['subsampling'] < 0:
+                save_options = {'quality': quality}
+            img.save(output_path, 'JPEG', **save_options)
+        else:
+            img.save(output_path)
         logger.info(f"Manual deface applied successfully: {output_path} with {len(deface_areas)} areas")
         
         return {'success': True, 'output_path': str(output_path)}
@@ -768,3 +1149,46 @@ def apply_manual_deface_to_video(
     except Exception as e:
         logger.error(f"Error in apply_manual_deface_to_video: {e}", exc_info=True)
         return {'success': False, 'error': str(e)}
+
+
+def apply_manual_deface_to_video_range(
+    video_path: Path,
+    output_path: Path,
+    deface_areas: List[Dict],
+    mosaicsize: int = 20
+) -> dict:
+    """
+    Render manual deface areas with time ranges into the whole video
+
+    Args:
+        video_path: Path to defaced video file (MP4)
+        output_path: Path for the output video (may equal video_path)
+        deface_areas: Deface area definitions as for apply_manual_deface, plus
+            optional 'start'/'end' (seconds) and 'keyframes' ([{t, x, y, width, height}])
+        mosaicsize: Default mosaic tile size
+
+    Returns:
+        dict with 'success' (bool), 'output_path' (str), 'frames', 'frames_changed', and optional 'error' (str)
+    """
+    from app.manual_deface_video import render_video
+
+    if not video_path.exists():
+        return {'success': False, 'error': f'Video file not found: {video_path}'}
+
+    try:
+        from config import DEFACE_FFMPEG_CODEC
+        codec = (DEFACE_FFMPEG_CODEC or 'libx264').strip()
+    except Exception:
+        codec = 'libx264'
+
+    codecs = list(dict.fromkeys([codec, 'libx264']))
+    while codecs:
+        attempt_codec = codecs.pop(0)
+        try:
+            return render_video(video_path, output_path, deface_areas, mosaicsize=mosaicsize, codec=attempt_codec)
+        except Exception as e:
+            if codecs and _is_codec_encode_error(str(e)):
+                logger.warning(f"Manual deface video encode failed with {attempt_codec}, retrying with libx264: {e}")
+                continue
+            logger.error(f"Error in apply_manual_deface_to_video_range: {e}", exc_info=True)
+            return {'success': False, 'error': str(e)}
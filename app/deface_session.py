@@ -1,22 +1,205 @@
 """
 Session management for deface operations
 Stores defaced file paths, original paths, settings, and manual deface areas
+
+Sessions are kept in memory and persisted to DEFACE_SESSION_STORE_FILE, so a
+restart keeps them (and their temp directories) usable. A reaper thread
+periodically removes expired sessions, evicts least recently used sessions
+while their temp data exceeds DEFACE_SESSION_DISK_QUOTA_MB and deletes
+orphaned temp directories in DEFACE_SESSION_TEMP_ROOT that no session owns.
+
+Several worker processes can share the store: every access holds an
+exclusive lock on a lock file next to it and re-reads the file when another
+process has written it since.
 """
 import uuid
 import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 import shutil
 
+try:
+    import fcntl
+except ImportError:  # Windows: no lock between processes (single-process server only)
+    fcntl = None
+
+from config import (DEFACE_SESSION_STORE_FILE, DEFACE_SESSION_TIMEOUT, DEFACE_SESSION_DISK_QUOTA_MB,
+                    DEFACE_SESSION_REAP_INTERVAL, DEFACE_SESSION_TEMP_ROOT)
+
 logger = logging.getLogger(__name__)
 
-# In-memory session storage (for production, consider Redis or database)
+# Session storage: loaded from DEFACE_SESSION_STORE_FILE on first use (and again whenever another
+# process has written it), written back on every change
 _sessions: Dict[str, Dict] = {}
+_loaded = False
+_store_mtime: Optional[int] = None  # mtime_ns of the store file as this process last read or wrote it
+_lock = threading.RLock()
+_lock_depth = 0  # nesting of _locked() in the thread holding _lock
+# Sessions whose processed items changed since the last save, and when each one's items were last saved
+_unsaved_processed: set = set()
+_processed_saved_at: Dict[str, float] = {}
+
+# A run's per-item updates of the processed list are saved at most this often (the whole store is rewritten)
+PROCESSED_SAVE_INTERVAL = 2.0
+
+# Session timeout (from last use)
+SESSION_TIMEOUT = timedelta(seconds=DEFACE_SESSION_TIMEOUT)
+
+# Prefix of session temp directories inside DEFACE_SESSION_TEMP_ROOT; the orphan sweep touches nothing else
+TEMP_DIR_PREFIX = 'v2p_deface_session_'
+
+_reaper_thread: Optional[threading.Thread] = None
+
+
+def _reset_lock_after_fork() -> None:
+    """A worker forked while another thread (e.g. the reaper) held _lock gets a fresh, free one"""
+    global _lock, _lock_depth
+    _lock = threading.RLock()
+    _lock_depth = 0
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
+
+
+def _to_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
+def _store_file_mtime() -> Optional[int]:
+    try:
+        return DEFACE_SESSION_STORE_FILE.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _run_is_live(pid) -> bool:
+    """True if a 'processing' run belongs to another process that is still running"""
+    if not pid or pid == os.getpid():
+        return False  # same PID after a restart (execv) is not the old run
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+@contextmanager
+def _locked():
+    """
+    Hold _lock and (outermost only) an exclusive lock on the store's lock file,
+    so worker processes sharing the store take turns
+    """
+    global _lock_depth
+    with _lock:
+        lock_file = None
+        if _lock_depth == 0 and fcntl is not None:
+            try:
+                DEFACE_SESSION_STORE_FILE.parent.mkdir(parents=True, exist_ok=True)
+                lock_file = open(DEFACE_SESSION_STORE_FILE.with_suffix('.lock'), 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning(f"Could not lock deface session store: {e}")
+                if lock_file is not None:
+                    lock_file.close()
+                lock_file = None
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+
+def _store() -> Dict[str, Dict]:
+    """Sessions dict, (re)loaded from disk when another process changed it (caller holds _locked())"""
+    global _loaded, _store_mtime
+    mtime = _store_file_mtime()
+    if _loaded and mtime == _store_mtime:
+        return _sessions
+    first_load = not _loaded
+    _loaded = True
+    _store_mtime = mtime
+    stored = {}
+    if mtime is not None:
+        try:
+            with open(DEFACE_SESSION_STORE_FILE, 'r', encoding='utf-8') as f:
+                stored = json.load(f).get('sessions', {})
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Error loading deface sessions, starting empty: {e}")
+    previous = dict(_sessions)
+    _sessions.clear()
+    for session_id, session in stored.items():
+        if not Path(session.get('temp_dir', '')).is_dir():
+            continue
+        session['created_at'] = _to_datetime(session.get('created_at'))
+        progress = session.get('progress') or {}
+        mine = previous.get(session_id)
+        if mine is not None:
+            # Progress and recency are kept in memory between saves; this process's are newer
+            if (mine.get('progress') or {}).get('pid') == os.getpid():
+                session['progress'] = mine['progress']
+            if session_id in _unsaved_processed:
+                session['processed'] = mine['processed']
+            session['last_accessed'] = max(session.get('last_accessed') or 0, mine.get('last_accessed') or 0)
+        elif first_load and progress.get('status') == 'processing' and not _run_is_live(progress.get('pid')):
+            # A run interrupted by the restart is not coming back
+            progress['status'] = 'error'
+        _sessions[session_id] = session
+    if first_load and _sessions:
+        logger.info(f"Loaded {len(_sessions)} deface session(s) from {DEFACE_SESSION_STORE_FILE}")
+    return _sessions
 
-# Session timeout: 1 hour
-SESSION_TIMEOUT = timedelta(hours=1)
+
+def _save() -> None:
+    """Write sessions atomically (caller holds _locked()); errors are logged, sessions stay in memory"""
+    global _store_mtime
+    try:
+        DEFACE_SESSION_STORE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = DEFACE_SESSION_STORE_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'sessions': _sessions}, f, indent=2, ensure_ascii=False,
+                      default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+        os.replace(tmp_file, DEFACE_SESSION_STORE_FILE)
+        _store_mtime = _store_file_mtime()
+        now = time.time()
+        for session_id in _unsaved_processed:
+            _processed_saved_at[session_id] = now
+        _unsaved_processed.clear()
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not persist deface sessions: {e}")
+
+
+def _run_in_progress(session: Dict) -> bool:
+    """True while the session's deface run is processing in this or another live process"""
+    progress = session.get('progress') or {}
+    if progress.get('status') != 'processing':
+        return False
+    return progress.get('pid') == os.getpid() or _run_is_live(progress.get('pid'))
+
+
+def _is_expired(session: Dict) -> bool:
+    """Unused for SESSION_TIMEOUT and not processing"""
+    if _run_in_progress(session):
+        return False
+    last_used = session.get('last_accessed') or _to_datetime(session.get('created_at')).timestamp()
+    return time.time() - last_used > SESSION_TIMEOUT.total_seconds()
 
 
 def create_session(temp_dir: Path) -> str:
@@ -31,20 +214,23 @@ def create_session(temp_dir: Path) -> str:
     """
     session_id = str(uuid.uuid4())
     
-    _sessions[session_id] = {
-        'session_id': session_id,
-        'temp_dir': str(temp_dir),
-        'created_at': datetime.now(),
-        'processed': [],  # List of processed media items
-        'settings': {},  # Deface settings used
-        'manual_defaces': {},  # Dict mapping media_id to list of manual deface areas
-        'progress': {  # Progress tracking
-            'total': 0,
-            'completed': 0,
-            'current_item': None,
-            'status': 'idle'  # 'idle', 'processing', 'complete', 'error'
+    with _locked():
+        _store()[session_id] = {
+            'session_id': session_id,
+            'temp_dir': str(temp_dir),
+            'created_at': datetime.now(),
+            'last_accessed': time.time(),
+            'processed': [],  # List of processed media items
+            'settings': {},  # Deface settings used
+            'manual_defaces': {},  # Dict mapping media_id to list of manual deface areas
+            'progress': {  # Progress tracking
+                'total': 0,
+                'completed': 0,
+                'current_item': None,
+                'status': 'idle'  # 'idle', 'processing', 'complete', 'error'
+            }
         }
-    }
+        _save()
     
     logger.info(f"Created deface session: {session_id}")
     return session_id
@@ -60,48 +246,50 @@ def get_session(session_id: str) -> Optional[Dict]:
     Returns:
         Session dict or None if not found/expired
     """
-    if session_id not in _sessions:
-        return None
-    
-    session = _sessions[session_id]
-    
-    # Check if session expired
-    created_at = session.get('created_at')
-    if isinstance(created_at, str):
-        try:
-            created_at = datetime.fromisoformat(created_at)
-        except:
-            created_at = datetime.now()
-    
-    if datetime.now() - created_at > SESSION_TIMEOUT:
-        logger.warning(f"Session expired: {session_id}")
-        cleanup_session(session_id)
-        return None
-    
-    # Convert datetime to ISO string for JSON serialization
-    session_copy = session.copy()
+    with _locked():
+        session = _store().get(session_id)
+        if session is None:
+            return None
+        
+        # Check if session expired
+        if _is_expired(session):
+            logger.warning(f"Session expired: {session_id}")
+            cleanup_session(session_id)
+            return None
+        
+        # Recency for quota eviction (persisted with the next change)
+        session['last_accessed'] = time.time()
+        
+        # Convert datetime to ISO string for JSON serialization
+        session_copy = session.copy()
     if isinstance(session_copy.get('created_at'), datetime):
         session_copy['created_at'] = session_copy['created_at'].isoformat()
     
     return session_copy
 
 
-def update_session_processed(session_id: str, processed_items: List[Dict]) -> bool:
+def update_session_processed(session_id: str, processed_items: List[Dict], flush: bool = True) -> bool:
     """
     Update session with processed media items
     
     Args:
         session_id: Session ID
         processed_items: List of processed media items (each with original_path, defaced_path, type, etc.)
+        flush: Save now; with False (per-item updates during a run) the store is written at most
+            every PROCESSED_SAVE_INTERVAL seconds, and by the next save of any change
         
     Returns:
         True if updated successfully, False if session not found
     """
-    if session_id not in _sessions:
-        return False
-    
-    # Update the original session, not a copy
-    _sessions[session_id]['processed'] = processed_items
+    with _locked():
+        if session_id not in _store():
+            return False
+        
+        # Update the original session, not a copy
+        _sessions[session_id]['processed'] = processed_items
+        _unsaved_processed.add(session_id)
+        if flush or time.time() - _processed_saved_at.get(session_id, 0) >= PROCESSED_SAVE_INTERVAL:
+            _save()
     return True
 
 
@@ -116,11 +304,13 @@ def update_session_settings(session_id: str, settings: Dict) -> bool:
     Returns:
         True if updated successfully, False if session not found
     """
-    if session_id not in _sessions:
-        return False
-    
-    # Update the original session, not a copy
-    _sessions[session_id]['settings'] = settings
+    with _locked():
+        if session_id not in _store():
+            return False
+        
+        # Update the original session, not a copy
+        _sessions[session_id]['settings'] = settings
+        _save()
     return True
 
 
@@ -136,15 +326,17 @@ def add_manual_defaces(session_id: str, media_id: str, deface_areas: List[Dict])
     Returns:
         True if updated successfully, False if session not found
     """
-    if session_id not in _sessions:
-        return False
-    
-    # Update the original session, not a copy
-    session = _sessions[session_id]
-    if 'manual_defaces' not in session:
-        session['manual_defaces'] = {}
-    
-    session['manual_defaces'][media_id] = deface_areas
+    with _locked():
+        if session_id not in _store():
+            return False
+        
+        # Update the original session, not a copy
+        session = _sessions[session_id]
+        if 'manual_defaces' not in session:
+            session['manual_defaces'] = {}
+        
+        session['manual_defaces'][media_id] = deface_areas
+        _save()
     return True
 
 
@@ -176,10 +368,14 @@ def cleanup_session(session_id: str) -> bool:
     Returns:
         True if cleaned up, False if session not found
     """
-    if session_id not in _sessions:
-        return False
+    with _locked():
+        session = _store().pop(session_id, None)
+        if session is None:
+            return False
+        _unsaved_processed.discard(session_id)
+        _processed_saved_at.pop(session_id, None)
+        _save()
     
-    session = _sessions[session_id]
     temp_dir = Path(session.get('temp_dir', ''))
     
     # Delete temporary directory
@@ -190,8 +386,6 @@ def cleanup_session(session_id: str) -> bool:
         except Exception as e:
             logger.error(f"Error cleaning up temp directory {temp_dir}: {e}")
     
-    # Remove session from memory
-    del _sessions[session_id]
     logger.info(f"Cleaned up session: {session_id}")
     
     return True
@@ -199,20 +393,10 @@ def cleanup_session(session_id: str) -> bool:
 
 def cleanup_expired_sessions():
     """
-    Clean up all expired sessions (call periodically)
+    Clean up all expired sessions (called by the reaper thread)
     """
-    expired_sessions = []
-    
-    for session_id, session in list(_sessions.items()):
-        created_at = session.get('created_at')
-        if isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at)
-            except:
-                created_at = datetime.now()
-        
-        if datetime.now() - created_at > SESSION_TIMEOUT:
-            expired_sessions.append(session_id)
+    with _locked():
+        expired_sessions = [session_id for session_id, session in _store().items() if _is_expired(session)]
     
     for session_id in expired_sessions:
         cleanup_session(session_id)
@@ -235,21 +419,28 @@ def update_session_progress(session_id: str, total: int = None, completed: int =
     Returns:
         True if updated successfully, False if session not found
     """
-    if session_id not in _sessions:
-        return False
-    
-    session = _sessions[session_id]
-    if 'progress' not in session:
-        session['progress'] = {'total': 0, 'completed': 0, 'current_item': None, 'status': 'idle'}
-    
-    if total is not None:
-        session['progress']['total'] = total
-    if completed is not None:
-        session['progress']['completed'] = completed
-    if current_item is not None:
-        session['progress']['current_item'] = current_item
-    if status is not None:
-        session['progress']['status'] = status
+    with _locked():
+        if session_id not in _store():
+            return False
+        
+        session = _sessions[session_id]
+        if 'progress' not in session:
+            session['progress'] = {'total': 0, 'completed': 0, 'current_item': None, 'status': 'idle'}
+        
+        if total is not None:
+            session['progress']['total'] = total
+        if completed is not None:
+            session['progress']['completed'] = completed
+        if current_item is not None:
+            session['progress']['current_item'] = current_item
+        if status is not None:
+            before = (session['progress'].get('status'), session['progress'].get('pid'))
+            session['progress']['status'] = status
+            if status == 'processing':
+                session['progress']['pid'] = os.getpid()  # the run lives in this process
+            if (status, session['progress'].get('pid')) != before:
+                # Other workers must see a run start and end (the quota never evicts a processing session)
+                _save()
     
     return True
 
@@ -264,10 +455,11 @@ def get_session_progress(session_id: str) -> Optional[Dict]:
     Returns:
         Progress dict or None if session not found
     """
-    if session_id not in _sessions:
-        return None
-    
-    return _sessions[session_id].get('progress', {'total': 0, 'completed': 0, 'current_item': None, 'status': 'idle'})
+    with _locked():
+        if session_id not in _store():
+            return None
+        
+        return _sessions[session_id].get('progress', {'total': 0, 'completed': 0, 'current_item': None, 'status': 'idle'})
 
 
 def get_session_temp_dir(session_id: str) -> Optional[Path]:
@@ -289,3 +481,172 @@ def get_session_temp_dir(session_id: str) -> Optional[Path]:
         return Path(temp_dir_str)
     
     return None
+
+
+def _dir_size(path: Path) -> int:
+    """Total size in bytes of the files under path (0 if missing)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def get_sessions_disk_usage() -> Dict:
+    """
+    Disk used by deface session temp directories
+    
+    Returns:
+        Dict with 'total_bytes', 'quota_bytes' (0 = no quota) and 'sessions'
+        (session_id, temp_dir, bytes, items, created_at, last_accessed, status),
+        most recently used first
+    """
+    with _locked():
+        sessions = [(session_id, dict(session)) for session_id, session in _store().items()]
+    
+    usage = []
+    for session_id, session in sessions:
+        usage.append({
+            'session_id': session_id,
+            'temp_dir': session.get('temp_dir'),
+            'bytes': _dir_size(Path(session.get('temp_dir', ''))),
+            'items': len(session.get('processed', [])),
+            'created_at': _to_datetime(session.get('created_at')).isoformat(),
+            'last_accessed': session.get('last_accessed'),
+            'status': (session.get('progress') or {}).get('status', 'idle'),
+        })
+    usage.sort(key=lambda s: s['last_accessed'] or 0, reverse=True)
+    return {
+        'total_bytes': sum(s['bytes'] for s in usage),
+        'quota_bytes': DEFACE_SESSION_DISK_QUOTA_MB * 1024 * 1024,
+        'sessions': usage
+    }
+
+
+def enforce_disk_quota(quota_bytes: Optional[int] = None) -> List[str]:
+    """
+    Evict least recently used sessions (and their temp data) until the total fits the quota.
+    Sessions that are still processing are never evicted.
+    
+    Args:
+        quota_bytes: Quota to enforce (default DEFACE_SESSION_DISK_QUOTA_MB; 0 = no quota)
+        
+    Returns:
+        IDs of the evicted sessions
+    """
+    if quota_bytes is None:
+        quota_bytes = DEFACE_SESSION_DISK_QUOTA_MB * 1024 * 1024
+    if quota_bytes <= 0:
+        return []
+    
+    usage = get_sessions_disk_usage()
+    total = usage['total_bytes']
+    evicted = []
+    for session in reversed(usage['sessions']):
+        if total <= quota_bytes:
+            break
+        if session['status'] == 'processing':
+            continue
+        if cleanup_session(session['session_id']):
+            total -= session['bytes']
+            evicted.append(session['session_id'])
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} deface session(s) over the disk quota "
+                    f"({usage['total_bytes'] // (1024 * 1024)} MB > {quota_bytes // (1024 * 1024)} MB)")
+    return evicted
+
+
+def create_session_temp_dir() -> Path:
+    """Create a new, empty session temp directory under DEFACE_SESSION_TEMP_ROOT"""
+    root = Path(DEFACE_SESSION_TEMP_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=TEMP_DIR_PREFIX, dir=root))
+
+
+def sweep_orphaned_temp_dirs(min_age_seconds: Optional[float] = None, temp_root: Optional[Path] = None) -> List[str]:
+    """
+    Delete session temp directories that no session owns (e.g. left over from before a restart)
+    
+    Only TEMP_DIR_PREFIX directories directly in the session temp root are considered, so
+    other deface_* directories in the system temp directory are never touched.
+    
+    Args:
+        min_age_seconds: Only directories not modified for this long are removed, so
+            directories a request is still filling are left alone (default: the session timeout)
+        temp_root: Directory to sweep (default: DEFACE_SESSION_TEMP_ROOT)
+        
+    Returns:
+        Paths of the removed directories
+    """
+    if min_age_seconds is None:
+        min_age_seconds = SESSION_TIMEOUT.total_seconds()
+    temp_root = Path(temp_root or DEFACE_SESSION_TEMP_ROOT)
+    with _locked():
+        owned = {str(Path(s.get('temp_dir', '')).resolve()) for s in _store().values()}
+    
+    removed = []
+    now = time.time()
+    try:
+        candidates = list(temp_root.glob(f'{TEMP_DIR_PREFIX}*'))
+    except OSError:
+        return removed
+    for path in candidates:
+        try:
+            if not path.is_dir() or path.is_symlink() or str(path.resolve()) in owned:
+                continue
+            if now - path.stat().st_mtime < min_age_seconds:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(str(path))
+    if removed:
+        logger.info(f"Removed {len(removed)} orphaned deface temp director{'y' if len(removed) == 1 else 'ies'}")
+    return removed
+
+
+def reap_sessions() -> None:
+    """One reaper pass: expired sessions, disk quota, orphaned temp directories"""
+    try:
+        with _locked():
+            # Persist this process's last_accessed first, so no worker expires a session used here
+            _store()
+            _save()
+        cleanup_expired_sessions()
+        enforce_disk_quota()
+        sweep_orphaned_temp_dirs()
+    except Exception as e:
+        logger.error(f"Deface session reaper failed: {e}", exc_info=True)
+
+
+def start_session_reaper(interval: Optional[float] = None) -> bool:
+    """
+    Start the background reaper thread (once per process); it runs a pass immediately,
+    which is the startup sweep of orphaned temp directories
+    
+    Args:
+        interval: Seconds between passes (default DEFACE_SESSION_REAP_INTERVAL; 0 = do not start)
+        
+    Returns:
+        True if the reaper is running
+    """
+    global _reaper_thread
+    if interval is None:
+        interval = DEFACE_SESSION_REAP_INTERVAL
+    if interval <= 0:
+        return False
+    with _lock:
+        if _reaper_thread is not None and _reaper_thread.is_alive():
+            return True
+        
+        def run():
+            while True:
+                reap_sessions()
+                time.sleep(interval)
+        
+        _reaper_thread = threading.Thread(target=run, name='deface-session-reaper', daemon=True)
+        _reaper_thread.start()
+    return True
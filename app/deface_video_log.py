@@ -2,8 +2,16 @@
 In-memory buffer and logger for video deface processing debug.
 Used so the UI or a separate tab can show live progress when a request is stuck.
 Also holds current run progress (total, completed, current_item) for polling during apply_deface.
+
+Progress is per run: a background deface job binds its own state dict with
+bind_deface_progress(), and the setters below update whichever state is bound
+in the calling context (falling back to the module-level state), so
+concurrent jobs do not overwrite each other.
 """
+import contextvars
+import copy
 import logging
+import threading
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
@@ -20,10 +28,21 @@ _DEFACE_PROGRESS: Dict[str, Any] = {
     "phase": None,     # images | videos | None
     "elapsed_seconds": 0,  # during video subprocess, updated by heartbeat
     "current_item_pct": None,  # 0-100 from deface CLI (e.g. 23) when parsing stderr
+    "segment_pcts": [],  # 0-100 per segment when a video is processed in parallel segments
     "item_names": [],  # ordered list of names (images then videos) for queue UI
     "completed_item_urls": [],  # ordered list of defaced URLs as each item completes (for detailed page links)
+    "completed_items": [],  # processed item dicts as each item completes (served by offset, not in progress polls)
 }
 
+_DEFAULT_PROGRESS = copy.deepcopy(_DEFACE_PROGRESS)
+
+# State bound by the running job (None = module-level _DEFACE_PROGRESS)
+_bound_progress: contextvars.ContextVar = contextvars.ContextVar('deface_progress', default=None)
+# Most recently bound state, shown by get_deface_progress() outside any job
+_latest_progress: Dict[str, Any] = _DEFACE_PROGRESS
+# Multi-field updates and snapshots hold this, so a poll never sees half an update
+_progress_lock = threading.Lock()
+
 _video_logger = None
 
 
@@ -49,14 +68,38 @@ def get_recent_lines(limit: int = 200) -> List[str]:
     return list(VIDEO_DEBUG_LINES[-limit:])
 
 
+def new_deface_progress() -> Dict[str, Any]:
+    """Fresh progress state for one deface run (see bind_deface_progress)."""
+    return copy.deepcopy(_DEFAULT_PROGRESS)
+
+
+def bind_deface_progress(state: Dict[str, Any]) -> contextvars.Token:
+    """Route progress updates in the current context (thread) to state. Returns a token for unbind."""
+    global _latest_progress
+    _latest_progress = state
+    return _bound_progress.set(state)
+
+
+def unbind_deface_progress(token: contextvars.Token) -> None:
+    """Undo bind_deface_progress."""
+    _bound_progress.reset(token)
+
+
+def _progress() -> Dict[str, Any]:
+    """Progress state bound in this context, else the module-level one."""
+    state = _bound_progress.get()
+    return _DEFACE_PROGRESS if state is None else state
+
+
 def set_deface_queue_item_names(names: List[str]) -> None:
     """Set the ordered list of item names (images then videos) for queue UI."""
-    _DEFACE_PROGRESS["item_names"] = list(names)
+    _progress()["item_names"] = list(names)
 
 
 def add_deface_completed_item_url(url: str) -> None:
     """Append the defaced URL when an item completes (so detailed page can show link)."""
-    _DEFACE_PROGRESS["completed_item_urls"].append(url)
+    with _progress_lock:
+        _progress()["completed_item_urls"].append(url)
 
 
 def set_deface_progress(
@@ -69,39 +112,81 @@ def set_deface_progress(
     current_item_pct: Optional[int] = None,
     item_names: Optional[List[str]] = None,
 ) -> None:
-    """Update current deface run progress (for polling during apply_deface)."""
-    if total is not None:
-        _DEFACE_PROGRESS["total"] = total
-    if item_names is not None:
-        _DEFACE_PROGRESS["item_names"] = list(item_names)
-    if completed is not None:
-        _DEFACE_PROGRESS["completed"] = completed
-    if current_item is not None:
-        _DEFACE_PROGRESS["current_item"] = current_item
-        _DEFACE_PROGRESS["current_item_pct"] = None  # reset when starting new item
-    if status is not None:
-        _DEFACE_PROGRESS["status"] = status
-    if phase is not None:
-        _DEFACE_PROGRESS["phase"] = phase
-    if elapsed_seconds is not None:
-        _DEFACE_PROGRESS["elapsed_seconds"] = elapsed_seconds
-    if current_item_pct is not None:
-        _DEFACE_PROGRESS["current_item_pct"] = current_item_pct
+    """Update current deface run progress (for polling during apply_deface); all given fields change at once."""
+    with _progress_lock:
+        state = _progress()
+        if total is not None:
+            state["total"] = total
+        if item_names is not None:
+            state["item_names"] = list(item_names)
+        if completed is not None:
+            state["completed"] = completed
+        if current_item is not None:
+            state["current_item"] = current_item
+            state["current_item_pct"] = None  # reset when starting new item
+            state["segment_pcts"] = []
+        if status is not None:
+            state["status"] = status
+        if phase is not None:
+            state["phase"] = phase
+        if elapsed_seconds is not None:
+            state["elapsed_seconds"] = elapsed_seconds
+        if current_item_pct is not None:
+            state["current_item_pct"] = current_item_pct
+
+
+def add_deface_completed_item(item: Dict[str, Any]) -> None:
+    """Publish a processed item (with its defaced_url) as soon as it completes, for progressive results."""
+    with _progress_lock:
+        state = _progress()
+        state["completed_items"].append(item)
+        state["completed_item_urls"].append(item.get("defaced_url"))
+
+
+def copy_deface_progress(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Consistent deep copy of a job's raw progress state (e.g. to publish it to other processes)."""
+    with _progress_lock:
+        return copy.deepcopy(state)
+
+
+def get_deface_completed_items(state: Optional[Dict[str, Any]] = None, offset: int = 0,
+                               limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Processed items published so far, from offset (state: a job's progress state, as get_deface_progress)."""
+    if state is None:
+        state = _bound_progress.get() or _latest_progress
+    offset = max(0, offset)
+    with _progress_lock:
+        items = state.get("completed_items") or []
+        end = len(items) if limit is None else offset + max(0, limit)
+        return copy.deepcopy(items[offset:end])
 
 
 def set_deface_current_item_pct(pct: int) -> None:
     """Update current item percentage from deface CLI output (0-100)."""
-    _DEFACE_PROGRESS["current_item_pct"] = max(0, min(100, pct))
+    _progress()["current_item_pct"] = max(0, min(100, pct))
 
 
-def set_deface_elapsed(seconds: int) -> None:
-    """Update elapsed seconds during video subprocess (called by heartbeat)."""
-    _DEFACE_PROGRESS["elapsed_seconds"] = seconds
+def set_deface_segment_progress(pcts: List[int]) -> None:
+    """Update per-segment percentages (0-100) for a video processed in parallel segments."""
+    _progress()["segment_pcts"] = [max(0, min(100, int(p))) for p in pcts]
 
 
-def get_deface_progress() -> Dict[str, Any]:
-    """Return current deface progress (for API). Includes queue with name+state for UI."""
-    out = dict(_DEFACE_PROGRESS)
+def set_deface_elapsed(seconds: int) -> None:
+    """Update elapsed seconds during video subprocess (called by heartbeat)."""
+    _progress()["elapsed_seconds"] = seconds
+
+
+def get_deface_progress(state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Return deface progress (for API). Includes queue with name+state for UI.
+    state: a job's progress state; default is the state bound in this context,
+    else the most recently started run.
+    """
+    if state is None:
+        state = _bound_progress.get() or _latest_progress
+    with _progress_lock:
+        out = copy.deepcopy({k: v for k, v in state.items() if k != "completed_items"})
+        out["items_available"] = len(state.get("completed_items") or [])
     names = out.get("item_names") or []
     total = out.get("total") or 0
     completed = out.get("completed") or 0
@@ -138,12 +223,7 @@ def get_deface_progress() -> Dict[str, Any]:
 
 def clear_deface_progress() -> None:
     """Reset progress after run completes or errors."""
-    _DEFACE_PROGRESS["total"] = 0
-    _DEFACE_PROGRESS["completed"] = 0
-    _DEFACE_PROGRESS["current_item"] = None
-    _DEFACE_PROGRESS["status"] = "idle"
-    _DEFACE_PROGRESS["phase"] = None
-    _DEFACE_PROGRESS["elapsed_seconds"] = 0
-    _DEFACE_PROGRESS["current_item_pct"] = None
-    _DEFACE_PROGRESS["item_names"] = []
-    _DEFACE_PROGRESS["completed_item_urls"] = []
+    with _progress_lock:
+        state = _progress()
+        state.clear()
+        state.update(copy.deepcopy(_DEFAULT_PROGRESS))
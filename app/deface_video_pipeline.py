@@ -0,0 +1,498 @@
+"""
+In-process video deface pipeline with detection stride and box tracking
+
+The deface CLI runs face detection on every frame, which dominates video
+runtime. This pipeline runs the shared FaceDetectionEngine only every Nth
+frame (and on scene cuts) and carries boxes across the frames in between:
+boxes matched between two detection frames are linearly interpolated,
+unmatched ones are held, and carried boxes get an extra safety margin.
+Every frame is still anonymized with deface's own anonymize_frame.
+
+Long videos can also be split at keyframes into segments that are
+anonymized in parallel worker processes and concatenated without
+re-encoding (anonymize_video_segmented).
+"""
+import logging
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.metrics import subprocess_timer
+
+logger = logging.getLogger(__name__)
+
+# Frames are compared at this size (grayscale) for scene-change detection
+SCENE_SAMPLE_SIZE = (64, 36)
+
+
+def _scene_sample(frame: np.ndarray) -> np.ndarray:
+    """Tiny grayscale version of a frame for cheap scene-change scoring"""
+    import cv2
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame[:, :, :3], cv2.COLOR_RGB2GRAY)
+    return cv2.resize(frame, SCENE_SAMPLE_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def scene_change_score(prev_sample: np.ndarray, sample: np.ndarray) -> float:
+    """Mean absolute difference (0-255) between two scene samples"""
+    return float(np.mean(np.abs(sample - prev_sample)))
+
+
+def expand_boxes(dets: np.ndarray, margin: float) -> np.ndarray:
+    """Grow each (x1, y1, x2, y2, score) box by margin x its size on every side"""
+    if len(dets) == 0 or margin <= 0:
+        return dets
+    out = dets.copy()
+    w = out[:, 2] - out[:, 0]
+    h = out[:, 3] - out[:, 1]
+    out[:, 0] = np.maximum(0, out[:, 0] - w * margin)
+    out[:, 1] = np.maximum(0, out[:, 1] - h * margin)
+    out[:, 2] += w * margin
+    out[:, 3] += h * margin
+    return out
+
+
+def _shift_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise centre distance between boxes, in units of their mean size"""
+    centre_a = (a[:, :2] + a[:, 2:4]) / 2
+    centre_b = (b[:, :2] + b[:, 2:4]) / 2
+    size_a = np.sqrt(np.clip((a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]), 1, None))
+    size_b = np.sqrt(np.clip((b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]), 1, None))
+    dist = np.linalg.norm(centre_a[:, None, :] - centre_b[None, :, :], axis=2)
+    return dist / ((size_a[:, None] + size_b[None, :]) / 2)
+
+
+def match_boxes(prev_dets: np.ndarray, next_dets: np.ndarray, max_shift: float = 1.5) -> List[Tuple[int, int]]:
+    """
+    Greedy one-to-one matching of boxes, closest pairs first.
+
+    Small faces can move further than their own width between detection
+    frames, so boxes are matched on centre distance (relative to box size)
+    rather than overlap; pairs further apart than max_shift are not matched.
+    """
+    if len(prev_dets) == 0 or len(next_dets) == 0:
+        return []
+    shift = _shift_matrix(prev_dets, next_dets)
+    pairs = []
+    used_prev, used_next = set(), set()
+    for flat in np.argsort(shift, axis=None):
+        i, j = np.unravel_index(flat, shift.shape)
+        if shift[i, j] > max_shift:
+            break
+        if i in used_prev or j in used_next:
+            continue
+        pairs.append((int(i), int(j)))
+        used_prev.add(i)
+        used_next.add(j)
+    return pairs
+
+
+def interpolate_boxes(prev_dets: np.ndarray, next_dets: np.ndarray, t: float, margin: float) -> np.ndarray:
+    """
+    Boxes for a frame a fraction t of the way between two detection frames.
+
+    Matched boxes move linearly; unmatched boxes from either side are held
+    (faces leaving or entering the shot). All carried boxes get the margin.
+    """
+    pairs = match_boxes(prev_dets, next_dets)
+    boxes = [prev_dets[i] * (1 - t) + next_dets[j] * t for i, j in pairs]
+    matched_prev = {i for i, _ in pairs}
+    matched_next = {j for _, j in pairs}
+    boxes.extend(prev_dets[i] for i in range(len(prev_dets)) if i not in matched_prev)
+    boxes.extend(next_dets[j] for j in range(len(next_dets)) if j not in matched_next)
+    if not boxes:
+        return np.empty(shape=[0, 5], dtype=np.float32)
+    return expand_boxes(np.asarray(boxes, dtype=np.float32), margin)
+
+
+def track_detections(
+    frames: Iterable[np.ndarray],
+    detect: Callable[[np.ndarray], np.ndarray],
+    detection_stride: int = 1,
+    scene_threshold: float = 0.0,
+    margin: float = 0.0
+) -> Iterator[Tuple[np.ndarray, np.ndarray, bool]]:
+    """
+    Yield (frame, dets, detected) for every frame, in order.
+
+    detect runs on the first frame, every detection_stride-th frame after the
+    last detection, and on any frame whose scene_change_score against the
+    previous frame exceeds scene_threshold (0 disables). Frames in between are
+    buffered until the next detection so their boxes can be interpolated; at
+    a scene cut the buffered frames only hold the previous scene's boxes.
+    """
+    detection_stride = max(1, int(detection_stride))
+    pending: List[np.ndarray] = []
+    prev_dets: Optional[np.ndarray] = None
+    prev_sample = None
+
+    for frame in frames:
+        cut = False
+        if scene_threshold > 0 and detection_stride > 1:
+            sample = _scene_sample(frame)
+            cut = prev_sample is not None and scene_change_score(prev_sample, sample) > scene_threshold
+            prev_sample = sample
+
+        if prev_dets is None or cut or len(pending) + 1 >= detection_stride:
+            dets = detect(frame)
+            gap = len(pending) + 1
+            for k, held in enumerate(pending, 1):
+                if cut:
+                    yield held, expand_boxes(prev_dets, margin), False
+                else:
+                    yield held, interpolate_boxes(prev_dets, dets, k / gap, margin), False
+            pending = []
+            prev_dets = dets
+            yield frame, dets, True
+        else:
+            pending.append(frame)
+
+    for held in pending:
+        yield held, expand_boxes(prev_dets, margin), False
+
+
+def anonymize_video(
+    input_path: Path,
+    output_path: Path,
+    engine,
+    replacewith: str = 'blur',
+    boxes: bool = False,
+    thresh: float = 0.2,
+    mosaicsize: int = 20,
+    draw_scores: bool = False,
+    detection_stride: int = 1,
+    scene_threshold: float = 0.0,
+    margin: float = 0.0,
+    codec: str = 'libx264',
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    timeout: Optional[float] = None,
+    detections: Optional[List[np.ndarray]] = None,
+    cancel_event=None
+) -> Dict:
+    """
+    Anonymize a video with the in-process engine (mirrors deface's video_detect).
+
+    Args:
+        engine: FaceDetectionEngine (model already loaded)
+        replacewith, boxes, thresh, mosaicsize, draw_scores: as deface_video
+        detection_stride, scene_threshold, margin: see track_detections
+        codec: FFmpeg video codec for the output
+        progress_callback: Called with (frames_done, total_frames or 0)
+        timeout: Abort with TimeoutError after this many seconds
+        detections: Per-frame boxes from an earlier run (detection cache);
+            when given no detection runs and ValueError is raised if the
+            video's frame count does not match
+        cancel_event: threading/multiprocessing Event checked before every
+            frame; once set the run stops with RuntimeError
+
+    Returns:
+        Dict with 'success', 'output_path', 'frames', 'detected_frames',
+        'detections' (per-frame boxes used), 'video_fps', 'video_size', 'processing_time'
+        and 'fps' (processing rate), or 'success': False with 'error'
+    """
+    import imageio
+    from deface.deface import anonymize_frame
+    from app.deface_engine import DEFACE_MASK_SCALE
+
+    start_time = time.time()
+    if replacewith not in ('solid', 'mosaic'):
+        replacewith = 'blur'
+
+    try:
+        reader = imageio.get_reader(str(input_path))
+        meta = reader.get_meta_data()
+        _ = meta['size']
+    except Exception as e:
+        return {'success': False, 'error': f'Could not open video: {e}', 'error_type': type(e).__name__}
+
+    try:
+        total_frames = reader.count_frames()
+    except Exception:
+        total_frames = 0
+
+    def detect(frame):
+        return engine.detect([frame], thresh=thresh)[0]
+
+    def replay(frames):
+        """Pair frames with the given per-frame boxes (no detection)"""
+        for index, frame in enumerate(frames):
+            if index >= len(detections):
+                raise ValueError(f'Cached detections cover {len(detections)} frames, video has more')
+            yield frame, detections[index], False
+
+    frames_done = 0
+    detected_frames = 0
+    used_detections = []
+    writer = None
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        writer = imageio.get_writer(str(output_path), format='FFMPEG', mode='I', fps=meta['fps'], codec=codec)
+        if detections is not None:
+            tracked = replay(reader.iter_data())
+        else:
+            tracked = track_detections(reader.iter_data(), detect, detection_stride, scene_threshold, margin)
+        for frame, dets, detected in tracked:
+            if cancel_event is not None and cancel_event.is_set():
+                raise RuntimeError('Processing cancelled')
+            used_detections.append(dets[:, :5].copy())
+            anonymize_frame(
+                dets, frame, mask_scale=DEFACE_MASK_SCALE,
+                replacewith=replacewith, ellipse=not boxes, draw_scores=draw_scores,
+                replaceimg=None, mosaicsize=mosaicsize
+            )
+            writer.append_data(frame)
+            frames_done += 1
+            detected_frames += int(detected)
+            if progress_callback and frames_done % 10 == 0:
+                progress_callback(frames_done, total_frames)
+            if timeout and time.time() - start_time > timeout:
+                raise TimeoutError(f'Processing timed out after {int(timeout)}s')
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+
+    if detections is not None and frames_done != len(detections):
+        raise ValueError(f'Cached detections cover {len(detections)} frames, video has {frames_done}')
+    if progress_callback:
+        progress_callback(frames_done, total_frames or frames_done)
+    processing_time = time.time() - start_time
+    source = 'cached detections' if detections is not None else f'detection on {detected_frames} (stride={detection_stride})'
+    logger.info(f"Deface video {Path(input_path).name}: {frames_done} frames, {source} in {processing_time:.1f}s")
+    return {
+        'success': True,
+        'output_path': str(output_path),
+        'frames': frames_done,
+        'detected_frames': detected_frames,
+        'detections': used_detections,
+        'video_fps': meta['fps'],
+        'video_size': list(meta['size']),
+        'processing_time': round(processing_time, 2),
+        'fps': round(frames_done / processing_time, 2) if processing_time > 0 else 0
+    }
+
+
+def plan_segments(keyframes: List[float], duration: float, segments: int, min_segment_seconds: float) -> List[float]:
+    """
+    Keyframe times at which to split a video into up to `segments` similar parts.
+
+    Each split is the keyframe nearest to an even division of the duration;
+    no part is made shorter than min_segment_seconds. Returns [] when the
+    video should be processed whole.
+    """
+    if segments <= 1 or duration <= 0 or min_segment_seconds <= 0:
+        return []
+    segments = min(segments, int(duration // min_segment_seconds))
+    candidates = [t for t in keyframes if 0 < t < duration]
+    cuts: List[float] = []
+    for i in range(1, segments):
+        if not candidates:
+            break
+        target = duration * i / segments
+        cut = min(candidates, key=lambda t: abs(t - target))
+        last = cuts[-1] if cuts else 0.0
+        if cut - last >= min_segment_seconds and duration - cut >= min_segment_seconds:
+            cuts.append(cut)
+    return cuts
+
+
+_segment_pool = None
+_segment_pool_lock = threading.Lock()
+
+
+def _init_segment_worker(threads: int) -> None:
+    """Keep each worker's OpenCV to its share of the cores"""
+    import cv2
+    cv2.setNumThreads(threads)
+
+
+def _get_segment_pool() -> ProcessPoolExecutor:
+    """Shared process pool for video segments (created on first use)"""
+    global _segment_pool
+    import os
+    from config import DEFACE_SEGMENT_WORKERS
+
+    with _segment_pool_lock:
+        if _segment_pool is None:
+            workers = max(1, DEFACE_SEGMENT_WORKERS)
+            # spawn: forking a multi-threaded server process can deadlock on held locks
+            _segment_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_segment_worker,
+                initargs=(max(1, (os.cpu_count() or 1) // workers),)
+            )
+        return _segment_pool
+
+
+def _anonymize_segment_task(index: int, progress, cancel_event, scale, execution_provider, kwargs: Dict) -> Dict:
+    """Process-pool entry point: anonymize one segment file with this worker's engine"""
+    from app.deface_engine import get_engine
+
+    if cancel_event.is_set():
+        raise RuntimeError('Processing cancelled')
+    engine = get_engine(scale=scale, execution_provider=execution_provider)
+
+    def on_progress(done, total):
+        progress[index] = (done, total)
+
+    return anonymize_video(engine=engine, progress_callback=on_progress, cancel_event=cancel_event, **kwargs)
+
+
+def _split_at_keyframes(input_path: Path, split_times: List[float], segment_dir: Path) -> List[Path]:
+    """Stream-copy the video track into one file per segment (cuts land on the given keyframes)"""
+    # The segment muxer cuts at the first keyframe at/after each time; back off
+    # slightly so rounding never pushes a cut to the following keyframe
+    times = ','.join(f"{max(0.0, t - 0.001):.3f}" for t in split_times)
+    cmd = [
+        'ffmpeg', '-y', '-i', str(input_path),
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_times', times, '-reset_timestamps', '1',
+        str(segment_dir / 'segment_%03d.mp4')
+    ]
+    with subprocess_timer('ffmpeg', 'segment_split'):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg segment split failed: {result.stderr or result.stdout}")
+    return sorted(segment_dir.glob('segment_*.mp4'))
+
+
+def _concat_segments(segment_paths: List[Path], output_path: Path) -> None:
+    """Join anonymized segments with the concat demuxer (no re-encode)"""
+    list_file = segment_paths[0].parent / 'concat.txt'
+    list_file.write_text(''.join(f"file '{p.as_posix()}'\n" for p in segment_paths), encoding='utf-8')
+    cmd = [
+        'ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', str(list_file),
+        '-c', 'copy', '-movflags', '+faststart', str(output_path)
+    ]
+    with subprocess_timer('ffmpeg', 'segment_concat'):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg segment concat failed: {result.stderr or result.stdout}")
+
+
+def _stop_segments(futures: List, cancel_event) -> None:
+    """Cancel queued segments, tell running ones to stop and wait until they have"""
+    if not any(not future.done() for future in futures):
+        return
+    try:
+        cancel_event.set()
+    except Exception as e:
+        logger.warning(f"Deface segments: could not signal cancellation: {e}")
+    for future in futures:
+        future.cancel()
+    wait(futures)
+    for future in futures:
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug(f"Deface segment stopped: {future.exception()}")
+
+
+def anonymize_video_segmented(
+    input_path: Path,
+    output_path: Path,
+    split_times: List[float],
+    scale: Optional[Tuple[int, int]] = None,
+    execution_provider: Optional[str] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    segment_progress_callback: Optional[Callable[[List[int]], None]] = None,
+    timeout: Optional[float] = None,
+    **options
+) -> Dict:
+    """
+    Anonymize a video as parallel segments split at keyframes.
+
+    The video track is stream-copied into segments at split_times (see
+    plan_segments), each segment runs anonymize_video in a worker process of
+    the shared segment pool (one engine per worker), and the outputs are
+    concatenated without re-encoding.
+
+    When a segment fails, the others are told to stop (a shared Event checked
+    before every frame) and are waited for before the segment files and the
+    manager are cleaned up, so nothing still writes there afterwards.
+
+    Args:
+        split_times: Keyframe times to split at
+        scale, execution_provider: Engine settings for the workers
+        progress_callback: Called with (frames_done, total_frames) over all segments
+        segment_progress_callback: Called with the list of per-segment percentages
+        timeout: Per-segment timeout in seconds
+        **options: anonymize_video options (replacewith, boxes, thresh, detection_stride, codec, ...)
+
+    Returns:
+        anonymize_video-style dict (detections in frame order) with an extra 'segments' count
+    """
+    start_time = time.time()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    segment_dir = Path(tempfile.mkdtemp(prefix='.deface_segments_', dir=str(output_path.parent)))
+    manager = multiprocessing.get_context('spawn').Manager()
+    cancel_event = manager.Event()
+    futures = []
+    try:
+        segments = _split_at_keyframes(input_path, split_times, segment_dir)
+        if not segments:
+            raise RuntimeError('FFmpeg segment split produced no output')
+        outputs = [segment_dir / f"anon_{p.name}" for p in segments]
+        progress = manager.dict()
+
+        pool = _get_segment_pool()
+        futures = [
+            pool.submit(_anonymize_segment_task, i, progress, cancel_event, scale, execution_provider,
+                        dict(options, input_path=seg, output_path=out, timeout=timeout))
+            for i, (seg, out) in enumerate(zip(segments, outputs))
+        ]
+
+        pending = set(futures)
+        failed = None
+        while pending and failed is None:
+            _, pending = wait(pending, timeout=1, return_when=FIRST_EXCEPTION)
+            states = [progress.get(i, (0, 0)) for i in range(len(segments))]
+            if segment_progress_callback:
+                segment_progress_callback([100 * d // t if t else 0 for d, t in states])
+            if progress_callback:
+                progress_callback(sum(d for d, _ in states), sum(t for _, t in states))
+            failed = next((f for f in futures if f.done() and f.exception()), None)
+        if failed is not None:
+            raise failed.exception()
+
+        results = [future.result() for future in futures]
+        for result in results:
+            if not result.get('success'):
+                raise RuntimeError(result.get('error', 'Segment anonymization failed'))
+
+        _concat_segments(outputs, output_path)
+    finally:
+        _stop_segments(futures, cancel_event)
+        try:
+            manager.shutdown()
+        except Exception as e:
+            logger.warning(f"Deface segments: manager shutdown failed: {e}")
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    frames = sum(r['frames'] for r in results)
+    processing_time = time.time() - start_time
+    if segment_progress_callback:
+        segment_progress_callback([100] * len(results))
+    if progress_callback:
+        progress_callback(frames, frames)
+    logger.info(f"Deface video {Path(input_path).name}: {frames} frames in {len(results)} parallel segments "
+                f"in {processing_time:.1f}s")
+    return {
+        'success': True,
+        'output_path': str(output_path),
+        'frames': frames,
+        'detected_frames': sum(r['detected_frames'] for r in results),
+        'detections': [dets for r in results for dets in r['detections']],
+        'video_fps': results[0]['video_fps'],
+        'video_size': results[0]['video_size'],
+        'segments': len(results),
+        'processing_time': round(processing_time, 2),
+        'fps': round(frames / processing_time, 2) if processing_time > 0 else 0
+    }
@@ -1,26 +1,226 @@
 """
 Image rotation module for rotating original images
+
+JPEGs are rotated losslessly where possible: either with jpegtran (DCT-domain
+transform, no re-encode) or, in 'exif' mode, by rewriting only the EXIF
+orientation tag. Other formats, and JPEGs neither path can handle, are
+decoded, rotated and re-encoded.
 """
 import logging
+import os
+import shutil
+import struct
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
 from PIL import Image
 
+from app.metrics import subprocess_timer
+
 logger = logging.getLogger('media_converter.image_rotator')
 
+EXIF_ORIENTATION_TAG = 0x0112
+
+# EXIF orientation -> transform taking stored pixels to displayed pixels
+_ORIENTATION_OPS = {
+    1: lambda a: a,
+    2: np.fliplr,
+    3: lambda a: np.rot90(a, 2),
+    4: np.flipud,
+    5: lambda a: a.T,
+    6: lambda a: np.rot90(a, -1),
+    7: lambda a: np.rot90(a, 2).T,
+    8: lambda a: np.rot90(a, 1),
+}
+
+# EXIF orientation -> jpegtran arguments applying the same transform
+_JPEGTRAN_OPS = {
+    2: ['-flip', 'horizontal'],
+    3: ['-rotate', '180'],
+    4: ['-flip', 'vertical'],
+    5: ['-transpose'],
+    6: ['-rotate', '90'],
+    7: ['-transverse'],
+    8: ['-rotate', '270'],
+}
+
+
+def compose_orientation(orientation: int, angle: int) -> int:
+    """
+    EXIF orientation that displays an image rotated by angle (clockwise degrees)
+    relative to how it displays with the given orientation.
+    """
+    probe = np.arange(6).reshape(2, 3)
+    target = np.rot90(_ORIENTATION_OPS.get(orientation, _ORIENTATION_OPS[1])(probe), -((angle % 360) // 90))
+    for candidate, op in _ORIENTATION_OPS.items():
+        result = op(probe)
+        if result.shape == target.shape and np.array_equal(result, target):
+            return candidate
+    raise ValueError(f'Cannot compose orientation {orientation} with {angle} degrees')
+
+
+def set_exif_orientation(image_path: Path, orientation: int) -> bool:
+    """
+    Overwrite the EXIF orientation tag of a JPEG in place (no re-encode).
+    
+    Returns:
+        True if the tag existed and was rewritten, False otherwise
+    """
+    try:
+        with open(image_path, 'r+b') as f:
+            data = f.read(256 * 1024)
+            if data[:2] != b'\xff\xd8':
+                return False
+            pos = 2
+            while pos + 4 <= len(data):
+                if data[pos] != 0xFF:
+                    return False
+                marker = data[pos + 1]
+                if marker in (0xDA, 0xD9):  # Start of scan / end of image: no EXIF header
+                    return False
+                segment_length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+                if marker == 0xE1 and data[pos + 4:pos + 10] == b'Exif\x00\x00':
+                    tiff = pos + 10
+                    endian = '<' if data[tiff:tiff + 2] == b'II' else '>'
+                    ifd0 = tiff + struct.unpack(endian + 'I', data[tiff + 4:tiff + 8])[0]
+                    entry_count = struct.unpack(endian + 'H', data[ifd0:ifd0 + 2])[0]
+                    for index in range(entry_count):
+                        entry = ifd0 + 2 + index * 12
+                        tag, field_type = struct.unpack(endian + 'HH', data[entry:entry + 4])
+                        if tag == EXIF_ORIENTATION_TAG and field_type == 3:  # SHORT
+                            f.seek(entry + 8)
+                            f.write(struct.pack(endian + 'H', orientation))
+                            return True
+                    return False
+                pos += 2 + segment_length
+    except (OSError, struct.error, IndexError) as e:
+        logger.debug(f"Could not rewrite EXIF orientation of {image_path}: {e}")
+    return False
+
 
-def rotate_image(image_path: Path, angle: int) -> dict:
+def _rotate_jpegtran(image_path: Path, orientation: int, had_orientation_tag: bool) -> bool:
+    """
+    Losslessly transform JPEG pixels so they display as the given orientation.
+    
+    Uses jpegtran -perfect, which refuses (rather than trimming edge blocks)
+    when the image size is not a multiple of the MCU size.
+    """
+    jpegtran = shutil.which('jpegtran')
+    if not jpegtran:
+        return False
+    
+    tmp_path = image_path.with_name(f".{image_path.name}.rotating")
+    cmd = [jpegtran, '-copy', 'all', '-perfect'] + _JPEGTRAN_OPS[orientation] + ['-outfile', str(tmp_path), str(image_path)]
+    try:
+        with subprocess_timer('jpegtran', 'rotate'):
+            result = subprocess.run(cmd, capture_output=True, timeout=120)
+        if result.returncode != 0 or not tmp_path.exists():
+            logger.debug(f"jpegtran could not rotate {image_path.name}: {result.stderr.decode(errors='replace')}")
+            return False
+        # Pixels now match the display orientation; reset the copied tag
+        if had_orientation_tag and not set_exif_orientation(tmp_path, 1):
+            return False
+        os.replace(tmp_path, image_path)
+        return True
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"jpegtran failed for {image_path.name}: {e}")
+        return False
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _rotate_reencode(image_path: Path, angle: int):
+    """Decode, rotate and re-encode (quality 95 for JPEG) over the original"""
+    # Open image
+    with Image.open(image_path) as img:
+        # Apply EXIF orientation first (if present) to get actual pixel orientation
+        from PIL import ImageOps
+        img = ImageOps.exif_transpose(img)
+        
+        # Rotate image
+        # PIL rotate: positive = counterclockwise, negative = clockwise
+        # So -90 = clockwise (right), 90 = counterclockwise (left)
+        rotated_img = img.rotate(-angle, expand=True)
+        
+        # Save rotated image (overwrite original)
+        # Preserve original format
+        img_format = img.format or 'JPEG'
+        if img_format == 'JPEG' or image_path.suffix.lower() in ('.jpg', '.jpeg'):
+            rotated_img = rotated_img.convert('RGB')
+            # Remove EXIF orientation tag when saving (since we've already applied rotation to pixels)
+            try:
+                exif = rotated_img.getexif() if hasattr(rotated_img, 'getexif') else None
+                if exif:
+                    # Create new EXIF dict without orientation tag
+                    exif_dict = dict(exif)
+                    exif_dict.pop(274, None)  # Remove orientation tag (274)
+                    # Save with updated EXIF (without orientation)
+                    if exif_dict:
+                        from PIL.ExifTags import TAGS
+                        new_exif = Image.Exif()
+                        for tag_id, value in exif_dict.items():
+                            if tag_id != 274:  # Skip orientation tag
+                                new_exif[tag_id] = value
+                        rotated_img.save(str(image_path), 'JPEG', quality=95, exif=new_exif)
+                    else:
+                        rotated_img.save(str(image_path), 'JPEG', quality=95)
+                else:
+                    rotated_img.save(str(image_path), 'JPEG', quality=95)
+            except Exception as e:
+                logger.warning(f"Could not update EXIF: {e}, saving without EXIF")
+                rotated_img.save(str(image_path), 'JPEG', quality=95)
+        elif img_format == 'PNG' or image_path.suffix.lower() == '.png':
+            # Preserve transparency if present
+            if rotated_img.mode == 'RGBA':
+                rotated_img.save(str(image_path), 'PNG')
+            else:
+                rotated_img = rotated_img.convert('RGB')
+                rotated_img.save(str(image_path), 'PNG')
+        else:
+            # Default to JPEG
+            rotated_img = rotated_img.convert('RGB')
+            try:
+                exif = rotated_img.getexif() if hasattr(rotated_img, 'getexif') else None
+                if exif:
+                    exif_dict = dict(exif)
+                    exif_dict.pop(274, None)  # Remove orientation tag
+                    if exif_dict:
+                        new_exif = Image.Exif()
+                        for tag_id, value in exif_dict.items():
+                            if tag_id != 274:
+                                new_exif[tag_id] = value
+                        rotated_img.save(str(image_path), 'JPEG', quality=95, exif=new_exif)
+                    else:
+                        rotated_img.save(str(image_path), 'JPEG', quality=95)
+                else:
+                    rotated_img.save(str(image_path), 'JPEG', quality=95)
+            except Exception as e:
+                logger.warning(f"Could not update EXIF: {e}, saving without EXIF")
+                rotated_img.save(str(image_path), 'JPEG', quality=95)
+
+
+def rotate_image(image_path: Path, angle: int, mode: Optional[str] = None) -> dict:
     """
     Rotate an image file in place
     
     Args:
         image_path: Path to image file
-        angle: Rotation angle in degrees (90, -90, 180, etc.)
+        angle: Rotation angle in degrees (90, -90, 180, etc.; positive = clockwise)
+        mode: 'lossless' (jpegtran, falling back to re-encode), 'exif' (rewrite
+            the orientation tag only, falling back to lossless) or 'reencode'.
+            Defaults to IMAGE_ROTATION_MODE. Non-JPEG images are always re-encoded.
     
     Returns:
-        Dict with success status and details
+        Dict with success status, details and the 'method' used
     """
     import time
+    from config import IMAGE_ROTATION_MODE
     start_time = time.time()
+    mode = mode or IMAGE_ROTATION_MODE
     
     # Validate input file
     if not image_path.exists():
@@ -31,95 +231,46 @@ def rotate_image(image_path: Path, angle: int) -> dict:
         }
     
     try:
-        # Open image
-        with Image.open(image_path) as img:
-            original_size = image_path.stat().st_size
-            
-            # Apply EXIF orientation first (if present) to get actual pixel orientation
-            from PIL import ImageOps
-            img = ImageOps.exif_transpose(img)
-            
-            # Rotate image
-            # PIL rotate: positive = counterclockwise, negative = clockwise
-            # So -90 = clockwise (right), 90 = counterclockwise (left)
-            rotated_img = img.rotate(-angle, expand=True)
+        original_size = image_path.stat().st_size
+        method = None
+        
+        if mode != 'reencode':
+            # Header-only read: no pixel decoding
+            with Image.open(image_path) as img:
+                is_jpeg = img.format == 'JPEG'
+                exif = img.getexif()
+                had_orientation_tag = EXIF_ORIENTATION_TAG in exif
+                orientation = exif.get(EXIF_ORIENTATION_TAG, 1)
             
-            # Save rotated image (overwrite original)
-            # Preserve original format
-            img_format = img.format or 'JPEG'
-            if img_format == 'JPEG' or image_path.suffix.lower() in ('.jpg', '.jpeg'):
-                rotated_img = rotated_img.convert('RGB')
-                # Remove EXIF orientation tag when saving (since we've already applied rotation to pixels)
-                try:
-                    exif = rotated_img.getexif() if hasattr(rotated_img, 'getexif') else None
-                    if exif:
-                        # Create new EXIF dict without orientation tag
-                        exif_dict = dict(exif)
-                        exif_dict.pop(274, None)  # Remove orientation tag (274)
-                        # Save with updated EXIF (without orientation)
-                        if exif_dict:
-                            from PIL.ExifTags import TAGS
-                            new_exif = Image.Exif()
-                            for tag_id, value in exif_dict.items():
-                                if tag_id != 274:  # Skip orientation tag
-                                    new_exif[tag_id] = value
-                            rotated_img.save(str(image_path), 'JPEG', quality=95, exif=new_exif)
-                        else:
-                            rotated_img.save(str(image_path), 'JPEG', quality=95)
-                    else:
-                        rotated_img.save(str(image_path), 'JPEG', quality=95)
-                except Exception as e:
-                    logger.warning(f"Could not update EXIF: {e}, saving without EXIF")
-                    rotated_img.save(str(image_path), 'JPEG', quality=95)
-            elif img_format == 'PNG' or image_path.suffix.lower() == '.png':
-                # Preserve transparency if present
-                if rotated_img.mode == 'RGBA':
-                    rotated_img.save(str(image_path), 'PNG')
-                else:
-                    rotated_img = rotated_img.convert('RGB')
-                    rotated_img.save(str(image_path), 'PNG')
-            else:
-                # Default to JPEG
-                rotated_img = rotated_img.convert('RGB')
-                try:
-                    exif = rotated_img.getexif() if hasattr(rotated_img, 'getexif') else None
-                    if exif:
-                        exif_dict = dict(exif)
-                        exif_dict.pop(274, None)  # Remove orientation tag
-                        if exif_dict:
-                            new_exif = Image.Exif()
-                            for tag_id, value in exif_dict.items():
-                                if tag_id != 274:
-                                    new_exif[tag_id] = value
-                            rotated_img.save(str(image_path), 'JPEG', quality=95, exif=new_exif)
-                        else:
-                            rotated_img.save(str(image_path), 'JPEG', quality=95)
-                    else:
-                        rotated_img.save(str(image_path), 'JPEG', quality=95)
-                except Exception as e:
-                    logger.warning(f"Could not update EXIF: {e}, saving without EXIF")
-                    rotated_img.save(str(image_path), 'JPEG', quality=95)
+            if is_jpeg:
+                new_orientation = compose_orientation(orientation, angle)
+                if mode == 'exif' and had_orientation_tag and set_exif_orientation(image_path, new_orientation):
+                    method = 'exif'
+                elif new_orientation == 1 and had_orientation_tag and set_exif_orientation(image_path, 1):
+                    # Rotation undoes the stored orientation: pixels are already upright
+                    method = 'exif'
+                elif new_orientation != 1 and _rotate_jpegtran(image_path, new_orientation, had_orientation_tag):
+                    method = 'lossless'
+        
+        if method is None:
+            _rotate_reencode(image_path, angle)
+            method = 'reencode'
         
         processing_time = time.time() - start_time
         new_size = image_path.stat().st_size
         
-        # Clear thumbnail cache for this file (since it changed)
-        from app.thumbnail_generator import get_thumbnail_cache_path
-        cache_path = get_thumbnail_cache_path(image_path, (120, 90))
-        if cache_path.exists():
-            try:
-                cache_path.unlink()
-                logger.debug(f"Cleared thumbnail cache: {cache_path}")
-            except Exception as e:
-                logger.warning(f"Could not clear thumbnail cache: {e}")
+        # Clear every cached thumbnail size for this file (since it changed)
+        from app.thumbnail_generator import invalidate_thumbnail_cache
+        invalidate_thumbnail_cache(image_path)
         
-        logger.info(f"Rotated image: {image_path.name} by {angle}° "
+        logger.info(f"Rotated image ({method}): {image_path.name} by {angle}° "
                    f"({original_size / (1024*1024):.2f}MB -> {new_size / (1024*1024):.2f}MB)")
         
         return {
             'success': True,
             'file_path': str(image_path),
             'angle': angle,
+            'method': method,
             'original_size': original_size,
             'new_size': new_size,
             'processing_time': round(processing_time, 2)
@@ -135,3 +286,19 @@ def rotate_image(image_path: Path, angle: int) -> dict:
             'processing_time': processing_time
         }
 
+
+def rotate_images(image_paths: List[Path], angle: int, mode: Optional[str] = None,
+                  max_workers: Optional[int] = None) -> List[dict]:
+    """
+    Rotate many images in parallel (results in input order)
+    
+    Threads suffice: jpegtran runs as a subprocess and Pillow releases the GIL
+    while decoding and encoding.
+    """
+    from config import IMAGE_CONVERSION_WORKERS
+    
+    if not image_paths:
+        return []
+    workers = min(max_workers or IMAGE_CONVERSION_WORKERS, len(image_paths))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda p: rotate_image(Path(p), angle, mode), image_paths))
@@ -0,0 +1,158 @@
+"""
+Job state shared between worker processes
+
+Under gunicorn with several workers, a job's background thread runs in the
+worker that accepted the request while its status polls can land on any
+worker. The owning worker publishes a snapshot of the job (one JSON file per
+job in JOB_STATE_DIR) every JOB_STATE_PUBLISH_INTERVAL seconds while it runs
+and once when it finishes; other workers answer status requests from that
+snapshot. A cancel request for a job owned elsewhere is left as a marker
+file that the owner's publisher picks up.
+
+Every snapshot records the process that published it, so a job whose worker
+was killed mid-run is reported as failed (see owner_is_live) instead of
+staying 'processing' forever.
+
+Only used with SHARED_JOB_STATE on (gunicorn.conf.py turns it on); the single
+process development server keeps jobs in memory only.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from config import JOB_STATE_DIR, JOB_STATE_PUBLISH_INTERVAL, SHARED_JOB_STATE
+
+logger = logging.getLogger(__name__)
+
+# Tells this process apart from an earlier one that had the same pid (e.g. a server restarted with execv)
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+# Error reported for a job whose worker process exited before finishing it
+OWNER_GONE_ERROR = 'The worker process running this job exited before it finished'
+
+
+def owner_is_live(snapshot: Dict) -> bool:
+    """True unless the process that published the snapshot is known to have exited"""
+    pid = snapshot.get('owner_pid')
+    if not pid:
+        return True  # published before owners were recorded
+    if pid == os.getpid():
+        return snapshot.get('owner_token') == _PROCESS_TOKEN
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+class JobSnapshotStore:
+    """Snapshots of one kind of job (e.g. 'deface', 'conversion'), one file per job"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def _path(self, job_id: str, suffix: str = '.json') -> Optional[Path]:
+        # Job ids are uuid4 strings; anything else never names a file
+        if not job_id or not all(c.isalnum() or c == '-' for c in job_id):
+            return None
+        return self.directory / f'{job_id}{suffix}'
+
+    def save(self, job_id: str, snapshot: Dict) -> None:
+        """Write the snapshot atomically with this process as its owner (errors are logged; the job keeps running)"""
+        path = self._path(job_id)
+        if path is None:
+            return
+        snapshot = {**snapshot, 'owner_pid': os.getpid(), 'owner_token': _PROCESS_TOKEN}
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not publish job {job_id}: {e}")
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        """The latest snapshot of job_id, or None"""
+        path = self._path(job_id)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read job {job_id}: {e}")
+            return None
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Ask the worker running job_id to cancel it; False if there is no such job"""
+        path = self._path(job_id, '.cancel')
+        if path is None or self.load(job_id) is None:
+            return False
+        path.touch()
+        return True
+
+    def cancel_requested(self, job_id: str) -> bool:
+        path = self._path(job_id, '.cancel')
+        return path is not None and path.exists()
+
+    def delete(self, job_id: str) -> None:
+        for suffix in ('.json', '.cancel'):
+            path = self._path(job_id, suffix)
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def cleanup(self, max_age_seconds: float) -> None:
+        """Remove snapshots not updated for max_age_seconds (finished jobs no worker holds any more)"""
+        if not self.directory.is_dir():
+            return
+        cutoff = time.time() - max_age_seconds
+        for path in self.directory.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+            except OSError:
+                continue
+
+    def start_publisher(self, job_id: str, snapshot: Callable[[], Dict], done: Callable[[], bool],
+                        on_cancel: Optional[Callable[[], None]] = None,
+                        interval: Optional[float] = None) -> threading.Thread:
+        """
+        Publish snapshot() every interval seconds until done() is true, then once more.
+
+        Args:
+            job_id: Job to publish
+            snapshot: Returns the job's current state (JSON-serialisable)
+            done: True once the job has finished
+            on_cancel: Called (once) when another worker asked to cancel the job
+            interval: Seconds between snapshots (default JOB_STATE_PUBLISH_INTERVAL)
+        """
+        interval = JOB_STATE_PUBLISH_INTERVAL if interval is None else interval
+
+        def run():
+            cancelled = False
+            while not done():
+                self.save(job_id, snapshot())
+                if on_cancel and not cancelled and self.cancel_requested(job_id):
+                    cancelled = True
+                    on_cancel()
+                time.sleep(interval)
+            self.save(job_id, snapshot())
+
+        thread = threading.Thread(target=run, name=f'job-publisher-{job_id[:8]}', daemon=True)
+        thread.start()
+        return thread
+
+
+def get_job_store(kind: str) -> Optional[JobSnapshotStore]:
+    """Shared store for a kind of job, or None when SHARED_JOB_STATE is off"""
+    if not SHARED_JOB_STATE:
+        return None
+    return JobSnapshotStore(JOB_STATE_DIR / kind)
@@ -0,0 +1,154 @@
+"""
+Conditional requests and compression for JSON responses
+
+File listings (/list_files, /list_images, /media-converter/list,
+/deface_existing) scan a learner folder and probe every file, which is the
+slow part of loading those pages. cached_listing gives such a view a strong
+ETag computed from a snapshot of the folder (relative path, size and mtime of
+every entry, a stat walk with no file reads): while the folder is unchanged,
+If-None-Match answers 304 without running the view at all.
+
+compress_json_response (an after-request hook in app.routes) compresses JSON
+bodies of at least JSON_COMPRESS_MIN_BYTES with Brotli (if the optional
+brotli package is installed) or gzip. A compressed representation gets its
+own strong ETag ("<etag>-br" / "<etag>-gzip"), and either form revalidates.
+"""
+import functools
+import gzip
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from flask import Response, make_response, request
+
+from config import JSON_COMPRESS_MIN_BYTES, JSON_GZIP_LEVEL, JSON_LISTING_MAX_AGE
+
+ENCODING_SUFFIXES = {'br': '-br', 'gzip': '-gzip'}
+
+
+def directory_snapshot_etag(roots: Iterable[Path], *key_parts: str) -> str:
+    """
+    Strong validator for the state of the given folder trees.
+
+    Args:
+        roots: Folders to snapshot recursively (a missing folder is part of the state)
+        key_parts: Anything else the response depends on (query string, code version)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in key_parts:
+        digest.update(f'{part}\0'.encode('utf-8', 'surrogateescape'))
+    for root in roots:
+        root = Path(root)
+        digest.update(f'root:{root}\0'.encode('utf-8', 'surrogateescape'))
+        if not root.is_dir():
+            digest.update(b'missing\0')
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, root)
+            for name in sorted(filenames):
+                try:
+                    stat = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                digest.update(f'{rel_dir}/{name}\0{stat.st_size}\0{stat.st_mtime_ns}\0'
+                              .encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def learner_folder(config_name: str, *subdirs: str) -> Callable[[], Optional[List[Path]]]:
+    """
+    Snapshot roots for a listing scoped by ?qualification=&learner= under a config folder.
+
+    The folder is looked up in config when the request comes in; without both
+    parameters the listing scans nothing and is not cached.
+    """
+    def roots() -> Optional[List[Path]]:
+        import config
+        qualification = request.args.get('qualification', '').strip()
+        learner = request.args.get('learner', '').strip()
+        if not qualification or not learner:
+            return None
+        return [Path(getattr(config, config_name), qualification, learner, *subdirs)]
+    return roots
+
+
+def _etag_matches(etag: str) -> bool:
+    if_none_match = request.if_none_match
+    return any(if_none_match.contains(etag + suffix) for suffix in ('',) + tuple(ENCODING_SUFFIXES.values()))
+
+
+def _cache_control() -> str:
+    if JSON_LISTING_MAX_AGE > 0:
+        return f'private, max-age={JSON_LISTING_MAX_AGE}'
+    return 'private, no-cache'
+
+
+def cached_listing(snapshot_roots: Callable[[], Optional[List[Path]]]):
+    """
+    Decorator for GET views whose JSON depends only on the files under snapshot_roots() and the query string.
+
+    200 responses get an ETag and Cache-Control; a matching If-None-Match gets
+    304 before the view runs. When snapshot_roots() returns None the view runs
+    as usual without validators.
+    """
+    def decorator(view):
+        # Responses change shape with the code, so the view's module version is part of the ETag
+        try:
+            code_version = str(os.stat(view.__code__.co_filename).st_mtime_ns)
+        except OSError:
+            code_version = ''
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            roots = snapshot_roots()
+            if roots is None:
+                return view(*args, **kwargs)
+            query = request.query_string.decode('latin-1')
+            etag = directory_snapshot_etag(roots, view.__name__, code_version, query)
+            if _etag_matches(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = _cache_control()
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_json_response(response: Response) -> Response:
+    """Compress a large JSON response body when the client accepts it (Brotli, else gzip)"""
+    if (JSON_COMPRESS_MIN_BYTES <= 0 or response.status_code != 200 or response.mimetype != 'application/json'
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < JSON_COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    accept = request.accept_encodings
+    brotli = _brotli() if accept['br'] else None
+    if brotli is not None:
+        encoding, body = 'br', brotli.compress(data, quality=4)
+    elif accept['gzip']:
+        encoding, body = 'gzip', gzip.compress(data, compresslevel=JSON_GZIP_LEVEL, mtime=0)
+    else:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + ENCODING_SUFFIXES[encoding], weak=weak)
+    return response
@@ -0,0 +1,250 @@
+"""
+Queue-based logging for the Flask app
+
+Loggers configured here (root, media_converter, app.routes, app.deface_video,
+app.trace) get a handler that only puts the record on an
+in-memory queue; one background thread writes the queued records to the log
+files and the console. A request thread therefore never waits on a file
+write or rotation. As with the stdlib QueueHandler, the message and traceback
+are rendered to text before a record is queued, so the queue holds no
+arguments or frames that may change or be kept alive. The queue is bounded
+(LOG_QUEUE_SIZE): when the writer falls behind, new records below WARNING are
+dropped and counted instead of blocking; warnings and errors wait for room
+(up to FULL_QUEUE_WAIT_SECONDS) so they are not lost.
+
+Diagnostic traces (trace_event) are structured JSON lines in logs/trace.log,
+sampled with DEBUG_TRACE_SAMPLE_RATE and written only when the app.trace
+logger is enabled for DEBUG (LOG_LEVEL).
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config import DEBUG_TRACE_SAMPLE_RATE, LOG_LEVEL, LOG_QUEUE_SIZE
+
+TRACE_LOGGER_NAME = 'app.trace'
+
+_trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+
+_queue: Optional[queue.Queue] = None
+_listener: Optional['_RoutingQueueListener'] = None
+# (logger, its queue handler) for each configured logger
+_queue_handlers: List[Tuple[logging.Logger, '_RoutingQueueHandler']] = []
+_stats = {'dropped': 0}
+_stats_lock = threading.Lock()
+
+# How long a WARNING or higher record waits for room in a full queue before it is dropped too
+FULL_QUEUE_WAIT_SECONDS = 5.0
+
+
+class _RoutingQueueHandler(logging.handlers.QueueHandler):
+    """Puts (target handlers, record) on the shared queue; the listener writes the record to those handlers"""
+
+    def __init__(self, log_queue: queue.Queue, targets: List[logging.Handler]):
+        super().__init__(log_queue)
+        self.targets = tuple(targets)
+        self.setLevel(min(h.level for h in targets))
+
+    def prepare(self, record):
+        # As QueueHandler.prepare: render the message (and traceback) now, on a copy without the
+        # args and exc_info, so later changes to the arguments are not logged and frames are released
+        msg = self.format(record)
+        record = copy.copy(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        if isinstance(getattr(record, 'trace', None), dict):
+            record.trace = dict(record.trace)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait((self.targets, record))
+            return
+        except queue.Full:
+            pass
+        if record.levelno >= logging.WARNING:
+            try:
+                self.queue.put((self.targets, record), timeout=FULL_QUEUE_WAIT_SECONDS)
+                return
+            except queue.Full:
+                pass
+        with _stats_lock:
+            _stats['dropped'] += 1
+
+
+class _RoutingQueueListener(logging.handlers.QueueListener):
+    """Background writer for records queued by _RoutingQueueHandler"""
+
+    def handle(self, item):
+        targets, record = item
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class _TraceFormatter(logging.Formatter):
+    """One JSON object per trace event (serialised on the writer thread)"""
+
+    def format(self, record):
+        return json.dumps({
+            'ts': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'event': record.getMessage(),
+            'location': f'{record.module}:{record.lineno}',
+            'thread': record.threadName,
+            'data': getattr(record, 'trace', None),
+        }, default=str)
+
+
+def _rotating_file(path: Path, level: int, formatter: logging.Formatter, max_mb: int = 10,
+                   backup_count: int = 5) -> logging.Handler:
+    handler = logging.handlers.RotatingFileHandler(str(path), maxBytes=max_mb * 1024 * 1024,
+                                                   backupCount=backup_count)
+    handler.setLevel(level)
+    handler.setFormatter(formatter)
+    return handler
+
+
+def _stop_listener() -> None:
+    """Flush queued records and close the file handlers of the current configuration"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for _, queue_handler in _queue_handlers:
+        for handler in queue_handler.targets:
+            handler.close()
+    _listener = None
+
+
+def configure_logging(logs_dir: Path) -> None:
+    """
+    Set up the app's log files and console output behind one background writer.
+
+    Safe to call again (e.g. a second create_app()): the previous configuration
+    is flushed and replaced.
+
+    Args:
+        logs_dir: Directory for app.log, media_converter.log, deface.log,
+            deface_video.log and trace.log
+    """
+    global _queue, _listener
+    _stop_listener()
+    for logger, queue_handler in _queue_handlers:
+        logger.removeHandler(queue_handler)
+    _queue_handlers.clear()
+
+    logs_dir = Path(logs_dir)
+    logs_dir.mkdir(exist_ok=True)
+    file_level = logging.getLevelName(LOG_LEVEL.upper())
+    if not isinstance(file_level, int):
+        file_level = logging.DEBUG
+    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    def console():
+        handler = logging.StreamHandler()
+        handler.setLevel(logging.INFO)
+        handler.setFormatter(console_formatter)
+        return handler
+
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    app_file = _rotating_file(logs_dir / 'app.log', file_level, file_formatter)
+    routes = {
+        # Root: all logs (including Flask/Werkzeug) to app.log, important ones to the console
+        '': [app_file, console()],
+        'media_converter': [_rotating_file(logs_dir / 'media_converter.log', file_level, file_formatter), console()],
+        # Deface routes (app.routes.*) also propagate to the root handlers
+        'app.routes': [_rotating_file(logs_dir / 'deface.log', file_level, file_formatter)],
+        # Video processing debug log (file; the in-memory lines for /deface_video_log are in deface_video_log)
+        'app.deface_video': [_rotating_file(logs_dir / 'deface_video.log', file_level, file_formatter,
+                                            max_mb=5, backup_count=3)],
+        TRACE_LOGGER_NAME: [_rotating_file(logs_dir / 'trace.log', logging.DEBUG, _TraceFormatter(),
+                                           max_mb=5, backup_count=3)],
+    }
+    levels = {'': logging.DEBUG, 'media_converter': logging.DEBUG, 'app.routes': logging.DEBUG,
+              'app.deface_video': logging.DEBUG, TRACE_LOGGER_NAME: file_level}
+
+    for logger_name, targets in routes.items():
+        logger = logging.getLogger(logger_name)
+        if logger_name == '':
+            logger.handlers.clear()
+        logger.setLevel(levels[logger_name])
+        queue_handler = _RoutingQueueHandler(_queue, targets)
+        logger.addHandler(queue_handler)
+        _queue_handlers.append((logger, queue_handler))
+    # Flask/Werkzeug request lines reach app.log through the root logger
+    logging.getLogger('werkzeug').setLevel(logging.INFO)
+    # Trace events go to trace.log only, not to app.log
+    _trace_logger.propagate = False
+
+    _listener = _RoutingQueueListener(_queue)
+    _listener.start()
+
+
+def _restart_after_fork() -> None:
+    # The writer thread does not survive fork (gunicorn with GUNICORN_PRELOAD=1), and the parent's
+    # queue may have been locked mid-put; give the child a fresh queue and writer.
+    global _queue, _listener
+    if _listener is None:
+        return
+    _queue = queue.Queue(LOG_QUEUE_SIZE)
+    for _, queue_handler in _queue_handlers:
+        queue_handler.queue = _queue
+    _listener = _RoutingQueueListener(_queue)
+    _listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+atexit.register(_stop_listener)
+
+
+def flush_logs() -> None:
+    """Block until every record queued so far has been written (tests, shutdown)"""
+    if _listener is None:
+        return
+    done = threading.Event()
+    marker = logging.makeLogRecord({'levelno': logging.CRITICAL})
+    marker_handler = logging.Handler()
+    marker_handler.handle = lambda record: done.set()
+    _queue.put(((marker_handler,), marker))
+    done.wait(5)
+
+
+def get_log_stats() -> Dict[str, int]:
+    """Queued (not yet written) and dropped record counts"""
+    with _stats_lock:
+        dropped = _stats['dropped']
+    return {'queued': _queue.qsize() if _queue is not None else 0, 'dropped': dropped}
+
+
+def trace_event(event: str, **data) -> None:
+    """
+    Record a structured diagnostic event (a JSON line in logs/trace.log).
+
+    The event is sampled (DEBUG_TRACE_SAMPLE_RATE) and skipped outright when
+    tracing is off, so callers can leave trace points in hot paths; data is
+    serialised by the writer thread, not the caller.
+
+    Args:
+        event: Event name, e.g. 'apply_manual_deface.session_lookup'
+        **data: JSON-serialisable fields (anything else is written with str())
+    """
+    if DEBUG_TRACE_SAMPLE_RATE <= 0 or not _trace_logger.isEnabledFor(logging.DEBUG):
+        return
+    if DEBUG_TRACE_SAMPLE_RATE < 1 and random.random() >= DEBUG_TRACE_SAMPLE_RATE:
+        return
+    _trace_logger.debug(event, extra={'trace': data}, stacklevel=2)
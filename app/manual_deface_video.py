@@ -0,0 +1,140 @@
+"""
+Manual deface areas rendered across video time ranges
+
+A manual area for a video may carry 'start' and 'end' (seconds) and an
+optional list of 'keyframes' ({t, x, y, width, height}) between which its
+box is linearly interpolated. render_video decodes the video once, draws
+the areas active at each frame's time with the manual deface renderer and
+pipes the raw frames straight into the ffmpeg encoder (no intermediate
+images), keeping the source audio when there is any.
+"""
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BOX_KEYS = ('x', 'y', 'width', 'height')
+
+
+def has_time_ranges(areas: List[Dict]) -> bool:
+    """True if any area is limited to a time range or keyframed (i.e. meant for the whole video)"""
+    return any(a.get('start') is not None or a.get('end') is not None or a.get('keyframes') for a in areas)
+
+
+def area_at(area: Dict, t: float) -> Optional[Dict]:
+    """
+    The area as drawn at time t, or None when it is not active then.
+
+    An area is active for start <= t <= end (a missing bound is open). With
+    keyframes the box is interpolated between the two keyframes around t and
+    held before the first / after the last one.
+    """
+    start, end = area.get('start'), area.get('end')
+    if (start is not None and t < float(start)) or (end is not None and t > float(end)):
+        return None
+    keyframes = sorted(area.get('keyframes') or [], key=lambda k: float(k['t']))
+    if not keyframes:
+        return area
+
+    box = None
+    if t <= float(keyframes[0]['t']):
+        box = keyframes[0]
+    elif t >= float(keyframes[-1]['t']):
+        box = keyframes[-1]
+    else:
+        for before, after in zip(keyframes, keyframes[1:]):
+            t0, t1 = float(before['t']), float(after['t'])
+            if t0 <= t <= t1:
+                w = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+                box = {k: float(before[k]) + (float(after[k]) - float(before[k])) * w for k in BOX_KEYS}
+                break
+    return dict(area, **{k: int(round(float(box[k]))) for k in BOX_KEYS})
+
+
+def active_areas(areas: List[Dict], t: float) -> List[Dict]:
+    """Areas (positioned for time t) that are active at time t"""
+    return [a for a in (area_at(area, t) for area in areas) if a is not None]
+
+
+def render_video(
+    input_path: Path,
+    output_path: Path,
+    areas: List[Dict],
+    mosaicsize: int = 20,
+    codec: str = 'libx264',
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict:
+    """
+    Render time-ranged manual deface areas into a video in one decode/encode pass.
+
+    The output is written next to output_path and moved into place when
+    complete, so output_path may be the input video.
+
+    Args:
+        input_path: Source video
+        output_path: Destination video (MP4)
+        areas: Manual deface areas, optionally with start, end and keyframes
+        mosaicsize: Default mosaic tile size
+        codec: FFmpeg video codec for the output
+        progress_callback: Called with (frames_done, total_frames or 0)
+
+    Returns:
+        Dict with 'success', 'output_path', 'frames', 'frames_changed' and
+        'processing_time'; raises on decode/encode errors
+    """
+    import imageio
+    from app.manual_deface_renderer import render_areas
+
+    start_time = time.time()
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.stem}.tmp{output_path.suffix}")
+
+    reader = imageio.get_reader(str(input_path))
+    meta = reader.get_meta_data()
+    fps = meta['fps']
+    try:
+        total_frames = reader.count_frames()
+    except Exception:
+        total_frames = 0
+
+    frames_done = 0
+    frames_changed = 0
+    writer = None
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Video from the piped frames; audio (if the source has any) copied as is
+        audio = {'audio_path': str(input_path), 'audio_codec': 'copy'} if meta.get('audio_codec') else {}
+        writer = imageio.get_writer(str(tmp_path), format='FFMPEG', mode='I', fps=fps, codec=codec, **audio)
+        for frame in reader.iter_data():
+            current = active_areas(areas, frames_done / fps)
+            if current:
+                render_areas(frame, current, mosaicsize=mosaicsize)
+                frames_changed += 1
+            writer.append_data(frame)
+            frames_done += 1
+            if progress_callback and frames_done % 10 == 0:
+                progress_callback(frames_done, total_frames)
+        writer.close()
+        writer = None
+        os.replace(tmp_path, output_path)
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+        tmp_path.unlink(missing_ok=True)
+
+    if progress_callback:
+        progress_callback(frames_done, total_frames or frames_done)
+    processing_time = time.time() - start_time
+    logger.info(f"Manual deface video {Path(input_path).name}: {len(areas)} areas on "
+                f"{frames_changed}/{frames_done} frames in {processing_time:.1f}s")
+    return {
+        'success': True,
+        'output_path': str(output_path),
+        'frames': frames_done,
+        'frames_changed': frames_changed,
+        'processing_time': round(processing_time, 2)
+    }
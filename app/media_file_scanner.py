@@ -5,6 +5,8 @@ import os
 from pathlib import Path
 from typing import List, Dict
 
+from app.thumbnail_generator import thumbnail_version
+
 
 def scan_media_files(root_path: str) -> Dict:
     """
@@ -47,7 +49,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'mov',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(mov_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -67,7 +70,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'mov',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(mov_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -87,7 +91,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'jpg',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(jpg_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -107,7 +112,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'jpg',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(jpg_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -127,7 +133,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'jpeg',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(jpeg_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -147,7 +154,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'jpeg',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(jpeg_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -167,7 +175,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'png',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(png_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -187,7 +196,8 @@ def scan_media_files(root_path: str) -> Dict:
                     'size_mb': round(stat.st_size / (1024 * 1024), 2),
                     'type': 'png',
                     'folder': str(relative_path.parent) if relative_path.parent != Path('.') else 'root',
-                    'mtime': stat.st_mtime  # Modification time for cache busting
+                    'mtime': stat.st_mtime,  # Modification time for cache busting
+                    'thumbnail_version': thumbnail_version(png_file, stat)  # &v= for immutable thumbnail URLs
                 })
         except (OSError, PermissionError):
             continue
@@ -225,13 +235,15 @@ def get_file_info(file_path: Path) -> Dict:
             try:
                 import subprocess
                 import json
+                from app.metrics import subprocess_timer
                 
                 # Use ffprobe to get video info
                 cmd = [
                     'ffprobe', '-v', 'quiet', '-print_format', 'json',
                     '-show_format', '-show_streams', str(file_path)
                 ]
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+                with subprocess_timer('ffprobe', 'file_info'):
+                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
                 
                 if result.returncode == 0:
                     data = json.loads(result.stdout)
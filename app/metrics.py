@@ -0,0 +1,286 @@
+"""
+Request, subprocess and cache metrics in Prometheus text format
+
+Served at /v2p-formatter/metrics (app/routes/metrics.py). Metrics are kept in
+memory per process. With SHARED_JOB_STATE on (gunicorn, several workers) each
+worker also publishes its values to JOB_STATE_DIR/metrics/<pid>.json every
+JOB_STATE_PUBLISH_INTERVAL seconds, and /metrics adds up the values of every
+live worker, so a scrape answered by any worker covers all of them.
+
+Usage:
+    REQUEST_COUNT.inc(endpoint='v2p_formatter.index', method='GET', status='200')
+    with subprocess_timer('ffprobe', 'file_info'):
+        subprocess.run(cmd, ...)
+    record_cache('thumbnail', hit=True)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from config import JOB_STATE_DIR, JOB_STATE_PUBLISH_INTERVAL, SHARED_JOB_STATE
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers quick JSON routes up to document generation and video processing
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_registry: List['_Metric'] = []
+
+
+class _Metric:
+    """A named metric with fixed label names; values are kept per label-value tuple"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> List[list]:
+        """[[label values], value] pairs (JSON-serialisable)"""
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Values are [per-bucket counts (not cumulative), sum, count]"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+
+# Flask requests (endpoint is the route's endpoint name, 'unmatched' for 404s)
+REQUEST_COUNT = Counter('v2p_http_requests_total', 'HTTP requests by endpoint, method and status',
+                        ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('v2p_http_request_duration_seconds',
+                            'Time to produce the response (streamed bodies are not included)',
+                            ('endpoint', 'method'))
+REQUESTS_IN_FLIGHT = Gauge('v2p_http_requests_in_flight', 'Requests being handled', ('endpoint',))
+# External tools (ffmpeg, ffprobe, deface, jpegtran)
+SUBPROCESS_DURATION = Histogram('v2p_subprocess_duration_seconds', 'Run time of external tools by operation',
+                                ('tool', 'operation'))
+SUBPROCESS_ERRORS = Counter('v2p_subprocess_errors_total',
+                            'External tool runs that raised (timeout, tool missing)', ('tool', 'operation'))
+# Thumbnail, deface detection and conversion manifest caches
+CACHE_REQUESTS = Counter('v2p_cache_requests_total', 'Cache lookups by cache and result (hit/miss)',
+                         ('cache', 'result'))
+
+
+@contextmanager
+def subprocess_timer(tool: str, operation: str):
+    """Time the enclosed external tool run into SUBPROCESS_DURATION (and count exceptions)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SUBPROCESS_ERRORS.inc(tool=tool, operation=operation)
+        raise
+    finally:
+        SUBPROCESS_DURATION.observe(time.perf_counter() - start, tool=tool, operation=operation)
+        ensure_publisher()
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+    ensure_publisher()
+
+
+def snapshot() -> Dict[str, list]:
+    """This process's values of every metric"""
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+def _merge(metric: _Metric, totals: Dict[tuple, object], samples: List[list]) -> None:
+    for labels, value in samples:
+        key = tuple(labels)
+        if isinstance(metric, Histogram):
+            if len(value[0]) != len(metric.buckets) + 1:
+                continue
+            entry = totals.setdefault(key, [[0] * (len(metric.buckets) + 1), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+            entry[1] += value[1]
+            entry[2] += value[2]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(snapshots: Optional[List[Dict[str, list]]] = None) -> str:
+    """
+    Prometheus text exposition (version 0.0.4) of the given snapshots added up.
+
+    Args:
+        snapshots: Per-process snapshot() results (default: this process, plus
+            the other live workers when SHARED_JOB_STATE is on)
+    """
+    if snapshots is None:
+        snapshots = [snapshot()] + _other_workers()
+    lines = []
+    for metric in _registry:
+        totals: Dict[tuple, object] = {}
+        for snap in snapshots:
+            _merge(metric, totals, snap.get(metric.name, []))
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for key in sorted(totals):
+            value = totals[key]
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[0]):
+                    cumulative += count
+                    lines.append(f'{metric.name}_bucket{_labels(metric.labelnames, key, ("le", _number(bound)))} '
+                                 f'{cumulative}')
+                lines.append(f'{metric.name}_sum{_labels(metric.labelnames, key)} {_number(value[1])}')
+                lines.append(f'{metric.name}_count{_labels(metric.labelnames, key)} {value[2]}')
+            else:
+                lines.append(f'{metric.name}{_labels(metric.labelnames, key)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ============================================================================
+# Sharing between gunicorn workers (SHARED_JOB_STATE)
+# ============================================================================
+
+_METRICS_DIR = JOB_STATE_DIR / 'metrics'
+_publisher_pid: Optional[int] = None
+_publisher_lock = threading.Lock()
+
+
+def _publish() -> None:
+    path = _METRICS_DIR / f'{os.getpid()}.json'
+    try:
+        _METRICS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not publish metrics: {e}")
+
+
+def ensure_publisher() -> None:
+    """Start this process's metrics publisher (once per process, so also after a fork)"""
+    global _publisher_pid
+    if not SHARED_JOB_STATE or _publisher_pid == os.getpid():
+        return
+    with _publisher_lock:
+        if _publisher_pid == os.getpid():
+            return
+        _publisher_pid = os.getpid()
+
+        def run():
+            while True:
+                _publish()
+                time.sleep(JOB_STATE_PUBLISH_INTERVAL)
+
+        threading.Thread(target=run, name='metrics-publisher', daemon=True).start()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _other_workers() -> List[Dict[str, list]]:
+    """Published snapshots of the other live processes (files of exited ones are removed)"""
+    if not SHARED_JOB_STATE or not _METRICS_DIR.is_dir():
+        return []
+    snapshots = []
+    for path in _METRICS_DIR.glob('*.json'):
+        try:
+            pid = int(path.stem)
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if not _pid_alive(pid):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return snapshots
+
@@ -0,0 +1,237 @@
+"""
+Opt-in request profiling
+
+Profiles real requests in production so slow reports ("generate DOCX took two
+minutes") can be traced to their hot spots. app/routes/profiles.py decides per
+request (should_profile) and starts a RequestProfiler; when the request is
+done the profile is written to PROFILE_DIR:
+
+- 'sample' mode: a background thread samples the stacks of the request thread
+  and of the threads it starts, directly or through threads it started (deface
+  pools, job threads), every PROFILE_SAMPLE_INTERVAL seconds. Other requests'
+  threads and pools started before the request are not sampled. Written as
+  collapsed stacks
+  (<name>.collapsed, one "frame;frame;frame count" line per stack, for
+  flamegraph.pl or speedscope).
+- 'cprofile' mode: cProfile on the request thread; written as pstats
+  (<name>.prof, for python -m pstats or snakeviz).
+
+With profiling off the per-request cost is one flag check.
+"""
+import cProfile
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import (PROFILE_ADMIN_TOKEN, PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_MODE, PROFILE_REQUESTS,
+                    PROFILE_ROUTE_PATTERN, PROFILE_SAMPLE_INTERVAL, PROFILE_SAMPLE_RATE)
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = {'sample': '.collapsed', 'cprofile': '.prof'}
+
+# <timestamp>_<endpoint>_<duration>ms_<id>.<collapsed|prof>
+_NAME_RE = re.compile(r'^(?P<ts>\d{8}T\d{6})_(?P<endpoint>[\w.-]+)_(?P<ms>\d+)ms_(?P<id>[0-9a-f]{8})'
+                      r'(?P<suffix>\.collapsed|\.prof)$')
+
+
+def token_valid(token: Optional[str]) -> bool:
+    """True if token is the configured admin token (never when none is configured)"""
+    return bool(PROFILE_ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def should_profile(endpoint: Optional[str], path: str, token: Optional[str] = None) -> bool:
+    """
+    Whether to profile this request.
+
+    Args:
+        endpoint: Flask endpoint name (None for unmatched URLs)
+        path: Request path
+        token: X-Profile-Token header value, if any
+    """
+    if token and token_valid(token):
+        return True
+    if not PROFILE_REQUESTS:
+        return False
+    if PROFILE_ROUTE_PATTERN and any(re.search(PROFILE_ROUTE_PATTERN, value) for value in (endpoint or '', path)):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+# Thread -> the StackSampler that samples it; threads it starts are sampled by the same one
+_sampled_threads: 'weakref.WeakKeyDictionary[threading.Thread, StackSampler]' = weakref.WeakKeyDictionary()
+_sampled_lock = threading.Lock()
+_thread_start = threading.Thread.start
+
+
+def _start_sampled(thread: threading.Thread) -> None:
+    """threading.Thread.start once a sampler has run: a thread started by a sampled thread is sampled too"""
+    sampler = _sampled_threads.get(threading.current_thread())
+    if sampler is not None:
+        sampler.track(thread)
+    _thread_start(thread)
+
+
+class StackSampler:
+    """Counts the collapsed stacks of the given thread, and of the threads it starts, every interval"""
+
+    def __init__(self, thread: threading.Thread, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread = thread
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._threads: weakref.WeakSet = weakref.WeakSet()
+
+    def track(self, thread: threading.Thread) -> None:
+        """Sample thread (and the threads it starts) until stop()"""
+        with _sampled_lock:
+            _sampled_threads[thread] = self
+            self._threads.add(thread)
+
+    def start(self) -> None:
+        threading.Thread.start = _start_sampled
+        self.track(self.thread)
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        _thread_start(self._thread)
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with _sampled_lock:
+            for thread in list(self._threads):
+                if _sampled_threads.get(thread) is self:
+                    del _sampled_threads[thread]
+        return self.stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with _sampled_lock:
+                names = {t.ident: t.name for t in self._threads if t.is_alive()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in names:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names[thread_id])
+                self.stacks[';'.join(reversed(labels))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    """Profiles one request in PROFILE_MODE; save() writes the profile and returns its file name"""
+
+    def __init__(self, mode: str = PROFILE_MODE):
+        self.mode = mode if mode in PROFILE_SUFFIXES else 'sample'
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._start = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+                return
+            except ValueError:
+                # Python 3.12+ allows one cProfile at a time (e.g. another request is being profiled)
+                self._profile = None
+                self.mode = 'sample'
+        if self.mode == 'sample':
+            self._sampler = StackSampler(threading.current_thread())
+            self._sampler.start()
+
+    def stop(self) -> None:
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.duration = time.perf_counter() - self._start
+
+    def save(self, endpoint: Optional[str], directory: Optional[Path] = None) -> Optional[str]:
+        """Write the profile (call after stop()); errors are logged, not raised"""
+        safe_endpoint = re.sub(r'[^\w.-]', '_', endpoint or 'unmatched')
+        name = (f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{safe_endpoint}_{int(self.duration * 1000)}ms_"
+                f"{uuid.uuid4().hex[:8]}{PROFILE_SUFFIXES[self.mode]}")
+        directory = Path(directory or PROFILE_DIR)
+        path = directory / name
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if self._profile is not None:
+                self._profile.dump_stats(str(path))
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    for stack, count in self._sampler.stacks.most_common():
+                        f.write(f'{stack} {count}\n')
+        except OSError as e:
+            logger.warning(f"Could not write profile {name}: {e}")
+            return None
+        prune_profiles(directory)
+        logger.info(f"Profiled {endpoint} ({self.duration:.2f}s): {path}")
+        return name
+
+
+def list_profiles(directory: Optional[Path] = None) -> List[Dict]:
+    """Saved profiles, newest first"""
+    directory = Path(directory or PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in directory.iterdir():
+        match = _NAME_RE.match(path.name)
+        if not match:
+            continue
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        profiles.append({
+            'name': path.name,
+            'endpoint': match.group('endpoint'),
+            'duration_ms': int(match.group('ms')),
+            'format': 'collapsed' if match.group('suffix') == '.collapsed' else 'pstats',
+            'created': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'size': stat.st_size,
+        })
+    profiles.sort(key=lambda p: p['name'], reverse=True)
+    return profiles
+
+
+def profile_path(name: str, directory: Optional[Path] = None) -> Optional[Path]:
+    """Path of a saved profile by name, or None (names that are not profile file names never resolve)"""
+    if not _NAME_RE.match(name or ''):
+        return None
+    path = Path(directory or PROFILE_DIR) / name
+    return path if path.is_file() else None
+
+
+def prune_profiles(directory: Optional[Path] = None, keep: Optional[int] = None) -> None:
+    """Delete all but the newest keep (default PROFILE_MAX_FILES) profiles"""
+    directory = Path(directory or PROFILE_DIR)
+    for profile in list_profiles(directory)[PROFILE_MAX_FILES if keep is None else keep:]:
+        try:
+            (directory / profile['name']).unlink()
+        except OSError:
+            pass
@@ -0,0 +1,226 @@
+"""
+Streaming HTTP Range responses for media files
+
+send_file_range answers GET/HEAD for a file on disk without ever holding more
+than one chunk of it in memory:
+
+- no (usable) Range: 200 with the whole file through wsgi.file_wrapper, so a
+  server that supports it (gunicorn) sends it with sendfile
+- one range: 206 streamed from the file in fixed-size chunks
+- several ranges: 206 multipart/byteranges, each part streamed the same way
+- unsatisfiable ranges: 416 with Content-Range: bytes */size
+
+Every response carries ETag and Last-Modified; If-None-Match /
+If-Modified-Since answer 304 and If-Range falls back to the whole file when
+the validator no longer matches.
+
+With MEDIA_X_ACCEL_REDIRECT on, x_accel_response hands a validated file to
+nginx instead (X-Accel-Redirect to an internal location), so the Python
+worker sends no file bytes at all.
+"""
+import os
+import uuid
+from pathlib import Path
+from urllib.parse import quote
+from typing import Iterator, List, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag
+from werkzeug.wsgi import wrap_file
+
+from config import MEDIA_RANGE_CHUNK_SIZE, MEDIA_X_ACCEL_LOCATIONS, MEDIA_X_ACCEL_REDIRECT
+
+# Past this many ranges in one request the Range header is ignored (whole file is sent)
+MAX_RANGES = 16
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Strong validator for a file version: mtime (ns) and size"""
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
+
+def parse_byte_ranges(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Byte ranges of a Range header as inclusive (start, end) pairs clipped to size.
+
+    Returns None when the header is absent, malformed or not in bytes (the
+    whole file should be sent) and [] when no range is satisfiable (416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+    specs = [s.strip() for s in spec.split(',') if s.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in specs:
+        first, dash, last = item.partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last) or not (first or '0').isdigit() or not (last or '0').isdigit():
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(int(last), size - 1) if last else size - 1))
+    return ranges
+
+
+def _iter_file_range(path: Path, start: int, length: int, chunk_size: int) -> Iterator[bytes]:
+    """Yield length bytes of the file from start, chunk_size at a time"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _not_modified(etag: str, stat: os.stat_result) -> bool:
+    """True if the client's cached copy (If-None-Match / If-Modified-Since) is current"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag)
+    since = parse_date(request.headers.get('If-Modified-Since'))
+    return since is not None and int(stat.st_mtime) <= since.timestamp()
+
+
+def _if_range_matches(etag: str, stat: os.stat_result) -> bool:
+    """True if there is no If-Range or it still names this version of the file"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        # Only a strong ETag comparison may allow a partial response
+        return if_range == quote_etag(etag)
+    date = parse_date(if_range)
+    return date is not None and int(stat.st_mtime) == int(date.timestamp())
+
+
+def x_accel_uri(file_path: Path) -> Optional[str]:
+    """Internal nginx URI for file_path, or None if it is not under a MEDIA_X_ACCEL_LOCATIONS root"""
+    resolved = Path(file_path).resolve()
+    for location, root in MEDIA_X_ACCEL_LOCATIONS.items():
+        try:
+            relative = resolved.relative_to(Path(root).resolve())
+        except ValueError:
+            continue
+        return location.rstrip('/') + '/' + quote(relative.as_posix())
+    return None
+
+
+def x_accel_response(file_path: Path, mimetype: Optional[str] = None,
+                     download_name: Optional[str] = None) -> Optional[Response]:
+    """
+    Empty response telling nginx to send file_path itself (X-Accel-Redirect).
+
+    nginx then handles Range, conditional requests and sendfile. Returns None
+    when MEDIA_X_ACCEL_REDIRECT is off or the file has no internal location,
+    and the caller serves the file as usual.
+
+    Args:
+        file_path: File to serve (caller has validated the path)
+        mimetype: Content type (nginx guesses from the extension when None)
+        download_name: Send as an attachment with this file name
+    """
+    if not MEDIA_X_ACCEL_REDIRECT:
+        return None
+    uri = x_accel_uri(file_path)
+    if uri is None:
+        return None
+    response = Response(status=200, mimetype=mimetype)
+    if mimetype is None:
+        # Let nginx pick the type from the file extension
+        del response.headers['Content-Type']
+    response.headers['X-Accel-Redirect'] = uri
+    if download_name:
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+    return response
+
+
+def send_file_range(file_path: Path, mimetype: str, chunk_size: Optional[int] = None) -> Response:
+    """
+    Response for file_path honouring Range, If-Range and conditional request headers.
+
+    Args:
+        file_path: File to serve (caller has validated the path)
+        mimetype: Content type of the file
+        chunk_size: Bytes read per chunk for partial responses (default MEDIA_RANGE_CHUNK_SIZE)
+
+    Returns:
+        Flask Response (200, 206, 304 or 416) whose body is streamed from disk
+    """
+    file_path = Path(file_path)
+    chunk_size = chunk_size or MEDIA_RANGE_CHUNK_SIZE
+    stat = file_path.stat()
+    size = stat.st_size
+    etag = file_etag(stat)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': 'no-cache'
+    }
+
+    if _not_modified(etag, stat):
+        return Response(status=304, headers=headers)
+
+    # An empty file has no byte ranges to serve; it is always sent whole (200 with no body)
+    use_range = size > 0 and _if_range_matches(etag, stat)
+    ranges = parse_byte_ranges(request.headers.get('Range'), size) if use_range else None
+
+    if ranges is None:
+        # Whole file: let the server use sendfile when it provides wsgi.file_wrapper
+        body = wrap_file(request.environ, open(file_path, 'rb'), buffer_size=chunk_size)
+        response = Response(body, status=200, mimetype=mimetype, headers=headers, direct_passthrough=True)
+        response.content_length = size
+        return response
+
+    if not ranges:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response = Response(_iter_file_range(file_path, start, end - start + 1, chunk_size), status=206,
+                            mimetype=mimetype, headers=headers, direct_passthrough=True)
+        response.content_length = end - start + 1
+        return response
+
+    # Several ranges: multipart/byteranges, headers of each part computed up front for Content-Length
+    boundary = uuid.uuid4().hex
+    part_heads = [
+        (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+         f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('latin-1')
+        for start, end in ranges
+    ]
+    tail = f'--{boundary}--\r\n'.encode('latin-1')
+    length = sum(len(head) + (end - start + 1) + 2 for head, (start, end) in zip(part_heads, ranges)) + len(tail)
+
+    def generate():
+        for head, (start, end) in zip(part_heads, ranges):
+            yield head
+            yield from _iter_file_range(file_path, start, end - start + 1, chunk_size)
+            yield b'\r\n'
+        yield tail
+
+    response = Response(generate(), status=206, headers=headers, direct_passthrough=True,
+                        content_type=f'multipart/byteranges; boundary={boundary}')
+    response.content_length = length
+    return response
@@ -0,0 +1,59 @@
+"""
+Routes of the v2p_formatter blueprint, one module per feature:
+
+- frames: main page, video selection, frame extraction, PDF/DOCX from frames,
+  downloads and video thumbnails
+- media_converter: media converter pages, conversion jobs, rotate/trim/crop
+- image_to_pdf: image to PDF/DOCX module
+- deface: automatic and manual deface, deface jobs, sessions and documents
+- metrics: per-request instrumentation and the Prometheus /metrics endpoint
+- profiles: opt-in request profiling and the admin /profiles endpoints
+
+Feature modules import their heavy dependencies (OpenCV, NumPy, Pillow,
+ReportLab, python-docx) inside the routes that use them, so importing the
+blueprint at server start (and in every gunicorn worker) stays cheap;
+tests/test_import_time.py keeps it that way.
+"""
+from pathlib import Path
+
+from flask import Blueprint
+
+bp = Blueprint('v2p_formatter', __name__)
+
+
+def _serve_file_with_range(file_path: Path, mimetype: str):
+    """Return Flask Response for file with Range support (206, multi-range, If-Range), streamed from disk
+    (or sent by nginx when X-Accel-Redirect is on)."""
+    from app.range_response import send_file_range, x_accel_response
+    return x_accel_response(file_path, mimetype) or send_file_range(file_path, mimetype)
+
+
+def _serve_thumbnail(file_path: Path, file_type: str, size: tuple):
+    """Return the thumbnail of file_path as JPEG; If-None-Match is answered from one stat, before any
+    generation or cache read. Requests carrying the current version (&v=) are cacheable as immutable."""
+    from flask import Response, request
+    from config import THUMBNAIL_IMMUTABLE_MAX_AGE
+    from app.thumbnail_generator import get_thumbnail, thumbnail_etag, thumbnail_version
+    version = thumbnail_version(file_path)
+    etag = thumbnail_etag(version, size)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(get_thumbnail(file_path, file_type, size), mimetype='image/jpeg')
+    response.set_etag(etag)
+    if request.args.get('v') == version and THUMBNAIL_IMMUTABLE_MAX_AGE > 0:
+        response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@bp.after_app_request
+def _compress_json(response):
+    """Gzip/Brotli for large JSON responses (see app.listing_cache)"""
+    from app.listing_cache import compress_json_response
+    return compress_json_response(response)
+
+
+# Register each feature's routes on bp
+from app.routes import frames, media_converter, image_to_pdf, deface, metrics, profiles  # noqa: E402,F401
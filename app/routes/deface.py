@@ -0,0 +1,1505 @@
+"""
+Deface module routes: automatic and manual deface, deface jobs and sessions,
+defaced file serving and deface documents
+"""
+from flask import render_template, request, jsonify, send_file, send_from_directory, Response, stream_with_context
+import contextvars
+import logging
+import json
+import time
+from collections import deque
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.routes import bp, _serve_file_with_range
+from app.listing_cache import cached_listing, learner_folder
+from app.deface_processor import (deface_images, deface_video, apply_manual_deface, apply_manual_deface_to_video,
+                                  apply_manual_deface_to_video_range)
+from app.manual_deface_video import has_time_ranges
+from app.deface_session import (
+    create_session, get_session, update_session_processed, 
+    update_session_settings, add_manual_defaces,
+    cleanup_session, get_session_temp_dir, update_session_progress,
+    get_sessions_disk_usage, create_session_temp_dir
+)
+from app.deface_video_log import (append_video_log, set_deface_progress, clear_deface_progress, get_deface_progress,
+                                 add_deface_completed_item)
+from app.deface_job import deface_job_manager
+from app.log_pipeline import trace_event
+from app.observation_media_scanner import list_qualifications, list_learners
+from config import RESOLUTION_PRESETS, OUTPUT_FOLDER, DEFACE_MAX_CONCURRENT_VIDEOS
+
+logger = logging.getLogger(__name__)
+
+# In-memory deface API log for Debug page (last N entries)
+_DEFACE_DEBUG_LOG_MAX = 100
+_DEFACE_DEBUG_LOG = deque(maxlen=_DEFACE_DEBUG_LOG_MAX)
+
+
+def _deface_debug_append(endpoint, request_summary, status_code, response_summary, error=None, diagnostics=None):
+    """Append a deface API call to the debug log (tracked and analysable on Debug page; also a trace event)."""
+    entry = {
+        'ts': datetime.utcnow().isoformat() + 'Z',
+        'endpoint': endpoint,
+        'request': request_summary,
+        'status': status_code,
+        'response': response_summary,
+        'error': error,
+    }
+    if diagnostics is not None:
+        entry['diagnostics'] = diagnostics
+    _DEFACE_DEBUG_LOG.append(entry)
+    trace_event('deface_api', **entry)
+
+
+# ============================================================================
+# Deface Module Routes
+# ============================================================================
+
+@bp.route('/deface', methods=['GET'])
+def deface_index():
+    """Deface main page"""
+    from config import OUTPUT_FOLDER
+    
+    # Get qualifications (top-level folders) from OUTPUT_FOLDER
+    qualifications = list_qualifications(OUTPUT_FOLDER)
+    
+    # Get selected qualification and learner from query parameters
+    selected_qualification = request.args.get('qualification', '')
+    selected_learner = request.args.get('learner', '')
+    
+    # Get learners for selected qualification (if any)
+    learners = []
+    if selected_qualification:
+        learners = list_learners(OUTPUT_FOLDER, selected_qualification)
+    
+    return render_template('deface.html',
+                         qualifications=qualifications,
+                         selected_qualification=selected_qualification,
+                         learners=learners,
+                         selected_learner=selected_learner)
+
+
+@bp.route('/deface/onnx_status', methods=['GET'])
+def deface_onnx_status():
+    """Return ONNX Runtime status (GPU/CPU) for Deface page and debug page."""
+    from app.deface_processor import get_onnx_runtime_status
+    return jsonify(get_onnx_runtime_status())
+
+
+@bp.route('/deface/debug', methods=['GET'])
+def deface_debug():
+    """Deface debug page (breakpoints, inspect state)."""
+    return render_template('deface_debug.html')
+
+
+@bp.route('/deface/debug/log', methods=['GET'])
+def deface_debug_log():
+    """Return recent deface API log entries for the Debug page (tracked and analysed)."""
+    return jsonify({'entries': list(_DEFACE_DEBUG_LOG)})
+
+
+@bp.route('/deface_video_log', methods=['GET'])
+def deface_video_log_json():
+    """Return recent video processing debug lines and deface progress (for live UI when request is in flight).
+
+    With ?job_id= the progress is that job's; otherwise the most recently started run's.
+    """
+    from app.deface_video_log import get_recent_lines
+    limit = min(int(request.args.get('limit', 200)), 300)
+    job = deface_job_manager.get_job(request.args.get('job_id', ''))
+    return jsonify({
+        'lines': get_recent_lines(limit=limit),
+        'progress': get_deface_progress(job.progress if job else None),
+    })
+
+
+@bp.route('/deface_video_log/view', methods=['GET'])
+def deface_video_log_view():
+    """HTML page that polls /deface_video_log and displays lines (open in new tab during Apply Deface)."""
+    return render_template('deface_video_log_view.html')
+
+
+@bp.route('/apply_deface', methods=['POST'])
+def apply_deface():
+    """Start a deface job for images/videos; returns 202 with job_id and session ID.
+
+    The job's result (preview URLs) is in /apply_deface/status/<job_id> or the
+    /apply_deface/events/<job_id> stream. With "wait": true, responds with the
+    result directly once processing is done.
+    """
+    from config import OUTPUT_FOLDER
+    from pathlib import Path
+    
+    def _log_apply(status_code, response_summary, error=None, diagnostics=None):
+        req = {'image_paths_count': len(data.get('image_paths', []))}
+        _deface_debug_append('apply_deface', req, status_code, response_summary, error=error, diagnostics=diagnostics)
+    
+    try:
+        data = request.json or {}
+        image_paths = data.get('image_paths', [])
+        quality = int(data.get('quality', 95))
+        max_size = data.get('max_size', '640x480')
+        qualification = (data.get('qualification') or '').strip()
+        learner = (data.get('learner') or '').strip()
+        
+        # Deface settings
+        replacewith = data.get('replacewith', 'blur')
+        boxes = data.get('boxes', False)
+        thresh = float(data.get('thresh', 0.2))
+        scale_str = data.get('scale', '')
+        mosaicsize = int(data.get('mosaicsize', 20))
+        draw_scores = data.get('draw_scores', False)
+        detection_stride = data.get('detection_stride')
+        detection_stride = int(detection_stride) if detection_stride not in (None, '') else None
+        approve_video_processing = data.get('approve_video_processing', False)
+        
+        if not image_paths:
+            out = {'success': False, 'error': 'No images or videos provided'}
+            _log_apply(400, out, error=out['error'])
+            return jsonify(out), 400
+        
+        # Validate paths and separate images from videos
+        validated_images = []
+        validated_videos = []
+        
+        for path in image_paths:
+            file_path = Path(path)
+            
+            # Validate path is within OUTPUT_FOLDER
+            try:
+                file_path.resolve().relative_to(OUTPUT_FOLDER.resolve())
+            except ValueError:
+                out = {'success': False, 'error': f'Invalid file path: {path}'}
+                _log_apply(400, out, error=out['error'])
+                return jsonify(out), 400
+            
+            if file_path.exists():
+                ext = file_path.suffix.lower()
+                if ext == '.mp4':
+                    validated_videos.append(file_path.resolve())
+                elif ext in {'.jpg', '.jpeg', '.png', '.gif', '.webp'}:
+                    validated_images.append(file_path.resolve())
+        
+        if not validated_images and not validated_videos:
+            out = {'success': False, 'error': 'No valid images or videos found'}
+            _log_apply(400, out, error=out['error'])
+            return jsonify(out), 400
+        
+        # Check approval for video processing
+        if validated_videos and not approve_video_processing:
+            out = {'success': False, 'error': 'Video processing requires approval. Please check "Approve Video Processing" setting.'}
+            _log_apply(400, out, error=out['error'])
+            return jsonify(out), 400
+
+        def _video_log(stage: str, msg: str) -> None:
+            line = f"[apply_deface] video {stage} | {msg}"
+            logger.info(line)
+            append_video_log(line)
+        if validated_videos:
+            _video_log("start", f"images={len(validated_images)} videos={len(validated_videos)} (video processing can take several minutes)")
+        
+        # Parse scale if provided
+        scale = None
+        if scale_str and scale_str != 'original':
+            try:
+                parts = scale_str.split('x')
+                if len(parts) == 2:
+                    scale = (int(parts[0]), int(parts[1]))
+            except:
+                pass
+        
+        # Create session and temporary directory
+        temp_dir = create_session_temp_dir()
+        session_id = create_session(temp_dir)
+        trace_event('apply_deface.session_created', session_id=session_id, temp_dir=str(temp_dir))
+        
+        # Store settings in session
+        update_session_settings(session_id, {
+            'replacewith': replacewith,
+            'boxes': boxes,
+            'thresh': thresh,
+            'scale': scale_str,
+            'mosaicsize': mosaicsize,
+            'draw_scores': draw_scores,
+            'detection_stride': detection_stride,
+            'approve_video_processing': approve_video_processing,
+            'quality': quality,
+            'max_size': max_size
+        })
+        
+        def _run():
+            """Process the validated images/videos (job thread); returns (payload, status_code)"""
+            processed_items = []
+            sequence = 0
+            # Diagnostics for debug log when deface produces no output
+            diagnostics_log = {
+                'validated_images_count': len(validated_images),
+                'validated_videos_count': len(validated_videos),
+                'image_paths_sample': [str(p) for p in validated_images[:3]],
+                'video_paths_sample': [str(p) for p in validated_videos[:3]],
+                'deface_images_result': None,
+                'image_skip_reasons': [],
+                'video_results': [],
+            }
+        
+            def publish_item(original_path, defaced_file, rel_path_str, media_type):
+                """Add a processed item and make it available to clients right away (job results, session)"""
+                nonlocal sequence
+                sequence += 1
+                item = {
+                    'original_path': str(original_path),
+                    'original_name': original_path.name,
+                    'defaced_path': str(defaced_file),
+                    'defaced_url': f'/v2p-formatter/deface_temp/{session_id}/{rel_path_str}',
+                    'type': media_type,
+                    'sequence': sequence,
+                    'manual_defaces': []
+                }
+                processed_items.append(item)
+                add_deface_completed_item(item)
+                update_session_processed(session_id, processed_items, flush=False)
+        
+            # Calculate total items for progress tracking (queue order: images then videos)
+            total_items = len(validated_images) + len(validated_videos)
+            queue_item_names = [p.name for p in validated_images] + [p.name for p in validated_videos]
+            update_session_progress(session_id, total=total_items, completed=0, status='processing')
+            clear_deface_progress()
+            set_deface_progress(total=total_items, completed=0, status='processing', phase='images' if validated_images else 'videos', item_names=queue_item_names)
+        
+            try:
+                # Process images with deface
+                if validated_images:
+                    n_imgs = len(validated_images)
+                    append_video_log(f"[apply_deface] images start | {n_imgs} image(s) (usually a few seconds)")
+                    
+                    def add_image_item(index, result):
+                        """Publish each defaced image as soon as it (and the ones before it) are done"""
+                        if not result.get('success'):
+                            return
+                        original_path = validated_images[index]
+                        defaced_file = Path(result['output_path'])
+                    
+                        # Verify file exists
+                        if not defaced_file.exists():
+                            diagnostics_log['image_skip_reasons'].append(f"{defaced_file.name}: file does not exist after deface")
+                            logger.error(f"Defaced file does not exist: {defaced_file}")
+                            return
+                    
+                        # Calculate relative path for URL
+                        try:
+                            rel_path = defaced_file.relative_to(temp_dir)
+                        except ValueError:
+                            diagnostics_log['image_skip_reasons'].append(f"{defaced_file.name}: not under temp_dir")
+                            logger.error(f"Defaced file {defaced_file} is not in temp_dir {temp_dir}")
+                            return
+                    
+                        # Convert to string with forward slashes
+                        rel_path_str = str(rel_path).replace('\\', '/')
+                        publish_item(original_path, defaced_file, rel_path_str, 'image')
+                    
+                    deface_result = deface_images(
+                        validated_images,
+                        temp_dir,
+                        replacewith=replacewith,
+                        boxes=boxes,
+                        thresh=thresh,
+                        scale=scale,
+                        mosaicsize=mosaicsize,
+                        draw_scores=draw_scores,
+                        output_prefix='deface_',
+                        progress_callback=lambda done, total: set_deface_progress(
+                            completed=done,
+                            current_item=validated_images[done].name if done < total else None
+                        ),
+                        item_callback=add_image_item
+                    )
+                    diagnostics_log['deface_images_result'] = {
+                        'processed_count': len(deface_result.get('processed', [])),
+                        'processed_paths': list(deface_result.get('processed', [])),
+                        'errors': list(deface_result.get('errors', [])),
+                        'success': deface_result.get('success'),
+                    }
+                
+                    # Log errors if any
+                    if deface_result.get('errors'):
+                        logger.warning(f"Deface processing errors: {deface_result.get('errors')}")
+                    
+                    set_deface_progress(completed=len(processed_items), phase='videos' if validated_videos else None)
+                    append_video_log(f"[apply_deface] images done | {len(processed_items)} image(s) processed")
+            
+                # Process videos: process directly with deface tool (outputs MP4); optional parallel (DEFACE_MAX_CONCURRENT_VIDEOS)
+                if validated_videos:
+                    completed_images = len([item for item in processed_items if item.get('type') == 'image'])
+                    completed = completed_images
+                    n_videos = len(validated_videos)
+                    max_parallel = max(1, min(8, int(DEFACE_MAX_CONCURRENT_VIDEOS)))
+                    if max_parallel <= 1:
+                        # Sequential (default): one video at a time, progress shows current video name and %
+                        for idx, video_path in enumerate(validated_videos):
+                            _video_log("loop_start", f"video {idx + 1}/{n_videos} name={video_path.name} path={video_path}")
+                            set_deface_progress(completed=completed, current_item=video_path.name, phase='videos', elapsed_seconds=0)
+                            update_session_progress(session_id, completed=completed, current_item=video_path.name)
+                            _video_log("call_deface_video", f"calling deface_video for {video_path.name}...")
+                            video_result = deface_video(
+                                video_path,
+                                temp_dir,
+                                replacewith=replacewith,
+                                boxes=boxes,
+                                thresh=thresh,
+                                scale=scale,
+                                mosaicsize=mosaicsize,
+                                draw_scores=draw_scores,
+                                output_prefix='deface_',
+                                detection_stride=detection_stride
+                            )
+                            _video_log("call_deface_video", f"returned success={video_result.get('success')} processed={len(video_result.get('processed', []))} errors={len(video_result.get('errors', []))}")
+                            diagnostics_log['video_results'].append({
+                                'input': video_path.name,
+                                'processed_count': len(video_result.get('processed', [])),
+                                'processed': list(video_result.get('processed', [])),
+                                'errors': list(video_result.get('errors', [])),
+                                'success': video_result.get('success'),
+                            })
+                            if video_result.get('processed'):
+                                defaced_path = video_result.get('processed', [])[0]
+                                defaced_file = Path(defaced_path)
+                                _video_log("add_item", f"defaced_file={defaced_file.name} exists={defaced_file.exists()}")
+                                if defaced_file.exists():
+                                    try:
+                                        rel_path = defaced_file.relative_to(temp_dir)
+                                        rel_path_str = str(rel_path).replace('\\', '/')
+                                        publish_item(video_path, defaced_file, rel_path_str, 'video')
+                                        _video_log("add_item", f"added to processed_items sequence={sequence}")
+                                    except ValueError:
+                                        logger.error(f"Defaced file {defaced_file} is not in temp_dir {temp_dir}")
+                            if video_result.get('errors'):
+                                logger.warning(f"Video deface processing errors: {video_result.get('errors')}")
+                            completed += 1
+                            _video_log("loop_end", f"video {idx + 1}/{n_videos} done processed_items={len(processed_items)}")
+                    else:
+                        # Parallel: run up to max_parallel videos at once; progress shows "Videos (N in parallel)"
+                        _video_log("parallel_start", f"videos={n_videos} max_workers={max_parallel}")
+                        set_deface_progress(completed=completed, current_item=f"Videos (up to {max_parallel} in parallel)", phase='videos', elapsed_seconds=0)
+                        update_session_progress(session_id, completed=completed, current_item=f"Processing {n_videos} videos in parallel")
+                        video_results_by_idx = {}
+
+                        def run_one(idx_video):
+                            idx, video_path = idx_video
+                            _video_log("call_deface_video", f"[worker] calling deface_video for {video_path.name}...")
+                            result = deface_video(
+                                video_path,
+                                temp_dir,
+                                replacewith=replacewith,
+                                boxes=boxes,
+                                thresh=thresh,
+                                scale=scale,
+                                mosaicsize=mosaicsize,
+                                draw_scores=draw_scores,
+                                output_prefix='deface_',
+                                detection_stride=detection_stride
+                            )
+                            return idx, video_path, result
+
+                        published = 0
+
+                        def publish_finished_videos():
+                            # Publish the finished prefix in original order so results stream as they land
+                            nonlocal published
+                            while published in video_results_by_idx:
+                                idx = published
+                                published += 1
+                                video_path, video_result = video_results_by_idx[idx]
+                                diagnostics_log['video_results'].append({
+                                    'input': video_path.name,
+                                    'processed_count': len(video_result.get('processed', [])),
+                                    'processed': list(video_result.get('processed', [])),
+                                    'errors': list(video_result.get('errors', [])),
+                                    'success': video_result.get('success'),
+                                })
+                                if video_result.get('processed'):
+                                    defaced_path = video_result.get('processed', [])[0]
+                                    defaced_file = Path(defaced_path)
+                                    if defaced_file.exists():
+                                        try:
+                                            rel_path = defaced_file.relative_to(temp_dir)
+                                            rel_path_str = str(rel_path).replace('\\', '/')
+                                            publish_item(video_path, defaced_file, rel_path_str, 'video')
+                                        except ValueError:
+                                            logger.error(f"Defaced file {defaced_file} is not in temp_dir {temp_dir}")
+                                if video_result.get('errors'):
+                                    logger.warning(f"Video deface processing errors: {video_result.get('errors')}")
+                                set_deface_progress(completed=len(processed_items), phase='videos')
+                                update_session_progress(session_id, completed=len(processed_items))
+
+                        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+                            # Each worker gets a copy of this context so its progress goes to this job
+                            futures = {executor.submit(contextvars.copy_context().run, run_one, (idx, vp)): idx
+                                       for idx, vp in enumerate(validated_videos)}
+                            for future in as_completed(futures):
+                                try:
+                                    idx, video_path, video_result = future.result()
+                                    video_results_by_idx[idx] = (video_path, video_result)
+                                except Exception as e:
+                                    idx = futures[future]
+                                    video_path = validated_videos[idx]
+                                    video_results_by_idx[idx] = (video_path, {
+                                        'success': False, 'processed': [], 'errors': [{'input': str(video_path), 'error': str(e)}],
+                                        'total': 1, 'successful': 0, 'failed': 1
+                                    })
+                                    logger.exception(f"Deface video task failed for {video_path.name}")
+                                publish_finished_videos()
+
+                        _video_log("parallel_done", f"total processed_items={len(processed_items)}")
+
+                    _video_log("all_done", f"total processed_items={len(processed_items)}")
+            
+                # Update progress to complete and append a clear completion line so the log shows run finished
+                set_deface_progress(completed=total_items, status='complete', current_item=None)
+                update_session_progress(session_id, completed=total_items, status='complete')
+                append_video_log(f"[apply_deface] run complete — {len(processed_items)} item(s) processed")
+            
+                # Do not return success if no files were actually processed (avoids 400 on generate_documents)
+                if not processed_items:
+                    cleanup_session(session_id)
+                    num_images = len(validated_images)
+                    num_videos = len(validated_videos)
+                    detail = f'{num_images} image(s) and {num_videos} video(s) were sent but deface produced no output.'
+                    err_msg = 'No files were defaced. ' + detail + ' Check that the deface tool is installed (pip install deface), paths are readable, and files are valid images/MP4.'
+                    out = {'success': False, 'error': err_msg, 'validated_images': num_images, 'validated_videos': num_videos}
+                    _log_apply(400, out, error=err_msg, diagnostics=diagnostics_log)
+                    return {'success': False, 'error': err_msg}, 400
+            
+                # Update session with processed items
+                update_session_processed(session_id, processed_items)
+                # Optionally copy defaced output to OUTPUT_FOLDER/qual/learner/deface/ so the review section appears when opening the page by URL
+                if qualification and learner and processed_items:
+                    try:
+                        deface_dir = OUTPUT_FOLDER / qualification / learner / 'deface'
+                        deface_dir.mkdir(parents=True, exist_ok=True)
+                        import shutil
+                        for item in processed_items:
+                            src = Path(item.get('defaced_path', ''))
+                            if not src.exists():
+                                continue
+                            # Always use canonical deface_<original_name> so we never get deface_deface_* in output
+                            original_name = item.get('original_name') or src.name
+                            base = original_name[7:] if original_name.startswith('deface_') else original_name
+                            name = f'deface_{base}' if base else src.name
+                            dest = deface_dir / name
+                            if dest.exists():
+                                base, ext = dest.stem, dest.suffix
+                                n = 1
+                                while dest.exists():
+                                    dest = deface_dir / f'{base}_{n}{ext}'
+                                    n += 1
+                            shutil.copy2(src, dest)
+                        _video_log("response", f"copied {len(processed_items)} file(s) to {deface_dir}")
+                    except Exception as e:
+                        logger.warning(f"apply_deface: could not copy to output folder: {e}")
+                if validated_videos:
+                    _video_log("response", f"returning success processed_count={len(processed_items)} session_id={session_id}")
+                out = {'success': True, 'processed_count': len(processed_items), 'session_id': session_id}
+                _log_apply(200, out)
+                return {
+                    'success': True,
+                    'processed': processed_items,
+                    'temp_dir': str(temp_dir),
+                    'session_id': session_id
+                }, 200
+        
+            except Exception as e:
+                logger.error(f"Error in apply_deface: {e}", exc_info=True)
+                clear_deface_progress()
+                cleanup_session(session_id)
+                out = {'success': False, 'error': str(e)}
+                _log_apply(500, out, error=str(e))
+                return out, 500
+
+        # Process in a background job; clients follow /apply_deface/status or /apply_deface/events.
+        # 'wait': true keeps the old behaviour of responding only when processing is done.
+        job = deface_job_manager.create_job(session_id)
+        if data.get('wait'):
+            job.run(_run)
+            return jsonify(job.result), job.status_code
+        job.start(_run)
+        _log_apply(202, {'success': True, 'job_id': job.job_id, 'session_id': session_id})
+        return jsonify({
+            'success': True,
+            'job_id': job.job_id,
+            'session_id': session_id,
+            'status_url': f'/v2p-formatter/apply_deface/status/{job.job_id}',
+            'events_url': f'/v2p-formatter/apply_deface/events/{job.job_id}'
+        }), 202
+    
+    except Exception as e:
+        logger.error(f"Error in apply_deface: {e}", exc_info=True)
+        clear_deface_progress()
+        out = {'success': False, 'error': str(e)}
+        try:
+            _log_apply(500, out, error=str(e))
+        except Exception:
+            pass
+        return jsonify(out), 500
+
+
+@bp.route('/deface_sessions/disk_usage', methods=['GET'])
+def deface_sessions_disk_usage():
+    """Disk used by deface session temp directories (total, quota and per session, most recently used first)"""
+    try:
+        return jsonify({
+            'success': True,
+            **get_sessions_disk_usage()
+        })
+    except Exception as e:
+        logger.error(f"Error in deface_sessions_disk_usage: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@bp.route('/apply_deface/status/<job_id>', methods=['GET'])
+def apply_deface_status(job_id):
+    """Get deface job status: progress while running, the /apply_deface result when done"""
+    job = deface_job_manager.get_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        **job.get_status()
+    })
+
+
+@bp.route('/apply_deface/results/<job_id>', methods=['GET'])
+def apply_deface_results(job_id):
+    """Processed items a deface job has published so far, from ?offset= (at most ?limit=), in input order"""
+    job = deface_job_manager.get_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    offset = max(0, request.args.get('offset', 0, type=int) or 0)
+    limit = request.args.get('limit', type=int)
+    done = job.done  # read before the items so a finished job's list is complete
+    items = job.get_items(offset, limit)
+    return jsonify({
+        'success': True,
+        'job_id': job.job_id,
+        'status': job.status.value,
+        'done': done,
+        'offset': offset,
+        'items': items,
+        'next_offset': offset + len(items),
+        'available': get_deface_progress(job.progress).get('items_available', 0)
+    })
+
+
+@bp.route('/apply_deface/events/<job_id>', methods=['GET'])
+def apply_deface_events(job_id):
+    """
+    Server-sent events stream of a deface job: an 'items' event with each batch of newly processed
+    items (as they finish, in input order) and a 'status' event per status change; ends when the job is done
+    """
+    job = deface_job_manager.get_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    def generate():
+        last = None
+        last_sent = 0.0
+        sent = 0
+        while True:
+            done = job.done  # read before the items and status so the final ones are always sent
+            items = job.get_items(sent)
+            if items:
+                yield f'event: items\ndata: {json.dumps({"offset": sent, "items": items})}\n\n'
+                sent += len(items)
+                last_sent = time.time()
+            status = job.get_status()
+            status.pop('elapsed_time', None)  # changes every poll; progress carries elapsed_seconds
+            payload = json.dumps({'success': True, **status})
+            if payload != last:
+                last = payload
+                last_sent = time.time()
+                yield f'event: status\ndata: {payload}\n\n'
+            elif time.time() - last_sent >= 15:
+                last_sent = time.time()
+                yield ': keep-alive\n\n'
+            if done:
+                return
+            time.sleep(1)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@bp.route('/deface_suggestions', methods=['GET'])
+def deface_suggestions():
+    """Suggested manual deface areas for a session item, from its cached face detections"""
+    from app.deface_processor import get_detection_suggestions
+    
+    session_id = request.args.get('session_id', '')
+    media_id = request.args.get('media_id', '')
+    time_point = request.args.get('time_point')
+    
+    session = get_session(session_id)
+    if not session:
+        return jsonify({
+            'success': False,
+            'error': 'Session expired or not found'
+        }), 404
+    
+    # Find media item by sequence, then by index (as apply_manual_deface)
+    processed_items = session.get('processed', [])
+    media_item = next((item for item in processed_items
+                       if item.get('sequence') is not None and str(item.get('sequence')) == str(media_id)), None)
+    if not media_item and media_id.isdigit() and int(media_id) < len(processed_items):
+        media_item = processed_items[int(media_id)]
+    if not media_item:
+        return jsonify({
+            'success': False,
+            'error': 'Media item not found'
+        }), 404
+    
+    try:
+        time_point = float(time_point) if media_item.get('type') == 'video' else None
+    except (TypeError, ValueError):
+        time_point = 0.0
+    result = get_detection_suggestions(Path(media_item['original_path']), session.get('settings', {}), time_point)
+    return jsonify(result)
+
+
+@bp.route('/apply_manual_deface', methods=['POST'])
+def apply_manual_deface_route():
+    """Apply manual deface areas to a specific image/frame"""
+    trace = {}  # what the lookups found; one trace event per request, written when it returns
+    try:
+        data = request.json
+        trace['has_request_json'] = bool(data)
+        session_id = data.get('session_id')
+        media_id = data.get('media_id')  # Index or identifier for media item
+        deface_areas = data.get('deface_areas', [])
+        mosaicsize = int(data.get('mosaicsize', 20))
+        time_point = data.get('time_point')  # For videos only
+        trace.update(session_id=session_id, media_id=media_id, media_id_type=type(media_id).__name__,
+                     deface_areas_count=len(deface_areas))
+        
+        if not session_id:
+            return jsonify({
+                'success': False,
+                'error': 'Session ID required'
+            }), 400
+        
+        if not media_id:
+            return jsonify({
+                'success': False,
+                'error': 'Media ID required'
+            }), 400
+        
+        if not deface_areas:
+            return jsonify({
+                'success': False,
+                'error': 'No deface areas provided'
+            }), 400
+        
+        # Get session
+        session = get_session(session_id)
+        trace['session_found'] = session is not None
+        if not session:
+            return jsonify({
+                'success': False,
+                'error': 'Session expired or not found'
+            }), 404
+        
+        # Get processed items
+        processed_items = session.get('processed', [])
+        trace['processed_items_count'] = len(processed_items)
+        
+        # Find media item by sequence first (as frontend sends sequence), then by index
+        media_item = None
+        
+        # Try sequence lookup first (frontend sends sequence || index, but prioritizes sequence)
+        for item in processed_items:
+            item_seq = item.get('sequence')
+            if item_seq is not None and str(item_seq) == str(media_id):
+                media_item = item
+                trace['matched_by'] = 'sequence'
+                break
+        
+        # If sequence lookup failed, try index lookup as fallback
+        if not media_item:
+            try:
+                media_idx = int(media_id)
+                if 0 <= media_idx < len(processed_items):
+                    media_item = processed_items[media_idx]
+                    trace.update(matched_by='index', found_sequence=media_item.get('sequence'))
+            except (ValueError, TypeError):
+                # media_id is not a valid integer, ignore
+                pass
+        
+        if not media_item:
+            trace['sequences'] = [item.get('sequence') for item in processed_items]
+            return jsonify({
+                'success': False,
+                'error': f'Media item not found: {media_id}'
+            }), 404
+        
+        # Get defaced path (for images and videos, use defaced_path)
+        temp_dir = get_session_temp_dir(session_id)
+        if not temp_dir:
+            return jsonify({
+                'success': False,
+                'error': 'Session temp directory not found'
+            }), 404
+        
+        # Video areas with start/end/keyframes go into the video itself, not a single frame
+        video_range = media_item.get('type') != 'image' and has_time_ranges(deface_areas)
+        trace.update(media_type=media_item.get('type'), video_range=video_range)
+        
+        if media_item.get('type') == 'image':
+            # For images: apply manual deface directly
+            defaced_path = Path(media_item.get('defaced_path', ''))
+            
+            if not defaced_path.exists():
+                return jsonify({
+                    'success': False,
+                    'error': f'Defaced file not found: {defaced_path}'
+                }), 404
+            
+            # Create output path with _manual suffix
+            output_path = defaced_path.parent / f"{defaced_path.stem}_manual{defaced_path.suffix}"
+            
+            # Apply manual deface
+            logger.info(f"Applying manual deface with {len(deface_areas)} areas to {defaced_path}")
+            logger.debug(f"Deface areas: {deface_areas}")
+            
+            result = apply_manual_deface(
+                defaced_path,
+                output_path,
+                deface_areas,
+                mosaicsize=mosaicsize
+            )
+            
+            if not result.get('success'):
+                return jsonify({
+                    'success': False,
+                    'error': result.get('error', 'Failed to apply manual deface')
+                }), 500
+            
+            # Update media item defaced_path to point to manual defaced version
+            media_item['defaced_path'] = str(output_path)
+            rel_path = output_path.relative_to(temp_dir)
+            media_item['defaced_url'] = f'/v2p-formatter/deface_temp/{session_id}/{rel_path}'
+        
+        elif video_range:
+            # For videos with time-ranged areas: render them into the whole defaced video
+            defaced_video_path = Path(media_item.get('defaced_path', ''))
+            if not defaced_video_path.exists():
+                defaced_video_path = temp_dir / media_item.get('defaced_path', '')
+            
+            if not defaced_video_path.exists():
+                return jsonify({
+                    'success': False,
+                    'error': f'Defaced video not found: {defaced_video_path}'
+                }), 404
+            
+            # Create output path with _manual suffix (re-applying overwrites it)
+            output_stem = defaced_video_path.stem
+            if not output_stem.endswith('_manual'):
+                output_stem = f"{output_stem}_manual"
+            output_path = defaced_video_path.parent / f"{output_stem}.mp4"
+            
+            logger.info(f"Applying manual deface with {len(deface_areas)} time-ranged areas to {defaced_video_path}")
+            result = apply_manual_deface_to_video_range(
+                defaced_video_path,
+                output_path,
+                deface_areas,
+                mosaicsize=mosaicsize
+            )
+            
+            if not result.get('success'):
+                return jsonify({
+                    'success': False,
+                    'error': result.get('error', 'Failed to apply manual deface to video')
+                }), 500
+            
+            # Update media item defaced_path to point to manual defaced version
+            media_item['defaced_path'] = str(output_path)
+            rel_path = output_path.relative_to(temp_dir)
+            media_item['defaced_url'] = f'/v2p-formatter/deface_temp/{session_id}/{rel_path}'
+        
+        else:
+            # For videos: extract frame at time_point and apply manual deface
+            if not time_point or time_point < 0:
+                return jsonify({
+                    'success': False,
+                    'error': 'Time point is required for video manual deface'
+                }), 400
+            
+            defaced_video_path = Path(media_item.get('defaced_path', ''))
+            if not defaced_video_path.exists():
+                # Try to construct full path from temp_dir
+                defaced_video_path = temp_dir / media_item.get('defaced_path', '')
+            
+            if not defaced_video_path.exists():
+                return jsonify({
+                    'success': False,
+                    'error': f'Defaced video not found: {defaced_video_path}'
+                }), 404
+            
+            # Create directory for manual defaced frames
+            manual_frames_dir = temp_dir / f"manual_frames_{media_id}"
+            manual_frames_dir.mkdir(parents=True, exist_ok=True)
+            
+            # Apply manual deface to video frame
+            result = apply_manual_deface_to_video(
+                defaced_video_path,
+                float(time_point),
+                manual_frames_dir,
+                deface_areas,
+                mosaicsize=mosaicsize
+            )
+            
+            if not result.get('success'):
+                return jsonify({
+                    'success': False,
+                    'error': result.get('error', 'Failed to apply manual deface to video frame')
+                }), 500
+            
+            # Store manually defaced frame information
+            output_path = Path(result['output_path'])
+            rel_path = output_path.relative_to(temp_dir)
+            
+            # Initialize manual_frames list if not exists
+            if 'manual_frames' not in media_item:
+                media_item['manual_frames'] = []
+            
+            # Add or update manual frame entry for this time point
+            frame_entry = {
+                'time_point': result['time_point'],
+                'frame_path': str(output_path),
+                'frame_url': f'/v2p-formatter/deface_temp/{session_id}/{rel_path}'
+            }
+            
+            # Check if frame for this time point already exists and replace it
+            existing_frame = None
+            for idx, frame in enumerate(media_item['manual_frames']):
+                if abs(frame.get('time_point', -1) - float(time_point)) < 0.01:
+                    existing_frame = idx
+                    break
+            
+            if existing_frame is not None:
+                media_item['manual_frames'][existing_frame] = frame_entry
+            else:
+                media_item['manual_frames'].append(frame_entry)
+            
+            # Store the output path for response
+            output_path = Path(result['output_path'])
+            rel_path = output_path.relative_to(temp_dir)
+            frame_url = f'/v2p-formatter/deface_temp/{session_id}/{rel_path}'
+        
+        # Store manual defaces in session
+        add_manual_defaces(session_id, str(media_id), deface_areas)
+        update_session_processed(session_id, processed_items)
+        
+        # Return updated defaced URL
+        if media_item.get('type') == 'image' or video_range:
+            defaced_url = media_item.get('defaced_url')
+            return_time_point = None
+        else:
+            # For videos, return the manually defaced frame URL
+            defaced_url = frame_entry.get('frame_url') if 'frame_entry' in locals() else frame_url
+            return_time_point = float(time_point) if time_point else None
+        
+        return jsonify({
+            'success': True,
+            'defaced_path': str(output_path),
+            'defaced_url': defaced_url,
+            'deface_areas_applied': len(deface_areas),
+            'time_point': return_time_point,
+            'video_range': video_range
+        })
+    
+    except Exception as e:
+        logger.error(f"Error in apply_manual_deface: {e}", exc_info=True)
+        trace['error'] = str(e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    finally:
+        trace_event('apply_manual_deface', **trace)
+
+
+@bp.route('/deface_existing')
+@cached_listing(learner_folder('OUTPUT_FOLDER', 'deface'))
+def deface_existing():
+    """List existing defaced files in OUTPUT_FOLDER/<qualification>/<learner>/deface/ for ongoing edit."""
+    from pathlib import Path
+    qualification = request.args.get('qualification', '').strip()
+    learner = request.args.get('learner', '').strip()
+    if not qualification or not learner:
+        return jsonify({'items': [], 'error': 'qualification and learner required'})
+    try:
+        deface_dir = OUTPUT_FOLDER / qualification / learner / 'deface'
+        if not deface_dir.exists() or not deface_dir.is_dir():
+            return jsonify({'items': []})
+        items = []
+        sequence = 0
+        for path in sorted(deface_dir.iterdir()):
+            if not path.is_file():
+                continue
+            suf = path.suffix.lower()
+            if suf in ('.mp4', '.webm', '.mov'):
+                ftype = 'video'
+            elif suf in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
+                ftype = 'image'
+            else:
+                continue
+            sequence += 1
+            name = path.name
+            original_name = name[7:] if name.startswith('deface_') else name
+            url = f'/v2p-formatter/deface_output/{qualification}/{learner}/{name}'
+            items.append({
+                'original_name': original_name,
+                'defaced_url': url,
+                'type': ftype,
+                'sequence': sequence,
+                'manual_defaces': [],
+                'from_existing': True,
+            })
+        return jsonify({'items': items})
+    except Exception as e:
+        logger.error(f"deface_existing: {e}", exc_info=True)
+        return jsonify({'items': [], 'error': str(e)})
+
+
+@bp.route('/deface_output/<qualification>/<learner>/<path:filename>')
+def serve_deface_output(qualification: str, learner: str, filename: str):
+    """Serve existing defaced files from OUTPUT_FOLDER/<qualification>/<learner>/deface/ (for ongoing edit)."""
+    try:
+        base = (OUTPUT_FOLDER / qualification / learner / 'deface').resolve()
+        file_path = (base / filename).resolve()
+        if not file_path.exists():
+            return jsonify({'error': 'Not found'}), 404
+        try:
+            file_path.resolve().relative_to(base)
+        except ValueError:
+            return jsonify({'error': 'Invalid path'}), 403
+        suf = file_path.suffix.lower()
+        if suf in ('.mp4', '.webm', '.mov'):
+            mimetype = 'video/mp4' if suf == '.mp4' else ('video/webm' if suf == '.webm' else 'video/quicktime')
+            return _serve_file_with_range(file_path, mimetype)
+        if suf in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
+            from app.range_response import x_accel_response
+            mimetype = 'image/jpeg' if suf in ('.jpg', '.jpeg') else f'image/{suf[1:]}'
+            return x_accel_response(file_path, mimetype) or send_file(str(file_path), mimetype=mimetype)
+        return jsonify({'error': 'Unsupported type'}), 404
+    except Exception as e:
+        logger.error(f"serve_deface_output: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/deface_temp/<session_id>/<path:filename>')
+def serve_deface_temp(session_id: str, filename: str):
+    """Serve temporary defaced images from session"""
+    try:
+        temp_dir = get_session_temp_dir(session_id)
+        if not temp_dir:
+            return jsonify({'error': 'Session not found or expired'}), 404
+        
+        file_path = temp_dir / filename
+        
+        # Security check: ensure file is within temp_dir
+        try:
+            file_path.resolve().relative_to(temp_dir.resolve())
+        except ValueError:
+            return jsonify({'error': 'Invalid file path'}), 403
+        
+        if not file_path.exists():
+            return jsonify({'error': 'File not found'}), 404
+        
+        suf = file_path.suffix.lower()
+        if suf in ('.mp4', '.webm', '.mov'):
+            mimetype = 'video/mp4' if suf == '.mp4' else ('video/webm' if suf == '.webm' else 'video/quicktime')
+            return _serve_file_with_range(file_path, mimetype)
+        from app.range_response import x_accel_response
+        return x_accel_response(file_path) or send_from_directory(str(temp_dir), filename, conditional=True)
+    
+    except Exception as e:
+        logger.error(f"Error serving deface temp file: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/generate_deface_documents', methods=['POST'])
+def generate_deface_documents():
+    """Generate PDF and/or DOCX documents from accepted defaced files in session"""
+    from app.image_docx_generator import create_image_docx
+    from app.image_pdf_generator import create_image_pdf
+    from app.video_processor import get_video_info
+    from config import OUTPUT_FOLDER, RESOLUTION_PRESETS
+    from pathlib import Path
+    import shutil
+    
+    def _log_generate(status_code, response_summary, error=None):
+        req = {'session_id': (data or {}).get('session_id'), 'output_format': (data or {}).get('output_format')}
+        _deface_debug_append('generate_deface_documents', req, status_code, response_summary, error=error)
+    
+    try:
+        data = request.json
+        session_id = data.get('session_id')
+        image_order = data.get('image_order', [])  # Use custom order if provided
+        output_format = data.get('output_format', 'pdf')  # 'pdf', 'docx', 'both', 'media', 'mp4', 'mp4+pdf'
+        layout = data.get('layout', 'grid')
+        images_per_page = int(data.get('images_per_page', 2))
+        quality = int(data.get('quality', 95))
+        max_size = data.get('max_size', '640x480')
+        # Determine if MP4 export is requested from output_format
+        export_mp4_videos = output_format in ('mp4', 'mp4+pdf')
+        logger.info(f"🔍 DEBUG: Output format: {output_format}, Export MP4 videos: {export_mp4_videos}")
+        logger.info(f"🔍 DEBUG: Session ID: {session_id}")
+        qualification = data.get('qualification', '').strip()
+        learner = data.get('learner', '').strip()
+
+        from_existing_folder = False
+        if not session_id:
+            # Generate from existing deface folder (user returned to page; no session)
+            if not qualification or not learner:
+                out = {'success': False, 'error': 'When no session ID, qualification and learner are required to use existing deface output'}
+                _log_generate(400, out, error=out['error'])
+                return jsonify(out), 400
+            deface_dir_existing = OUTPUT_FOLDER / qualification / learner / 'deface'
+            if not deface_dir_existing.exists() or not deface_dir_existing.is_dir():
+                out = {'success': False, 'error': 'No existing deface output found for this qualification and learner'}
+                _log_generate(404, out, error=out['error'])
+                return jsonify(out), 404
+            processed_items = []
+            for path in sorted(deface_dir_existing.iterdir()):
+                if not path.is_file():
+                    continue
+                suf = path.suffix.lower()
+                if suf in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
+                    ftype = 'image'
+                elif suf in ('.mp4', '.webm', '.mov'):
+                    ftype = 'video'
+                else:
+                    continue
+                sequence = len(processed_items) + 1
+                name = path.name
+                original_name = name[7:] if name.startswith('deface_') else name
+                processed_items.append({
+                    'defaced_path': str(path),
+                    'original_name': original_name,
+                    'type': ftype,
+                    'sequence': sequence,
+                    'manual_defaces': [],
+                    'manual_frames': [],
+                })
+            if not processed_items:
+                out = {'success': False, 'error': 'No defaced image or video files found in existing deface folder'}
+                _log_generate(400, out, error=out['error'])
+                return jsonify(out), 400
+            temp_dir = None
+            from_existing_folder = True
+            logger.info(f"🔍 DEBUG: Using existing deface folder: {deface_dir_existing}, items: {len(processed_items)}")
+        else:
+            from_existing_folder = False
+            # Get session
+            session = get_session(session_id)
+            if not session:
+                out = {'success': False, 'error': 'Session expired or not found'}
+                _log_generate(404, out, error=out['error'])
+                return jsonify(out), 404
+
+            # Get processed items from session
+            processed_items = session.get('processed', [])
+            logger.info(f"🔍 DEBUG: Processed items count: {len(processed_items)}")
+            if not processed_items:
+                out = {'success': False, 'error': 'No processed files found in session'}
+                _log_generate(400, out, error=out['error'])
+                return jsonify(out), 400
+
+            # Get session settings for quality/max_size if not provided
+            session_settings = session.get('settings', {})
+            if not quality:
+                quality = session_settings.get('quality', 95)
+            if not max_size:
+                max_size = session_settings.get('max_size', '640x480')
+
+            # Get temp directory for session
+            temp_dir = get_session_temp_dir(session_id)
+            if not temp_dir:
+                out = {'success': False, 'error': 'Session temp directory not found'}
+                _log_generate(404, out, error=out['error'])
+                return jsonify(out), 404
+        
+        # Build list of defaced images from session processed items (skip only for mp4-only format)
+        defaced_images = []
+        image_names = []
+        
+        # Skip image/frame extraction for MP4-only format
+        if output_format != 'mp4':
+            processed_items_map = {item.get('sequence', idx): item for idx, item in enumerate(processed_items)}
+            
+            # Apply custom order if provided, otherwise use sequence order
+            if image_order:
+                # image_order contains sequence numbers or indices
+                ordered_items = []
+                for order_key in image_order:
+                    # Try to find by sequence number
+                    item = None
+                    for seq, proc_item in processed_items_map.items():
+                        if str(seq) == str(order_key) or str(proc_item.get('sequence')) == str(order_key):
+                            item = proc_item
+                            break
+                    if item:
+                        ordered_items.append(item)
+            else:
+                # Use sequence order (1, 2, 3...)
+                ordered_items = sorted(processed_items, key=lambda x: x.get('sequence', 0))
+            
+            # Build defaced_images list and image_names from ordered items
+            for item in ordered_items:
+                if item.get('type') == 'image':
+                    defaced_path = Path(item.get('defaced_path', ''))
+                    if defaced_path.exists():
+                        defaced_images.append(defaced_path)
+                        # Extract filename without 'deface_' prefix
+                        filename = defaced_path.stem
+                        if filename.startswith('deface_'):
+                            filename = filename[7:]
+                        image_names.append(filename)
+                elif item.get('type') == 'video':
+                    # For videos, use manually defaced frames if available, otherwise extract frames
+                    defaced_video_path = Path(item.get('defaced_path', ''))
+                    if not defaced_video_path.exists():
+                        defaced_video_path = temp_dir / item.get('defaced_path', '')
+                    
+                    if defaced_video_path.exists() and defaced_video_path.suffix.lower() == '.mp4':
+                        # Check for manually defaced frames
+                        manual_frames = item.get('manual_frames', [])
+                        manual_frame_map = {frame.get('time_point'): frame for frame in manual_frames}
+                        
+                        # Extract frames from defaced MP4 video
+                        from app.video_processor import get_video_info, extract_frames_at_times
+                        import tempfile as tf
+                        
+                        video_info = get_video_info(defaced_video_path)
+                        if video_info:
+                            duration = video_info['duration']
+                            # Extract frames every 1 second
+                            time_points = [float(i) for i in range(0, int(duration) + 1)]
+                            
+                            # Create temporary directory for extracted frames (only for non-manual frames)
+                            temp_frames_dir = Path(tf.mkdtemp(prefix='deface_frames_'))
+                            try:
+                                # For each time point, use manual frame if available, otherwise extract
+                                video_stem = defaced_video_path.stem
+                                if video_stem.startswith('deface_'):
+                                    video_stem = video_stem[7:]
+                                
+                                for idx, time_point in enumerate(time_points, start=1):
+                                    # Check if manual frame exists for this time point
+                                    manual_frame = None
+                                    for manual_time, manual_frame_data in manual_frame_map.items():
+                                        if abs(manual_time - time_point) < 0.5:  # Within 0.5 seconds
+                                            manual_frame = manual_frame_data
+                                            break
+                                    
+                                    if manual_frame and manual_frame.get('frame_path'):
+                                        # Use manually defaced frame
+                                        manual_frame_path = Path(manual_frame['frame_path'])
+                                        if not manual_frame_path.exists():
+                                            manual_frame_path = temp_dir / manual_frame['frame_path']
+                                        
+                                        if manual_frame_path.exists():
+                                            defaced_images.append(manual_frame_path)
+                                            time_str = f"{int(time_point)}_{int((time_point % 1) * 100):02d}"
+                                            filename = f"{video_stem}_frame_{time_str}_manual"
+                                            image_names.append(filename)
+                                            continue
+                                    
+                                    # Extract regular frame for this time point
+                                    frame_output_path = temp_frames_dir / f"{idx}.jpg"
+                                    from app.video_processor import extract_frame
+                                    if extract_frame(defaced_video_path, time_point, frame_output_path, quality=95, resolution=None):
+                                        if frame_output_path.exists():
+                                            defaced_images.append(frame_output_path)
+                                            time_str = f"{int(time_point)}_{int((time_point % 1) * 100):02d}"
+                                            filename = f"{video_stem}_frame_{time_str}"
+                                            image_names.append(filename)
+                            except Exception as e:
+                                logger.error(f"Error processing frames from video {defaced_video_path}: {e}", exc_info=True)
+                            finally:
+                                # Note: temp_frames_dir cleanup happens after document generation
+                                pass
+        
+        # Only require defaced_images for PDF/DOCX/media (standalone images); not for MP4-only export
+        if output_format not in ('mp4',) and not defaced_images:
+            out = {'success': False, 'error': 'No defaced files found in session'}
+            _log_generate(400, out, error=out['error'])
+            return jsonify(out), 400
+        
+        # Determine output location (use learner folder if provided, otherwise use first original file's directory)
+        if qualification and learner:
+            # Output to learner folder: OUTPUT_FOLDER/qualification/learner
+            output_dir = OUTPUT_FOLDER / qualification / learner
+            output_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            # Fallback: use first original file's directory from session
+            first_original = processed_items[0].get('original_path', '') if processed_items else ''
+            if first_original:
+                first_file = Path(first_original)
+                if first_file.exists():
+                    output_dir = first_file.parent
+                else:
+                    output_dir = OUTPUT_FOLDER
+            else:
+                output_dir = OUTPUT_FOLDER
+        
+        # All deface output goes into a 'deface' subfolder
+        deface_dir = output_dir / 'deface'
+        deface_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Get resolution settings
+        max_width = None
+        max_height = None
+        if max_size and max_size != 'original' and max_size in RESOLUTION_PRESETS:
+            if RESOLUTION_PRESETS[max_size]:
+                max_width, max_height = RESOLUTION_PRESETS[max_size]
+        elif max_size and max_size != 'original':
+            # Try to parse custom size (e.g., "800x600")
+            try:
+                parts = max_size.split('x')
+                if len(parts) == 2:
+                    max_width = int(parts[0])
+                    max_height = int(parts[1])
+            except:
+                pass
+            
+        # Get filename from request (mandatory)
+        filename = data.get('filename', '').strip()
+        if not filename:
+            out = {'success': False, 'error': 'Filename is required'}
+            _log_generate(400, out, error=out['error'])
+            return jsonify(out), 400
+        
+        # Sanitize filename: remove invalid characters
+        import re
+        filename = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', filename)
+        # Remove leading/trailing dots and spaces
+        filename = re.sub(r'^[.\s]+|[.\s]+$', '', filename)
+        
+        if not filename:
+            out = {'success': False, 'error': 'Filename contains only invalid characters'}
+            _log_generate(400, out, error=out['error'])
+            return jsonify(out), 400
+        
+        # Add 'deface_' prefix to output filename
+        output_base_name = f'deface_{filename}'
+        
+        results = {}
+        exported_standalone_images = []
+        exported_videos = []
+        
+        # Always export standalone defaced images (individual files) in addition to merged PDF/DOCX
+        if defaced_images and image_names:
+            try:
+                used_names = set()
+                for i, (img_path, name) in enumerate(zip(defaced_images, image_names)):
+                    src = Path(img_path)
+                    if not src.exists():
+                        continue
+                    base = f"deface_{name}"
+                    suffix = src.suffix or '.jpg'
+                    out_name = base + suffix
+                    n = 0
+                    while out_name in used_names or (deface_dir / out_name).exists():
+                        n += 1
+                        out_name = f"{base}_{n}{suffix}"
+                    used_names.add(out_name)
+                    dest = deface_dir / out_name
+                    shutil.copy2(src, dest)
+                    exported_standalone_images.append({
+                        'path': str(dest),
+                        'relative_path': str(dest.relative_to(OUTPUT_FOLDER)),
+                        'name': out_name,
+                    })
+                if exported_standalone_images:
+                    results['exported_standalone_images'] = exported_standalone_images
+                    results['exported_standalone_images_count'] = len(exported_standalone_images)
+            except Exception as e:
+                logger.error(f"Error exporting standalone defaced images: {e}", exc_info=True)
+                results['exported_standalone_images_error'] = str(e)
+        
+        # Generate PDF if requested (skip for media-only)
+        if output_format in ('pdf', 'both', 'mp4+pdf'):
+            # Skip PDF generation if no images (e.g., MP4+PDF with only videos)
+            if defaced_images:
+                pdf_path = deface_dir / f'{output_base_name}.pdf'
+                try:
+                    create_image_pdf(
+                        images=[str(p) for p in defaced_images],
+                        image_names=image_names,
+                        output_path=str(pdf_path),
+                        layout=layout,
+                        images_per_page=images_per_page,
+                        quality=quality,
+                        max_width=max_width,
+                        max_height=max_height
+                    )
+                    results['pdf_path'] = str(pdf_path)
+                    results['pdf_url'] = f'/v2p-formatter/download?path={pdf_path.relative_to(OUTPUT_FOLDER)}'
+                except Exception as e:
+                    logger.error(f"Error generating PDF: {e}", exc_info=True)
+                    results['pdf_error'] = str(e)
+            else:
+                logger.warning("Skipping PDF generation: no images available (MP4+PDF with only videos)")
+                results['pdf_error'] = 'No images available for PDF generation'
+        
+        # Generate DOCX if requested (skip for media-only)
+        if output_format in ('docx', 'both'):
+            docx_path = deface_dir / f'{output_base_name}.docx'
+            try:
+                create_image_docx(
+                    images=[str(p) for p in defaced_images],
+                    image_names=image_names,
+                    output_path=str(docx_path),
+                    images_per_page=images_per_page,
+                    quality=quality,
+                    max_width=max_width,
+                    max_height=max_height
+                )
+                results['docx_path'] = str(docx_path)
+                results['docx_relative_path'] = str(docx_path.relative_to(OUTPUT_FOLDER))
+                results['docx_url'] = f'/v2p-formatter/download?path={docx_path.relative_to(OUTPUT_FOLDER)}'
+            except Exception as e:
+                logger.error(f"Error generating DOCX: {e}", exc_info=True)
+                results['docx_error'] = str(e)
+        
+        # Always export standalone defaced videos (individual MP4 files) in addition to merged PDF/DOCX
+        try:
+            video_items = [item for item in processed_items if item.get('type') == 'video']
+            logger.info(f"🔍 DEBUG: Found {len(video_items)} video items to export out of {len(processed_items)} total items")
+            for item in video_items:
+                defaced_video_path_str = item.get('defaced_path', '')
+                defaced_video_path = Path(defaced_video_path_str)
+                
+                logger.info(f"Processing video item: {item.get('original_name')}, defaced_path: {defaced_video_path_str}")
+                
+                if not defaced_video_path.exists():
+                    logger.warning(f"Defaced video file does not exist (absolute path): {defaced_video_path}")
+                    continue
+                
+                if defaced_video_path.suffix.lower() == '.mp4':
+                    original_name = item.get('original_name', defaced_video_path.name)
+                    output_name = original_name if original_name.startswith('deface_') else f'deface_{original_name}'
+                    output_video_path = deface_dir / output_name
+                    shutil.copy2(defaced_video_path, output_video_path)
+                    exported_videos.append({
+                        'path': str(output_video_path),
+                        'relative_path': str(output_video_path.relative_to(OUTPUT_FOLDER)),
+                        'url': f'/v2p-formatter/download?path={output_video_path.relative_to(OUTPUT_FOLDER)}',
+                        'name': output_name
+                    })
+                    logger.info(f"Exported defaced video: {output_video_path}")
+                else:
+                    logger.warning(f"Defaced video file is not MP4: {defaced_video_path}")
+            
+            if exported_videos:
+                results['exported_videos'] = exported_videos
+                results['exported_videos_count'] = len(exported_videos)
+                logger.info(f"Successfully exported {len(exported_videos)} standalone MP4 videos")
+        except Exception as e:
+            logger.error(f"Error exporting standalone defaced videos: {e}", exc_info=True)
+            results['exported_videos_error'] = str(e)
+            
+        # Determine primary file path
+        # If MP4 only, don't require PDF/DOCX
+        logger.info(f"🔍 DEBUG: Checking file path logic - output_format={output_format}, exported_videos count={len(exported_videos)}")
+        logger.info(f"🔍 DEBUG: results keys: {list(results.keys())}")
+        if output_format == 'mp4':
+            # MP4 only - just need exported videos
+            logger.info(f"🔍 DEBUG: MP4-only format detected, checking exported_videos")
+            if not exported_videos:
+                logger.error(f"🔍 DEBUG: MP4 format selected but no videos exported!")
+                out = {'success': False, 'error': 'No videos to export'}
+                _log_generate(400, out, error=out['error'])
+                return jsonify(out), 400
+            logger.info(f"🔍 DEBUG: MP4-only format: Successfully exported {len(exported_videos)} videos")
+        elif output_format == 'media':
+            # Media only - no PDF/DOCX; success if we have any standalone files
+            if not exported_standalone_images and not exported_videos:
+                out = {'success': False, 'error': 'No defaced media files to export'}
+                _log_generate(400, out, error=out['error'])
+                return jsonify(out), 400
+            logger.info(f"🔍 DEBUG: Media-only format: exported {len(exported_standalone_images)} images, {len(exported_videos)} videos")
+        else:
+            # PDF/DOCX formats require at least one document
+            # For mp4+pdf, allow success if MP4 export succeeded even if PDF failed
+            logger.info(f"🔍 DEBUG: Non-MP4 format path - output_format={output_format}")
+            if 'pdf_path' in results:
+                logger.info(f"🔍 DEBUG: Using PDF path: {results['pdf_path']}")
+                results['file_path'] = results['pdf_path']
+            elif 'docx_path' in results:
+                logger.info(f"🔍 DEBUG: Using DOCX path: {results['docx_path']}")
+                results['file_path'] = results['docx_path']
+            elif output_format == 'mp4+pdf' and exported_videos:
+                # MP4+PDF: MP4 export succeeded, PDF failed - still success
+                logger.info(f"🔍 DEBUG: MP4+PDF format with exported videos")
+                if exported_videos:
+                    results['file_path'] = exported_videos[0].get('path', '')
+            elif output_format not in ('mp4', 'mp4+pdf', 'media'):
+                # PDF/DOCX format requested but no documents generated
+                logger.error(f"🔍 DEBUG: ERROR PATH - output_format={output_format}, pdf_path in results={'pdf_path' in results}, docx_path in results={'docx_path' in results}")
+                error_details = []
+                if 'pdf_error' in results:
+                    error_details.append(f"PDF: {results['pdf_error']}")
+                if 'docx_error' in results:
+                    error_details.append(f"DOCX: {results['docx_error']}")
+                error_msg = 'Failed to generate any documents'
+                if error_details:
+                    error_msg += f" ({'; '.join(error_details)})"
+                logger.error(f"🔍 DEBUG: Failed to generate documents for format {output_format}: {error_details}")
+                out = {'success': False, 'error': error_msg}
+                _log_generate(500, out, error=error_msg)
+                return jsonify(out), 500
+            else:
+                logger.warning(f"🔍 DEBUG: Unexpected else branch - output_format={output_format}, exported_videos={len(exported_videos) if exported_videos else 0}")
+        
+        # Cleanup session after successful document generation (skip when using existing deface folder)
+        if not from_existing_folder and session_id:
+            cleanup_session(session_id)
+        
+        # Add output folder path to response (deface subfolder where files were written)
+        results['output_folder_path'] = str(deface_dir)
+        
+        _log_generate(200, {'success': True, 'output_folder_path': str(deface_dir), **{k: v for k, v in results.items() if k in ('pdf_path', 'docx_path', 'exported_videos_count')}})
+        return jsonify({
+            'success': True,
+            **results
+        })
+    
+    except Exception as e:
+        logger.error(f"🔍 DEBUG: Exception in generate_deface_documents: {e}", exc_info=True)
+        logger.error(f"🔍 DEBUG: Exception type: {type(e).__name__}, args: {e.args}")
+        import traceback
+        logger.error(f"🔍 DEBUG: Full traceback:\n{traceback.format_exc()}")
+        out = {'success': False, 'error': f'Error: {str(e)}'}
+        try:
+            _log_generate(500, out, error=str(e))
+        except Exception:
+            pass
+        return jsonify(out), 500
@@ -0,0 +1,838 @@
+"""
+Main page routes: video selection, frame extraction, PDF/DOCX from frames,
+file downloads and video thumbnails
+"""
+from flask import render_template, request, jsonify, send_file, send_from_directory, Response
+import os
+import logging
+from pathlib import Path
+from app.routes import bp, _serve_file_with_range, _serve_thumbnail
+from app.listing_cache import cached_listing, learner_folder
+from app.utils import create_output_folder, get_pdf_output_path, parse_time_points
+from app.file_scanner import scan_mp4_files, organize_files_by_folder
+from app.observation_media_scanner import list_qualifications, list_learners
+from config import DEFAULT_IMAGE_QUALITY, DEFAULT_RESOLUTION, RESOLUTION_PRESETS, INPUT_FOLDER, OUTPUT_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# Static files are now served directly by nginx, not Flask
+# Removed /static/<path:filename> route to prevent MIME type errors
+
+@bp.route('/static/cache/<path:filename>')
+def serve_cache(filename):
+    """Serve cached files (thumbnails)"""
+    from flask import current_app
+    base_dir = Path(current_app.config.get('BASE_DIR', Path(__file__).parent.parent.parent))
+    return send_from_directory(str(base_dir / 'static' / 'cache'), filename)
+
+@bp.route('/')
+def index():
+    """Main page"""
+    from config import OUTPUT_FOLDER
+    
+    # Get qualifications (top-level folders) from OUTPUT_FOLDER
+    qualifications = list_qualifications(OUTPUT_FOLDER)
+    
+    # Get selected qualification and learner from query parameters
+    selected_qualification = request.args.get('qualification', '')
+    selected_learner = request.args.get('learner', '')
+    
+    # Get learners for selected qualification (if any)
+    learners = []
+    if selected_qualification:
+        learners = list_learners(OUTPUT_FOLDER, selected_qualification)
+    
+    return render_template('index.html',
+                         qualifications=qualifications,
+                         learners=learners,
+                         selected_qualification=selected_qualification,
+                         selected_learner=selected_learner)
+
+@bp.route('/qualifications', methods=['GET'])
+def get_qualifications():
+    """List all top-level folders in the output directory (qualifications)"""
+    from config import OUTPUT_FOLDER
+    try:
+        qualifications = list_qualifications(OUTPUT_FOLDER)
+        return jsonify({'success': True, 'qualifications': qualifications})
+    except Exception as e:
+        logger.error(f"Error listing qualifications: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/learners', methods=['GET'])
+def get_input_learners():
+    """List subfolders (learners) within a selected qualification for output folder"""
+    from config import OUTPUT_FOLDER
+    qualification = request.args.get('qualification')
+    if not qualification:
+        return jsonify({'success': False, 'error': 'Qualification not provided'}), 400
+    try:
+        learners = list_learners(OUTPUT_FOLDER, qualification)
+        logger.info(f"[deface] GET /learners qualification={qualification!r} -> {len(learners)} learners: {learners[:20]!r}")
+        return jsonify({'success': True, 'learners': learners})
+    except Exception as e:
+        logger.error(f"Error listing learners for qualification {qualification}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/list_files', methods=['GET'])
+@cached_listing(learner_folder('OUTPUT_FOLDER'))
+def list_files():
+    """List all MP4 files in the output directory, optionally filtered by qualification/learner"""
+    from config import OUTPUT_FOLDER
+    from pathlib import Path
+    
+    # Get filter parameters
+    qualification = request.args.get('qualification', '')
+    learner = request.args.get('learner', '')
+    
+    try:
+        # Only scan when both qualification and learner are selected
+        if qualification and learner:
+            # Scan only within qualification/learner folder and all its subfolders
+            scan_path = OUTPUT_FOLDER / qualification / learner
+            if not scan_path.exists():
+                return jsonify({
+                    'success': True,
+                    'files': [],
+                    'tree': {},
+                    'count': 0,
+                    'input_folder': str(INPUT_FOLDER),
+                    'output_folder': str(OUTPUT_FOLDER)
+                })
+            # Scan files recursively from the specific qualification/learner path
+            # scan_mp4_files uses rglob which recursively scans all subfolders
+            all_files = scan_mp4_files(str(scan_path))
+            
+            # Update relative paths to be relative to OUTPUT_FOLDER (not scan_path)
+            base_path = OUTPUT_FOLDER
+            filtered_files = []
+            for file_info in all_files:
+                file_path = Path(file_info['path'])
+                try:
+                    # Calculate relative path from OUTPUT_FOLDER
+                    relative_to_base = file_path.relative_to(base_path)
+                    rel_str = str(relative_to_base)
+                    file_info['relative_path'] = rel_str
+                    # Update folder to be relative to OUTPUT_FOLDER as well
+                    # The folder should be the path relative to OUTPUT_FOLDER, excluding filename
+                    folder_path = relative_to_base.parent
+                    file_info['folder'] = str(folder_path) if folder_path != Path('.') else 'root'
+                    filtered_files.append(file_info)
+                except ValueError:
+                    # Path not relative to base, skip
+                    continue
+        else:
+            # No learner selected - return empty (only show files when learner is selected)
+            return jsonify({
+                'success': True,
+                'files': [],
+                'tree': {},
+                'count': 0,
+                'input_folder': str(INPUT_FOLDER),
+                'output_folder': str(OUTPUT_FOLDER)
+            })
+        
+        tree = organize_files_by_folder(filtered_files)
+        
+        return jsonify({
+            'success': True,
+            'files': filtered_files,
+            'tree': tree,
+            'count': len(filtered_files),
+            'input_folder': str(INPUT_FOLDER),
+            'output_folder': str(OUTPUT_FOLDER),
+            'qualification': qualification,
+            'learner': learner
+        })
+    except Exception as e:
+        import logging
+        logging.error(f"Error scanning files: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to scan files: {str(e)}'
+        }), 500
+
+@bp.route('/test')
+def test_upload():
+    """Simple test page for upload"""
+    with open('test_upload_simple.html', 'r') as f:
+        return f.read()
+
+@bp.route('/select_file', methods=['POST'])
+def select_file():
+    """Handle file selection (file already exists on server)"""
+    from app.video_processor import get_video_info
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    try:
+        data = request.json
+        file_path = data.get('file_path')
+        
+        if not file_path:
+            return jsonify({'error': 'No file path provided'}), 400
+        
+        logger.info(f"📁 File selected: {file_path}")
+        
+        # Validate file exists and is within output folder
+        file_path = os.path.abspath(file_path)
+        output_path = os.path.abspath(str(OUTPUT_FOLDER))
+        
+        if not file_path.startswith(output_path):
+            logger.error(f"❌ File path outside output folder: {file_path}")
+            return jsonify({'error': 'File path must be within output folder'}), 403
+        
+        if not os.path.exists(file_path):
+            logger.error(f"❌ File not found: {file_path}")
+            return jsonify({'error': 'File not found'}), 404
+        
+        # Validate it's an MP4 file
+        if not file_path.lower().endswith('.mp4'):
+            return jsonify({'error': 'Invalid file type. Only MP4 files are allowed.'}), 400
+        
+        # Get video info
+        logger.info("🎬 Extracting video info...")
+        video_info = get_video_info(file_path)
+        
+        if not video_info:
+            logger.error("❌ Failed to read video file")
+            return jsonify({'error': 'Failed to read video file'}), 400
+        
+        logger.info(f"✅ Video info extracted: {video_info['duration']}s, {video_info['width']}x{video_info['height']}")
+        
+        response_data = {
+            'success': True,
+            'filename': os.path.basename(file_path),
+            'filepath': file_path,
+            'duration': round(video_info['duration'], 2),
+            'width': video_info['width'],
+            'height': video_info['height'],
+            'fps': round(video_info['fps'], 2)
+        }
+        
+        logger.info("✅ File selection successful")
+        return jsonify(response_data)
+        
+    except Exception as e:
+        logger.error(f"❌ File selection error: {str(e)}", exc_info=True)
+        return jsonify({'error': f'File selection failed: {str(e)}'}), 500
+
+@bp.route('/preview_frame', methods=['POST'])
+def preview_frame():
+    """Preview frame at specific time point"""
+    data = request.json
+    video_path = data.get('video_path')
+    time_point = float(data.get('time_point', 0))
+    
+    if not video_path or not os.path.exists(video_path):
+        return jsonify({'error': 'Video file not found'}), 400
+    
+    # Extract frame to temporary location
+    from app.video_processor import extract_frame
+    import tempfile
+    
+    temp_dir = Path(tempfile.gettempdir())
+    temp_frame = temp_dir / f"preview_{int(time_point)}.jpg"
+    
+    if extract_frame(video_path, time_point, temp_frame, quality=85):
+        return send_file(str(temp_frame), mimetype='image/jpeg')
+    else:
+        return jsonify({'error': 'Failed to extract frame'}), 400
+
+@bp.route('/extract_frames', methods=['POST'])
+def extract_frames():
+    """Extract frames at specified time points"""
+    from app.video_processor import extract_frames_at_times, get_video_info
+    data = request.json
+    video_path = data.get('video_path')
+    time_input = data.get('time_points', '')
+    quality = int(data.get('quality', DEFAULT_IMAGE_QUALITY))
+    resolution = data.get('resolution', DEFAULT_RESOLUTION)
+    
+    if not video_path or not os.path.exists(video_path):
+        return jsonify({'error': 'Video file not found'}), 400
+    
+    # Handle both array and string formats
+    if isinstance(time_input, list):
+        # Direct array of numbers
+        time_points = [float(t) for t in time_input]
+    elif isinstance(time_input, (int, float)):
+        # Single number
+        time_points = [float(time_input)]
+    else:
+        # String format - parse it
+        time_points = parse_time_points(str(time_input))
+        if not time_points:
+            return jsonify({'error': 'Invalid time points format. Expected array of numbers or comma-separated string.'}), 400
+    
+    # Get video info to validate time points
+    video_info = get_video_info(video_path)
+    if not video_info:
+        return jsonify({'error': 'Failed to read video file'}), 400
+    
+    # Validate time points are within duration (allow small floating point tolerance)
+    max_time = video_info['duration']
+    tolerance = 0.1  # Allow 0.1 second tolerance for floating point precision
+    invalid_times = [t for t in time_points if t < -tolerance or t > (max_time + tolerance)]
+    if invalid_times:
+        # Clamp invalid times to valid range instead of erroring
+        import logging
+        logging.warning(f"Time points outside video duration, clamping: {invalid_times}")
+        time_points = [max(0, min(t, max_time - 0.01)) for t in time_points]
+        # Remove duplicates and sort
+        time_points = sorted(list(set(time_points)))
+    
+    # Get resolution
+    resolution_tuple = RESOLUTION_PRESETS.get(resolution)
+    
+    # Create output folder in output directory
+    output_dir = create_output_folder(video_path)
+    
+    # Extract frames
+    try:
+        extracted_images = extract_frames_at_times(
+            video_path, time_points, output_dir, quality, resolution_tuple
+        )
+        
+        return jsonify({
+            'success': True,
+            'images': extracted_images,
+            'count': len(extracted_images),
+            'output_dir': str(output_dir)
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to extract frames: {str(e)}'}), 500
+
+@bp.route('/generate_pdf', methods=['POST'])
+def generate_pdf():
+    """Generate PDF from extracted images"""
+    from app.pdf_generator import create_pdf
+    data = request.json
+    video_path = data.get('video_path')
+    image_paths = data.get('image_paths', [])
+    layout = data.get('layout', 'grid')
+    images_per_page = int(data.get('images_per_page', 4))
+    
+    if not video_path:
+        return jsonify({'error': 'Video path not provided'}), 400
+    
+    if not image_paths:
+        return jsonify({'error': 'No images provided'}), 400
+    
+    # Validate image paths exist
+    missing_images = [img for img in image_paths if not os.path.exists(img)]
+    if missing_images:
+        return jsonify({'error': f'Images not found: {missing_images}'}), 400
+    
+    # Get PDF output path in output directory
+    pdf_path = get_pdf_output_path(video_path)
+    
+    try:
+        create_pdf(image_paths, pdf_path, layout, images_per_page)
+        
+        # Calculate relative path for download/Preview links
+        pdf_relative_path = pdf_path.relative_to(OUTPUT_FOLDER)
+        
+        return jsonify({
+            'success': True,
+            'file_path': str(pdf_path),
+            'pdf_path': str(pdf_path),  # Keep for backward compatibility
+            'pdf_relative_path': str(pdf_relative_path),  # For Preview link
+            'filename': pdf_path.name,
+            'output_folder_path': str(pdf_path.parent)  # Output folder path
+        })
+    except Exception as e:
+        return jsonify({'error': f'Failed to generate PDF: {str(e)}'}), 500
+
+@bp.route('/generate_docx', methods=['POST'])
+def generate_docx():
+    """Generate DOCX from extracted images"""
+    data = request.json
+    video_path = data.get('video_path')
+    image_paths = data.get('image_paths', [])
+    images_per_page = int(data.get('images_per_page', 1))
+    
+    if not video_path:
+        return jsonify({'error': 'Video path not provided'}), 400
+    
+    if not image_paths:
+        return jsonify({'error': 'No images provided'}), 400
+    
+    # Validate image paths exist
+    missing_images = [img for img in image_paths if not os.path.exists(img)]
+    if missing_images:
+        return jsonify({'error': f'Images not found: {missing_images}'}), 400
+    
+    # Get DOCX output path in output directory
+    from app.utils import get_docx_output_path
+    docx_path = get_docx_output_path(video_path)
+    
+    try:
+        from app.docx_generator import create_docx
+        create_docx(image_paths, docx_path, images_per_page)
+        
+        return jsonify({
+            'success': True,
+            'file_path': str(docx_path),
+            'filename': docx_path.name
+        })
+    except Exception as e:
+        import logging
+        logging.error(f"Error generating DOCX: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Failed to generate DOCX: {str(e)}'}), 500
+
+@bp.route('/batch_video_info', methods=['POST'])
+def batch_video_info():
+    """Get video information for multiple videos at once"""
+    from app.video_processor import get_video_info
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    try:
+        data = request.json
+        video_paths = data.get('video_paths', [])
+        
+        if not video_paths:
+            return jsonify({'error': 'No video paths provided'}), 400
+        
+        if not isinstance(video_paths, list):
+            return jsonify({'error': 'video_paths must be an array'}), 400
+        
+        # Limit batch size to prevent abuse
+        if len(video_paths) > 20:
+            return jsonify({'error': 'Maximum 20 videos allowed per batch'}), 400
+        
+        results = []
+        errors = []
+        
+        for idx, video_path in enumerate(video_paths):
+            try:
+                # Validate file path
+                video_path = os.path.abspath(str(video_path))
+                output_path = os.path.abspath(str(OUTPUT_FOLDER))
+                
+                if not video_path.startswith(output_path):
+                    errors.append({
+                        'index': idx,
+                        'video_path': video_path,
+                        'error': 'File path must be within output folder'
+                    })
+                    continue
+                
+                if not os.path.exists(video_path):
+                    errors.append({
+                        'index': idx,
+                        'video_path': video_path,
+                        'error': 'File not found'
+                    })
+                    continue
+                
+                if not video_path.lower().endswith('.mp4'):
+                    errors.append({
+                        'index': idx,
+                        'video_path': video_path,
+                        'error': 'Invalid file type. Only MP4 files are allowed.'
+                    })
+                    continue
+                
+                # Get video info
+                video_info = get_video_info(video_path)
+                
+                if not video_info:
+                    errors.append({
+                        'index': idx,
+                        'video_path': video_path,
+                        'error': 'Failed to read video file'
+                    })
+                    continue
+                
+                results.append({
+                    'video_path': video_path,
+                    'filename': os.path.basename(video_path),
+                    'duration': round(video_info['duration'], 2),
+                    'width': video_info['width'],
+                    'height': video_info['height'],
+                    'fps': round(video_info['fps'], 2),
+                    'frame_count': video_info.get('frame_count', 0)
+                })
+                
+            except Exception as e:
+                logger.error(f"Error processing video {idx}: {str(e)}", exc_info=True)
+                errors.append({
+                    'index': idx,
+                    'video_path': str(video_path) if video_path else 'unknown',
+                    'error': f'Error processing video: {str(e)}'
+                })
+        
+        return jsonify({
+            'success': True,
+            'videos': results,
+            'errors': errors,
+            'total_requested': len(video_paths),
+            'successful': len(results),
+            'failed': len(errors)
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch video info error: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Failed to get video info: {str(e)}'}), 500
+
+@bp.route('/validate_batch_time_points', methods=['POST'])
+def validate_batch_time_points():
+    """Validate time points against multiple videos' durations"""
+    from app.video_processor import get_video_info
+    import logging
+    logger = logging.getLogger(__name__)
+    
+    try:
+        data = request.json
+        video_paths = data.get('video_paths', [])
+        time_points = data.get('time_points', [])
+        
+        if not video_paths:
+            return jsonify({'error': 'No video paths provided'}), 400
+        
+        if not isinstance(video_paths, list):
+            return jsonify({'error': 'video_paths must be an array'}), 400
+        
+        if not time_points:
+            return jsonify({'error': 'No time points provided'}), 400
+        
+        if not isinstance(time_points, list):
+            return jsonify({'error': 'time_points must be an array'}), 400
+        
+        # Limit batch size
+        if len(video_paths) > 20:
+            return jsonify({'error': 'Maximum 20 videos allowed per batch'}), 400
+        
+        # Validate time_points are numbers
+        try:
+            time_points = [float(t) for t in time_points]
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid time_points format. Must be array of numbers.'}), 400
+        
+        validation_results = []
+        overall_valid = True
+        tolerance = 0.1  # Allow small tolerance for floating point precision
+        
+        for idx, video_path in enumerate(video_paths):
+            try:
+                # Validate file path
+                video_path = os.path.abspath(str(video_path))
+                output_path = os.path.abspath(str(OUTPUT_FOLDER))
+                
+                if not video_path.startswith(output_path):
+                    validation_results.append({
+                        'video_path': video_path,
+                        'valid': False,
+                        'error': 'File path must be within output folder',
+                        'warnings': []
+                    })
+                    overall_valid = False
+                    continue
+                
+                if not os.path.exists(video_path):
+                    validation_results.append({
+                        'video_path': video_path,
+                        'valid': False,
+                        'error': 'File not found',
+                        'warnings': []
+                    })
+                    overall_valid = False
+                    continue
+                
+                # Get video info
+                video_info = get_video_info(video_path)
+                
+                if not video_info:
+                    validation_results.append({
+                        'video_path': video_path,
+                        'valid': False,
+                        'error': 'Failed to read video file',
+                        'warnings': []
+                    })
+                    overall_valid = False
+                    continue
+                
+                duration = video_info['duration']
+                max_time = duration
+                
+                # Check each time point
+                invalid_times = []
+                warnings = []
+                
+                for time_point in time_points:
+                    if time_point < -tolerance or time_point > (max_time + tolerance):
+                        invalid_times.append(time_point)
+                
+                if invalid_times:
+                    warnings.append({
+                        'type': 'time_points_exceed_duration',
+                        'message': f'Time points exceed video duration ({duration:.2f}s)',
+                        'invalid_times': invalid_times,
+                        'video_duration': duration
+                    })
+                    # Still valid, but with warnings (will be clamped during extraction)
+                    validation_results.append({
+                        'video_path': video_path,
+                        'filename': os.path.basename(video_path),
+                        'valid': True,
+                        'duration': duration,
+                        'warnings': warnings,
+                        'invalid_time_points': invalid_times
+                    })
+                else:
+                    validation_results.append({
+                        'video_path': video_path,
+                        'filename': os.path.basename(video_path),
+                        'valid': True,
+                        'duration': duration,
+                        'warnings': []
+                    })
+                
+            except Exception as e:
+                logger.error(f"Error validating video {idx}: {str(e)}", exc_info=True)
+                validation_results.append({
+                    'video_path': str(video_path) if video_path else 'unknown',
+                    'valid': False,
+                    'error': f'Error validating video: {str(e)}',
+                    'warnings': []
+                })
+                overall_valid = False
+        
+        return jsonify({
+            'success': True,
+            'valid': overall_valid,
+            'results': validation_results,
+            'total_videos': len(video_paths),
+            'has_warnings': any(r.get('warnings') for r in validation_results)
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch time points validation error: {str(e)}", exc_info=True)
+        return jsonify({'error': f'Failed to validate time points: {str(e)}'}), 500
+
+@bp.route('/open_folder', methods=['POST'])
+def open_folder():
+    """Open folder in macOS Finder"""
+    import subprocess
+    import platform
+    
+    try:
+        data = request.json
+        folder_path = data.get('path')
+        
+        if not folder_path:
+            return jsonify({
+                'success': False,
+                'error': 'No folder path provided'
+            }), 400
+        
+        folder_path_obj = Path(folder_path)
+        
+        # Validate path exists
+        if not folder_path_obj.exists() or not folder_path_obj.is_dir():
+            return jsonify({
+                'success': False,
+                'error': 'Folder does not exist'
+            }), 400
+        
+        # On macOS, use 'open' command to open Finder
+        if platform.system() == 'Darwin':
+            try:
+                subprocess.Popen(['open', str(folder_path_obj)])
+                return jsonify({
+                    'success': True,
+                    'message': 'Folder opened in Finder'
+                })
+            except Exception as e:
+                logger.error(f"Error opening folder in Finder: {e}", exc_info=True)
+                return jsonify({
+                    'success': False,
+                    'error': f'Failed to open folder: {str(e)}'
+                }), 500
+        else:
+            # For other platforms, return success but don't open (could implement Windows/Linux later)
+            return jsonify({
+                'success': True,
+                'message': 'Folder path returned (open not supported on this platform)'
+            })
+            
+    except Exception as e:
+        logger.error(f"Error in open_folder: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to open folder: {str(e)}'
+        }), 500
+
+@bp.route('/open_file', methods=['POST'])
+def open_file():
+    """Open file in macOS Preview (PDF) or default app"""
+    import subprocess
+    import platform
+    
+    try:
+        data = request.json
+        file_path = data.get('path')
+        
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': 'No file path provided'
+            }), 400
+        
+        # Handle both relative and absolute paths
+        if os.path.isabs(file_path):
+            file_path_abs = Path(file_path)
+        else:
+            # Relative path - join with OUTPUT_FOLDER
+            file_path_abs = OUTPUT_FOLDER / file_path
+        
+        file_path_abs = file_path_abs.resolve()
+        
+        # Validate path exists
+        if not file_path_abs.exists() or not file_path_abs.is_file():
+            return jsonify({
+                'success': False,
+                'error': 'File does not exist'
+            }), 400
+        
+        # Security: validate path is within OUTPUT_FOLDER
+        try:
+            file_path_abs.relative_to(OUTPUT_FOLDER.resolve())
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid file path - must be in output folder'
+            }), 403
+        
+        # On macOS, use 'open -a Preview' for PDFs, 'open' for others
+        if platform.system() == 'Darwin':
+            try:
+                if file_path_abs.suffix.lower() == '.pdf':
+                    # Open PDF in Preview
+                    subprocess.Popen(['open', '-a', 'Preview', str(file_path_abs)])
+                else:
+                    # Open other files with default app
+                    subprocess.Popen(['open', str(file_path_abs)])
+                return jsonify({
+                    'success': True,
+                    'message': 'File opened in Preview' if file_path_abs.suffix.lower() == '.pdf' else 'File opened'
+                })
+            except Exception as e:
+                logger.error(f"Error opening file: {e}", exc_info=True)
+                return jsonify({
+                    'success': False,
+                    'error': f'Failed to open file: {str(e)}'
+                }), 500
+        else:
+            # For other platforms, return success but don't open (could implement Windows/Linux later)
+            return jsonify({
+                'success': True,
+                'message': 'File path returned (open not supported on this platform)'
+            })
+            
+    except Exception as e:
+        logger.error(f"Error in open_file: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to open file: {str(e)}'
+        }), 500
+
+@bp.route('/download')
+def download_file():
+    """Download generated file from output folder"""
+    filepath = request.args.get('path')
+    if not filepath:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    # Handle both relative and absolute paths
+    if os.path.isabs(filepath):
+        # Absolute path provided
+        filepath_abs = os.path.abspath(filepath)
+    else:
+        # Relative path - join with OUTPUT_FOLDER
+        filepath_abs = os.path.abspath(os.path.join(str(OUTPUT_FOLDER), filepath))
+    
+    output_path = os.path.abspath(str(OUTPUT_FOLDER))
+    
+    # Security: validate path is within output directory
+    if not filepath_abs.startswith(output_path):
+        return jsonify({'error': 'Invalid file path - must be in output folder'}), 403
+    
+    if os.path.exists(filepath_abs) and os.path.isfile(filepath_abs):
+        from app.range_response import x_accel_response
+        accel = x_accel_response(Path(filepath_abs), download_name=os.path.basename(filepath_abs))
+        return accel or send_file(filepath_abs, as_attachment=True)
+    return jsonify({'error': 'File not found'}), 404
+
+@bp.route('/video_file')
+def serve_video_file():
+    """Serve video file for preview"""
+    filepath = request.args.get('path')
+    if not filepath:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    # Security: validate path is within output directory
+    filepath = os.path.abspath(filepath)
+    output_path = os.path.abspath(str(OUTPUT_FOLDER))
+    
+    if not filepath.startswith(output_path):
+        return jsonify({'error': 'Invalid file path'}), 403
+    
+    if os.path.exists(filepath) and os.path.isfile(filepath):
+        return _serve_file_with_range(Path(filepath), 'video/mp4')
+    return jsonify({'error': 'File not found'}), 404
+
+@bp.route('/thumbnail', methods=['GET'])
+def get_video_thumbnail():
+    """Generate and serve thumbnail for MP4 video files (main page)"""
+    from app.utils import validate_input_path
+    from pathlib import Path
+    
+    file_path = request.args.get('path')
+    if not file_path:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    file_path_obj = Path(file_path).resolve()  # Resolve to handle absolute paths
+    
+    # Validate path is within OUTPUT_FOLDER
+    is_valid, error_msg = validate_input_path(str(file_path_obj), OUTPUT_FOLDER)
+    if not is_valid:
+        return jsonify({'error': error_msg}), 403
+    
+    # Check if file exists
+    if not file_path_obj.exists() or not file_path_obj.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Check file type
+    ext = file_path_obj.suffix.lower()
+    file_type = None
+    
+    if ext == '.mp4':
+        file_type = 'mp4'
+    elif ext in {'.jpg', '.jpeg', '.png', '.gif', '.webp'}:
+        # Pass the extension without the dot (e.g., 'jpg', 'png')
+        file_type = ext.lstrip('.')
+    else:
+        return jsonify({'error': f'File type {ext} not supported for thumbnails'}), 400
+    
+    # Get size parameter (optional) - increased default for better quality
+    size_str = request.args.get('size', '640x480')
+    try:
+        width, height = map(int, size_str.split('x'))
+        size = (width, height)
+    except:
+        size = (640, 480)
+    
+    try:
+        # ETag and 304 from a stat of the source; the thumbnail is only generated (or read from cache) for a 200
+        return _serve_thumbnail(file_path_obj, file_type, size)
+    except Exception as e:
+        import logging
+        import traceback
+        error_details = traceback.format_exc()
+        logging.error(f"Error generating thumbnail for {file_path}: {e}\n{error_details}", exc_info=True)
+        return jsonify({'error': f'Failed to generate thumbnail: {str(e)}', 'details': str(e)}), 500
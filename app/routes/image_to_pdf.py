@@ -0,0 +1,326 @@
+"""
+Image to PDF module routes: image listing and PDF/DOCX generation
+"""
+from flask import render_template, request, jsonify
+import logging
+from pathlib import Path
+from app.routes import bp
+from app.listing_cache import cached_listing, learner_folder
+from app.file_scanner import scan_mp4_files
+from app.image_scanner import scan_image_files, organize_images_by_folder
+from app.observation_media_scanner import list_qualifications, list_learners
+from config import RESOLUTION_PRESETS, OUTPUT_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Image to PDF Module Routes
+# ============================================================================
+
+@bp.route('/image-to-pdf', methods=['GET'])
+def image_to_pdf_index():
+    """Image to PDF main page"""
+    from config import OUTPUT_FOLDER
+    
+    # Get qualifications (top-level folders) from OUTPUT_FOLDER
+    qualifications = list_qualifications(OUTPUT_FOLDER)
+    
+    # Get selected qualification and learner from query parameters
+    selected_qualification = request.args.get('qualification', '')
+    selected_learner = request.args.get('learner', '')
+    
+    # Get learners for selected qualification (if any)
+    learners = []
+    if selected_qualification:
+        learners = list_learners(OUTPUT_FOLDER, selected_qualification)
+    
+    return render_template('image_to_pdf.html',
+                         qualifications=qualifications,
+                         selected_qualification=selected_qualification,
+                         learners=learners,
+                         selected_learner=selected_learner)
+
+
+@bp.route('/list_images', methods=['GET'])
+@cached_listing(learner_folder('OUTPUT_FOLDER'))
+def list_images():
+    """List all image and video files in the output directory, optionally filtered by qualification/learner"""
+    from app.video_processor import get_video_info
+    from config import OUTPUT_FOLDER
+    from pathlib import Path
+    
+    # Get filter parameters
+    qualification = request.args.get('qualification', '')
+    learner = request.args.get('learner', '')
+    
+    try:
+        # Only scan when both qualification and learner are selected
+        if qualification and learner:
+            # Scan only within qualification/learner folder and all its subfolders
+            scan_path = OUTPUT_FOLDER / qualification / learner
+            exists = scan_path.exists()
+            logger.info(f"[deface] GET /list_images qualification={qualification!r} learner={learner!r} scan_path={scan_path!r} exists={exists}")
+            if not exists:
+                return jsonify({
+                    'success': True,
+                    'files': [],
+                    'tree': {},
+                    'count': 0,
+                    'output_folder': str(OUTPUT_FOLDER),
+                    'debug': {'scan_path': str(scan_path), 'exists': False}
+                })
+            
+            # Scan images recursively from the specific qualification/learner path
+            all_image_files = scan_image_files(str(scan_path))
+            all_video_files = scan_mp4_files(str(scan_path))
+            logger.info(f"[deface] list_images scan_path={scan_path!r} -> images={len(all_image_files)} videos={len(all_video_files)}")
+            
+            # Combine images and videos
+            # Add 'type' field to distinguish between images and videos
+            for file_info in all_image_files:
+                file_info['type'] = 'image'
+            
+            for file_info in all_video_files:
+                file_info['type'] = 'video'
+                # Add duration for display in deface file selector (min/sec under file name)
+                try:
+                    info = get_video_info(file_info['path'])
+                    file_info['duration_seconds'] = round(info['duration'], 2) if info and info.get('duration') is not None else None
+                except Exception:
+                    file_info['duration_seconds'] = None
+            
+            all_files = all_image_files + all_video_files
+            
+            # Update relative paths to be relative to OUTPUT_FOLDER (for downloads)
+            # But folder paths should be relative to the learner folder (scan_path)
+            # Exclude files inside the deface output subfolder so the selector shows only source media to deface
+            base_path = OUTPUT_FOLDER
+            filtered_files = []
+            for file_info in all_files:
+                file_path = Path(file_info['path'])
+                try:
+                    # Calculate folder relative to scan_path (learner folder) for UI display
+                    relative_to_learner = file_path.relative_to(scan_path)
+                    # Exclude anything under the 'deface' subfolder (defaced outputs)
+                    if relative_to_learner.parts and relative_to_learner.parts[0] == 'deface':
+                        continue
+                    # Calculate relative path from OUTPUT_FOLDER (for download links)
+                    relative_to_base = file_path.relative_to(base_path)
+                    rel_str = str(relative_to_base)
+                    file_info['relative_path'] = rel_str
+                    
+                    folder_path = relative_to_learner.parent
+                    # If image is directly in learner folder, it's 'root', otherwise use folder name
+                    file_info['folder'] = str(folder_path) if folder_path != Path('.') else 'root'
+                    
+                    filtered_files.append(file_info)
+                except ValueError:
+                    # Path not relative to base or scan_path, skip
+                    continue
+            
+            # Sort files: subfolders first, then root, then alphabetical within each
+            filtered_files.sort(key=lambda x: (
+                1 if x['folder'] == 'root' else 0,  # Root last
+                x['folder'],  # Then by folder name
+                x['name']  # Then by filename
+            ))
+            
+            # Organize files by folder for tree structure
+            tree = organize_images_by_folder(filtered_files)
+            
+            return jsonify({
+                'success': True,
+                'files': filtered_files,
+                'tree': tree,
+                'count': len(filtered_files),
+                'output_folder': str(OUTPUT_FOLDER),
+                'debug': {'scan_path': str(scan_path), 'exists': True, 'images': len(all_image_files), 'videos': len(all_video_files)}
+            })
+        else:
+            # No learner selected - return empty (only show files when learner is selected)
+            return jsonify({
+                'success': True,
+                'files': [],
+                'tree': {},
+                'count': 0,
+                'output_folder': str(OUTPUT_FOLDER)
+            })
+    except Exception as e:
+        logger.error(f"Error listing images: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to list images: {str(e)}'
+        }), 500
+
+
+@bp.route('/generate_image_documents', methods=['POST'])
+def generate_image_documents():
+    """Generate PDF and/or DOCX documents from selected images"""
+    from app.image_docx_generator import create_image_docx
+    from app.image_pdf_generator import create_image_pdf
+    from config import OUTPUT_FOLDER, RESOLUTION_PRESETS
+    from pathlib import Path
+    import tempfile
+    
+    try:
+        data = request.json
+        image_paths = data.get('image_paths', [])
+        image_order = data.get('image_order', image_paths)  # Use custom order if provided
+        quality = int(data.get('quality', 95))
+        max_size = data.get('max_size', '640x480')
+        output_format = data.get('output_format', 'both')  # 'pdf', 'docx', or 'both'
+        layout = data.get('layout', 'grid')
+        images_per_page = int(data.get('images_per_page', 2))
+        
+        if not image_paths:
+            return jsonify({
+                'success': False,
+                'error': 'No images provided'
+            }), 400
+        
+        # Validate paths
+        validated_paths = []
+        for path in image_order if image_order else image_paths:
+            img_path = Path(path)
+            
+            # Validate path is within OUTPUT_FOLDER
+            try:
+                img_path.resolve().relative_to(OUTPUT_FOLDER.resolve())
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid image path: {path}'
+                }), 400
+            
+            if img_path.exists():
+                validated_paths.append(str(img_path.resolve()))
+        
+        if not validated_paths:
+            return jsonify({
+                'success': False,
+                'error': 'No valid images found'
+            }), 400
+        
+        # Extract filenames (without extension)
+        image_names = []
+        for path in validated_paths:
+            filename = Path(path).stem  # Get filename without extension
+            image_names.append(filename)
+        
+        # Get resolution settings
+        max_width = None
+        max_height = None
+        if max_size and max_size != 'original' and max_size in RESOLUTION_PRESETS:
+            if RESOLUTION_PRESETS[max_size]:
+                max_width, max_height = RESOLUTION_PRESETS[max_size]
+        elif max_size and max_size != 'original':
+            # Try to parse custom size (e.g., "800x600")
+            try:
+                parts = max_size.split('x')
+                if len(parts) == 2:
+                    max_width = int(parts[0])
+                    max_height = int(parts[1])
+            except:
+                pass
+        
+        # Determine output location (use learner folder if provided, otherwise use first image's directory)
+        qualification = data.get('qualification', '')
+        learner = data.get('learner', '')
+        
+        if qualification and learner:
+            # Output to learner folder: OUTPUT_FOLDER/qualification/learner
+            output_dir = OUTPUT_FOLDER / qualification / learner
+            output_dir.mkdir(parents=True, exist_ok=True)
+        else:
+            # Fallback: use first image's directory
+            output_dir = Path(validated_paths[0]).parent
+        
+        # Get filename from request (mandatory)
+        filename = data.get('filename', '').strip()
+        if not filename:
+            return jsonify({
+                'success': False,
+                'error': 'Filename is required'
+            }), 400
+        
+        # Sanitize filename: remove invalid characters
+        import re
+        filename = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '_', filename)
+        # Remove leading/trailing dots and spaces
+        filename = re.sub(r'^[.\s]+|[.\s]+$', '', filename)
+        
+        if not filename:
+            return jsonify({
+                'success': False,
+                'error': 'Filename contains only invalid characters'
+            }), 400
+        
+        output_base_name = filename
+        
+        results = {}
+        
+        # Generate PDF if requested
+        if output_format in ('pdf', 'both'):
+            pdf_path = output_dir / f'{output_base_name}.pdf'
+            try:
+                create_image_pdf(
+                    images=validated_paths,
+                    image_names=image_names,
+                    output_path=str(pdf_path),
+                    layout=layout,
+                    images_per_page=images_per_page,
+                    quality=quality,
+                    max_width=max_width,
+                    max_height=max_height
+                )
+                results['pdf_path'] = str(pdf_path)
+                results['pdf_url'] = f'/v2p-formatter/download?path={pdf_path.relative_to(OUTPUT_FOLDER)}'
+            except Exception as e:
+                logger.error(f"Error generating PDF: {e}", exc_info=True)
+                results['pdf_error'] = str(e)
+        
+        # Generate DOCX if requested
+        if output_format in ('docx', 'both'):
+            docx_path = output_dir / f'{output_base_name}.docx'
+            try:
+                create_image_docx(
+                    images=validated_paths,
+                    image_names=image_names,
+                    output_path=str(docx_path),
+                    images_per_page=images_per_page,
+                    quality=quality,
+                    max_width=max_width,
+                    max_height=max_height
+                )
+                results['docx_path'] = str(docx_path)
+                results['docx_relative_path'] = str(docx_path.relative_to(OUTPUT_FOLDER))
+                results['docx_url'] = f'/v2p-formatter/download?path={docx_path.relative_to(OUTPUT_FOLDER)}'
+            except Exception as e:
+                logger.error(f"Error generating DOCX: {e}", exc_info=True)
+                results['docx_error'] = str(e)
+        
+        # Determine primary file path
+        if 'pdf_path' in results:
+            results['file_path'] = results['pdf_path']
+        elif 'docx_path' in results:
+            results['file_path'] = results['docx_path']
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to generate any documents'
+            }), 500
+        
+        # Add output folder path to response
+        results['output_folder_path'] = str(output_dir)
+        
+        return jsonify({
+            'success': True,
+            **results
+        })
+        
+    except Exception as e:
+        logger.error(f"Error generating image documents: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to generate documents: {str(e)}'
+        }), 500
@@ -0,0 +1,906 @@
+"""
+Media converter routes: file listing, conversion jobs, previews, rotate/trim/crop
+"""
+from flask import render_template, request, jsonify, send_file, Response
+import os
+import logging
+from pathlib import Path
+from app.routes import bp, _serve_file_with_range, _serve_thumbnail
+from app.listing_cache import cached_listing, learner_folder
+from app.observation_media_scanner import list_qualifications, list_learners
+from config import OUTPUT_FOLDER
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Media Converter Routes
+# ============================================================================
+
+@bp.route('/media-converter')
+def media_converter():
+    """Media converter main page"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    
+    # Get qualifications (top-level folders)
+    qualifications = list_qualifications(MEDIA_CONVERTER_INPUT_FOLDER)
+    
+    # Get selected qualification and learner from query parameters
+    selected_qualification = request.args.get('qualification', '')
+    selected_learner = request.args.get('learner', '')
+    
+    # Get learners for selected qualification (if any)
+    learners = []
+    if selected_qualification:
+        learners = list_learners(MEDIA_CONVERTER_INPUT_FOLDER, selected_qualification)
+    
+    return render_template('media_converter.html',
+                         qualifications=qualifications,
+                         learners=learners,
+                         selected_qualification=selected_qualification,
+                         selected_learner=selected_learner)
+
+
+@bp.route('/media-converter/qualifications', methods=['GET'])
+def get_media_converter_qualifications():
+    """List all top-level folders in the input directory (qualifications)"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    try:
+        qualifications = list_qualifications(MEDIA_CONVERTER_INPUT_FOLDER)
+        return jsonify({'success': True, 'qualifications': qualifications})
+    except Exception as e:
+        logger.error(f"Error listing qualifications: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/media-converter/learners', methods=['GET'])
+def get_media_converter_learners():
+    """List subfolders (learners) within a selected qualification"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    qualification = request.args.get('qualification')
+    if not qualification:
+        return jsonify({'success': False, 'error': 'Qualification not provided'}), 400
+    try:
+        learners = list_learners(MEDIA_CONVERTER_INPUT_FOLDER, qualification)
+        return jsonify({'success': True, 'learners': learners})
+    except Exception as e:
+        logger.error(f"Error listing learners for qualification {qualification}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/media-converter/list', methods=['GET'])
+@cached_listing(learner_folder('MEDIA_CONVERTER_INPUT_FOLDER'))
+def list_media_files():
+    """List all MOV, JPG, JPEG, and PNG files in input folder, optionally filtered by qualification/learner"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    from app.media_file_scanner import scan_media_files, get_file_info
+    from pathlib import Path
+    
+    # Get filter parameters
+    qualification = request.args.get('qualification', '')
+    learner = request.args.get('learner', '')
+    
+    try:
+        # Determine scan path based on filters
+        if qualification and learner:
+            # Scan only within qualification/learner folder
+            scan_path = MEDIA_CONVERTER_INPUT_FOLDER / qualification / learner
+            if not scan_path.exists():
+                return jsonify({
+                    'success': True,
+                    'videos': [],
+                    'images': [],
+                    'video_count': 0,
+                    'image_count': 0,
+                    'input_folder': str(MEDIA_CONVERTER_INPUT_FOLDER),
+                    'output_folder': str(OUTPUT_FOLDER)
+                })
+        elif qualification:
+            # If only qualification selected, return empty (per requirements)
+            return jsonify({
+                'success': True,
+                'videos': [],
+                'images': [],
+                'video_count': 0,
+                'image_count': 0,
+                'input_folder': str(MEDIA_CONVERTER_INPUT_FOLDER),
+                'output_folder': str(OUTPUT_FOLDER)
+            })
+        else:
+            # No filters - return empty (per requirements: show no files until both selected)
+            return jsonify({
+                'success': True,
+                'videos': [],
+                'images': [],
+                'video_count': 0,
+                'image_count': 0,
+                'input_folder': str(MEDIA_CONVERTER_INPUT_FOLDER),
+                'output_folder': str(OUTPUT_FOLDER)
+            })
+        
+        result = scan_media_files(str(scan_path))
+        
+        # Filter files to ensure they're within the qualification/learner path
+        # and update relative_path to be relative to INPUT_FOLDER for output path calculation
+        base_path = MEDIA_CONVERTER_INPUT_FOLDER
+        filtered_videos = []
+        filtered_images = []
+        
+        for video in result['videos']:
+            video_path = Path(video['path'])
+            try:
+                relative_to_base = video_path.relative_to(base_path)
+                # Ensure it starts with qualification/learner
+                if str(relative_to_base).startswith(f"{qualification}/{learner}/") or str(relative_to_base) == f"{qualification}/{learner}":
+                    video['relative_path'] = str(relative_to_base)
+                    filtered_videos.append(video)
+            except ValueError:
+                # Path not relative to base, skip
+                continue
+        
+        for image in result['images']:
+            image_path = Path(image['path'])
+            try:
+                relative_to_base = image_path.relative_to(base_path)
+                # Ensure it starts with qualification/learner
+                if str(relative_to_base).startswith(f"{qualification}/{learner}/") or str(relative_to_base) == f"{qualification}/{learner}":
+                    image['relative_path'] = str(relative_to_base)
+                    filtered_images.append(image)
+            except ValueError:
+                # Path not relative to base, skip
+                continue
+        
+        # Add file info (width, height, duration) to each file
+        for video in filtered_videos:
+            file_info = get_file_info(Path(video['path']))
+            video.update({
+                'width': file_info.get('width', 0),
+                'height': file_info.get('height', 0),
+                'duration': file_info.get('duration', 0)
+            })
+        
+        for image in filtered_images:
+            file_info = get_file_info(Path(image['path']))
+            image.update({
+                'width': file_info.get('width', 0),
+                'height': file_info.get('height', 0)
+            })
+        
+        return jsonify({
+            'success': True,
+            'videos': filtered_videos,
+            'images': filtered_images,
+            'video_count': len(filtered_videos),
+            'image_count': len(filtered_images),
+            'input_folder': str(MEDIA_CONVERTER_INPUT_FOLDER),
+            'output_folder': str(OUTPUT_FOLDER),
+            'qualification': qualification,
+            'learner': learner
+        })
+    except Exception as e:
+        import logging
+        logging.error(f"Error scanning media files: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to scan files: {str(e)}'
+        }), 500
+
+
+def _converted_or_released(output_path: Path, convert):
+    """Run convert(); if it fails, remove the empty output placeholder claimed for it"""
+    from app.utils import release_media_output_path
+    try:
+        result = convert()
+    except Exception:
+        release_media_output_path(output_path)
+        raise
+    if not result.get('success'):
+        release_media_output_path(output_path)
+    return result
+
+
+@bp.route('/media-converter/convert', methods=['POST'])
+def convert_media():
+    """Start conversion job (asynchronous)"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER, MEDIA_CONVERTER_OUTPUT_FOLDER, IMAGE_CONVERSION_WORKERS
+    from app.conversion_job import job_manager, video_conversion_slots
+    from app.conversion_manifest import run_with_manifest
+    from app.utils import validate_input_path, reserve_media_output_path
+    from pathlib import Path
+    
+    try:
+        data = request.get_json()
+        files = data.get('files', [])  # List of {type, path, ...}
+        settings = data.get('settings', {})  # {video: {...}, image: {...}}
+        force = bool(data.get('force', False))  # Re-convert even if the manifest has an up-to-date output
+        
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'No files selected for conversion'
+            }), 400
+        
+        # Validate all file paths
+        validated_files = []
+        for file_info in files:
+            file_path = file_info.get('path')
+            if not file_path:
+                continue
+            
+            is_valid, error_msg = validate_input_path(file_path, MEDIA_CONVERTER_INPUT_FOLDER)
+            if not is_valid:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid file path: {error_msg}'
+                }), 400
+            
+            validated_files.append(file_info)
+        
+        if not validated_files:
+            return jsonify({
+                'success': False,
+                'error': 'No valid files to convert'
+            }), 400
+        
+        # Create conversion job; images are converted concurrently on the process
+        # pool, videos are further limited by video_conversion_slots
+        has_images = any(f.get('type') in ('jpg', 'jpeg', 'png') for f in validated_files)
+        job_id = job_manager.create_job(
+            validated_files,
+            settings,
+            max_workers=IMAGE_CONVERSION_WORKERS if has_images else 1
+        )
+        job = job_manager.get_job(job_id)
+        
+        # Start conversion in background
+        def converter_func(file_info, settings):
+            """Converter function for job"""
+            file_path = Path(file_info['path'])
+            file_type = file_info.get('type', '')
+            
+            if file_type == 'mov':
+                # Video conversion
+                from app.video_converter import convert_mov_to_mp4
+                from config import VIDEO_QUALITY_PRESETS
+                video_settings = settings.get('video', {})
+                quality_preset = video_settings.get('quality', 'medium')
+                custom_settings = video_settings.get('custom')
+                
+                # Target size (MB) can be set per file or for the whole job
+                target_size_mb = file_info.get('target_size_mb') or video_settings.get('target_size_mb')
+                if target_size_mb:
+                    base_settings = custom_settings or VIDEO_QUALITY_PRESETS['target_size']
+                    custom_settings = {**base_settings, 'target_size_mb': float(target_size_mb)}
+                
+                effective_settings = {
+                    'type': 'video',
+                    'ext': '.mp4',
+                    'settings': custom_settings or VIDEO_QUALITY_PRESETS.get(quality_preset, VIDEO_QUALITY_PRESETS['medium'])
+                }
+                
+                def convert():
+                    # Claimed here, not just checked: conversions run in parallel
+                    output_path = reserve_media_output_path(
+                        file_path,
+                        MEDIA_CONVERTER_OUTPUT_FOLDER,
+                        '.mp4'
+                    )
+                    
+                    def run():
+                        with video_conversion_slots:
+                            return convert_mov_to_mp4(file_path, output_path, quality_preset, custom_settings)
+                    
+                    return _converted_or_released(output_path, run)
+                
+                return run_with_manifest(
+                    file_path, effective_settings, convert, force=force,
+                    reserve_output=lambda: reserve_media_output_path(file_path, MEDIA_CONVERTER_OUTPUT_FOLDER, '.mp4')
+                )
+            
+            elif file_type in ('jpg', 'jpeg', 'png'):
+                # Image conversion
+                from app.image_converter import submit_image_conversion
+                from config import IMAGE_RESOLUTION_PRESETS, IMAGE_QUALITY_PRESETS
+                
+                image_settings = settings.get('image', {})
+                resolution_preset = image_settings.get('resolution', 'original')
+                quality_preset = image_settings.get('quality', 'medium')
+                maintain_aspect = image_settings.get('maintain_aspect', True)
+                allow_stretch = image_settings.get('allow_stretch', False)
+                
+                # Get resolution
+                resolution = None
+                if resolution_preset != 'original':
+                    resolution = IMAGE_RESOLUTION_PRESETS.get(resolution_preset)
+                elif image_settings.get('custom_resolution'):
+                    width = image_settings.get('custom_width', 1920)
+                    height = image_settings.get('custom_height', 1080)
+                    resolution = (width, height)
+                
+                # Get quality
+                quality = IMAGE_QUALITY_PRESETS.get(quality_preset, 80)
+                if image_settings.get('custom_quality'):
+                    quality = image_settings.get('custom_quality_value', 80)
+                
+                # Determine output extension (keep original for JPG, use .jpeg for PNG)
+                if file_type == 'png':
+                    output_ext = '.jpeg'
+                else:
+                    output_ext = file_path.suffix  # Keep original extension
+                
+                effective_settings = {
+                    'type': 'image',
+                    'ext': output_ext,
+                    'resolution': list(resolution) if resolution else None,
+                    'quality': quality,
+                    'maintain_aspect': maintain_aspect,
+                    'allow_stretch': allow_stretch
+                }
+                
+                def convert():
+                    # Claimed here, not just checked: conversions run in parallel
+                    output_path = reserve_media_output_path(
+                        file_path,
+                        MEDIA_CONVERTER_OUTPUT_FOLDER,
+                        output_ext
+                    )
+                    return _converted_or_released(output_path, lambda: submit_image_conversion(
+                        input_path=file_path,
+                        output_path=output_path,
+                        resolution=resolution,
+                        quality=quality,
+                        maintain_aspect=maintain_aspect,
+                        allow_stretch=allow_stretch
+                    ).result())
+                
+                return run_with_manifest(
+                    file_path, effective_settings, convert, force=force,
+                    reserve_output=lambda: reserve_media_output_path(file_path, MEDIA_CONVERTER_OUTPUT_FOLDER, output_ext)
+                )
+            
+            else:
+                return {
+                    'success': False,
+                    'error': f'Unsupported file type: {file_type}'
+                }
+        
+        job.start(converter_func)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'message': f'Conversion job started with {len(validated_files)} file(s)'
+        })
+    
+    except Exception as e:
+        import logging
+        logging.error(f"Error starting conversion: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to start conversion: {str(e)}'
+        }), 500
+
+
+@bp.route('/media-converter/status/<job_id>', methods=['GET'])
+def conversion_status(job_id):
+    """Get conversion job status"""
+    from app.conversion_job import job_manager
+    
+    job = job_manager.get_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    status = job.get_status()
+    return jsonify({
+        'success': True,
+        **status
+    })
+
+
+@bp.route('/media-converter/cancel/<job_id>', methods=['POST'])
+def cancel_conversion(job_id):
+    """Cancel running conversion job"""
+    from app.conversion_job import job_manager
+    
+    success = job_manager.cancel_job(job_id)
+    if success:
+        return jsonify({
+            'success': True,
+            'message': 'Conversion cancelled'
+        })
+    else:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found or cannot be cancelled'
+        }), 404
+
+
+@bp.route('/media-converter/manifest', methods=['GET'])
+def conversion_manifest_entries():
+    """Query the conversion manifest (optionally by input or output path)"""
+    from app.conversion_manifest import conversion_manifest
+    
+    entries = conversion_manifest.query(
+        input_path=request.args.get('input_path'),
+        output_path=request.args.get('output_path')
+    )
+    return jsonify({
+        'success': True,
+        'count': len(entries),
+        'entries': entries
+    })
+
+
+@bp.route('/media-converter/preview/<path:file_path>', methods=['GET'])
+def preview_converted_file(file_path):
+    """Serve converted file for preview"""
+    from config import MEDIA_CONVERTER_OUTPUT_FOLDER
+    from app.utils import validate_output_path
+    from pathlib import Path
+    
+    file_path_obj = Path(file_path)
+    
+    # Validate path
+    is_valid, error_msg = validate_output_path(str(file_path_obj), MEDIA_CONVERTER_OUTPUT_FOLDER)
+    if not is_valid:
+        return jsonify({'error': error_msg}), 403
+    
+    # Check if file exists
+    if not file_path_obj.exists() or not file_path_obj.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Determine MIME type
+    ext = file_path_obj.suffix.lower()
+    mime_types = {
+        '.mp4': 'video/mp4',
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png'
+    }
+    mimetype = mime_types.get(ext, 'application/octet-stream')
+    
+    return send_file(str(file_path_obj), mimetype=mimetype)
+
+@bp.route('/media-converter/video-preview', methods=['GET'])
+def preview_video_file():
+    """Serve original video file for preview (from input folder)"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    from app.utils import validate_input_path
+    from pathlib import Path
+    
+    file_path = request.args.get('path')
+    if not file_path:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    file_path_obj = Path(file_path)
+    
+    # Validate path is within input folder
+    is_valid, error_msg = validate_input_path(str(file_path_obj), MEDIA_CONVERTER_INPUT_FOLDER)
+    if not is_valid:
+        return jsonify({'error': error_msg}), 403
+    
+    # Check if file exists
+    if not file_path_obj.exists() or not file_path_obj.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Check if it's a video file
+    ext = file_path_obj.suffix.lower()
+    if ext not in ('.mov', '.mp4'):
+        return jsonify({'error': 'Only video files are supported'}), 400
+    
+    # Determine MIME type
+    mime_types = {
+        '.mov': 'video/quicktime',
+        '.mp4': 'video/mp4'
+    }
+    mimetype = mime_types.get(ext, 'video/mp4')
+    
+    return _serve_file_with_range(file_path_obj, mimetype)
+
+
+@bp.route('/media-converter/download/<path:file_path>', methods=['GET'])
+def download_converted_file(file_path):
+    """Download converted file"""
+    from config import MEDIA_CONVERTER_OUTPUT_FOLDER
+    from app.utils import validate_output_path
+    from pathlib import Path
+    
+    file_path_obj = Path(file_path)
+    
+    # Validate path
+    is_valid, error_msg = validate_output_path(str(file_path_obj), MEDIA_CONVERTER_OUTPUT_FOLDER)
+    if not is_valid:
+        return jsonify({'error': error_msg}), 403
+    
+    # Check if file exists
+    if not file_path_obj.exists() or not file_path_obj.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    
+    return send_file(str(file_path_obj), as_attachment=True)
+
+
+@bp.route('/media-converter/rotate-images', methods=['POST'])
+def rotate_images():
+    """Rotate selected images in place"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER
+    from app.utils import validate_input_path
+    from app.image_rotator import rotate_images as rotate_images_func
+    from pathlib import Path
+    
+    try:
+        data = request.get_json()
+        files = data.get('files', [])  # List of {path, type}
+        angle = data.get('angle', 90)  # Rotation angle in degrees
+        mode = data.get('mode')  # Optional: 'lossless', 'exif' or 'reencode' (default IMAGE_ROTATION_MODE)
+        
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'No files selected for rotation'
+            }), 400
+        
+        # Validate angle
+        if angle not in (-90, 90, 180, -180, 270, -270):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid rotation angle. Must be 90, -90, 180, or 270 degrees'
+            }), 400
+        
+        if mode not in (None, 'lossless', 'exif', 'reencode'):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid rotation mode. Must be lossless, exif or reencode'
+            }), 400
+        
+        # Validate all file paths
+        validated_files = []
+        for file_info in files:
+            file_path = file_info.get('path')
+            if not file_path:
+                continue
+            
+            is_valid, error_msg = validate_input_path(file_path, MEDIA_CONVERTER_INPUT_FOLDER)
+            if not is_valid:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid file path: {error_msg}'
+                }), 400
+            
+            # Check if it's an image file
+            file_type = file_info.get('type', '')
+            if file_type not in ('jpg', 'jpeg', 'png'):
+                continue
+            
+            validated_files.append(Path(file_path))
+        
+        if not validated_files:
+            return jsonify({
+                'success': False,
+                'error': 'No valid image files to rotate'
+            }), 400
+        
+        # Rotate images in parallel (lossless for JPEG where possible)
+        results = []
+        errors = []
+        
+        for file_path, result in zip(validated_files, rotate_images_func(validated_files, angle, mode)):
+            if result.get('success'):
+                results.append(result)
+            else:
+                errors.append({
+                    'path': str(file_path),
+                    'error': result.get('error', 'Unknown error')
+                })
+        
+        # If any failed, return error (stop on failure as per requirements)
+        if errors:
+            return jsonify({
+                'success': False,
+                'error': f'Failed to rotate {len(errors)} file(s)',
+                'errors': errors,
+                'rotated_count': len(results)
+            }), 500
+        
+        return jsonify({
+            'success': True,
+            'rotated_count': len(results),
+            'methods': {r['file_path']: r['method'] for r in results},
+            'message': f'Successfully rotated {len(results)} image(s)'
+        })
+    
+    except Exception as e:
+        import logging
+        logging.error(f"Error rotating images: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to rotate images: {str(e)}'
+        }), 500
+
+
+@bp.route('/media-converter/trim-video', methods=['POST'])
+def trim_video():
+    """Trim video to specified time range"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER, MEDIA_CONVERTER_OUTPUT_FOLDER
+    from app.utils import validate_input_path, get_media_output_path
+    from app.video_converter import trim_video as trim_video_func
+    from pathlib import Path
+    
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        start_time = float(data.get('start_time', 0))
+        end_time = float(data.get('end_time', 0))
+        quality_preset = data.get('quality', 'medium')
+        custom_settings = data.get('custom_settings')
+        fast = bool(data.get('fast', False))  # Stream-copy where possible
+        frame_accurate = bool(data.get('frame_accurate', False))  # With fast: smart cut instead of keyframe snap
+        
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': 'No file path provided'
+            }), 400
+        
+        # Validate path
+        is_valid, error_msg = validate_input_path(file_path, MEDIA_CONVERTER_INPUT_FOLDER)
+        if not is_valid:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid file path: {error_msg}'
+            }), 400
+        
+        file_path_obj = Path(file_path)
+        
+        # Check if it's a video file
+        ext = file_path_obj.suffix.lower()
+        if ext not in ('.mov', '.mp4'):
+            return jsonify({
+                'success': False,
+                'error': 'Only video files (MOV/MP4) are supported'
+            }), 400
+        
+        # Get output path
+        output_path = get_media_output_path(
+            file_path_obj,
+            MEDIA_CONVERTER_OUTPUT_FOLDER,
+            '.mp4'
+        )
+        
+        # Trim video
+        result = trim_video_func(
+            file_path_obj,
+            output_path,
+            start_time,
+            end_time,
+            quality_preset,
+            custom_settings,
+            fast=fast,
+            frame_accurate=frame_accurate
+        )
+        
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'output_path': result['output_path'],
+                'output_size_mb': result['output_size_mb'],
+                'trimmed_duration': result.get('trimmed_duration', 0),
+                'mode': result.get('mode'),
+                'message': f'Video trimmed successfully ({start_time}s - {end_time}s)'
+            })
+        else:
+            # Return detailed error information
+            error_response = {
+                'success': False,
+                'error': result.get('error', 'Unknown error'),
+                'error_type': result.get('error_type', 'Unknown')
+            }
+            
+            # Include FFmpeg error details if available
+            if result.get('ffmpeg_stderr'):
+                error_response['ffmpeg_stderr'] = result['ffmpeg_stderr']
+            if result.get('ffmpeg_stdout'):
+                error_response['ffmpeg_stdout'] = result['ffmpeg_stdout']
+            if result.get('processing_time'):
+                error_response['processing_time'] = result['processing_time']
+            
+            logger.error(f"Trim video failed: {error_response}")
+            return jsonify(error_response), 500
+    
+    except Exception as e:
+        import logging
+        logging.error(f"Error trimming video: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to trim video: {str(e)}'
+        }), 500
+
+
+@bp.route('/media-converter/crop-video', methods=['POST'])
+def crop_video():
+    """Crop video to specified region"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER, MEDIA_CONVERTER_OUTPUT_FOLDER
+    from app.utils import validate_input_path, get_media_output_path
+    from app.video_converter import crop_video as crop_video_func
+    from pathlib import Path
+    
+    try:
+        data = request.get_json()
+        file_path = data.get('file_path')
+        x = int(data.get('x', 0))
+        y = int(data.get('y', 0))
+        width = int(data.get('width', 0))
+        height = int(data.get('height', 0))
+        quality_preset = data.get('quality', 'medium')
+        custom_settings = data.get('custom_settings')
+        
+        if not file_path:
+            return jsonify({
+                'success': False,
+                'error': 'No file path provided'
+            }), 400
+        
+        # Validate path
+        is_valid, error_msg = validate_input_path(file_path, MEDIA_CONVERTER_INPUT_FOLDER)
+        if not is_valid:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid file path: {error_msg}'
+            }), 400
+        
+        file_path_obj = Path(file_path)
+        
+        # Check if it's a video file
+        ext = file_path_obj.suffix.lower()
+        if ext not in ('.mov', '.mp4'):
+            return jsonify({
+                'success': False,
+                'error': 'Only video files (MOV/MP4) are supported'
+            }), 400
+        
+        # Get output path
+        output_path = get_media_output_path(
+            file_path_obj,
+            MEDIA_CONVERTER_OUTPUT_FOLDER,
+            '.mp4'
+        )
+        
+        # Crop video
+        result = crop_video_func(
+            file_path_obj,
+            output_path,
+            x,
+            y,
+            width,
+            height,
+            quality_preset,
+            custom_settings
+        )
+        
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'output_path': result['output_path'],
+                'output_size_mb': result['output_size_mb'],
+                'crop_width': result.get('crop_width', width),
+                'crop_height': result.get('crop_height', height),
+                'message': f'Video cropped successfully ({width}x{height} @ {x},{y})'
+            })
+        else:
+            # Return detailed error information
+            error_response = {
+                'success': False,
+                'error': result.get('error', 'Unknown error'),
+                'error_type': result.get('error_type', 'Unknown')
+            }
+            
+            # Include FFmpeg error details if available
+            if result.get('ffmpeg_stderr'):
+                error_response['ffmpeg_stderr'] = result['ffmpeg_stderr']
+            if result.get('ffmpeg_stdout'):
+                error_response['ffmpeg_stdout'] = result['ffmpeg_stdout']
+            if result.get('processing_time'):
+                error_response['processing_time'] = result['processing_time']
+            
+            logger.error(f"Crop video failed: {error_response}")
+            return jsonify(error_response), 500
+    
+    except Exception as e:
+        import logging
+        logging.error(f"Error cropping video: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': f'Failed to crop video: {str(e)}'
+        }), 500
+
+
+@bp.route('/media-converter/thumbnail', methods=['GET'])
+def get_thumbnail():
+    """Generate and serve thumbnail for a media file"""
+    from config import MEDIA_CONVERTER_INPUT_FOLDER, OUTPUT_FOLDER
+    from app.utils import validate_input_path
+    from pathlib import Path
+    
+    file_path = request.args.get('path')
+    if not file_path:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    file_path_obj = Path(file_path).resolve()
+    
+    # Validate path - check both MEDIA_CONVERTER_INPUT_FOLDER and OUTPUT_FOLDER
+    # (Observation Media files are in OUTPUT_FOLDER)
+    input_folder_obj = MEDIA_CONVERTER_INPUT_FOLDER.resolve()
+    output_folder_obj = OUTPUT_FOLDER.resolve()
+    
+    # Check if path is within either folder
+    is_valid = False
+    try:
+        file_path_obj.relative_to(input_folder_obj)
+        is_valid = True
+    except ValueError:
+        try:
+            file_path_obj.relative_to(output_folder_obj)
+            is_valid = True
+        except ValueError:
+            pass
+    
+    if not is_valid:
+        return jsonify({'error': 'File path must be within input or output folder'}), 403
+    
+    # Check if file exists
+    if not file_path_obj.exists() or not file_path_obj.is_file():
+        return jsonify({'error': 'File not found'}), 404
+    
+    # Determine file type
+    ext = file_path_obj.suffix.lower()
+    if ext == '.mov':
+        file_type = 'mov'
+    elif ext == '.mp4':
+        file_type = 'mp4'
+    elif ext == '.mp3':
+        file_type = 'mp3'  # Audio files - will return placeholder
+    elif ext in ('.jpg', '.jpeg'):
+        file_type = 'jpg'
+    elif ext == '.png':
+        file_type = 'png'
+    elif ext == '.pdf':
+        file_type = 'pdf'
+    else:
+        return jsonify({'error': 'Unsupported file type'}), 400
+    
+    # Get size parameter (optional) - increased default for better quality
+    size_str = request.args.get('size', '640x480')
+    try:
+        width, height = map(int, size_str.split('x'))
+        size = (width, height)
+    except:
+        size = (640, 480)
+    
+    try:
+        # ETag and 304 from a stat of the source; the thumbnail is only generated (or read from cache) for a 200
+        return _serve_thumbnail(file_path_obj, file_type, size)
+    except Exception as e:
+        import logging
+        logging.error(f"Error generating thumbnail: {e}", exc_info=True)
+        return jsonify({'error': f'Failed to generate thumbnail: {str(e)}'}), 500
+
+
+@bp.route('/media-converter/audio-file', methods=['GET'])
+def serve_audio_file():
+    """Serve audio file for preview"""
+    filepath = request.args.get('path')
+    if not filepath:
+        return jsonify({'error': 'No file path provided'}), 400
+    
+    # Security: validate path is within output directory
+    filepath = os.path.abspath(filepath)
+    output_path = os.path.abspath(str(OUTPUT_FOLDER))
+    
+    if not filepath.startswith(output_path):
+        return jsonify({'error': 'Invalid file path - must be in output folder'}), 403
+    
+    if os.path.exists(filepath) and os.path.isfile(filepath):
+        from app.range_response import x_accel_response
+        return x_accel_response(Path(filepath), 'audio/mpeg') or send_file(filepath, mimetype='audio/mpeg')
+    return jsonify({'error': 'File not found'}), 404
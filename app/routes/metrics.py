@@ -0,0 +1,44 @@
+"""
+Metrics routes: per-request instrumentation and the Prometheus /metrics endpoint
+"""
+from flask import Response, g, request
+import time
+from app.routes import bp
+from app.metrics import REQUEST_COUNT, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, ensure_publisher, render
+
+
+def _endpoint_label() -> str:
+    # Endpoint names, not paths, so file paths in URLs do not create a series each
+    return request.endpoint or 'unmatched'
+
+
+@bp.before_app_request
+def _metrics_request_started():
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = _endpoint_label()
+    REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+    ensure_publisher()
+
+
+@bp.after_app_request
+def _metrics_request_finished(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        endpoint = g.metrics_endpoint
+        REQUEST_COUNT.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+    return response
+
+
+@bp.teardown_app_request
+def _metrics_request_teardown(exc):
+    # Runs even when the request failed before a response was made
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, subprocess and cache metrics in Prometheus text format"""
+    return Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
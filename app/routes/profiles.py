@@ -0,0 +1,55 @@
+"""
+Request profiling routes: profile selected requests and list/download the profiles (admin token required)
+"""
+from flask import g, jsonify, request, send_file
+from app.routes import bp
+from app.profiler import RequestProfiler, list_profiles, profile_path, should_profile, token_valid
+from config import PROFILE_ADMIN_TOKEN
+
+
+def _admin_error():
+    """Error response unless the request carries the admin token (X-Profile-Token header or ?token=)"""
+    if not PROFILE_ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Profiling admin token not configured (PROFILE_ADMIN_TOKEN)'}), 403
+    if not token_valid(request.headers.get('X-Profile-Token') or request.args.get('token')):
+        return jsonify({'success': False, 'error': 'Invalid or missing profiling token'}), 403
+    return None
+
+
+@bp.before_app_request
+def _profile_request_started():
+    if should_profile(request.endpoint, request.path, request.headers.get('X-Profile-Token')):
+        profiler = RequestProfiler()
+        profiler.start()
+        g.request_profiler = profiler
+
+
+@bp.teardown_app_request
+def _profile_request_finished(exc):
+    # After the response (including streamed bodies) is done
+    profiler = g.pop('request_profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(request.endpoint)
+
+
+@bp.route('/profiles', methods=['GET'])
+def profiles_list():
+    """Saved request profiles, newest first"""
+    error = _admin_error()
+    if error:
+        return error
+    return jsonify({'success': True, 'profiles': list_profiles()})
+
+
+@bp.route('/profiles/<name>', methods=['GET'])
+def profiles_download(name):
+    """Download one profile (.collapsed text or .prof pstats)"""
+    error = _admin_error()
+    if error:
+        return error
+    path = profile_path(name)
+    if path is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    mimetype = 'text/plain' if path.suffix == '.collapsed' else 'application/octet-stream'
+    return send_file(str(path), mimetype=mimetype, as_attachment=True, download_name=name)
@@ -7,6 +7,7 @@ from PIL import Image
 import subprocess
 import io
 import hashlib
+from app.metrics import record_cache, subprocess_timer
 
 logger = logging.getLogger('media_converter.thumbnail')
 
@@ -28,12 +29,62 @@ def get_thumbnail_cache_path(file_path: Path, size: tuple = (120, 90)) -> Path:
     cache_dir = BASE_DIR / 'static' / 'cache' / 'thumbnails'
     cache_dir.mkdir(parents=True, exist_ok=True)
     
-    # Generate cache key from file path and modification time
-    file_stat = file_path.stat()
-    cache_key = f"{file_path}_{file_stat.st_mtime}_{size[0]}x{size[1]}"
-    cache_hash = hashlib.md5(cache_key.encode()).hexdigest()
+    # Cache file name: <path hash>_<version+size hash>.jpg, so every cached size
+    # of one source file can be found (and invalidated) by its path prefix
+    variant_key = f"{thumbnail_version(file_path)}_{size[0]}x{size[1]}"
+    variant_hash = hashlib.md5(variant_key.encode()).hexdigest()
     
-    return cache_dir / f"{cache_hash}.jpg"
+    return cache_dir / f"{_thumbnail_path_hash(file_path)}_{variant_hash}.jpg"
+
+
+def thumbnail_version(file_path: Path, file_stat=None) -> str:
+    """
+    Version of a source file's thumbnails (changes whenever the file does)
+    
+    A digest of the file's size and mtime_ns: stable across restarts and
+    workers, and computed from one stat call. Listings send it to the browser
+    so thumbnail URLs (&v=<version>) can be cached as immutable.
+    
+    Args:
+        file_path: Path to source file
+        file_stat: os.stat_result of file_path, if the caller already has it
+    """
+    if file_stat is None:
+        file_stat = file_path.stat()
+    key = f"{file_stat.st_size}:{file_stat.st_mtime_ns}"
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def thumbnail_etag(version: str, size: tuple) -> str:
+    """Strong ETag of one thumbnail size of a source file version"""
+    return f"{version}-{size[0]}x{size[1]}"
+
+
+def _thumbnail_path_hash(file_path: Path) -> str:
+    """Per-source-file prefix of thumbnail cache names"""
+    return hashlib.md5(str(file_path).encode()).hexdigest()
+
+
+def invalidate_thumbnail_cache(file_path: Path) -> int:
+    """
+    Delete every cached thumbnail (all sizes) for a source file
+    
+    Returns:
+        Number of cache files removed
+    """
+    from config import BASE_DIR
+    
+    cache_dir = BASE_DIR / 'static' / 'cache' / 'thumbnails'
+    removed = 0
+    for cache_path in cache_dir.glob(f"{_thumbnail_path_hash(file_path)}_*.jpg"):
+        try:
+            cache_path.unlink()
+            removed += 1
+        except OSError as e:
+            logger.warning(f"Could not clear thumbnail cache {cache_path}: {e}")
+    if removed:
+        logger.debug(f"Cleared {removed} cached thumbnail(s) for {file_path}")
+    return removed
 
 
 def generate_image_thumbnail(image_path: Path, size: tuple = (120, 90)) -> bytes:
@@ -113,7 +164,8 @@ def generate_video_thumbnail(video_path: Path, size: tuple = (120, 90), time_sec
                 'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
                 '-of', 'default=noprint_wrappers=1:nokey=1', str(video_path)
             ]
-            probe_result = subprocess.run(probe_cmd, capture_output=True, timeout=5, text=True)
+            with subprocess_timer('ffprobe', 'thumbnail_probe'):
+                probe_result = subprocess.run(probe_cmd, capture_output=True, timeout=5, text=True)
             if probe_result.returncode == 0 and probe_result.stdout.strip():
                 duration_str = probe_result.stdout.strip()
                 try:
@@ -167,11 +219,12 @@ def generate_video_thumbnail(video_path: Path, size: tuple = (120, 90), time_sec
                 '-'
             ]
         
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            timeout=10
-        )
+        with subprocess_timer('ffmpeg', 'thumbnail'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                timeout=10
+            )
         
         if result.returncode != 0:
             error_msg = result.stderr.decode() if result.stderr else "Unknown FFmpeg error"
@@ -337,9 +390,12 @@ def get_thumbnail(file_path: Path, file_type: str, size: tuple = (120, 90), use_
         cache_path = get_thumbnail_cache_path(file_path, size)
         if cache_path.exists():
             try:
-                return cache_path.read_bytes()
+                data = cache_path.read_bytes()
+                record_cache('thumbnail', hit=True)
+                return data
             except Exception as e:
                 logger.warning(f"Error reading cache: {e}")
+        record_cache('thumbnail', hit=False)
     
     # Generate thumbnail
     if file_type in ('mov', 'mp4'):
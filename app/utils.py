@@ -85,11 +85,43 @@ def parse_time_points(time_input):
     return sorted(time_points) if time_points else None
 
 
+def _media_output_candidates(input_path: Path, output_base: Path, new_extension: str):
+    """Output paths for an input in order of preference: <stem><ext>, then <stem>_1<ext>, <stem>_2<ext>, ..."""
+    from config import INPUT_FOLDER
+    
+    input_file = Path(input_path)
+    
+    # Get relative path from INPUT_FOLDER
+    try:
+        relative_path = input_file.relative_to(INPUT_FOLDER)
+    except ValueError:
+        # If file is not in INPUT_FOLDER, just use filename
+        output_dir = output_base
+    else:
+        # Preserve subfolder structure
+        parent_folders = relative_path.parent
+        if parent_folders and str(parent_folders) != '.':
+            output_dir = output_base / parent_folders
+        else:
+            output_dir = output_base
+        
+        output_dir.mkdir(parents=True, exist_ok=True)
+    
+    yield output_dir / f"{input_file.stem}{new_extension}"
+    counter = 1
+    while True:
+        yield output_dir / f"{input_file.stem}_{counter}{new_extension}"
+        counter += 1
+
+
 def get_media_output_path(input_path: Path, output_base: Path, new_extension: str) -> Path:
     """
     Generate output path for media conversion, preserving subfolder structure.
     Handles duplicate files by adding suffix (_1, _2, etc.)
     
+    The path is only checked, not claimed: when several conversions run at
+    once use reserve_media_output_path instead.
+    
     Args:
         input_path: Path to input file
         output_base: Base output folder
@@ -103,41 +135,36 @@ def get_media_output_path(input_path: Path, output_base: Path, new_extension: st
         Output: /output/folder1/video.mp4
         If exists: /output/folder1/video_1.mp4
     """
-    from config import INPUT_FOLDER
-    
-    input_file = Path(input_path)
+    for output_path in _media_output_candidates(input_path, output_base, new_extension):
+        if not output_path.exists():
+            return output_path
+
+
+def reserve_media_output_path(input_path: Path, output_base: Path, new_extension: str) -> Path:
+    """
+    Like get_media_output_path, but claims the path by creating it (empty, O_CREAT|O_EXCL).
     
-    # Get relative path from INPUT_FOLDER
+    Safe when conversions run in parallel: two inputs with the same stem
+    (IMG.PNG and IMG.JPG) never get the same output. The converter overwrites
+    the placeholder; call release_media_output_path if it fails.
+    """
+    for output_path in _media_output_candidates(input_path, output_base, new_extension):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(output_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return output_path
+
+
+def release_media_output_path(output_path: Path) -> None:
+    """Remove a path claimed by reserve_media_output_path if nothing was written to it"""
     try:
-        relative_path = input_file.relative_to(INPUT_FOLDER)
-    except ValueError:
-        # If file is not in INPUT_FOLDER, just use filename
-        output_path = output_base / f"{input_file.stem}{new_extension}"
-    else:
-        # Preserve subfolder structure
-        parent_folders = relative_path.parent
-        if parent_folders and str(parent_folders) != '.':
-            output_dir = output_base / parent_folders
-        else:
-            output_dir = output_base
-        
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_path = output_dir / f"{input_file.stem}{new_extension}"
-    
-    # Handle duplicates
-    if output_path.exists():
-        counter = 1
-        while True:
-            if parent_folders and str(parent_folders) != '.':
-                new_path = output_base / parent_folders / f"{input_file.stem}_{counter}{new_extension}"
-            else:
-                new_path = output_base / f"{input_file.stem}_{counter}{new_extension}"
-            
-            if not new_path.exists():
-                return new_path
-            counter += 1
-    
-    return output_path
+        if output_path.stat().st_size == 0:
+            output_path.unlink()
+    except OSError:
+        pass
 
 
 def validate_input_path(file_path: str, input_folder: Path) -> tuple[bool, str]:
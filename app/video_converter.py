@@ -1,11 +1,14 @@
 """
 Video conversion module for converting MOV to MP4
 """
+import math
+import os
 import subprocess
 import logging
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import shutil
+from app.metrics import subprocess_timer
 
 logger = logging.getLogger('media_converter.video_converter')
 
@@ -31,7 +34,8 @@ def get_video_info(video_path: Path) -> Dict:
             'ffprobe', '-v', 'quiet', '-print_format', 'json',
             '-show_format', '-show_streams', str(video_path)
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        with subprocess_timer('ffprobe', 'video_info'):
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
         
         if result.returncode != 0:
             return {'error': 'Failed to get video info', 'stderr': result.stderr}
@@ -53,6 +57,7 @@ def get_video_info(video_path: Path) -> Dict:
             info['width'] = int(video_stream.get('width', 0))
             info['height'] = int(video_stream.get('height', 0))
             info['codec'] = video_stream.get('codec_name', 'unknown')
+            info['pix_fmt'] = video_stream.get('pix_fmt')
             # Calculate FPS from frame rate string (e.g., "30/1" = 30.0)
             fps_str = video_stream.get('r_frame_rate', '0/1')
             try:
@@ -83,11 +88,15 @@ def convert_mov_to_mp4(
     """
     Convert MOV to MP4 using FFmpeg
     
+    Settings containing 'target_size_mb' (the 'target_size' preset) use a
+    two-pass encode sized to fit; the result then also reports
+    target_video_bitrate_kbps, target_deviation_percent and within_target.
+    
     Args:
         input_path: Path to input MOV file
         output_path: Path to output MP4 file
-        quality_preset: 'low', 'medium', or 'high'
-        custom_settings: Optional dict with custom settings (bitrate, crf, scale, etc.)
+        quality_preset: 'low', 'medium', 'high', or 'target_size'
+        custom_settings: Optional dict with custom settings (bitrate, crf, scale, target_size_mb, etc.)
     
     Returns:
         Dict with success status, output_size, processing_time, etc.
@@ -122,6 +131,10 @@ def convert_mov_to_mp4(
     else:
         settings = VIDEO_QUALITY_PRESETS.get(quality_preset, VIDEO_QUALITY_PRESETS['medium'])
     
+    # Target size: two-pass encode at a bitrate derived from the duration
+    if settings.get('target_size_mb'):
+        return _convert_to_target_size(input_path, output_path, settings, start_time)
+    
     # Build FFmpeg command
     cmd = ['ffmpeg', '-i', str(input_path), '-y']  # -y to overwrite
     
@@ -158,12 +171,13 @@ def convert_mov_to_mp4(
     
     try:
         # Run FFmpeg
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1 hour timeout
-        )
+        with subprocess_timer('ffmpeg', 'convert'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=3600  # 1 hour timeout
+            )
         
         processing_time = time.time() - start_time
         
@@ -227,17 +241,364 @@ def convert_mov_to_mp4(
         }
 
 
+def compute_target_bitrate(target_size_mb: float, duration: float, audio_kbps: int = 128) -> int:
+    """
+    Video bitrate (kbps) that makes an encode of the given duration fit target_size_mb.
+    
+    The size budget minus container overhead and the audio track is spread
+    evenly over the duration. Clamped to VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS.
+    """
+    from config import VIDEO_TARGET_SIZE_OVERHEAD, VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS
+    
+    if duration <= 0:
+        raise ValueError('Duration must be > 0 to compute a target bitrate')
+    
+    budget_kbits = target_size_mb * 1024 * 1024 * 8 / 1000 * (1 - VIDEO_TARGET_SIZE_OVERHEAD)
+    video_kbps = budget_kbits / duration - audio_kbps
+    return max(int(video_kbps), VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS)
+
+
+def parse_bitrate_kbps(value, default: int = 128) -> int:
+    """
+    Bitrate in kbps from an FFmpeg-style value: '128k', '128 K', '1.5M' or plain bits per second.
+    
+    Values that cannot be parsed (or are not positive) give default, with a warning.
+    """
+    multipliers = {'': 0.001, 'k': 1, 'm': 1000}
+    text = str(value).strip().lower().replace(' ', '')
+    if text.endswith('bps'):
+        text = text[:-3]
+    unit = text[-1:] if text[-1:] in ('k', 'm') else ''
+    try:
+        kbps = float(text[:len(text) - len(unit)]) * multipliers[unit]
+    except ValueError:
+        kbps = 0
+    if not math.isfinite(kbps) or kbps < 1:
+        logger.warning(f"Unrecognised audio bitrate {value!r}; using {default}k")
+        return default
+    return int(round(kbps))
+
+
+def _convert_to_target_size(input_path: Path, output_path: Path, settings: Dict, start_time: float) -> Dict:
+    """Two-pass encode sized to settings['target_size_mb'] (see convert_mov_to_mp4)"""
+    import tempfile
+    import time
+    
+    target_size_mb = float(settings['target_size_mb'])
+    audio_kbps = parse_bitrate_kbps(settings.get('audio_bitrate', '128k'))
+    audio_bitrate = f'{audio_kbps}k'
+    
+    video_info = get_video_info(input_path)
+    if 'error' in video_info:
+        return {
+            'success': False,
+            'error': f'Failed to get video info: {video_info["error"]}',
+            'error_type': 'VideoInfoError'
+        }
+    duration = video_info.get('duration', 0)
+    if duration <= 0:
+        return {
+            'success': False,
+            'error': 'Cannot encode to a target size: video duration is unknown',
+            'error_type': 'VideoInfoError'
+        }
+    if not video_info.get('audio_codec'):
+        audio_kbps = 0
+    
+    video_kbps = compute_target_bitrate(target_size_mb, duration, audio_kbps)
+    source_kbps = video_info.get('bitrate', 0) // 1000
+    if source_kbps > 0:
+        # Never spend more bits than the source has; small inputs stay small
+        video_kbps = min(video_kbps, source_kbps)
+    
+    encode_args = ['-c:v', settings.get('codec', 'libx264'), '-b:v', f'{video_kbps}k']
+    if 'preset' in settings:
+        encode_args.extend(['-preset', settings['preset']])
+    if settings.get('scale'):
+        encode_args.extend(['-vf', f"scale={settings['scale']}:force_original_aspect_ratio=decrease"])
+    
+    try:
+        with tempfile.TemporaryDirectory(prefix='twopass_') as tmp:
+            passlog = str(Path(tmp) / 'ffmpeg2pass')
+            _run_ffmpeg(
+                ['ffmpeg', '-y', '-i', str(input_path)] + encode_args +
+                ['-pass', '1', '-passlogfile', passlog, '-an', '-f', 'null', os.devnull],
+                'target-size pass 1'
+            )
+            _run_ffmpeg(
+                ['ffmpeg', '-y', '-i', str(input_path)] + encode_args +
+                ['-pass', '2', '-passlogfile', passlog, '-c:a', 'aac', '-b:a', audio_bitrate,
+                 '-movflags', '+faststart', str(output_path)],
+                'target-size pass 2'
+            )
+    except RuntimeError as e:
+        processing_time = time.time() - start_time
+        logger.error(str(e))
+        return {
+            'success': False,
+            'error': str(e),
+            'error_type': 'FFmpegError',
+            'processing_time': processing_time
+        }
+    except subprocess.TimeoutExpired:
+        processing_time = time.time() - start_time
+        logger.error(f"FFmpeg two-pass encode timed out after {processing_time:.2f} seconds")
+        return {
+            'success': False,
+            'error': 'Conversion timed out (exceeded 1 hour)',
+            'error_type': 'Timeout',
+            'processing_time': processing_time
+        }
+    
+    processing_time = time.time() - start_time
+    if not output_path.exists():
+        return {
+            'success': False,
+            'error': 'Output file was not created',
+            'error_type': 'OutputFileNotFound',
+            'processing_time': processing_time
+        }
+    
+    output_size = output_path.stat().st_size
+    input_size = input_path.stat().st_size
+    reduction_percent = round((1 - output_size / input_size) * 100, 2) if input_size > 0 else 0
+    target_bytes = target_size_mb * 1024 * 1024
+    deviation_percent = round((output_size - target_bytes) / target_bytes * 100, 2)
+    
+    logger.info(f"Target-size conversion: {input_path.name} -> {output_path.name} "
+               f"({output_size / (1024*1024):.2f}MB for {target_size_mb}MB target, "
+               f"{deviation_percent:+}% at {video_kbps}kbps)")
+    
+    return {
+        'success': True,
+        'output_path': str(output_path),
+        'output_size': output_size,
+        'output_size_mb': round(output_size / (1024 * 1024), 2),
+        'input_size': input_size,
+        'input_size_mb': round(input_size / (1024 * 1024), 2),
+        'reduction_percent': reduction_percent,
+        'processing_time': round(processing_time, 2),
+        'target_size_mb': target_size_mb,
+        'target_video_bitrate_kbps': video_kbps,
+        'target_deviation_percent': deviation_percent,
+        'within_target': output_size <= target_bytes
+    }
+
+
+def get_keyframe_times(video_path: Path, intervals: Optional[List[Tuple[float, float]]] = None) -> List[float]:
+    """
+    List keyframe timestamps of the first video stream using FFprobe.
+    
+    Reads packet flags only (no decoding), so this is cheap even for long files.
+    
+    Args:
+        video_path: Path to video file
+        intervals: Optional list of (start, end) seconds to restrict the scan to
+    
+    Returns:
+        Sorted list of keyframe times in seconds (empty list on failure)
+    """
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0']
+    if intervals:
+        read_intervals = ','.join(f"{max(0.0, a):.3f}%{b:.3f}" for a, b in intervals)
+        cmd.extend(['-read_intervals', read_intervals])
+    cmd.extend(['-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', str(video_path)])
+    
+    try:
+        with subprocess_timer('ffprobe', 'keyframes'):
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Keyframe probe failed for {video_path}: {e}")
+        return []
+    
+    if result.returncode != 0:
+        logger.warning(f"Keyframe probe failed for {video_path}: {result.stderr}")
+        return []
+    
+    keyframes = set()
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2 or not parts[1].startswith('K'):
+            continue
+        try:
+            keyframes.add(float(parts[0]))
+        except ValueError:
+            continue
+    
+    return sorted(keyframes)
+
+
+def _run_ffmpeg(cmd: List[str], label: str) -> subprocess.CompletedProcess:
+    """Run an FFmpeg command, raising RuntimeError with stderr on failure"""
+    logger.debug(f"FFmpeg {label} command: {' '.join(cmd)}")
+    with subprocess_timer('ffmpeg', label):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
+    if result.returncode != 0:
+        raise RuntimeError(f"FFmpeg {label} failed: {result.stderr or result.stdout or 'Unknown FFmpeg error'}")
+    return result
+
+
+def _stream_copy_trim(input_path: Path, output_path: Path, start_time: float, duration_seconds: float):
+    """Cut [start_time, start_time + duration) without re-encoding (input-side seek)"""
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f"{start_time:.3f}",
+        '-i', str(input_path),
+        '-t', f"{duration_seconds:.3f}",
+        '-map', '0:v:0', '-map', '0:a?',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart',
+        str(output_path)
+    ]
+    _run_ffmpeg(cmd, 'stream-copy trim')
+
+
+def _smart_cut_trim(
+    input_path: Path,
+    output_path: Path,
+    start_time: float,
+    end_time: float,
+    first_keyframe: float,
+    last_keyframe: float,
+    video_info: Dict
+):
+    """
+    Frame-accurate trim that only re-encodes the partial GOPs at each boundary.
+    
+    Video is cut as head (re-encoded, start -> first keyframe), middle (stream-copied,
+    first keyframe -> last keyframe) and tail (re-encoded, last keyframe -> end).
+    The pieces are joined as MPEG-TS so each carries its own SPS/PPS, then muxed
+    with the audio for the range (re-encoded to AAC, which is cheap).
+    
+    Each piece boundary sits on a keyframe, so its seek and duration are kept half a
+    frame inside the piece: an input seek with ``-c:v copy`` starts at the keyframe at
+    or before the seek point, and one landing a rounding error short of the first
+    keyframe would copy the whole previous GOP again.
+    """
+    import tempfile
+    
+    fps = video_info.get('fps') or 0
+    half_frame = 0.5 / fps if fps > 0 else 0.005
+    
+    encode_args = [
+        '-c:v', 'libx264', '-preset', 'fast', '-crf', '18',
+        '-pix_fmt', video_info.get('pix_fmt') or 'yuv420p',
+    ]
+    
+    with tempfile.TemporaryDirectory(prefix='trim_') as tmp:
+        tmp_dir = Path(tmp)
+        pieces = []
+        
+        # (name, start, end, seek, duration, re-encode)
+        segments = [
+            ('head', start_time, first_keyframe,
+             start_time, first_keyframe - start_time - half_frame, True),
+            ('middle', first_keyframe, last_keyframe,
+             first_keyframe + half_frame, last_keyframe - first_keyframe - 2 * half_frame, False),
+            ('tail', last_keyframe, end_time,
+             last_keyframe - half_frame, end_time - last_keyframe + half_frame, True),
+        ]
+        for name, seg_start, seg_end, seek, seg_duration, reencode in segments:
+            if seg_end - seg_start <= 0.001:
+                continue
+            piece = tmp_dir / f"{name}.ts"
+            cmd = [
+                'ffmpeg', '-y',
+                '-ss', f"{seek:.6f}",
+                '-i', str(input_path),
+                '-t', f"{seg_duration:.6f}",
+                '-map', '0:v:0', '-an',
+            ]
+            cmd.extend(encode_args if reencode else ['-c:v', 'copy'])
+            cmd.extend(['-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts', str(piece)])
+            _run_ffmpeg(cmd, f'smart-cut {name}')
+            pieces.append(piece)
+        
+        cmd = [
+            'ffmpeg', '-y',
+            '-i', 'concat:' + '|'.join(str(p) for p in pieces),
+            '-ss', f"{start_time:.3f}",
+            '-i', str(input_path),
+            '-t', f"{end_time - start_time:.3f}",
+            '-map', '0:v:0', '-map', '1:a?',
+            '-c:v', 'copy',
+            '-c:a', 'aac', '-b:a', '128k',
+            '-shortest',
+            '-movflags', '+faststart',
+            str(output_path)
+        ]
+        _run_ffmpeg(cmd, 'smart-cut mux')
+
+
+def _plan_fast_trim(
+    input_path: Path,
+    start_time: float,
+    end_time: float,
+    frame_accurate: bool,
+    video_info: Dict
+) -> Dict:
+    """
+    Decide how to satisfy a fast trim request.
+    
+    Returns:
+        Dict with 'mode' ('copy', 'smart' or 'reencode') plus the cut points to use
+    """
+    from config import TRIM_KEYFRAME_TOLERANCE, TRIM_KEYFRAME_SEARCH_WINDOW
+    
+    window = TRIM_KEYFRAME_SEARCH_WINDOW
+    keyframes = get_keyframe_times(
+        input_path,
+        [(start_time - window, start_time + window), (end_time - window, end_time)]
+    )
+    if not keyframes:
+        return {'mode': 'reencode', 'reason': 'no keyframe information'}
+    
+    at_or_before_start = [k for k in keyframes if k <= start_time + TRIM_KEYFRAME_TOLERANCE]
+    if at_or_before_start:
+        snap = at_or_before_start[-1]
+        if not frame_accurate or start_time - snap <= TRIM_KEYFRAME_TOLERANCE:
+            # Stream copy: the output starts at the keyframe, so report that as the start
+            return {'mode': 'copy', 'start': snap, 'end': end_time}
+    
+    # Frame-accurate cut needed: smart cut only works when the copied GOPs
+    # can be spliced with libx264 output
+    if video_info.get('codec') != 'h264':
+        return {'mode': 'reencode', 'reason': f"smart cut unsupported for codec {video_info.get('codec')}"}
+    
+    first_keyframe = next((k for k in keyframes if k >= start_time), None)
+    last_keyframe = next((k for k in reversed(keyframes) if k <= end_time), None)
+    if first_keyframe is None or last_keyframe is None or last_keyframe <= first_keyframe:
+        return {'mode': 'reencode', 'reason': 'range shorter than one GOP'}
+    
+    return {
+        'mode': 'smart',
+        'start': start_time,
+        'end': end_time,
+        'first_keyframe': first_keyframe,
+        'last_keyframe': last_keyframe,
+    }
+
+
 def trim_video(
     input_path: Path,
     output_path: Path,
     start_time: float,
     end_time: float,
     quality_preset: str = 'medium',
-    custom_settings: Optional[Dict] = None
+    custom_settings: Optional[Dict] = None,
+    fast: bool = False,
+    frame_accurate: bool = False
 ) -> Dict:
     """
     Trim video to specified time range using FFmpeg
     
+    By default the range is re-encoded with the quality preset. With ``fast=True``
+    the video is stream-copied (``-c copy``) from the keyframe at or before the
+    start point; quality settings are not applied in that case. If
+    ``frame_accurate`` is also set and the start point is not near a keyframe,
+    only the boundary GOPs are re-encoded (smart cut) and the rest is copied.
+    
     Args:
         input_path: Path to input video file
         output_path: Path to output video file
@@ -245,9 +606,12 @@ def trim_video(
         end_time: End time in seconds
         quality_preset: 'low', 'medium', or 'high'
         custom_settings: Optional dict with custom settings
+        fast: Stream-copy instead of re-encoding where possible
+        frame_accurate: With fast, fall back to a smart cut rather than snapping
+            the start to the previous keyframe
     
     Returns:
-        Dict with success status, output_size, processing_time, etc.
+        Dict with success status, output_size, processing_time, mode, etc.
     """
     import time
     start_time_processing = time.time()
@@ -308,14 +672,36 @@ def trim_video(
     else:
         settings = VIDEO_QUALITY_PRESETS.get(quality_preset, VIDEO_QUALITY_PRESETS['medium'])
     
+    if fast:
+        plan = _plan_fast_trim(input_path, start_time, end_time, frame_accurate, video_info)
+        if plan['mode'] != 'reencode':
+            try:
+                if plan['mode'] == 'copy':
+                    _stream_copy_trim(input_path, output_path, plan['start'], plan['end'] - plan['start'])
+                else:
+                    _smart_cut_trim(
+                        input_path, output_path, plan['start'], plan['end'],
+                        plan['first_keyframe'], plan['last_keyframe'], video_info
+                    )
+            except (RuntimeError, subprocess.TimeoutExpired) as e:
+                logger.warning(f"Fast trim ({plan['mode']}) failed, falling back to re-encode: {e}")
+            else:
+                processing_time = time.time() - start_time_processing
+                if output_path.exists():
+                    return _trim_result(
+                        input_path, output_path, plan['start'], plan['end'],
+                        processing_time, plan['mode']
+                    )
+        else:
+            logger.info(f"Fast trim not possible for {input_path.name} ({plan.get('reason')}), re-encoding")
+    
     # Calculate duration
     duration_seconds = end_time - start_time
     
     # Build FFmpeg command
-    cmd = ['ffmpeg', '-i', str(input_path), '-y']  # -y to overwrite
-    
-    # Trim: use -ss (start) and -t (duration) for accurate trimming
-    cmd.extend(['-ss', str(start_time)])
+    # Trim: -ss before -i seeks on the input (no decoding of the prefix); with
+    # re-encoding this is still frame-accurate. -t is the duration.
+    cmd = ['ffmpeg', '-y', '-ss', str(start_time), '-i', str(input_path)]  # -y to overwrite
     cmd.extend(['-t', str(duration_seconds)])
     
     # Video codec
@@ -341,9 +727,6 @@ def trim_video(
     # Audio codec (preserve audio)
     cmd.extend(['-c:a', 'aac', '-b:a', '128k'])
     
-    # Avoid re-encoding if possible (copy codec for faster processing)
-    # But we'll re-encode to ensure compatibility
-    
     # Output file
     cmd.append(str(output_path))
     
@@ -352,12 +735,13 @@ def trim_video(
     
     try:
         # Run FFmpeg
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1 hour timeout
-        )
+        with subprocess_timer('ffmpeg', 'trim'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=3600  # 1 hour timeout
+            )
         
         processing_time = time.time() - start_time_processing
         
@@ -375,24 +759,7 @@ def trim_video(
         
         # Get output file size
         if output_path.exists():
-            output_size = output_path.stat().st_size
-            input_size = input_path.stat().st_size
-            reduction_percent = round((1 - output_size / input_size) * 100, 2) if input_size > 0 else 0
-            
-            logger.info(f"Trim successful: {input_path.name} -> {output_path.name} "
-                       f"({start_time}s-{end_time}s, {input_size / (1024*1024):.2f}MB -> {output_size / (1024*1024):.2f}MB)")
-            
-            return {
-                'success': True,
-                'output_path': str(output_path),
-                'output_size': output_size,
-                'output_size_mb': round(output_size / (1024 * 1024), 2),
-                'input_size': input_size,
-                'input_size_mb': round(input_size / (1024 * 1024), 2),
-                'reduction_percent': reduction_percent,
-                'processing_time': round(processing_time, 2),
-                'trimmed_duration': duration_seconds
-            }
+            return _trim_result(input_path, output_path, start_time, end_time, processing_time, 'reencode')
         else:
             return {
                 'success': False,
@@ -421,6 +788,37 @@ def trim_video(
         }
 
 
+def _trim_result(
+    input_path: Path,
+    output_path: Path,
+    start_time: float,
+    end_time: float,
+    processing_time: float,
+    mode: str
+) -> Dict:
+    """Build the success result for a completed trim"""
+    output_size = output_path.stat().st_size
+    input_size = input_path.stat().st_size
+    reduction_percent = round((1 - output_size / input_size) * 100, 2) if input_size > 0 else 0
+    
+    logger.info(f"Trim successful ({mode}): {input_path.name} -> {output_path.name} "
+               f"({start_time}s-{end_time}s, {input_size / (1024*1024):.2f}MB -> {output_size / (1024*1024):.2f}MB)")
+    
+    return {
+        'success': True,
+        'output_path': str(output_path),
+        'output_size': output_size,
+        'output_size_mb': round(output_size / (1024 * 1024), 2),
+        'input_size': input_size,
+        'input_size_mb': round(input_size / (1024 * 1024), 2),
+        'reduction_percent': reduction_percent,
+        'processing_time': round(processing_time, 2),
+        'trimmed_duration': end_time - start_time,
+        'start_time': start_time,
+        'mode': mode
+    }
+
+
 def crop_video(
     input_path: Path,
     output_path: Path,
@@ -560,12 +958,13 @@ def crop_video(
     
     try:
         # Run FFmpeg
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1 hour timeout
-        )
+        with subprocess_timer('ffmpeg', 'crop'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=3600  # 1 hour timeout
+            )
         
         processing_time = time.time() - start_time_processing
         
@@ -0,0 +1,3 @@
+"""
+Benchmark suite for the media hot paths (see benchmarks/run.py)
+"""
@@ -0,0 +1,201 @@
+"""
+Benchmark cases for the media hot paths
+
+Each case is registered with @case(name) and receives the Fixtures; it
+returns a Bench whose run() is what gets timed. before() runs ahead of every
+timed round without being timed (e.g. emptying a cache for a cold run), and
+cleanup() once after the last round.
+"""
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from benchmarks.fixtures import Fixtures
+
+
+@dataclass
+class Bench:
+    run: Callable[[], object]
+    before: Optional[Callable[[], None]] = None
+    cleanup: Optional[Callable[[], None]] = None
+
+
+CASES: Dict[str, Callable[[Fixtures], Bench]] = {}
+
+
+def case(name: str):
+    """Register a benchmark case under name (group.case)"""
+    def decorator(func):
+        CASES[name] = func
+        return func
+    return decorator
+
+
+def _scratch_dir() -> Path:
+    return Path(tempfile.mkdtemp(prefix='v2p_bench_'))
+
+
+def _removing(path: Path) -> Callable[[], None]:
+    return lambda: shutil.rmtree(path, ignore_errors=True)
+
+
+# ============================================================================
+# Frames and thumbnails
+# ============================================================================
+
+@case('frames.extract_frames_at_times')
+def extract_frames(fx: Fixtures) -> Bench:
+    """Ten frames spread over a 10 s 720p clip"""
+    from app.video_processor import extract_frames_at_times
+    video = fx.video(seconds=10, size=(1280, 720))
+    out_dir = _scratch_dir()
+    time_points = [0.5 + i * 0.95 for i in range(10)]
+    return Bench(lambda: extract_frames_at_times(video, time_points, out_dir, quality=95),
+                 cleanup=_removing(out_dir))
+
+
+def _thumbnail_bench(fx: Fixtures, warm: bool) -> Bench:
+    from app.thumbnail_generator import get_thumbnail, invalidate_thumbnail_cache
+    image = fx.image((4000, 3000))
+    size = (640, 480)
+    if warm:
+        get_thumbnail(image, 'jpg', size)
+    before = None if warm else (lambda: invalidate_thumbnail_cache(image))
+    return Bench(lambda: get_thumbnail(image, 'jpg', size), before=before,
+                 cleanup=lambda: invalidate_thumbnail_cache(image))
+
+
+@case('thumbnail.get_thumbnail_cold')
+def thumbnail_cold(fx: Fixtures) -> Bench:
+    """640x480 thumbnail of a 12 MP JPEG, generated and written to the cache"""
+    return _thumbnail_bench(fx, warm=False)
+
+
+@case('thumbnail.get_thumbnail_warm')
+def thumbnail_warm(fx: Fixtures) -> Bench:
+    """Same thumbnail served from the cache"""
+    return _thumbnail_bench(fx, warm=True)
+
+
+# ============================================================================
+# Media scanners (10k-file learner tree)
+# ============================================================================
+
+@case('scan.media_file_scanner')
+def scan_media_converter(fx: Fixtures) -> Bench:
+    from app.media_file_scanner import scan_media_files
+    learner_dir = fx.file_tree() / 'Qual' / 'Learner'
+    return Bench(lambda: scan_media_files(str(learner_dir)))
+
+
+@case('scan.image_scanner')
+def scan_images(fx: Fixtures) -> Bench:
+    from app.image_scanner import scan_image_files
+    learner_dir = fx.file_tree() / 'Qual' / 'Learner'
+    return Bench(lambda: scan_image_files(str(learner_dir)))
+
+
+@case('scan.file_scanner_mp4')
+def scan_mp4(fx: Fixtures) -> Bench:
+    from app.file_scanner import scan_mp4_files
+    learner_dir = fx.file_tree() / 'Qual' / 'Learner'
+    return Bench(lambda: scan_mp4_files(str(learner_dir)))
+
+
+@case('scan.observation_report_scanner')
+def scan_observation_media(fx: Fixtures) -> Bench:
+    """Includes the per-file metadata probe (image header, video properties)"""
+    from app.observation_report_scanner import scan_media_files
+    root = fx.file_tree()
+    return Bench(lambda: scan_media_files('Qual', 'Learner', root))
+
+
+# ============================================================================
+# Image conversion and documents
+# ============================================================================
+
+@case('convert.convert_image_to_jpeg')
+def convert_jpeg(fx: Fixtures) -> Bench:
+    """12 MP JPEG downscaled to 1920x1080"""
+    from app.image_converter import convert_image_to_jpeg
+    image = fx.image((4000, 3000))
+    out_dir = _scratch_dir()
+    return Bench(lambda: convert_image_to_jpeg(image, out_dir / 'out.jpg', resolution=(1920, 1080), quality=80),
+                 cleanup=_removing(out_dir))
+
+
+@case('convert.convert_png_to_jpeg')
+def convert_png(fx: Fixtures) -> Bench:
+    """1080p PNG to JPEG at its own size"""
+    from app.image_converter import convert_image_to_jpeg
+    image = fx.image((1920, 1080), fmt='PNG')
+    out_dir = _scratch_dir()
+    return Bench(lambda: convert_image_to_jpeg(image, out_dir / 'out.jpg', quality=80),
+                 cleanup=_removing(out_dir))
+
+
+@case('documents.create_image_pdf')
+def image_pdf(fx: Fixtures) -> Bench:
+    """12 1080p images, 4 per page"""
+    from app.image_pdf_generator import create_image_pdf
+    images = fx.images(12)
+    names = [p.stem for p in images]
+    out_dir = _scratch_dir()
+    return Bench(lambda: create_image_pdf([str(p) for p in images], names, str(out_dir / 'images.pdf'),
+                                          images_per_page=4),
+                 cleanup=_removing(out_dir))
+
+
+@case('documents.create_image_docx')
+def image_docx(fx: Fixtures) -> Bench:
+    """12 1080p images, 4 per page"""
+    from app.image_docx_generator import create_image_docx
+    images = fx.images(12)
+    names = [p.stem for p in images]
+    out_dir = _scratch_dir()
+    return Bench(lambda: create_image_docx([str(p) for p in images], names, str(out_dir / 'images.docx'),
+                                           images_per_page=4),
+                 cleanup=_removing(out_dir))
+
+
+@case('documents.create_observation_docx')
+def observation_docx(fx: Fixtures) -> Bench:
+    """40-section report with 8 placeholders of 2 images each"""
+    from app.observation_docx_generator import create_observation_docx
+    text = fx.observation_text()
+    assignments = fx.observation_assignments()
+    out_dir = _scratch_dir()
+    return Bench(lambda: create_observation_docx(text, assignments, out_dir / 'observation.docx'),
+                 cleanup=_removing(out_dir))
+
+
+@case('ac_matrix.extract_ac_references_with_context')
+def ac_references(fx: Fixtures) -> Bench:
+    from app.ac_matrix_analyzer import extract_ac_references_with_context
+    text = fx.observation_text()
+    return Bench(lambda: extract_ac_references_with_context(text))
+
+
+# ============================================================================
+# Deface
+# ============================================================================
+
+@case('deface.apply_manual_deface')
+def manual_deface(fx: Fixtures) -> Bench:
+    """60 mixed blur/solid/mosaic areas on a 1080p JPEG"""
+    import numpy as np
+    from app.deface_processor import apply_manual_deface
+    image = fx.image((1920, 1080))
+    rng = np.random.default_rng(0)
+    methods = ('blur', 'solid', 'mosaic')
+    areas = []
+    for i in range(60):
+        w, h = (int(v) for v in rng.integers(60, 240, size=2))
+        areas.append({'x': int(rng.integers(0, 1920 - w)), 'y': int(rng.integers(0, 1080 - h)),
+                      'width': w, 'height': h, 'shape': 'ellipse' if i % 4 == 0 else 'rectangular',
+                      'method': methods[i % 3]})
+    out_dir = _scratch_dir()
+    return Bench(lambda: apply_manual_deface(image, out_dir / 'manual.jpg', areas),
+                 cleanup=_removing(out_dir))
@@ -0,0 +1,154 @@
+"""
+Synthetic benchmark fixtures
+
+Everything is generated locally from fixed seeds, so two runs (or two
+machines) measure the same inputs. Fixtures are written once under the
+fixtures directory and reused by later runs; the file names carry the
+parameters, so changing a size generates a new fixture instead of reusing a
+stale one.
+"""
+import io
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Extension mix of a learner folder (photos dominate, then screenshots and clips)
+TREE_MIX = (('.jpg', 0.55), ('.png', 0.15), ('.jpeg', 0.05), ('.mp4', 0.15), ('.mov', 0.10))
+
+
+def _smooth_rgb(width: int, height: int, seed: int) -> np.ndarray:
+    """Upscaled noise: compresses like a photo, unlike pure noise"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, size=(max(1, height // 40), max(1, width // 40), 3), dtype=np.uint8)
+    return np.asarray(Image.fromarray(small).resize((width, height), Image.Resampling.BILINEAR))
+
+
+class Fixtures:
+    """
+    Lazily generated benchmark inputs under one directory.
+
+    Args:
+        directory: Where fixtures are kept between runs
+        scale: Multiplier for file counts and text sizes (1.0 = the reference
+            profile; smaller values are for smoke runs)
+    """
+
+    def __init__(self, directory: Path, scale: float = 1.0):
+        self.directory = Path(directory).resolve()
+        self.scale = scale
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def scaled(self, count: int) -> int:
+        return max(1, int(count * self.scale))
+
+    def image(self, size: Tuple[int, int] = (1920, 1080), fmt: str = 'JPEG', seed: int = 0) -> Path:
+        """A photo-like JPEG or PNG of the given size"""
+        suffix = '.png' if fmt == 'PNG' else '.jpg'
+        path = self.directory / 'images' / f'{size[0]}x{size[1]}_{seed}{suffix}'
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            img = Image.fromarray(_smooth_rgb(size[0], size[1], seed))
+            img.save(path, fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+        return path
+
+    def images(self, count: int, size: Tuple[int, int] = (1920, 1080)) -> List[Path]:
+        return [self.image(size, seed=i) for i in range(count)]
+
+    def video(self, seconds: int = 10, size: Tuple[int, int] = (1280, 720), fps: int = 25) -> Path:
+        """An H.264 test-pattern MP4 (ffmpeg testsrc2), or an MPEG-4 one written by OpenCV without ffmpeg"""
+        path = self.directory / 'videos' / f'testsrc_{size[0]}x{size[1]}_{fps}fps_{seconds}s.mp4'
+        if path.exists():
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if shutil.which('ffmpeg'):
+            subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'lavfi',
+                 '-i', f'testsrc2=size={size[0]}x{size[1]}:rate={fps}:duration={seconds}',
+                 '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', str(path)],
+                check=True, capture_output=True)
+            return path
+        import cv2
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+        base = _smooth_rgb(size[0], size[1], 0)
+        for i in range(seconds * fps):
+            # Moving content so frames differ (seeking has to decode real data)
+            writer.write(np.roll(base, i * 8, axis=1))
+        writer.release()
+        return path
+
+    def file_tree(self, count: int = 10000, folders: int = 100) -> Path:
+        """
+        A qualification/learner tree with count media files spread over nested folders.
+
+        Images are copies of one tiny valid JPEG/PNG and videos copies of one
+        short clip, so scanners that open files (metadata probes) still work.
+        Layout: <root>/Qual/Learner/<folder>/<sub>/<name>
+        """
+        count = self.scaled(count)
+        root = self.directory / f'tree_{count}'
+        learner_dir = root / 'Qual' / 'Learner'
+        marker = root / '.complete'
+        if marker.exists():
+            return root
+        if root.exists():
+            shutil.rmtree(root)
+        contents = {
+            '.jpg': self._encoded((64, 48), 'JPEG'),
+            '.jpeg': self._encoded((64, 48), 'JPEG'),
+            '.png': self._encoded((64, 48), 'PNG'),
+            '.mp4': self.video(seconds=1, size=(64, 48), fps=5).read_bytes(),
+        }
+        contents['.mov'] = contents['.mp4']
+        rng = np.random.default_rng(0)
+        extensions = [ext for ext, _ in TREE_MIX]
+        weights = np.array([w for _, w in TREE_MIX])
+        picks = rng.choice(len(extensions), size=count, p=weights / weights.sum())
+        for i, pick in enumerate(picks):
+            ext = extensions[pick]
+            folder = learner_dir / f'folder_{i % folders:03d}' / f'sub_{(i // folders) % 3}'
+            folder.mkdir(parents=True, exist_ok=True)
+            (folder / f'media_{i:05d}{ext}').write_bytes(contents[ext])
+        marker.touch()
+        return root
+
+    @staticmethod
+    def _encoded(size: Tuple[int, int], fmt: str) -> bytes:
+        buffer = io.BytesIO()
+        Image.fromarray(_smooth_rgb(size[0], size[1], 1)).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def observation_text(self, sections: int = 40, paragraphs: int = 12, placeholders: int = 8) -> str:
+        """
+        A long observation report: SECTION headers, paragraphs citing ACs and {{ImageN}} placeholders.
+        """
+        sections = self.scaled(sections)
+        rng = np.random.default_rng(0)
+        words = ('learner', 'demonstrated', 'safe', 'working', 'practice', 'site', 'induction', 'equipment',
+                 'checked', 'assessor', 'observed', 'task', 'completed', 'materials', 'risk', 'assessment',
+                 'explained', 'procedure', 'tools', 'correctly', 'scaffold', 'method', 'statement')
+        lines = []
+        placeholder = 0
+        for s in range(1, sections + 1):
+            lines.append(f'SECTION {s} - Observed activity {s}')
+            for p in range(paragraphs):
+                sentence = ' '.join(rng.choice(words, size=40))
+                ac = f'{rng.integers(1, 9)}.{rng.integers(1, 9)}'
+                lines.append(f'{sentence.capitalize()}, covering AC {ac} and {ac}.')
+                if p == 0 and placeholder < placeholders:
+                    placeholder += 1
+                    lines.append(f'{{{{Image{placeholder}}}}}')
+            lines.append('')
+        return '\n'.join(lines)
+
+    def observation_assignments(self, placeholders: int = 8, per_placeholder: int = 2) -> Dict[str, list]:
+        """Media for the {{ImageN}} placeholders of observation_text (placeholder keys are lower case)"""
+        images = self.images(placeholders * per_placeholder, size=(1280, 960))
+        return {
+            f'image{n + 1}': [{'type': 'image', 'path': str(path), 'name': path.name}
+                              for path in images[n * per_placeholder:(n + 1) * per_placeholder]]
+            for n in range(placeholders)
+        }
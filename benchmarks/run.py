@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the media hot paths
+
+Runs the cases in benchmarks/cases.py on synthetic fixtures (generated once
+into benchmarks/.fixtures) and writes the timings, with the machine profile
+they were taken on, to benchmarks/results/<machine>/<commit>.json. Results
+of two commits on the same machine can then be compared for regressions.
+
+Usage:
+  python -m benchmarks.run                          # every case, results for HEAD
+  python -m benchmarks.run -k scan -k thumbnail     # cases whose name contains a pattern
+  python -m benchmarks.run --compare HEAD~1         # also compare with an earlier commit's results
+  python -m benchmarks.run --compare old.json --fail-on-regression
+  python -m benchmarks.run --scale 0.05 --repeat 1 --no-save   # smoke run
+"""
+import os
+
+# Pin the thread pools of OpenCV, OpenBLAS and OpenMP before they are imported, so timings
+# do not depend on the machine's core count
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import shutil  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+import traceback  # noqa: E402
+from datetime import datetime  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Dict, Iterable, List, Optional  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks.cases import CASES  # noqa: E402
+from benchmarks.fixtures import Fixtures  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / 'results'
+FIXTURES_DIR = BENCH_DIR / '.fixtures'
+RESULT_VERSION = 1
+PACKAGES = ('numpy', 'opencv-python', 'opencv-python-headless', 'Pillow', 'reportlab', 'python-docx')
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _first_line(cmd: List[str]) -> Optional[str]:
+    try:
+        output = subprocess.run(cmd, capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.splitlines()[0] if output else None
+
+
+def _cpu_model() -> str:
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def machine_profile(name: str) -> Dict:
+    """What the timings depend on besides the code: hardware, Python, libraries, ffmpeg, thread pinning"""
+    from importlib import metadata
+    packages = {}
+    for package in PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            continue
+    ffmpeg = None
+    if shutil.which('ffmpeg'):
+        ffmpeg = _first_line(['ffmpeg', '-version'])
+    return {
+        'name': name,
+        'platform': platform.platform(),
+        'cpu': _cpu_model(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'packages': packages,
+        'ffmpeg': ffmpeg,
+        'threads': {var: os.environ.get(var) for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                                                         'MKL_NUM_THREADS')},
+    }
+
+
+def select_cases(patterns: Iterable[str]) -> List[str]:
+    """Registered case names containing any of the patterns (all cases without patterns)"""
+    patterns = list(patterns)
+    return [name for name in CASES if not patterns or any(p in name for p in patterns)]
+
+
+def summarize(times: List[float]) -> Dict:
+    """Timing statistics in milliseconds"""
+    ms = [t * 1000 for t in times]
+    return {
+        'rounds': len(ms),
+        'min_ms': round(min(ms), 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'stdev_ms': round(statistics.stdev(ms), 3) if len(ms) > 1 else 0.0,
+        'max_ms': round(max(ms), 3),
+    }
+
+
+def run_case(name: str, fixtures: Fixtures, repeat: int, warmup: int) -> Dict:
+    """Set up one case, run it warmup + repeat times and summarise the timed rounds; errors are recorded"""
+    try:
+        bench = CASES[name](fixtures)
+    except Exception as e:
+        traceback.print_exc()
+        return {'error': f'setup: {e}'}
+    times = []
+    try:
+        for round_index in range(warmup + repeat):
+            if bench.before is not None:
+                bench.before()
+            start = time.perf_counter()
+            bench.run()
+            elapsed = time.perf_counter() - start
+            if round_index >= warmup:
+                times.append(elapsed)
+    except Exception as e:
+        traceback.print_exc()
+        return {'error': str(e)}
+    finally:
+        if bench.cleanup is not None:
+            bench.cleanup()
+    return summarize(times)
+
+
+def run_cases(names: List[str], fixtures: Fixtures, repeat: int = 5, warmup: int = 1,
+              echo: bool = False) -> Dict[str, Dict]:
+    results = {}
+    for name in names:
+        results[name] = run_case(name, fixtures, repeat, warmup)
+        if echo:
+            result = results[name]
+            summary = result.get('error') or f"median {result['median_ms']:.1f} ms (min {result['min_ms']:.1f})"
+            print(f'{name:<48} {summary}', flush=True)
+    return results
+
+
+def compare(current: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float = 0.10,
+            metric: str = 'median_ms') -> List[Dict]:
+    """
+    Per-case comparison of two result sets.
+
+    A case is a 'regression' when it got slower by more than threshold (a
+    fraction), an 'improvement' when it got faster by more than threshold.
+    """
+    rows = []
+    for name in sorted(set(current) | set(baseline)):
+        now, base = current.get(name, {}), baseline.get(name, {})
+        row = {'case': name, 'baseline_ms': base.get(metric), 'current_ms': now.get(metric), 'ratio': None}
+        if row['current_ms'] is None:
+            row['status'] = 'missing'
+        elif row['baseline_ms'] is None:
+            row['status'] = 'new'
+        else:
+            row['ratio'] = round(row['current_ms'] / row['baseline_ms'], 3) if row['baseline_ms'] else None
+            if row['ratio'] is None:
+                row['status'] = 'ok'
+            elif row['ratio'] > 1 + threshold:
+                row['status'] = 'regression'
+            elif row['ratio'] < 1 - threshold:
+                row['status'] = 'improvement'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def result_path(machine: str, commit: str) -> Path:
+    return RESULTS_DIR / machine / f'{commit}.json'
+
+
+def resolve_baseline(ref: str, machine: str) -> Path:
+    """A result file path, or a commit-ish whose results were saved for this machine"""
+    path = Path(ref)
+    if path.is_file():
+        return path
+    commit = _git('rev-parse', '--verify', f'{ref}^{{commit}}')
+    if commit is None:
+        raise SystemExit(f'No result file or commit {ref!r}')
+    path = result_path(machine, commit)
+    if not path.is_file():
+        raise SystemExit(f'No saved results for {ref} ({commit[:10]}) on machine {machine!r}: {path}')
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('-k', dest='patterns', action='append', default=[],
+                    help='Only cases whose name contains this (repeatable)')
+    ap.add_argument('--list', action='store_true', help='List the cases and exit')
+    ap.add_argument('--repeat', type=int, default=5, help='Timed rounds per case')
+    ap.add_argument('--warmup', type=int, default=1, help='Untimed rounds before the timed ones')
+    ap.add_argument('--scale', type=float, default=1.0,
+                    help='Fixture size multiplier (1.0 = reference profile, e.g. the 10k-file tree)')
+    ap.add_argument('--machine', default=platform.node() or 'local',
+                    help='Machine profile name; results are kept per machine')
+    ap.add_argument('--fixtures', type=Path, default=FIXTURES_DIR, help='Fixture directory')
+    ap.add_argument('--output', type=Path, default=None,
+                    help='Result file (default benchmarks/results/<machine>/<commit>.json)')
+    ap.add_argument('--no-save', action='store_true', help='Do not write a result file')
+    ap.add_argument('--compare', default=None, help='Result file or commit to compare with')
+    ap.add_argument('--threshold', type=float, default=0.10, help='Relative change reported as a regression')
+    ap.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on a regression')
+    args = ap.parse_args(argv)
+
+    if args.list:
+        for name, func in CASES.items():
+            print(f'{name:<48} {(func.__doc__ or "").strip()}')
+        return 0
+
+    names = select_cases(args.patterns)
+    if not names:
+        print('No cases match', file=sys.stderr)
+        return 2
+    baseline_path = resolve_baseline(args.compare, args.machine) if args.compare else None
+
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+    commit = _git('rev-parse', 'HEAD') or 'unknown'
+    dirty = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    fixtures = Fixtures(args.fixtures, scale=args.scale)
+    print(f'Commit {commit[:10]}{" (dirty)" if dirty else ""}, machine {args.machine}, '
+          f'{len(names)} case(s), {args.repeat} round(s) each, scale {args.scale}', flush=True)
+    results = run_cases(names, fixtures, repeat=args.repeat, warmup=args.warmup, echo=True)
+
+    document = {
+        'version': RESULT_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': machine_profile(args.machine),
+        'settings': {'repeat': args.repeat, 'warmup': args.warmup, 'scale': args.scale},
+        'results': results,
+    }
+    if not args.no_save:
+        output = args.output or result_path(args.machine, commit)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(document, indent=2) + '\n', encoding='utf-8')
+        print(f'Results: {output}')
+
+    status = 1 if any('error' in r for r in results.values()) else 0
+    if baseline_path is not None:
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+        if baseline.get('settings', {}).get('scale') != args.scale:
+            print(f"Warning: baseline was run at scale {baseline.get('settings', {}).get('scale')}")
+        # Only the cases run now (-k) are compared
+        baseline_results = {name: r for name, r in baseline.get('results', {}).items() if name in results}
+        rows = compare(results, baseline_results, threshold=args.threshold)
+        print(f"\nAgainst {baseline.get('commit', str(baseline_path))[:10]} (median, threshold {args.threshold:.0%})")
+        for row in rows:
+            base = '-' if row['baseline_ms'] is None else f"{row['baseline_ms']:.1f}"
+            now = '-' if row['current_ms'] is None else f"{row['current_ms']:.1f}"
+            ratio = '' if row['ratio'] is None else f"{row['ratio']:.2f}x"
+            print(f"{row['case']:<48} {base:>10} {now:>10} {ratio:>7}  {row['status']}")
+        if args.fail_on_regression and any(row['status'] == 'regression' for row in rows):
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 # Base directory
@@ -66,9 +67,28 @@ VIDEO_QUALITY_PRESETS = {
         'scale': None,  # Keep original resolution
         'codec': 'libx264',
         'preset': 'slow'
+    },
+    'target_size': {
+        # Two-pass encode at a bitrate computed from the probed duration so the
+        # output fits under target_size_mb (e.g. e-portfolio upload limits)
+        'target_size_mb': 50,
+        'scale': '1920:1080',
+        'codec': 'libx264',
+        'preset': 'medium',
+        'audio_bitrate': '128k'
     }
 }
 
+# Target-size encoding: fraction of the size budget reserved for container overhead
+VIDEO_TARGET_SIZE_OVERHEAD = 0.02
+# Target-size encoding: never go below this video bitrate (kbps), even if the target is then missed
+VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS = 100
+
+# Trim fast path: a cut point within this many seconds of a keyframe is snapped to it and stream-copied
+TRIM_KEYFRAME_TOLERANCE = 0.25
+# Trim fast path: seconds either side of each cut point to scan for keyframes (should exceed the longest GOP)
+TRIM_KEYFRAME_SEARCH_WINDOW = 10
+
 # Image Conversion Presets
 IMAGE_RESOLUTION_PRESETS = {
     'original': None,
@@ -83,6 +103,18 @@ IMAGE_QUALITY_PRESETS = {
     'high': 95      # Larger file, best quality
 }
 
+# Image conversion: worker processes for batch/job image conversion (env IMAGE_CONVERSION_WORKERS overrides)
+IMAGE_CONVERSION_WORKERS = int(os.environ.get('IMAGE_CONVERSION_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+# Image conversion: JPEG draft decoding keeps at least this multiple of the target size for the LANCZOS pass
+IMAGE_DRAFT_OVERSAMPLE = 2
+
+# Image rotation: 'lossless' (jpegtran DCT transform when available), 'exif' (rewrite the orientation
+# tag only; fastest, but relies on every consumer honouring EXIF) or 'reencode' (decode/rotate/re-encode)
+IMAGE_ROTATION_MODE = (os.environ.get('IMAGE_ROTATION_MODE') or 'lossless').strip()
+
+# Conversion manifest: (input fingerprint, settings) -> output, used to skip unchanged re-conversions
+CONVERSION_MANIFEST_FILE = BASE_DIR / 'data' / 'conversion_manifest.json'
+
 # Processing Settings
 MAX_CONCURRENT_CONVERSIONS = 2  # Process 2 files in parallel
 CONVERSION_TIMEOUT = 3600  # 1 hour timeout per file
@@ -93,15 +125,129 @@ DEFACE_VIDEO_TIMEOUT = int(os.environ.get('DEFACE_VIDEO_TIMEOUT', '600'))
 # Deface video: max videos processed in parallel (1 = sequential; 2–4 = faster for batches; use with care on CPU/GPU).
 DEFACE_MAX_CONCURRENT_VIDEOS = int(os.environ.get('DEFACE_MAX_CONCURRENT_VIDEOS', '1'))
 
+# Deface: /apply_deface runs as a background job; at most this many jobs process at once (others wait as 'pending').
+DEFACE_MAX_CONCURRENT_JOBS = int(os.environ.get('DEFACE_MAX_CONCURRENT_JOBS', '1'))
+
+# Deface: finished background jobs (and their results) are kept this long for status polling, in seconds.
+DEFACE_JOB_RETENTION_SECONDS = int(os.environ.get('DEFACE_JOB_RETENTION_SECONDS', '3600'))
+
 # Deface: optional ONNX execution provider (e.g. CUDAExecutionProvider for Nvidia GPU). Empty = let deface auto-select.
 DEFACE_EXECUTION_PROVIDER = (os.environ.get('DEFACE_EXECUTION_PROVIDER') or '').strip() or None
 
+# Deface images: 'inprocess' loads the CenterFace model once and reuses it across images; 'cli' spawns
+# one deface process per image (env DEFACE_IMAGE_ENGINE overrides). inprocess falls back to cli if deface
+# cannot be imported into the app's environment.
+DEFACE_IMAGE_ENGINE = (os.environ.get('DEFACE_IMAGE_ENGINE') or 'inprocess').strip()
+
+# Deface images (inprocess engine): model backend ('auto' prefers onnxruntime, else OpenCV DNN) and
+# number of images per detection batch
+DEFACE_ENGINE_BACKEND = (os.environ.get('DEFACE_ENGINE_BACKEND') or 'auto').strip()
+DEFACE_ENGINE_BATCH_SIZE = int(os.environ.get('DEFACE_ENGINE_BATCH_SIZE', '8'))
+# Deface images: worker threads per batch (env DEFACE_IMAGE_WORKERS overrides). 0 = one per core with the in-process
+# engine (inference itself runs one at a time); with the deface CLI, cores divided by the threads one inference uses
+DEFACE_IMAGE_WORKERS = int(os.environ.get('DEFACE_IMAGE_WORKERS', '0'))
+
+# Deface video: 'inprocess' runs our own pipeline on the shared engine (supports detection stride);
+# 'cli' runs one deface process per video (env DEFACE_VIDEO_ENGINE overrides)
+DEFACE_VIDEO_ENGINE = (os.environ.get('DEFACE_VIDEO_ENGINE') or 'inprocess').strip()
+
+# Deface video (inprocess): run face detection every Nth frame and track boxes in between
+# (1 = every frame, same as the CLI; env DEFACE_DETECTION_STRIDE overrides)
+DEFACE_DETECTION_STRIDE = int(os.environ.get('DEFACE_DETECTION_STRIDE', '1'))
+# Deface video (inprocess): largest stride accepted; frames between detections are buffered in memory
+DEFACE_DETECTION_STRIDE_MAX = 30
+# Deface video (inprocess): mean grey-level change (0-255) between frames that counts as a scene cut
+# and forces detection; 0 disables
+DEFACE_SCENE_CHANGE_THRESHOLD = 30.0
+# Deface video (inprocess): tracked (non-detected) boxes grow by this fraction of their size on each side
+DEFACE_TRACK_MARGIN = 0.15
+
+# Deface video (inprocess): worker processes for splitting one long video into keyframe-aligned segments
+# that are anonymized in parallel and joined without re-encoding (1 = off; env DEFACE_SEGMENT_WORKERS overrides)
+DEFACE_SEGMENT_WORKERS = int(os.environ.get('DEFACE_SEGMENT_WORKERS', str(max(1, (os.cpu_count() or 2) - 1))))
+# Deface video (inprocess): never make a segment shorter than this many seconds (shorter videos run whole)
+DEFACE_SEGMENT_MIN_SECONDS = 10
+
+# Deface: detections (per-frame boxes) are cached per file content + thresh/scale (+ video stride/tracking),
+# so re-running with only a different style skips face detection. Oldest entries are pruned past the size
+# limit in MB; 0 disables the cache.
+DEFACE_DETECTION_CACHE_DIR = BASE_DIR / 'data' / 'deface_detections'
+DEFACE_DETECTION_CACHE_MAX_MB = int(os.environ.get('DEFACE_DETECTION_CACHE_MAX_MB', '256'))
+
+# Deface sessions: persisted here so a restart keeps them (and their temp dirs) usable. A session expires
+# once unused for this many seconds, never while it is processing (env DEFACE_SESSION_TIMEOUT overrides).
+DEFACE_SESSION_STORE_FILE = BASE_DIR / 'data' / 'deface_sessions.json'
+DEFACE_SESSION_TIMEOUT = int(os.environ.get('DEFACE_SESSION_TIMEOUT', '3600'))
+# Session temp dirs are created here (env DEFACE_SESSION_TEMP_ROOT overrides); the reaper only sweeps this directory.
+# Keep it under MEDIA_X_ACCEL_TMP_ROOT when X-Accel-Redirect serves session files.
+DEFACE_SESSION_TEMP_ROOT = Path(os.environ.get('DEFACE_SESSION_TEMP_ROOT') or
+                                Path(tempfile.gettempdir()) / 'v2p_deface_sessions')
+# Disk quota in MB for all deface session temp dirs; least recently used sessions are evicted past it (0 = no quota)
+DEFACE_SESSION_DISK_QUOTA_MB = int(os.environ.get('DEFACE_SESSION_DISK_QUOTA_MB', '10240'))
+# Seconds between reaper passes (expired sessions, disk quota, orphaned session temp dirs); 0 disables the reaper
+DEFACE_SESSION_REAP_INTERVAL = int(os.environ.get('DEFACE_SESSION_REAP_INTERVAL', '300'))
+
 # Deface video: FFmpeg codec for output encoding. Default libx264; set to h264_nvenc for Nvidia GPU encoding (faster when available).
 DEFACE_FFMPEG_CODEC = (os.environ.get('DEFACE_FFMPEG_CODEC') or 'libx264').strip()
 
+# Media serving: bytes read per chunk when streaming Range (206) responses for video previews
+MEDIA_RANGE_CHUNK_SIZE = int(os.environ.get('MEDIA_RANGE_CHUNK_SIZE', str(256 * 1024)))
+# Media serving behind nginx: when on, file routes validate the path as usual and answer with an
+# X-Accel-Redirect to an internal nginx location (see nginx-config.conf), so nginx sends the bytes.
+# Off by default (env MEDIA_X_ACCEL_REDIRECT=1 turns it on). Files outside these roots are still sent by Flask.
+MEDIA_X_ACCEL_REDIRECT = (os.environ.get('MEDIA_X_ACCEL_REDIRECT') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
+MEDIA_X_ACCEL_LOCATIONS = {
+    '/v2p-internal/input/': INPUT_FOLDER,
+    '/v2p-internal/output/': OUTPUT_FOLDER,
+    '/v2p-internal/tmp/': Path(os.environ.get('MEDIA_X_ACCEL_TMP_ROOT') or tempfile.gettempdir()),  # deface session temp dirs
+}
+
+# JSON responses of at least this many bytes are compressed (Brotli when the optional brotli package is
+# installed and the client accepts it, else gzip); 0 disables compression
+JSON_COMPRESS_MIN_BYTES = int(os.environ.get('JSON_COMPRESS_MIN_BYTES', '1024'))
+JSON_GZIP_LEVEL = int(os.environ.get('JSON_GZIP_LEVEL', '6'))
+# File listings (list_files, list_images, media-converter/list, deface_existing) carry a strong ETag of the
+# scanned folder and answer 304 while it is unchanged. Seconds a browser may reuse a listing without asking:
+# 0 (default) revalidates every time, because a listing changes right after a conversion or deface run.
+JSON_LISTING_MAX_AGE = int(os.environ.get('JSON_LISTING_MAX_AGE', '0'))
+# Thumbnail URLs that carry the source file's version (&v=, from the listings) are cached this many seconds
+# as immutable; thumbnails requested without it revalidate every time (a stat of the source, then 304)
+THUMBNAIL_IMMUTABLE_MAX_AGE = int(os.environ.get('THUMBNAIL_IMMUTABLE_MAX_AGE', str(365 * 24 * 3600)))
+
+# Multi-process serving (gunicorn, see gunicorn.conf.py): job status is published to files under
+# JOB_STATE_DIR so any worker can answer status polls. Off for the single-process server
+# (gunicorn.conf.py sets SHARED_JOB_STATE=1).
+SHARED_JOB_STATE = (os.environ.get('SHARED_JOB_STATE') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
+JOB_STATE_DIR = Path(os.environ.get('JOB_STATE_DIR') or (BASE_DIR / 'data' / 'jobs'))
+# Seconds between status snapshots of a running job
+JOB_STATE_PUBLISH_INTERVAL = float(os.environ.get('JOB_STATE_PUBLISH_INTERVAL', '1'))
+
+# Request profiling (see app/profiler.py). With PROFILE_REQUESTS=1, a request is profiled when its endpoint name
+# or path matches PROFILE_ROUTE_PATTERN (regex), or at random with probability PROFILE_SAMPLE_RATE. A request with
+# an X-Profile-Token header equal to PROFILE_ADMIN_TOKEN is always profiled. The same token is needed to list and
+# download profiles (/profiles); with no token set, those endpoints are off.
+PROFILE_REQUESTS = (os.environ.get('PROFILE_REQUESTS') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ROUTE_PATTERN = os.environ.get('PROFILE_ROUTE_PATTERN', '')
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+# 'sample': statistical sampler over the request thread and threads it starts (collapsed stacks, .collapsed);
+# 'cprofile': deterministic, request thread only (pstats, .prof)
+PROFILE_MODE = (os.environ.get('PROFILE_MODE') or 'sample').strip().lower()
+# Seconds between stack samples in 'sample' mode
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR') or (BASE_DIR / 'logs' / 'profiles'))
+# Only the newest profiles are kept
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '200'))
+
 # Debug Settings
 DEBUG_MODE = True
 DEBUG_LOG_LEVEL = 'DEBUG'
+# Level written to the log files (env LOG_LEVEL overrides; INFO and above also turns trace events off)
+LOG_LEVEL = (os.environ.get('LOG_LEVEL') or DEBUG_LOG_LEVEL).strip()
+# Records waiting for the background log writer; past this, new records are dropped rather than block a request
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+# Fraction (0-1) of diagnostic trace events (logs/trace.log) kept; 0 disables them
+DEBUG_TRACE_SAMPLE_RATE = float(os.environ.get('DEBUG_TRACE_SAMPLE_RATE', '1'))
 DEBUG_CONSOLE_OUTPUT = True
 DEBUG_UI_PANEL = True
 
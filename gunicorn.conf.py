@@ -0,0 +1,40 @@
+"""
+gunicorn settings for Video to Image Formatter (production, behind nginx)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Several worker processes each with a few threads, so CPU-heavy routes (PIL,
+OpenCV, ReportLab, python-docx) no longer share one GIL. Reload gracefully
+with SIGHUP (scripts/restart.sh does this): new workers start, importing the
+current code, while the old ones finish their requests. GUNICORN_PRELOAD=1
+imports the app once in the master and forks it (less memory, faster worker
+start), but then SIGHUP does not pick up code changes; restart instead.
+
+Background jobs run in the worker that accepted them; their status is shared
+through files (SHARED_JOB_STATE, JOB_STATE_DIR) so any worker can answer
+status polls, and deface sessions are shared through their store file. Each
+worker still allows DEFACE_MAX_CONCURRENT_JOBS deface jobs of its own, so
+keep workers * DEFACE_MAX_CONCURRENT_JOBS within what the CPU can take.
+"""
+import multiprocessing
+import os
+
+# Job status must be visible to every worker (read by config when the app is imported)
+os.environ.setdefault('SHARED_JOB_STATE', '1')
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5001')
+workers = int(os.environ.get('GUNICORN_WORKERS', str(min(4, multiprocessing.cpu_count()))))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+# /apply_deface with "wait": true and bulk document generation can take minutes
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '900'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '120'))
+keepalive = 5
+
+# Same PID file as run.py, so scripts/restart.sh finds the master
+pidfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.flask.pid')
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
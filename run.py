@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 """
-Run script for Video to Image Formatter
+Run script for Video to Image Formatter (single-process development server)
+
+For production behind nginx use gunicorn instead (several worker processes,
+graceful reload with SIGHUP):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+FLASK_DEBUG=1 turns on the Werkzeug debugger (never expose it through nginx).
 """
 import os
 import signal
@@ -27,7 +34,7 @@ def remove_pid():
 
 
 def _restart_self(signum, frame):
-    """SIGUSR1: replace this process with a fresh run (same PID, no respawn)."""
+    """SIGUSR1: replace this process with a fresh run (same PID, no respawn). gunicorn reloads on SIGHUP instead."""
     os.execv(sys.executable, [sys.executable, RUN_PY])
 
 
@@ -40,7 +47,8 @@ if __name__ == '__main__':
         print("Access the application at: http://localhost/v2p-formatter")
         print("(Flask running on port {}, proxied by nginx on port 80)".format(PORT))
         print("(PID file: {}). Send SIGUSR1 or run ./scripts/restart.sh to restart.".format(PID_FILE))
-        app.run(debug=True, host='127.0.0.1', port=PORT, use_reloader=False, threaded=True)
+        debug = os.environ.get('FLASK_DEBUG', '0').strip().lower() in ('1', 'true', 'yes', 'on')
+        app.run(debug=debug, host='127.0.0.1', port=PORT, use_reloader=False, threaded=True)
     finally:
         remove_pid()
 
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: video deface detection stride vs full-rate detection.
+
+Runs the in-process detection/tracking loop (decode + detect + track, no
+encoding) over a video at stride 1 and at each requested stride, and reports
+frames/s, speed-up and recall. Recall is the share of full-rate detections
+that are covered (by at least --coverage of their area) by a box the strided
+run would anonymize on the same frame.
+
+Usage:
+  python scripts/benchmark_deface_stride.py VIDEO [--strides 2 3 5 10] [--scale 640x360]
+  python scripts/benchmark_deface_stride.py VIDEO --json results.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.deface_engine import FaceDetectionEngine  # noqa: E402
+from app.deface_video_pipeline import track_detections  # noqa: E402
+from config import DEFACE_SCENE_CHANGE_THRESHOLD, DEFACE_TRACK_MARGIN  # noqa: E402
+
+
+def run(video, engine, thresh, stride, scene_threshold, margin):
+    """Per-frame boxes and wall time for one pass over the video"""
+    import imageio
+
+    reader = imageio.get_reader(str(video))
+    per_frame = []
+    detected = 0
+    start = time.perf_counter()
+    try:
+        detect = lambda frame: engine.detect([frame], thresh=thresh)[0]  # noqa: E731
+        for _, dets, was_detected in track_detections(reader.iter_data(), detect, stride, scene_threshold, margin):
+            per_frame.append(dets[:, :4].copy())
+            detected += int(was_detected)
+    finally:
+        reader.close()
+    return per_frame, detected, time.perf_counter() - start
+
+
+def covered(ref_box, boxes, coverage):
+    """True if some box covers at least `coverage` of ref_box's area"""
+    if len(boxes) == 0:
+        return False
+    area = max((ref_box[2] - ref_box[0]) * (ref_box[3] - ref_box[1]), 1e-6)
+    iw = np.clip(np.minimum(boxes[:, 2], ref_box[2]) - np.maximum(boxes[:, 0], ref_box[0]), 0, None)
+    ih = np.clip(np.minimum(boxes[:, 3], ref_box[3]) - np.maximum(boxes[:, 1], ref_box[1]), 0, None)
+    return bool(np.max(iw * ih) / area >= coverage)
+
+
+def recall(reference, candidate, coverage):
+    total = hits = 0
+    for ref_boxes, boxes in zip(reference, candidate):
+        for ref_box in ref_boxes:
+            total += 1
+            hits += covered(ref_box, boxes, coverage)
+    return hits / total if total else 1.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('video', type=Path)
+    ap.add_argument('--strides', type=int, nargs='+', default=[2, 3, 5, 10])
+    ap.add_argument('--thresh', type=float, default=0.2)
+    ap.add_argument('--scale', default=None, help='Detection scale WxH (default: original)')
+    ap.add_argument('--scene-threshold', type=float, default=DEFACE_SCENE_CHANGE_THRESHOLD)
+    ap.add_argument('--margin', type=float, default=DEFACE_TRACK_MARGIN)
+    ap.add_argument('--coverage', type=float, default=0.9,
+                    help='Fraction of a reference box that must be covered to count as recalled')
+    ap.add_argument('--json', type=Path, default=None, help='Also write results to this JSON file')
+    args = ap.parse_args()
+
+    scale = tuple(int(v) for v in args.scale.split('x')) if args.scale else None
+    engine = FaceDetectionEngine(scale=scale)
+
+    reference, ref_detected, ref_time = run(args.video, engine, args.thresh, 1, 0, 0)
+    frames = len(reference)
+    rows = [{'stride': 1, 'detected_frames': ref_detected, 'seconds': round(ref_time, 2),
+             'fps': round(frames / ref_time, 2), 'speedup': 1.0, 'recall': 1.0}]
+    for stride in args.strides:
+        boxes, detected, elapsed = run(args.video, engine, args.thresh, stride, args.scene_threshold, args.margin)
+        rows.append({
+            'stride': stride,
+            'detected_frames': detected,
+            'seconds': round(elapsed, 2),
+            'fps': round(frames / elapsed, 2),
+            'speedup': round(ref_time / elapsed, 2),
+            'recall': round(recall(reference, boxes, args.coverage), 4),
+        })
+
+    faces = sum(len(b) for b in reference)
+    print(f"{args.video.name}: {frames} frames, {faces} full-rate detections, backend={engine.backend}")
+    print(f"{'stride':>6} {'detected':>9} {'seconds':>8} {'fps':>7} {'speedup':>8} {'recall':>7}")
+    for row in rows:
+        print(f"{row['stride']:>6} {row['detected_frames']:>9} {row['seconds']:>8} {row['fps']:>7} "
+              f"{row['speedup']:>7}x {row['recall']:>7.1%}")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            'video': str(args.video),
+            'frames': frames,
+            'reference_detections': faces,
+            'backend': engine.backend,
+            'scale': args.scale,
+            'thresh': args.thresh,
+            'coverage': args.coverage,
+            'results': rows,
+        }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
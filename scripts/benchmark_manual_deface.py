@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: vectorized manual deface renderer vs the previous per-area PIL loop.
+
+Renders N random manual deface areas (mixed blur / solid / mosaic) on a
+synthetic frame with both implementations and reports the time per frame.
+The per-area loop is the one apply_manual_deface used before: crop, filter
+or resize, paste back, one ImageDraw per solid box.
+
+Usage:
+  python scripts/benchmark_manual_deface.py [--size 3840x2160] [--areas 60] [--repeat 5]
+  python scripts/benchmark_manual_deface.py --json results.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.manual_deface_renderer import render_areas  # noqa: E402
+
+
+def legacy_render(img, areas, mosaicsize=20):
+    """Per-area PIL rendering (previous apply_manual_deface loop)"""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    for area in areas:
+        x, y, width, height = area['x'], area['y'], area['width'], area['height']
+        img_width, img_height = img.size
+        x = max(0, min(x, img_width - 1))
+        y = max(0, min(y, img_height - 1))
+        width = max(1, min(width, img_width - x))
+        height = max(1, min(height, img_height - y))
+        region = img.crop((x, y, x + width, y + height))
+        if area['method'] == 'blur':
+            img.paste(region.filter(ImageFilter.GaussianBlur(radius=15)), (x, y))
+        elif area['method'] == 'solid':
+            ImageDraw.Draw(img).rectangle([x, y, x + width, y + height], fill='black')
+        elif area['method'] == 'mosaic':
+            small = region.resize((max(1, width // mosaicsize), max(1, height // mosaicsize)), Image.Resampling.NEAREST)
+            img.paste(small.resize((width, height), Image.Resampling.NEAREST), (x, y))
+    return img
+
+
+def random_areas(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    methods = ['blur', 'solid', 'mosaic']
+    areas = []
+    for i in range(count):
+        w, h = (int(v) for v in rng.integers(60, 240, size=2))
+        areas.append({
+            'x': int(rng.integers(0, width - w)),
+            'y': int(rng.integers(0, height - h)),
+            'width': w,
+            'height': h,
+            'shape': 'rectangular',
+            'method': methods[i % 3],
+        })
+    return areas
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    ap.add_argument('--size', default='3840x2160', help='Frame size WxH')
+    ap.add_argument('--areas', type=int, nargs='+', default=[10, 60, 200])
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--json', type=Path, default=None, help='Also write results to this JSON file')
+    args = ap.parse_args()
+
+    from PIL import Image
+
+    width, height = (int(v) for v in args.size.split('x'))
+    # Smooth content, like a real frame (blur cost does not depend on content)
+    small = np.random.default_rng(1).integers(0, 255, size=(height // 40, width // 40, 3), dtype=np.uint8)
+    frame = np.asarray(Image.fromarray(small).resize((width, height), Image.Resampling.BILINEAR))
+
+    rows = []
+    for count in args.areas:
+        areas = random_areas(count, width, height)
+        ellipses = [dict(a, shape='ellipse') for a in areas]
+        legacy = best_of(args.repeat, lambda: legacy_render(Image.fromarray(frame), areas))
+        vectorized = best_of(args.repeat, lambda: render_areas(frame.copy(), areas))
+        vectorized_ellipse = best_of(args.repeat, lambda: render_areas(frame.copy(), ellipses))
+        rows.append({
+            'areas': count,
+            'legacy_ms': round(legacy * 1000, 1),
+            'vectorized_ms': round(vectorized * 1000, 1),
+            'vectorized_ellipse_ms': round(vectorized_ellipse * 1000, 1),
+            'speedup': round(legacy / vectorized, 2),
+        })
+
+    print(f"Frame {width}x{height}, best of {args.repeat}")
+    print(f"{'areas':>6} {'legacy ms':>10} {'vector ms':>10} {'ellipse ms':>11} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['areas']:>6} {row['legacy_ms']:>10} {row['vectorized_ms']:>10} "
+              f"{row['vectorized_ellipse_ms']:>11} {row['speedup']:>7}x")
+
+    if args.json:
+        args.json.write_text(json.dumps({'size': args.size, 'repeat': args.repeat, 'results': rows}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,8 @@
 #!/usr/bin/env bash
-# Restart the Flask app. If it's already running (same PID file), send SIGUSR1 so it
-# restarts in-place (same process, no respawn). Otherwise free port 5001 and start.
+# Restart the Flask app. If it's already running (same PID file), reload it in place:
+# SIGHUP for gunicorn (graceful: new workers start, old ones finish their requests),
+# SIGUSR1 for run.py (same process, no respawn). Otherwise free port 5001 and start,
+# with gunicorn when it is installed (production) or run.py.
 set -e
 cd "$(dirname "$0")/.."
 PORT=5001
@@ -10,6 +12,12 @@ PID_FILE=".flask.pid"
 if [ -f "$PID_FILE" ]; then
   PID=$(cat "$PID_FILE")
   if kill -0 "$PID" 2>/dev/null; then
+    if ps -p "$PID" -o command= 2>/dev/null | grep -q gunicorn; then
+      echo "Reloading gunicorn gracefully (master PID $PID)..."
+      kill -HUP "$PID" 2>/dev/null || true
+      echo "Done. Workers are being replaced."
+      exit 0
+    fi
     echo "Restarting app in-place (PID $PID)..."
     kill -USR1 "$PID" 2>/dev/null || true
     echo "Done. App is restarting (same process)."
@@ -37,5 +45,9 @@ if [ -x "venv/bin/python3" ]; then
 else
   PYTHON="python3"
 fi
+if "$PYTHON" -c "import gunicorn" 2>/dev/null; then
+  echo "Starting app with gunicorn ($PYTHON)..."
+  exec "$PYTHON" -m gunicorn -c gunicorn.conf.py wsgi:app
+fi
 echo "Starting app ($PYTHON)..."
 exec "$PYTHON" run.py
@@ -30,5 +30,9 @@ echo "See NGINX_SETUP.md for configuration instructions"
 echo ""
 
 # Run without sudo (port 5000 doesn't require privileges)
+# Production: gunicorn with several workers when installed (see gunicorn.conf.py); else the dev server
+if python -c "import gunicorn" 2>/dev/null; then
+    exec python -m gunicorn -c gunicorn.conf.py wsgi:app
+fi
 python run.py
 
@@ -0,0 +1,67 @@
+"""
+Unit tests for the benchmark runner (case selection, result files, regression comparison)
+"""
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from benchmarks import run
+from benchmarks.cases import CASES
+
+
+class TestCompare(unittest.TestCase):
+    """Test regression detection between two result sets"""
+
+    def test_statuses(self):
+        baseline = {'a': {'median_ms': 100.0}, 'b': {'median_ms': 100.0}, 'c': {'median_ms': 100.0},
+                    'gone': {'median_ms': 1.0}}
+        current = {'a': {'median_ms': 105.0}, 'b': {'median_ms': 125.0}, 'c': {'median_ms': 50.0},
+                   'added': {'median_ms': 1.0}}
+        rows = {row['case']: row for row in run.compare(current, baseline, threshold=0.10)}
+        self.assertEqual(rows['a']['status'], 'ok')
+        self.assertEqual(rows['b']['status'], 'regression')
+        self.assertEqual(rows['b']['ratio'], 1.25)
+        self.assertEqual(rows['c']['status'], 'improvement')
+        self.assertEqual(rows['gone']['status'], 'missing')
+        self.assertEqual(rows['added']['status'], 'new')
+
+
+class TestRunner(unittest.TestCase):
+    """Test a small run end to end"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_requested_hot_paths_are_registered(self):
+        for pattern in ('extract_frames_at_times', 'get_thumbnail_cold', 'get_thumbnail_warm', 'scan.',
+                        'convert_image_to_jpeg', 'create_image_pdf', 'create_image_docx',
+                        'create_observation_docx', 'extract_ac_references_with_context', 'apply_manual_deface'):
+            self.assertTrue(run.select_cases([pattern]), pattern)
+        self.assertEqual(run.select_cases([]), list(CASES))
+
+    def test_result_file_and_compare(self):
+        output = self.temp_dir / 'result.json'
+        args = ['-k', 'ac_matrix', '-k', 'scan.file_scanner', '--scale', '0.01', '--repeat', '2',
+                '--fixtures', str(self.temp_dir / 'fixtures')]
+        self.assertEqual(run.main(args + ['--output', str(output)]), 0)
+        document = json.loads(output.read_text())
+        self.assertEqual(set(document['results']), {'ac_matrix.extract_ac_references_with_context',
+                                                    'scan.file_scanner_mp4'})
+        self.assertEqual(document['results']['scan.file_scanner_mp4']['rounds'], 2)
+        self.assertIn('cpu_count', document['machine'])
+        self.assertEqual(document['settings']['scale'], 0.01)
+
+        # A far slower baseline never makes the current run a regression
+        for result in document['results'].values():
+            result['median_ms'] *= 1000
+        output.write_text(json.dumps(document))
+        self.assertEqual(run.main(args + ['--no-save', '--compare', str(output), '--fail-on-regression']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
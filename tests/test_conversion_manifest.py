@@ -0,0 +1,148 @@
+"""
+Unit tests for the conversion manifest (skip/dedupe cache)
+"""
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.conversion_manifest import ConversionManifest, run_with_manifest
+
+
+class TestConversionManifest(unittest.TestCase):
+    """Test skipping of unchanged conversions"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.manifest = ConversionManifest(self.temp_dir / 'manifest.json')
+        self.input_path = self.temp_dir / 'clip.mov'
+        self.input_path.write_bytes(b'source video bytes')
+        self.output_path = self.temp_dir / 'out' / 'clip.mp4'
+        self.settings = {'type': 'video', 'ext': '.mp4', 'settings': {'crf': 23}}
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _convert(self):
+        self.calls += 1
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.output_path.write_bytes(b'encoded' * self.calls)
+        return {'success': True, 'output_path': str(self.output_path)}
+
+    def _run(self, settings=None, force=False):
+        return run_with_manifest(self.input_path, settings or self.settings, self._convert,
+                                 force=force, manifest=self.manifest)
+
+    def test_second_run_is_skipped(self):
+        """Unchanged input with the same settings reports the existing output"""
+        first = self._run()
+        second = self._run()
+        self.assertFalse(first['skipped'])
+        self.assertTrue(second['skipped'])
+        self.assertEqual(second['output_path'], str(self.output_path))
+        self.assertEqual(self.calls, 1)
+
+    def test_changed_settings_converts_again(self):
+        """Different effective settings are a different cache key"""
+        self._run()
+        result = self._run(settings={'type': 'video', 'ext': '.mp4', 'settings': {'crf': 28}})
+        self.assertFalse(result['skipped'])
+        self.assertEqual(self.calls, 2)
+
+    def test_changed_input_converts_again(self):
+        """Editing the source invalidates the entry"""
+        self._run()
+        time.sleep(0.01)
+        self.input_path.write_bytes(b'edited source video bytes')
+        result = self._run()
+        self.assertFalse(result['skipped'])
+        self.assertEqual(self.calls, 2)
+
+    def test_force_converts_again(self):
+        """force bypasses the manifest"""
+        self._run()
+        result = self._run(force=True)
+        self.assertFalse(result['skipped'])
+        self.assertEqual(self.calls, 2)
+
+    def test_missing_output_converts_again(self):
+        """A deleted output is not reported as existing"""
+        self._run()
+        self.output_path.unlink()
+        result = self._run()
+        self.assertFalse(result['skipped'])
+
+    def test_identical_copy_is_deduplicated(self):
+        """A byte-identical copy elsewhere matches by content fingerprint"""
+        self._run()
+        copy_path = self.temp_dir / 'copy.mov'
+        shutil.copy(self.input_path, copy_path)
+        entry = self.manifest.lookup(copy_path, self.settings)
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry['output_path'], str(self.output_path))
+
+    def test_identical_copy_gets_its_own_output(self):
+        """A copy in another learner's folder never reports the other learner's output as its own"""
+        self._run()
+        copy_path = self.temp_dir / 'other_learner' / 'clip.mov'
+        copy_path.parent.mkdir()
+        shutil.copy(self.input_path, copy_path)
+
+        # Without a place for its own output the copy is converted
+        converted = self.temp_dir / 'other_learner' / 'clip.mp4'
+
+        def convert_copy():
+            converted.write_bytes(self.output_path.read_bytes())
+            return {'success': True, 'output_path': str(converted)}
+
+        result = run_with_manifest(copy_path, self.settings, convert_copy, manifest=self.manifest)
+        self.assertFalse(result['skipped'])
+        self.assertEqual(result['output_path'], str(converted))
+
+        copy_output = self.temp_dir / 'out_other' / 'clip.mp4'
+
+        def reserve():
+            copy_output.parent.mkdir(exist_ok=True)
+            copy_output.touch()
+            return copy_output
+
+        other_copy = self.temp_dir / 'third' / 'clip.mov'
+        other_copy.parent.mkdir()
+        shutil.copy(self.input_path, other_copy)
+        result = run_with_manifest(other_copy, self.settings, self._convert, manifest=self.manifest,
+                                   reserve_output=reserve)
+        self.assertTrue(result['skipped'])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(result['output_path'], str(copy_output))
+        self.assertEqual(copy_output.read_bytes(), self.output_path.read_bytes())
+        # Every input keeps its own entry
+        self.assertEqual(len(self.manifest.query()), 3)
+        self.assertTrue(self._run()['skipped'])
+
+    def test_processes_do_not_overwrite_each_other(self):
+        """A second manifest object on the same file (another worker) sees and keeps the first one's entries"""
+        other_worker = ConversionManifest(self.temp_dir / 'manifest.json')
+        self.assertEqual(other_worker.query(), [])
+        self._run()
+        second_input = self.temp_dir / 'second.mov'
+        second_input.write_bytes(b'another video')
+        other_worker.record(second_input, self.settings, self.output_path)
+        self.assertEqual(len(self.manifest.query()), 2)
+        self.assertEqual(self.manifest.remove(str(second_input)), 1)
+        self.assertEqual(len(other_worker.query()), 1)
+
+    def test_query_and_persistence(self):
+        """Entries persist to disk and can be queried by path"""
+        self._run()
+        reloaded = ConversionManifest(self.temp_dir / 'manifest.json')
+        entries = reloaded.query(input_path=str(self.input_path))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['output_path'], str(self.output_path))
+        self.assertEqual(reloaded.remove(str(self.input_path)), 1)
+        self.assertEqual(reloaded.query(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Unit tests for the deface detection cache
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from app.deface_detection_cache import DetectionCache, image_params, suggested_regions, video_params
+from app.deface_engine import FaceDetectionEngine, is_available
+
+
+class TestDetectionCache(unittest.TestCase):
+    """Test storing, keying and pruning of cached detections"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.cache = DetectionCache(self.temp_dir / 'cache', max_bytes=10 * 1024 * 1024)
+        self.input_path = self.temp_dir / 'clip.mp4'
+        self.input_path.write_bytes(b'video bytes')
+        self.detections = [
+            np.asarray([[1, 2, 30, 40, 0.9]], dtype=np.float32),
+            np.empty((0, 5), dtype=np.float32),
+            np.asarray([[5, 5, 20, 20, 0.5], [50, 50, 80, 90, 0.7]], dtype=np.float32),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip_keeps_per_frame_boxes(self):
+        params = video_params(0.2, None, 5, 30.0, 0.15)
+        self.cache.put(self.input_path, params, self.detections, meta={'fps': 25.0})
+        entry = self.cache.get(self.input_path, params)
+        self.assertEqual(entry['meta']['fps'], 25.0)
+        self.assertEqual(len(entry['detections']), 3)
+        for cached, original in zip(entry['detections'], self.detections):
+            np.testing.assert_array_equal(cached, original)
+
+    def test_detection_settings_are_part_of_the_key(self):
+        self.cache.put(self.input_path, image_params(0.2, None), self.detections[:1])
+        self.assertIsNone(self.cache.get(self.input_path, image_params(0.3, None)))
+        self.assertIsNone(self.cache.get(self.input_path, image_params(0.2, (640, 360))))
+        self.assertIsNotNone(self.cache.get(self.input_path, image_params(0.2, None)))
+
+    def test_changed_content_misses(self):
+        params = image_params(0.2, None)
+        self.cache.put(self.input_path, params, self.detections[:1])
+        self.input_path.write_bytes(b'another video')
+        self.assertIsNone(self.cache.get(self.input_path, params))
+
+    def test_identical_copy_hits(self):
+        params = image_params(0.2, None)
+        self.cache.put(self.input_path, params, self.detections[:1])
+        copy_path = self.temp_dir / 'copy.mp4'
+        shutil.copy2(self.input_path, copy_path)
+        self.assertIsNotNone(self.cache.get(copy_path, params))
+
+    def test_prune_removes_oldest_entries(self):
+        big = [np.random.default_rng(0).random((20000, 5), dtype=np.float32)]
+        self.cache.max_bytes = 1
+        self.cache.put(self.input_path, image_params(0.2, None), big)
+        self.assertEqual(list((self.temp_dir / 'cache').glob('*.npz')), [])
+
+    def test_disabled_cache_stores_nothing(self):
+        cache = DetectionCache(self.temp_dir / 'off', max_bytes=0)
+        cache.put(self.input_path, image_params(0.2, None), self.detections[:1])
+        self.assertIsNone(cache.get(self.input_path, image_params(0.2, None)))
+        self.assertFalse((self.temp_dir / 'off').exists())
+
+    def test_suggested_regions_apply_mask_scale_and_clip(self):
+        dets = np.asarray([[10, 10, 30, 50, 0.8], [90, 90, 120, 120, 0.6]], dtype=np.float32)
+        regions = suggested_regions(dets, (100, 100), 1.3)
+        self.assertEqual((regions[0]['x'], regions[0]['y'], regions[0]['width'], regions[0]['height']), (4, 0, 32, 62))
+        self.assertEqual((regions[1]['x'] + regions[1]['width'], regions[1]['y'] + regions[1]['height']), (99, 99))
+
+
+@unittest.skipUnless(is_available(), 'deface package not installed')
+class TestCachedImageDeface(unittest.TestCase):
+    """Test that restyling a cached image skips detection and matches a fresh run"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = FaceDetectionEngine()
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.cache = DetectionCache(self.temp_dir / 'cache', max_bytes=10 * 1024 * 1024)
+        noise = np.random.default_rng(0).integers(0, 255, size=(30, 40, 3), dtype=np.uint8)
+        self.input_path = self.temp_dir / 'input.png'
+        Image.fromarray(noise).resize((320, 240), Image.Resampling.BICUBIC).save(self.input_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_restyle_uses_cached_detections(self):
+        first = self.engine.anonymize_files([(self.input_path, self.temp_dir / 'blur.png')],
+                                            thresh=0.01, detection_cache=self.cache)[0]
+        self.assertFalse(first['cached'])
+
+        with mock.patch.object(self.engine, 'detect', wraps=self.engine.detect) as detect:
+            cached = self.engine.anonymize_files([(self.input_path, self.temp_dir / 'cached.png')],
+                                                 replacewith='mosaic', thresh=0.01, detection_cache=self.cache)[0]
+            detect.assert_not_called()
+        self.assertTrue(cached['cached'])
+        self.assertEqual(cached['faces'], first['faces'])
+
+        fresh = self.engine.anonymize_files([(self.input_path, self.temp_dir / 'fresh.png')],
+                                            replacewith='mosaic', thresh=0.01)[0]
+        self.assertTrue(fresh['success'])
+        np.testing.assert_array_equal(np.asarray(Image.open(self.temp_dir / 'cached.png')),
+                                      np.asarray(Image.open(self.temp_dir / 'fresh.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
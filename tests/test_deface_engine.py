@@ -0,0 +1,74 @@
+"""
+Unit tests for the in-process deface engine
+"""
+import filecmp
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.deface_engine import FaceDetectionEngine, is_available
+
+
+@unittest.skipUnless(is_available(), 'deface package not installed')
+class TestFaceDetectionEngine(unittest.TestCase):
+    """Test that batched in-process detection matches the deface CLI"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = FaceDetectionEngine()
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        rng = np.random.default_rng(0)
+        # Smooth blobs give the detector a few low-confidence candidates
+        noise = rng.integers(0, 255, size=(30, 40, 3), dtype=np.uint8)
+        self.frame = np.asarray(Image.fromarray(noise).resize((320, 240), Image.Resampling.BICUBIC))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_batched_detection_matches_single(self):
+        """Sharing a forward pass across frames does not change detections"""
+        thresh = 0.01
+        other = np.ascontiguousarray(self.frame[::-1])
+        small = np.ascontiguousarray(self.frame[:120, :160])
+        batched = self.engine.detect([self.frame, other, small], thresh=thresh)
+        for frame, dets in zip([self.frame, other, small], batched):
+            single, _ = self.engine.centerface(frame, threshold=thresh)
+            np.testing.assert_allclose(dets, single, rtol=1e-5, atol=1e-3)
+
+    def test_missing_input_reported_per_item(self):
+        """A missing file fails only its own item"""
+        good = self.temp_dir / 'good.png'
+        Image.fromarray(self.frame).save(good)
+        results = self.engine.anonymize_files([
+            (self.temp_dir / 'missing.png', self.temp_dir / 'out_missing.png'),
+            (good, self.temp_dir / 'out_good.png'),
+        ])
+        self.assertFalse(results[0]['success'])
+        self.assertTrue(results[1]['success'])
+        self.assertTrue((self.temp_dir / 'out_good.png').exists())
+
+    @unittest.skipUnless(shutil.which('deface'), 'deface CLI not on PATH')
+    def test_output_identical_to_cli(self):
+        """Engine output files are byte-identical to the deface CLI's"""
+        input_path = self.temp_dir / 'input.png'
+        Image.fromarray(self.frame).save(input_path)
+        cli_output = self.temp_dir / 'cli.png'
+        subprocess.run(['deface', str(input_path), '-o', str(cli_output),
+                        '--thresh', '0.01', '--boxes', '--replacewith', 'mosaic', '--draw-scores'],
+                       capture_output=True, check=True, timeout=120)
+        engine_output = self.temp_dir / 'engine.png'
+        result = self.engine.anonymize_files([(input_path, engine_output)], replacewith='mosaic',
+                                             boxes=True, thresh=0.01, draw_scores=True)[0]
+        self.assertTrue(result['success'])
+        self.assertTrue(filecmp.cmp(cli_output, engine_output, shallow=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
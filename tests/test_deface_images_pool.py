@@ -0,0 +1,118 @@
+"""
+Unit tests for the concurrent deface_images worker pool
+"""
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from app import deface_processor
+from app.deface_engine import is_available
+
+
+def _fake_deface_image(img_path, output_path, **kwargs):
+    """Later images finish first; names containing 'bad' fail"""
+    time.sleep(0.05 / (1 + int(Path(img_path).stem.split('_')[-1])))
+    if 'bad' in Path(img_path).name:
+        return {'success': False, 'error': 'no faces here'}
+    Path(output_path).write_bytes(b'defaced')
+    return {'success': True, 'output_path': str(output_path)}
+
+
+class TestDefaceImagesPool(unittest.TestCase):
+    """Test that concurrent processing keeps output order, errors and progress order"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.inputs = []
+        for i in range(8):
+            path = self.temp_dir / f"{'bad' if i == 3 else 'img'}_{i}.jpg"
+            path.write_bytes(b'image')
+            self.inputs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_cli_path_keeps_order_errors_and_progress(self):
+        progress = []
+        with mock.patch.object(deface_processor, '_get_inprocess_engine', return_value=None), \
+                mock.patch.object(deface_processor, 'deface_image', side_effect=_fake_deface_image), \
+                mock.patch('config.DEFACE_IMAGE_WORKERS', 4):
+            result = deface_processor.deface_images(self.inputs, self.temp_dir / 'out',
+                                                    progress_callback=lambda done, total: progress.append((done, total)))
+
+        expected = [str(self.temp_dir / 'out' / f'deface_{p.name}') for p in self.inputs if 'bad' not in p.name]
+        self.assertEqual(result['processed'], expected)
+        self.assertEqual(result['errors'], [{'input': str(self.inputs[3]), 'error': 'no faces here'}])
+        self.assertEqual((result['total'], result['successful'], result['failed']), (8, 7, 1))
+        done = [d for d, _ in progress]
+        self.assertEqual(done, sorted(set(done)))
+        self.assertEqual(progress[-1], (8, 8))
+
+    def test_item_callback_gets_each_image_in_input_order(self):
+        seen = []
+        with mock.patch.object(deface_processor, '_get_inprocess_engine', return_value=None), \
+                mock.patch.object(deface_processor, 'deface_image', side_effect=_fake_deface_image), \
+                mock.patch('config.DEFACE_IMAGE_WORKERS', 4):
+            deface_processor.deface_images(self.inputs, self.temp_dir / 'out',
+                                           item_callback=lambda index, result: seen.append((index, result)))
+
+        self.assertEqual([index for index, _ in seen], list(range(8)))
+        self.assertFalse(seen[3][1]['success'])
+        self.assertEqual(seen[0][1]['output_path'], str(self.temp_dir / 'out' / 'deface_img_0.jpg'))
+
+    def test_pool_size(self):
+        def size(cpus, threads, jobs, inprocess):
+            with mock.patch.object(deface_processor.os, 'cpu_count', return_value=cpus), \
+                    mock.patch.object(deface_processor, 'get_onnx_runtime_status',
+                                      return_value={'inference_threads': threads}), \
+                    mock.patch('config.DEFACE_IMAGE_WORKERS', 0):
+                return deface_processor._image_pool_size(jobs, inprocess)
+
+        # CPU provider (inference on every core): the in-process pool still fans out
+        self.assertEqual(size(8, 8, 20, True), 8)
+        self.assertGreater(size(4, 4, 20, True), 1)
+        self.assertEqual(size(8, 1, 20, True), 8)   # GPU provider
+        self.assertEqual(size(8, 2, 20, False), 4)  # each deface process runs its own model
+        self.assertEqual(size(8, 1, 3, True), 3)    # never more workers than jobs
+        with mock.patch('config.DEFACE_IMAGE_WORKERS', 2):
+            self.assertEqual(deface_processor._image_pool_size(20, True), 2)
+
+@unittest.skipUnless(is_available(), 'deface package not installed')
+class TestDefaceImagesPoolInprocess(unittest.TestCase):
+    """Test that the pooled in-process engine writes the same files as one worker"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        rng = np.random.default_rng(0)
+        self.inputs = []
+        for i in range(5):
+            noise = rng.integers(0, 255, size=(30, 40, 3), dtype=np.uint8)
+            path = self.temp_dir / f'img_{i}.png'
+            Image.fromarray(noise).resize((320, 240), Image.Resampling.BICUBIC).save(path)
+            self.inputs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _run(self, workers, out_name):
+        with mock.patch('config.DEFACE_IMAGE_WORKERS', workers), mock.patch('config.DEFACE_ENGINE_BATCH_SIZE', 2), \
+                mock.patch.object(deface_processor, '_get_detection_cache', return_value=None):
+            return deface_processor.deface_images(self.inputs, self.temp_dir / out_name, thresh=0.01)
+
+    def test_pool_matches_single_worker(self):
+        single = self._run(1, 'single')
+        pooled = self._run(3, 'pooled')
+        self.assertTrue(pooled['success'])
+        self.assertEqual([Path(p).name for p in pooled['processed']], [Path(p).name for p in single['processed']])
+        for a, b in zip(single['processed'], pooled['processed']):
+            np.testing.assert_array_equal(np.asarray(Image.open(a)), np.asarray(Image.open(b)))
+
+
+if __name__ == '__main__':
+    unittest.main()
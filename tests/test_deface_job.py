@@ -0,0 +1,107 @@
+"""
+Unit tests for background deface jobs and per-job progress
+"""
+import contextvars
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from app.deface_job import DefaceJobManager, DefaceJobStatus
+from app.deface_video_log import (
+    add_deface_completed_item, get_deface_progress, set_deface_current_item_pct, set_deface_progress
+)
+
+
+class TestDefaceJob(unittest.TestCase):
+    """Test job lifecycle and that concurrent jobs keep separate progress"""
+
+    def setUp(self):
+        self.manager = DefaceJobManager()
+
+    def test_result_and_status(self):
+        job = self.manager.create_job('session-1')
+        job.start(lambda: ({'success': True, 'processed': [], 'session_id': 'session-1'}, 200))
+        job.thread.join(5)
+        status = job.get_status()
+        self.assertEqual(status['status'], DefaceJobStatus.COMPLETED.value)
+        self.assertEqual(status['status_code'], 200)
+        self.assertEqual(status['result']['session_id'], 'session-1')
+
+    def test_exception_marks_job_failed(self):
+        job = self.manager.create_job()
+
+        def run():
+            raise RuntimeError('boom')
+
+        job.run(run)
+        self.assertEqual(job.status, DefaceJobStatus.FAILED)
+        self.assertEqual(job.status_code, 500)
+        self.assertEqual(job.error, 'boom')
+
+    def test_progress_is_per_job(self):
+        """Progress setters, including from worker threads, update only the calling job"""
+        seen = {}
+        both_running = threading.Barrier(2)
+
+        def run_for(name, pct):
+            def run():
+                set_deface_progress(total=2, current_item=name, status='processing')
+                both_running.wait(5)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    executor.submit(contextvars.copy_context().run, set_deface_current_item_pct, pct).result()
+                seen[name] = get_deface_progress()
+                return {'success': True}, 200
+            return run
+
+        # Allow both jobs to hold a slot at once so they overlap
+        first, second = self.manager.create_job(), self.manager.create_job()
+        threads = [threading.Thread(target=first.run, args=(run_for('a.mp4', 10),)),
+                   threading.Thread(target=second.run, args=(run_for('b.mp4', 90),))]
+        with mock.patch('app.deface_job.deface_job_slots', threading.BoundedSemaphore(2)):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+
+        self.assertEqual((seen['a.mp4']['current_item'], seen['a.mp4']['current_item_pct']), ('a.mp4', 10))
+        self.assertEqual((seen['b.mp4']['current_item'], seen['b.mp4']['current_item_pct']), ('b.mp4', 90))
+        self.assertEqual(first.get_status()['progress']['current_item_pct'], 10)
+
+    def test_finished_jobs_are_cleaned_up(self):
+        job = self.manager.create_job()
+        job.run(lambda: ({'success': True}, 200))
+        self.manager.cleanup_old_jobs(max_age_seconds=0)
+        job.end_time -= 1
+        self.manager.cleanup_old_jobs(max_age_seconds=0)
+        self.assertIsNone(self.manager.get_job(job.job_id))
+
+    def test_items_are_published_while_running(self):
+        """Items added during the run are readable (by offset) before the job finishes"""
+        published = threading.Event()
+        release = threading.Event()
+
+        def run():
+            add_deface_completed_item({'sequence': 1, 'defaced_url': '/a'})
+            add_deface_completed_item({'sequence': 2, 'defaced_url': '/b'})
+            published.set()
+            release.wait(5)
+            return {'success': True}, 200
+
+        job = self.manager.create_job()
+        job.start(run)
+        self.assertTrue(published.wait(5))
+        self.assertFalse(job.done)
+        self.assertEqual([i['sequence'] for i in job.get_items()], [1, 2])
+        self.assertEqual([i['sequence'] for i in job.get_items(1)], [2])
+        self.assertEqual(job.get_items(0, 1), [{'sequence': 1, 'defaced_url': '/a'}])
+        progress = job.get_status()['progress']
+        self.assertEqual(progress['items_available'], 2)
+        self.assertNotIn('completed_items', progress)
+        self.assertEqual(progress['completed_item_urls'], ['/a', '/b'])
+        release.set()
+        job.thread.join(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
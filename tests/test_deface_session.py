@@ -0,0 +1,219 @@
+"""
+Unit tests for the persistent deface session store
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from app import deface_session
+
+
+class SessionStoreTestCase(unittest.TestCase):
+    """Runs each test against an empty store backed by a temp file"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        patcher = mock.patch.object(deface_session, 'DEFACE_SESSION_STORE_FILE', self.temp_dir / 'sessions.json')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._reset()
+
+    def tearDown(self):
+        self._reset()
+        shutil.rmtree(self.temp_dir)
+
+    def _reset(self):
+        """Forget the in-memory sessions, as a restart would"""
+        deface_session._sessions.clear()
+        deface_session._loaded = False
+        deface_session._unsaved_processed.clear()
+        deface_session._processed_saved_at.clear()
+
+    def _session_with_data(self, name, size):
+        session_dir = self.temp_dir / name
+        session_dir.mkdir()
+        (session_dir / 'defaced.bin').write_bytes(b'x' * size)
+        return deface_session.create_session(session_dir)
+
+
+class TestPersistence(SessionStoreTestCase):
+    """Test that sessions survive a restart"""
+
+    def test_session_is_reloaded(self):
+        session_id = self._session_with_data('deface_a', 10)
+        deface_session.update_session_processed(session_id, [{'type': 'image', 'defaced_path': 'x.jpg'}])
+        deface_session.add_manual_defaces(session_id, '1', [{'x': 1, 'y': 2, 'width': 3, 'height': 4}])
+        self._reset()
+
+        session = deface_session.get_session(session_id)
+        self.assertIsNotNone(session)
+        self.assertEqual(session['processed'][0]['defaced_path'], 'x.jpg')
+        self.assertEqual(deface_session.get_manual_defaces(session_id, '1')[0]['width'], 3)
+
+    def test_session_without_temp_dir_is_dropped_on_load(self):
+        session_id = self._session_with_data('deface_b', 10)
+        shutil.rmtree(self.temp_dir / 'deface_b')
+        self._reset()
+        self.assertIsNone(deface_session.get_session(session_id))
+
+    def test_interrupted_run_is_marked_failed(self):
+        session_id = self._session_with_data('deface_c', 10)
+        deface_session.update_session_progress(session_id, status='processing')
+        deface_session.update_session_processed(session_id, [])
+        self._reset()
+        self.assertEqual(deface_session.get_session_progress(session_id)['status'], 'error')
+
+
+class TestSharedStore(SessionStoreTestCase):
+    """Test that worker processes sharing the store file see each other's changes"""
+
+    def _write_from_other_process(self, change):
+        """Change the store file as another worker would (its own read-modify-write)"""
+        store_file = deface_session.DEFACE_SESSION_STORE_FILE
+        data = json.loads(store_file.read_text())
+        change(data['sessions'])
+        time.sleep(0.01)  # a distinct mtime
+        store_file.write_text(json.dumps(data))
+
+    def test_changes_by_other_process_are_picked_up(self):
+        session_id = self._session_with_data('deface_shared', 10)
+        other_dir = self.temp_dir / 'deface_other'
+        other_dir.mkdir()
+
+        def add_session(sessions):
+            sessions['other'] = dict(sessions[session_id], session_id='other', temp_dir=str(other_dir))
+            sessions[session_id]['processed'] = [{'type': 'image', 'defaced_path': 'y.jpg'}]
+        self._write_from_other_process(add_session)
+
+        self.assertIsNotNone(deface_session.get_session('other'))
+        self.assertEqual(deface_session.get_session(session_id)['processed'][0]['defaced_path'], 'y.jpg')
+
+        self._write_from_other_process(lambda sessions: sessions.pop('other'))
+        self.assertIsNone(deface_session.get_session('other'))
+
+    def test_run_status_is_visible_to_other_processes(self):
+        session_id = self._session_with_data('deface_status', 10)
+
+        def stored_progress():
+            return json.loads(deface_session.DEFACE_SESSION_STORE_FILE.read_text())['sessions'][session_id]['progress']
+
+        deface_session.update_session_progress(session_id, total=3, completed=0, status='processing')
+        self.assertEqual((stored_progress()['status'], stored_progress()['pid']), ('processing', os.getpid()))
+        deface_session.update_session_progress(session_id, completed=1)
+        deface_session.update_session_progress(session_id, completed=3, status='complete')
+        self.assertEqual(stored_progress()['status'], 'complete')
+
+    def test_per_item_processed_updates_are_throttled(self):
+        session_id = self._session_with_data('deface_items', 10)
+
+        def stored_processed():
+            return json.loads(deface_session.DEFACE_SESSION_STORE_FILE.read_text())['sessions'][session_id]['processed']
+
+        items = []
+        with mock.patch.object(deface_session, '_save', wraps=deface_session._save) as save:
+            for n in range(50):
+                items = items + [{'type': 'image', 'defaced_path': f'{n}.jpg'}]
+                deface_session.update_session_processed(session_id, items, flush=False)
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(len(stored_processed()), 1)
+
+        # Unsaved items survive a reload for another worker's change, and the final update saves them
+        self._write_from_other_process(lambda sessions: sessions[session_id].update(last_accessed=time.time()))
+        self.assertEqual(len(deface_session.get_session(session_id)['processed']), 50)
+        deface_session.update_session_processed(session_id, items)
+        self.assertEqual(len(stored_processed()), 50)
+
+    def test_run_of_another_live_process_is_not_failed(self):
+        session_id = self._session_with_data('deface_live', 10)
+        deface_session.update_session_progress(session_id, status='processing')
+        deface_session.update_session_processed(session_id, [])
+        self._write_from_other_process(lambda sessions: sessions[session_id]['progress'].update(pid=os.getppid()))
+        self._reset()
+        self.assertEqual(deface_session.get_session_progress(session_id)['status'], 'processing')
+
+
+class TestExpiry(SessionStoreTestCase):
+    """Test that sessions expire after a period without use, never while processing"""
+
+    def test_expiry_follows_last_use(self):
+        used = self._session_with_data('deface_used', 10)
+        idle = self._session_with_data('deface_idle', 10)
+        busy = self._session_with_data('deface_busy', 10)
+        deface_session.update_session_progress(busy, status='processing')
+        long_ago = time.time() - deface_session.SESSION_TIMEOUT.total_seconds() - 60
+        for session_id in (used, idle, busy):
+            deface_session._sessions[session_id]['created_at'] = datetime.fromtimestamp(long_ago)
+        for session_id in (idle, busy):
+            deface_session._sessions[session_id]['last_accessed'] = long_ago
+
+        deface_session.cleanup_expired_sessions()
+        self.assertIsNotNone(deface_session.get_session(used))
+        self.assertIsNone(deface_session.get_session(idle))
+        self.assertIsNotNone(deface_session.get_session(busy))
+
+
+class TestDiskQuota(SessionStoreTestCase):
+    """Test disk usage accounting and least recently used eviction"""
+
+    def test_usage_and_lru_eviction(self):
+        old = self._session_with_data('deface_old', 1000)
+        busy = self._session_with_data('deface_busy', 1000)
+        recent = self._session_with_data('deface_recent', 1000)
+        deface_session.update_session_progress(busy, status='processing')
+        deface_session._sessions[old]['last_accessed'] = 1
+        deface_session._sessions[busy]['last_accessed'] = 2
+        deface_session.get_session(recent)
+
+        usage = deface_session.get_sessions_disk_usage()
+        self.assertEqual(usage['total_bytes'], 3000)
+        self.assertEqual(usage['sessions'][0]['session_id'], recent)
+
+        evicted = deface_session.enforce_disk_quota(quota_bytes=2500)
+        self.assertEqual(evicted, [old])
+        self.assertFalse((self.temp_dir / 'deface_old').exists())
+
+        # The processing session is skipped even though it is older
+        self.assertEqual(deface_session.enforce_disk_quota(quota_bytes=1500), [recent])
+        self.assertIsNotNone(deface_session.get_session(busy))
+
+
+class TestOrphanSweep(SessionStoreTestCase):
+    """Test removal of session temp directories no session owns"""
+
+    def test_only_old_unowned_dirs_are_removed(self):
+        prefix = deface_session.TEMP_DIR_PREFIX
+        owned = self.temp_dir / f'{prefix}owned'
+        owned.mkdir()
+        deface_session.create_session(owned)
+        orphan = self.temp_dir / f'{prefix}orphan'
+        fresh = self.temp_dir / f'{prefix}fresh'
+        others = [self.temp_dir / name for name in ('unrelated', 'deface_frames_x', 'deface_other_app')]
+        for path in [orphan, fresh] + others:
+            path.mkdir()
+        old = time.time() - 7200
+        for path in [owned, orphan] + others:
+            os.utime(path, (old, old))
+
+        removed = deface_session.sweep_orphaned_temp_dirs(min_age_seconds=3600, temp_root=self.temp_dir)
+        self.assertEqual(removed, [str(orphan)])
+        self.assertTrue(owned.exists() and fresh.exists())
+        self.assertTrue(all(path.exists() for path in others))
+
+    def test_session_dirs_are_created_under_the_session_root(self):
+        root = self.temp_dir / 'sessions'
+        with mock.patch.object(deface_session, 'DEFACE_SESSION_TEMP_ROOT', root):
+            temp_dir = deface_session.create_session_temp_dir()
+            old = time.time() - 7200
+            os.utime(temp_dir, (old, old))
+            self.assertEqual(temp_dir.parent, root)
+            self.assertTrue(temp_dir.name.startswith(deface_session.TEMP_DIR_PREFIX))
+            self.assertEqual(deface_session.sweep_orphaned_temp_dirs(min_age_seconds=3600), [str(temp_dir)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Unit tests for detection stride and box tracking in the video deface pipeline
+"""
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from app import deface_video_pipeline
+from app.deface_video_pipeline import (
+    expand_boxes, interpolate_boxes, match_boxes, plan_segments, track_detections
+)
+
+
+def _dets(*boxes):
+    return np.asarray([list(b) + [0.9] for b in boxes], dtype=np.float32).reshape(-1, 5)
+
+
+class TestTrackDetections(unittest.TestCase):
+    """Test which frames run detection and which boxes carried frames get"""
+
+    def setUp(self):
+        self.calls = []
+
+    def _frames(self, n, cut_at=None):
+        frames = []
+        for i in range(n):
+            value = 200 if cut_at is not None and i >= cut_at else 50
+            frame = np.full((36, 64, 3), value, dtype=np.uint8)
+            frame[0, 0, 0] = i  # identify the frame
+            frames.append(frame)
+        return frames
+
+    def _detect(self, frame):
+        index = int(frame[0, 0, 0])
+        self.calls.append(index)
+        # One face moving 5px right per frame
+        return _dets((5 * index, 0, 5 * index + 20, 20))
+
+    def _run(self, frames, stride, scene_threshold=0.0, margin=0.0):
+        return list(track_detections(frames, self._detect, stride, scene_threshold, margin))
+
+    def test_stride_one_detects_every_frame(self):
+        out = self._run(self._frames(5), 1)
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4])
+        self.assertTrue(all(detected for _, _, detected in out))
+
+    def test_stride_detects_every_nth_frame_in_order(self):
+        out = self._run(self._frames(11), 5)
+        self.assertEqual(self.calls, [0, 5, 10])
+        self.assertEqual([int(f[0, 0, 0]) for f, _, _ in out], list(range(11)))
+        self.assertEqual([d for _, _, d in out], [i % 5 == 0 for i in range(11)])
+
+    def test_carried_boxes_are_interpolated(self):
+        out = self._run(self._frames(6), 5)
+        frame, dets, detected = out[2]
+        self.assertFalse(detected)
+        np.testing.assert_allclose(dets[0, :4], [10, 0, 30, 20], atol=1e-4)
+
+    def test_trailing_frames_hold_last_boxes(self):
+        out = self._run(self._frames(8), 5)
+        np.testing.assert_allclose(out[7][1][0, :4], [25, 0, 45, 20], atol=1e-4)
+
+    def test_scene_cut_forces_detection_and_is_not_interpolated(self):
+        out = self._run(self._frames(10, cut_at=3), 5, scene_threshold=30.0)
+        self.assertEqual(self.calls, [0, 3, 8])
+        # Frames before the cut keep the first scene's box
+        np.testing.assert_allclose(out[2][1][0, :4], [0, 0, 20, 20], atol=1e-4)
+
+    def test_margin_applies_only_to_carried_frames(self):
+        out = self._run(self._frames(6), 5, margin=0.5)
+        np.testing.assert_allclose(out[0][1][0, :4], [0, 0, 20, 20])
+        np.testing.assert_allclose(out[2][1][0, :4], [0, 0, 40, 30], atol=1e-4)
+
+
+class TestBoxMatching(unittest.TestCase):
+    """Test matching and interpolation between detection frames"""
+
+    def test_small_fast_face_still_matches(self):
+        """A face that moves further than its width (no overlap) is still matched"""
+        self.assertEqual(match_boxes(_dets((0, 0, 20, 20)), _dets((25, 0, 45, 20))), [(0, 0)])
+
+    def test_distant_boxes_do_not_match(self):
+        self.assertEqual(match_boxes(_dets((0, 0, 20, 20)), _dets((200, 0, 220, 20))), [])
+
+    def test_unmatched_boxes_are_held(self):
+        """Faces leaving or entering between detections are kept on carried frames"""
+        boxes = interpolate_boxes(_dets((0, 0, 20, 20)), _dets((200, 0, 220, 20)), 0.5, 0.0)
+        self.assertEqual(len(boxes), 2)
+
+    def test_expand_boxes_clips_at_zero(self):
+        np.testing.assert_allclose(expand_boxes(_dets((5, 5, 25, 25)), 0.5)[0, :4], [0, 0, 35, 35])
+
+
+
+class TestPlanSegments(unittest.TestCase):
+    """Test where long videos are split for parallel segment processing"""
+
+    def setUp(self):
+        self.keyframes = [i * 2.0 for i in range(60)]  # 2s GOP, 120s video
+
+    def test_splits_on_keyframes_near_even_division(self):
+        self.assertEqual(plan_segments(self.keyframes, 120.0, 4, 10), [30.0, 60.0, 90.0])
+
+    def test_irregular_keyframes_pick_nearest(self):
+        self.assertEqual(plan_segments([0.0, 7.0, 13.0, 29.0, 31.5], 40.0, 2, 10), [13.0])
+
+    def test_segment_count_limited_by_min_length(self):
+        self.assertEqual(len(plan_segments(self.keyframes, 25.0, 8, 10)), 1)
+
+    def test_short_video_or_single_worker_not_split(self):
+        self.assertEqual(plan_segments(self.keyframes, 15.0, 8, 10), [])
+        self.assertEqual(plan_segments(self.keyframes, 120.0, 1, 10), [])
+
+    def test_no_keyframes_not_split(self):
+        self.assertEqual(plan_segments([], 120.0, 4, 10), [])
+
+
+
+class TestSegmentFailure(unittest.TestCase):
+    """Test that a failed segment stops the others before the segment files are removed"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        self.stopped = {}
+        self.started = threading.Event()
+
+    def tearDown(self):
+        self.pool.shutdown(wait=True)
+        shutil.rmtree(self.temp_dir)
+
+    def _split(self, input_path, split_times, segment_dir):
+        paths = [segment_dir / f'segment_{i:03d}.mp4' for i in range(3)]
+        for path in paths:
+            path.write_bytes(b'segment')
+        return paths
+
+    def _task(self, index, progress, cancel_event, scale, execution_provider, kwargs):
+        if cancel_event.is_set():
+            raise RuntimeError('Processing cancelled')
+        if index == 0:
+            self.started.wait(5)
+            raise RuntimeError('segment 0 failed')
+        self.started.set()
+        while not cancel_event.is_set():
+            kwargs['output_path'].write_bytes(b'frame')
+            progress[index] = (1, 10)
+            time.sleep(0.01)
+        self.stopped[index] = kwargs['output_path'].parent.exists()
+        raise RuntimeError('Processing cancelled')
+
+    def test_running_segments_stop_before_cleanup(self):
+        with mock.patch.object(deface_video_pipeline, '_split_at_keyframes', self._split), \
+                mock.patch.object(deface_video_pipeline, '_get_segment_pool', return_value=self.pool), \
+                mock.patch.object(deface_video_pipeline, '_anonymize_segment_task', self._task):
+            with self.assertRaisesRegex(RuntimeError, 'segment 0 failed'):
+                deface_video_pipeline.anonymize_video_segmented(
+                    self.temp_dir / 'in.mp4', self.temp_dir / 'out' / 'out.mp4', [10.0, 20.0])
+        # Every segment that was running saw the cancellation while its directory still existed
+        self.assertIn(1, self.stopped)
+        self.assertTrue(all(self.stopped.values()))
+        self.assertEqual(list((self.temp_dir / 'out').iterdir()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
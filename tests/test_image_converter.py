@@ -0,0 +1,82 @@
+"""
+Unit tests for image conversion (draft decoding and batch engine)
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from app.image_converter import convert_image_to_jpeg, convert_images_batch
+
+
+class TestImageConverter(unittest.TestCase):
+    """Test single and batch JPEG conversion"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _make_jpeg(self, name, size, orientation=None):
+        path = self.temp_dir / name
+        img = Image.new('RGB', size, (200, 100, 50))
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        img.save(path, 'JPEG', exif=exif)
+        return path
+
+    def test_large_downscale_uses_draft(self):
+        """Large JPEG downscales decode in draft mode and report final size without re-reading"""
+        src = self._make_jpeg('big.jpg', (4000, 3000))
+        result = convert_image_to_jpeg(src, self.temp_dir / 'out.jpg', (640, 480), 80)
+        self.assertTrue(result['success'])
+        self.assertTrue(result['draft_decoded'])
+        self.assertEqual((result['original_width'], result['original_height']), (4000, 3000))
+        self.assertEqual((result['final_width'], result['final_height']), (640, 480))
+        with Image.open(self.temp_dir / 'out.jpg') as out:
+            self.assertEqual(out.size, (640, 480))
+        self.assertEqual(set(result['timings']), {'decode_ms', 'resize_ms', 'encode_ms'})
+
+    def test_small_downscale_skips_draft(self):
+        """Small factors decode at full size"""
+        src = self._make_jpeg('medium.jpg', (1600, 1200))
+        result = convert_image_to_jpeg(src, self.temp_dir / 'out.jpg', (1280, 720), 80)
+        self.assertTrue(result['success'])
+        self.assertFalse(result['draft_decoded'])
+
+    def test_exif_rotated_dimensions(self):
+        """Orientation 6 (90 degrees) swaps reported and output dimensions"""
+        src = self._make_jpeg('rotated.jpg', (4000, 3000), orientation=6)
+        result = convert_image_to_jpeg(src, self.temp_dir / 'out.jpg', (480, 640), 80)
+        self.assertTrue(result['success'])
+        self.assertEqual((result['original_width'], result['original_height']), (3000, 4000))
+        self.assertEqual((result['final_width'], result['final_height']), (480, 640))
+
+    def test_batch_preserves_order(self):
+        """Batch results come back in input order with per-image timings"""
+        items = []
+        for i in range(4):
+            src = self._make_jpeg(f'img{i}.jpg', (800 + i * 100, 600))
+            items.append({
+                'input_path': src,
+                'output_path': self.temp_dir / 'out' / f'img{i}.jpg',
+                'resolution': (400, 300),
+                'quality': 80
+            })
+        items.append({'input_path': self.temp_dir / 'missing.jpg',
+                      'output_path': self.temp_dir / 'out' / 'missing.jpg'})
+        batch = convert_images_batch(items, max_workers=2)
+        self.assertEqual(batch['succeeded'], 4)
+        self.assertEqual(batch['failed'], 1)
+        for i, result in enumerate(batch['results'][:4]):
+            self.assertEqual(result['output_path'], str(self.temp_dir / 'out' / f'img{i}.jpg'))
+            self.assertIn('timings', result)
+        self.assertEqual(batch['results'][4]['error_type'], 'FileNotFound')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Unit tests for image rotation (lossless / EXIF paths and cache invalidation)
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image, ImageOps
+
+from app import image_rotator
+from app.image_rotator import compose_orientation, rotate_image, rotate_images, set_exif_orientation
+
+
+class TestImageRotator(unittest.TestCase):
+    """Test in-place rotation"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _make_jpeg(self, name, size=(64, 32), orientation=None):
+        path = self.temp_dir / name
+        img = Image.new('RGB', size, (255, 0, 0))
+        img.paste((0, 0, 255), (0, 0, size[0] // 2, size[1]))  # Left half blue
+        exif = Image.Exif()
+        exif[0x010F] = 'TestCamera'
+        if orientation:
+            exif[0x0112] = orientation
+        img.save(path, 'JPEG', exif=exif, quality=95)
+        return path
+
+    def _displayed(self, path):
+        with Image.open(path) as img:
+            return ImageOps.exif_transpose(img).convert('RGB')
+
+    def test_compose_orientation(self):
+        """Rotations compose with existing EXIF orientations"""
+        self.assertEqual(compose_orientation(1, 90), 6)
+        self.assertEqual(compose_orientation(1, -90), 8)
+        self.assertEqual(compose_orientation(1, 180), 3)
+        self.assertEqual(compose_orientation(6, 90), 3)
+        self.assertEqual(compose_orientation(6, -90), 1)
+        self.assertEqual(compose_orientation(2, 180), 4)
+
+    def test_exif_mode_rewrites_tag_only(self):
+        """EXIF mode leaves the compressed image data untouched"""
+        path = self._make_jpeg('tagged.jpg', orientation=1)
+        before = path.read_bytes()
+        result = rotate_image(path, 90, mode='exif')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['method'], 'exif')
+        after = path.read_bytes()
+        self.assertEqual(len(before), len(after))
+        with Image.open(path) as img:
+            self.assertEqual(img.getexif()[0x0112], 6)
+        self.assertEqual(self._displayed(path).size, (32, 64))
+
+    def test_undoing_orientation_needs_no_pixel_work(self):
+        """Rotating an EXIF-rotated image back upright just resets the tag"""
+        path = self._make_jpeg('rotated.jpg', orientation=6)
+        result = rotate_image(path, -90)
+        self.assertEqual(result['method'], 'exif')
+        self.assertEqual(self._displayed(path).size, (64, 32))
+
+    def test_reencode_fallback_without_jpegtran(self):
+        """Without jpegtran the pixels are rotated and re-encoded"""
+        path = self._make_jpeg('plain.jpg')
+        with patch.object(image_rotator.shutil, 'which', return_value=None):
+            result = rotate_image(path, 90)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['method'], 'reencode')
+        displayed = self._displayed(path)
+        self.assertEqual(displayed.size, (32, 64))
+        # Clockwise: the blue left half ends up on top
+        self.assertGreater(displayed.getpixel((16, 5))[2], 200)
+
+    def test_set_orientation_without_exif(self):
+        """Files without an orientation tag cannot be patched in place"""
+        path = self.temp_dir / 'noexif.jpg'
+        Image.new('RGB', (16, 16)).save(path, 'JPEG')
+        self.assertFalse(set_exif_orientation(path, 6))
+
+    def test_rotation_invalidates_all_thumbnail_sizes(self):
+        """Every cached thumbnail size is cleared, not just 120x90"""
+        from app.thumbnail_generator import get_thumbnail, get_thumbnail_cache_path
+        path = self._make_jpeg('thumbs.jpg', orientation=1)
+        cache_paths = []
+        for size in ((120, 90), (640, 480)):
+            get_thumbnail(path, 'jpg', size)
+            cache_paths.append(get_thumbnail_cache_path(path, size))
+        self.assertTrue(all(p.exists() for p in cache_paths))
+        rotate_image(path, 90, mode='exif')
+        self.assertFalse(any(p.exists() for p in cache_paths))
+
+    def test_batch_rotation(self):
+        """Batch rotation returns one result per file in order"""
+        paths = [self._make_jpeg(f'b{i}.jpg', orientation=1) for i in range(3)]
+        results = rotate_images(paths, 180, mode='exif', max_workers=2)
+        self.assertEqual([r['file_path'] for r in results], [str(p) for p in paths])
+        self.assertTrue(all(r['success'] for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
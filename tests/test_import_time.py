@@ -0,0 +1,59 @@
+"""
+Regression test for server start-up import cost
+
+Runs `python -X importtime` on create_app() in a fresh interpreter and checks
+that none of the heavy libraries (OpenCV, NumPy, Pillow, ReportLab,
+python-docx) is imported until a route needs it.
+"""
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Top-level packages the feature routes must import on first use only
+HEAVY_MODULES = ('cv2', 'numpy', 'PIL', 'reportlab', 'docx', 'imageio', 'onnxruntime')
+
+
+def measure_import_time():
+    """
+    Import the app and build it under -X importtime.
+
+    Returns:
+        Dict mapping module name to cumulative import time in microseconds
+    """
+    env = dict(os.environ, DEFACE_SESSION_REAP_INTERVAL='0', PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+        cwd=str(PROJECT_ROOT), env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise AssertionError(f"create_app() failed:\n{proc.stderr[-2000:]}")
+    timings = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        timings[parts[2].strip()] = int(parts[1].strip())
+    return timings
+
+
+class TestImportTime(unittest.TestCase):
+    """Test that starting the server does not load heavy libraries"""
+
+    def test_create_app_does_not_import_heavy_modules(self):
+        timings = measure_import_time()
+        self.assertIn('app.routes', timings)
+        heavy = sorted(name for name in timings if name.split('.')[0] in HEAVY_MODULES)
+        slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:15]
+        report = '\n'.join(f'{us / 1000:8.1f} ms  {name}' for name, us in slowest)
+        self.assertEqual(heavy, [], f"Heavy modules imported at start-up; slowest imports:\n{report}")
+
+
+if __name__ == '__main__':
+    unittest.main()
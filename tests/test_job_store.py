@@ -0,0 +1,175 @@
+"""
+Unit tests for job state shared between worker processes
+"""
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import job_store
+from app.conversion_job import JobManager, JobStatus, SharedConversionJob
+from app.deface_job import DefaceJobManager, DefaceJobStatus, SharedDefaceJob
+from app.deface_video_log import add_deface_completed_item, set_deface_progress
+from app.job_store import JobSnapshotStore
+
+
+class JobStoreTestCase(unittest.TestCase):
+    """Two managers on one store directory stand in for two worker processes"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        patcher = mock.patch.object(job_store, 'JOB_STATE_PUBLISH_INTERVAL', 0.05)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def store(self, kind):
+        return JobSnapshotStore(self.temp_dir / kind)
+
+
+class TestJobSnapshotStore(JobStoreTestCase):
+    """Test snapshot files, cancel markers and cleanup"""
+
+    def test_save_load_cancel_and_cleanup(self):
+        store = self.store('test')
+        self.assertIsNone(store.load('missing'))
+        self.assertFalse(store.request_cancel('missing'))
+        self.assertIsNone(store.load('../etc/passwd'))
+
+        store.save('job-1', {'status': 'processing'})
+        self.assertEqual(store.load('job-1')['status'], 'processing')
+        self.assertTrue(job_store.owner_is_live(store.load('job-1')))
+        self.assertFalse(store.cancel_requested('job-1'))
+        self.assertTrue(store.request_cancel('job-1'))
+        self.assertTrue(store.cancel_requested('job-1'))
+
+        store.cleanup(max_age_seconds=3600)
+        self.assertIsNotNone(store.load('job-1'))
+        store.cleanup(max_age_seconds=-1)
+        self.assertIsNone(store.load('job-1'))
+        self.assertFalse(store.cancel_requested('job-1'))
+
+
+class TestSharedDefaceJob(JobStoreTestCase):
+    """Test that a worker that does not own a deface job can report it"""
+
+    def test_status_and_items_from_other_worker(self):
+        owner, other = DefaceJobManager(self.store('deface')), DefaceJobManager(self.store('deface'))
+        published = threading.Event()
+        release = threading.Event()
+
+        def run():
+            set_deface_progress(total=2, completed=1, status='processing')
+            add_deface_completed_item({'sequence': 1, 'defaced_url': '/a'})
+            published.set()
+            release.wait(5)
+            return {'success': True, 'processed': [{'sequence': 1}]}, 200
+
+        job = owner.create_job('session-1')
+        job.store.start_publisher = lambda *args, **kwargs: None  # publish by hand below
+        job.start(run)
+        self.assertTrue(published.wait(5))
+        job.store.save(job.job_id, job.snapshot())
+
+        shared = other.get_job(job.job_id)
+        self.assertIsInstance(shared, SharedDefaceJob)
+        self.assertEqual(shared.status, DefaceJobStatus.PROCESSING)
+        self.assertFalse(shared.done)
+        self.assertEqual(shared.get_status()['progress']['completed'], 1)
+        self.assertEqual(shared.get_items(), [{'sequence': 1, 'defaced_url': '/a'}])
+
+        release.set()
+        job.thread.join(5)
+        status = shared.get_status()
+        self.assertTrue(shared.done)
+        self.assertEqual((status['status'], status['status_code']), ('completed', 200))
+        self.assertEqual(status['result']['processed'], [{'sequence': 1}])
+        self.assertIsNone(other.get_job('unknown'))
+
+
+class TestSharedConversionJob(JobStoreTestCase):
+    """Test status and cancel of a conversion job from another worker"""
+
+    def test_cancel_from_other_worker(self):
+        owner, other = JobManager(self.store('conversion')), JobManager(self.store('conversion'))
+        started = threading.Event()
+
+        def convert(file_info, settings):
+            started.set()
+            time.sleep(0.3)
+            return {'success': True}
+
+        job_id = owner.create_job([{'type': 'video', 'path': f'/in/{i}.mp4'} for i in range(5)], {})
+        job = owner.get_job(job_id)
+        job.start(convert)
+        self.assertTrue(started.wait(5))
+
+        shared = other.get_job(job_id)
+        self.assertIsInstance(shared, SharedConversionJob)
+        self.assertEqual(shared.get_status()['total_files'], 5)
+        self.assertTrue(other.cancel_job(job_id))
+
+        job.thread.join(10)
+        self.assertEqual(job.status, JobStatus.CANCELLED)
+        deadline = time.time() + 5
+        while shared.get_status()['status'] != 'cancelled' and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(shared.get_status()['status'], 'cancelled')
+        self.assertLess(shared.get_status()['completed_files'], 5)
+
+
+
+class TestOrphanedJobs(JobStoreTestCase):
+    """Test that a job whose worker process died is reported as failed"""
+
+    def setUp(self):
+        super().setUp()
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        self.dead_pid = process.pid
+
+    def _orphan(self, store, job_id):
+        snapshot = store.load(job_id)
+        snapshot['owner_pid'] = self.dead_pid
+        path = store.directory / f'{job_id}.json'
+        path.write_text(json.dumps(snapshot))
+
+    def test_deface_job(self):
+        store = self.store('deface')
+        job = DefaceJobManager(store).create_job('session-1')
+        self._orphan(store, job.job_id)
+
+        shared = DefaceJobManager(store).get_job(job.job_id)
+        self.assertTrue(shared.done)  # ends the /apply_deface/events stream
+        status = shared.get_status()
+        self.assertEqual((status['status'], status['status_code']), ('failed', 500))
+        self.assertEqual(status['error'], job_store.OWNER_GONE_ERROR)
+        self.assertEqual(store.load(job.job_id)['status'], 'failed')
+
+    def test_conversion_job(self):
+        store = self.store('conversion')
+        job_id = JobManager(store).create_job([{'type': 'video', 'path': '/in/a.mp4'}], {})
+        self._orphan(store, job_id)
+
+        status = JobManager(store).get_job(job_id).get_status()
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], job_store.OWNER_GONE_ERROR)
+        self.assertNotIn('owner_pid', status)
+
+    def test_finished_job_is_kept(self):
+        store = self.store('conversion')
+        store.save('job-1', {'job_id': 'job-1', 'status': 'completed', 'end_time': time.time()})
+        self._orphan(store, 'job-1')
+        self.assertEqual(SharedConversionJob(store, 'job-1').get_status()['status'], 'completed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Unit tests for JSON listing ETags (304) and JSON compression
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask, jsonify
+
+from app.listing_cache import cached_listing, compress_json_response, directory_snapshot_etag, learner_folder
+
+
+class TestDirectorySnapshotEtag(unittest.TestCase):
+    """Test that the ETag follows the folder's contents"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        (self.temp_dir / 'sub').mkdir()
+        (self.temp_dir / 'sub' / 'a.mp4').write_bytes(b'aaa')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_changes_with_files(self):
+        etag = directory_snapshot_etag([self.temp_dir], 'q=1')
+        self.assertEqual(directory_snapshot_etag([self.temp_dir], 'q=1'), etag)
+        self.assertNotEqual(directory_snapshot_etag([self.temp_dir], 'q=2'), etag)
+
+        (self.temp_dir / 'sub' / 'b.jpg').write_bytes(b'b')
+        added = directory_snapshot_etag([self.temp_dir], 'q=1')
+        self.assertNotEqual(added, etag)
+
+        os.utime(self.temp_dir / 'sub' / 'b.jpg', ns=(1, 1))
+        self.assertNotEqual(directory_snapshot_etag([self.temp_dir], 'q=1'), added)
+        self.assertNotEqual(directory_snapshot_etag([self.temp_dir / 'missing'], 'q=1'), etag)
+
+
+class TestCachedListing(unittest.TestCase):
+    """Test 304 handling and compression through a minimal app"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.learner_dir = self.temp_dir / 'Qual' / 'Learner'
+        self.learner_dir.mkdir(parents=True)
+        (self.learner_dir / 'clip.mp4').write_bytes(b'x')
+        patcher = mock.patch('config.OUTPUT_FOLDER', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+        app = Flask(__name__)
+
+        @app.route('/list')
+        @cached_listing(learner_folder('OUTPUT_FOLDER'))
+        def listing():
+            self.calls += 1
+            names = sorted(p.name for p in self.learner_dir.iterdir())
+            return jsonify({'success': True, 'files': names * 200})
+
+        app.after_request(compress_json_response)
+        self.client = app.test_client()
+        self.url = '/list?qualification=Qual&learner=Learner'
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_not_modified_until_folder_changes(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        etag = r.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(r.headers['Cache-Control'], 'private, no-cache')
+
+        r = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.headers['ETag'], etag)
+        self.assertEqual(self.calls, 1)
+
+        (self.learner_dir / 'new.jpg').write_bytes(b'y')
+        r = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('new.jpg', r.get_json()['files'])
+        self.assertEqual(self.calls, 2)
+
+    def test_without_learner_not_cached(self):
+        r = self.client.get('/list')
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn('ETag', r.headers)
+
+    def test_gzip_and_revalidate_compressed_etag(self):
+        r = self.client.get(self.url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', r.headers['Vary'])
+        self.assertTrue(r.headers['ETag'].endswith('-gzip"'))
+        body = json.loads(gzip.decompress(r.get_data()))
+        self.assertEqual(len(body['files']), 200)
+        self.assertEqual(int(r.headers['Content-Length']), len(r.get_data()))
+
+        r = self.client.get(self.url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': r.headers['ETag']})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+    def test_small_or_unaccepted_not_compressed(self):
+        r = self.client.get(self.url)
+        self.assertNotIn('Content-Encoding', r.headers)
+        with mock.patch('app.listing_cache.JSON_COMPRESS_MIN_BYTES', 10 ** 9):
+            r = self.client.get('/list', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', r.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
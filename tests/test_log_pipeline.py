@@ -0,0 +1,130 @@
+"""
+Unit tests for the queue-based logging pipeline
+"""
+import json
+import logging
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app import log_pipeline
+
+
+class TestLogPipeline(unittest.TestCase):
+    """Test that records are written by the background writer, and trace events as JSON lines"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        root = logging.getLogger()
+        self.saved_root = (list(root.handlers), root.level)
+        log_pipeline.configure_logging(self.temp_dir)
+
+    def tearDown(self):
+        log_pipeline._stop_listener()
+        for logger, queue_handler in log_pipeline._queue_handlers:
+            logger.removeHandler(queue_handler)
+        log_pipeline._queue_handlers.clear()
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved_root
+        root.setLevel(level)
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, name):
+        log_pipeline.flush_logs()
+        return (self.temp_dir / name).read_text()
+
+    def test_records_reach_their_files(self):
+        logging.getLogger('app.routes.deface').debug('deface line')
+        logging.getLogger('media_converter.job').info('converter line')
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logging.getLogger('app.other').exception('failed')
+
+        deface_log = self.read('deface.log')
+        self.assertIn('app.routes.deface - DEBUG - deface line', deface_log)
+        self.assertNotIn('converter line', deface_log)
+        self.assertIn('converter line', self.read('media_converter.log'))
+        app_log = self.read('app.log')
+        self.assertIn('deface line', app_log)
+        self.assertIn('ValueError: boom', app_log)
+
+    def test_trace_event_json_and_sampling(self):
+        log_pipeline.trace_event('test.event', session_id='abc', count=2, path=Path('/tmp/x'))
+        with mock.patch.object(log_pipeline, 'DEBUG_TRACE_SAMPLE_RATE', 0):
+            log_pipeline.trace_event('test.skipped')
+
+        events = [json.loads(line) for line in self.read('trace.log').splitlines()]
+        self.assertEqual([e['event'] for e in events], ['test.event'])
+        self.assertEqual(events[0]['data'], {'session_id': 'abc', 'count': 2, 'path': '/tmp/x'})
+        self.assertIn('test_log_pipeline:', events[0]['location'])
+        self.assertNotIn('test.event', self.read('app.log'))
+
+    def test_full_queue_drops_only_below_warning(self):
+        log_queue = queue.Queue(1)
+        handler = log_pipeline._RoutingQueueHandler(log_queue, [logging.NullHandler()])
+        dropped = log_pipeline.get_log_stats()['dropped']
+        info = logging.makeLogRecord({'msg': 'x', 'levelno': logging.INFO})
+        handler.emit(info)
+        handler.emit(info)
+        self.assertEqual(log_pipeline.get_log_stats()['dropped'], dropped + 1)
+
+        # An error waits for the writer to make room
+        error = logging.makeLogRecord({'msg': 'failed %s', 'args': ('x',), 'levelno': logging.ERROR})
+        threading.Timer(0.1, log_queue.get).start()
+        handler.emit(error)
+        self.assertEqual(log_pipeline.get_log_stats()['dropped'], dropped + 1)
+        targets, record = log_queue.get_nowait()
+        self.assertEqual(record.levelno, logging.ERROR)
+
+    def test_records_are_rendered_before_queueing(self):
+        log_queue = queue.Queue()
+        handler = log_pipeline._RoutingQueueHandler(log_queue, [logging.NullHandler()])
+        items = ['a']
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = logging.makeLogRecord({'msg': 'items %s', 'args': (items,), 'levelno': logging.ERROR,
+                                            'exc_info': sys.exc_info()})
+        data = {'count': 1}
+        record.trace = data
+        handler.emit(record)
+        items.append('b')
+        data['count'] = 2
+
+        _, queued = log_queue.get_nowait()
+        self.assertTrue(queued.getMessage().startswith("items ['a']\nTraceback"))
+        self.assertIn('ValueError: boom', queued.getMessage())
+        self.assertIsNone(queued.args)
+        self.assertIsNone(queued.exc_info)
+        self.assertEqual(queued.trace, {'count': 1})
+
+
+class TestManualDefaceTrace(unittest.TestCase):
+    """Test that /apply_manual_deface writes one summary trace event per request"""
+
+    def test_one_trace_event_per_request(self):
+        from app import create_app
+        client = create_app().test_client()
+        session = {'processed': [{'sequence': i, 'type': 'image'} for i in range(1, 51)]}
+        with mock.patch('app.routes.deface.get_session', return_value=session), \
+                mock.patch('app.routes.deface.trace_event') as trace:
+            r = client.post('/v2p-formatter/apply_manual_deface',
+                            json={'session_id': 's1', 'media_id': 'missing', 'deface_areas': [{'x': 0}]})
+        self.assertEqual(r.status_code, 404)
+        trace.assert_called_once()
+        event, = trace.call_args.args
+        data = trace.call_args.kwargs
+        self.assertEqual(event, 'apply_manual_deface')
+        self.assertEqual((data['session_id'], data['processed_items_count']), ('s1', 50))
+        self.assertNotIn('matched_by', data)
+        self.assertEqual(len(data['sequences']), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Unit tests for the vectorized manual deface renderer
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.deface_processor import apply_manual_deface
+from app.manual_deface_renderer import blur_groups, normalize_areas, render_areas
+
+
+def _frame(width=320, height=240):
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 255, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    return np.asarray(Image.fromarray(noise).resize((width, height), Image.Resampling.BICUBIC)).copy()
+
+
+class TestRenderAreas(unittest.TestCase):
+    """Test that areas change exactly their own pixels"""
+
+    def setUp(self):
+        self.frame = _frame()
+
+    def _changed(self, areas):
+        out = render_areas(self.frame.copy(), areas)
+        return np.any(out != self.frame, axis=2), out
+
+    def test_solid_rectangle(self):
+        changed, out = self._changed([{'x': 10, 'y': 20, 'width': 30, 'height': 40, 'method': 'solid'}])
+        self.assertTrue(np.all(out[20:60, 10:40] == 0))
+        changed[20:60, 10:40] = False
+        self.assertFalse(changed.any())
+
+    def test_blur_stays_inside_area(self):
+        changed, _ = self._changed([{'x': 100, 'y': 100, 'width': 50, 'height': 50, 'method': 'blur'}])
+        self.assertTrue(changed[100:150, 100:150].mean() > 0.9)
+        changed[100:150, 100:150] = False
+        self.assertFalse(changed.any())
+
+    def test_mosaic_makes_tiles(self):
+        _, out = self._changed([{'x': 0, 'y': 0, 'width': 40, 'height': 40, 'method': 'mosaic', 'mosaicsize': 10}])
+        tile = out[0:10, 0:10].reshape(-1, 3)
+        self.assertTrue(np.all(tile == tile[0]))
+
+    def test_ellipse_keeps_corners(self):
+        changed, _ = self._changed([{'x': 50, 'y': 50, 'width': 60, 'height': 40, 'shape': 'ellipse', 'method': 'solid'}])
+        self.assertFalse(changed[50, 50] or changed[89, 109])
+        self.assertTrue(changed[70, 80])
+
+    def test_solid_wins_over_blur(self):
+        _, out = self._changed([
+            {'x': 30, 'y': 30, 'width': 20, 'height': 20, 'method': 'solid'},
+            {'x': 20, 'y': 20, 'width': 60, 'height': 60, 'method': 'blur'},
+        ])
+        self.assertTrue(np.all(out[30:50, 30:50] == 0))
+
+    def test_normalize_clips_and_drops_unknown(self):
+        areas = normalize_areas([
+            {'x': -5, 'y': 230, 'width': 50, 'height': 50, 'method': 'blur'},
+            {'x': 0, 'y': 0, 'width': 10, 'height': 10, 'method': 'sparkle'},
+        ], (320, 240))
+        self.assertEqual(len(areas), 1)
+        self.assertEqual((areas[0]['x'], areas[0]['y'], areas[0]['width'], areas[0]['height']), (0, 230, 50, 10))
+
+    def test_only_overlapping_blur_areas_are_grouped(self):
+        areas = normalize_areas([
+            {'x': 10, 'y': 10, 'width': 40, 'height': 40},
+            {'x': 20, 'y': 20, 'width': 40, 'height': 40},
+            {'x': 2000, 'y': 1000, 'width': 40, 'height': 40},
+        ], (3840, 2160))
+        self.assertEqual(sorted(len(group) for _, group in blur_groups(areas, (3840, 2160))), [1, 2])
+
+
+class TestApplyManualDeface(unittest.TestCase):
+    """Test file handling of apply_manual_deface"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_jpeg_keeps_source_quantization(self):
+        input_path = self.temp_dir / 'in.jpg'
+        Image.fromarray(_frame()).save(input_path, 'JPEG', quality=70)
+        output_path = self.temp_dir / 'out.jpg'
+        result = apply_manual_deface(input_path, output_path,
+                                     [{'x': 10, 'y': 10, 'width': 50, 'height': 50, 'method': 'mosaic'}])
+        self.assertTrue(result['success'])
+        with Image.open(input_path) as src, Image.open(output_path) as out:
+            self.assertEqual(src.quantization, out.quantization)
+
+    def test_png_output_stays_png(self):
+        input_path = self.temp_dir / 'in.png'
+        Image.fromarray(_frame()).save(input_path)
+        output_path = self.temp_dir / 'out.png'
+        result = apply_manual_deface(input_path, output_path,
+                                     [{'x': 10, 'y': 10, 'width': 50, 'height': 50, 'method': 'solid'}])
+        self.assertTrue(result['success'])
+        with Image.open(output_path) as out:
+            self.assertEqual(out.format, 'PNG')
+            self.assertEqual(np.asarray(out)[30, 30].tolist(), [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
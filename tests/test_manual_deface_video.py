@@ -0,0 +1,97 @@
+"""
+Unit tests for manual deface areas rendered across video time ranges
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from app.manual_deface_video import active_areas, area_at, has_time_ranges, render_video
+
+
+def _ffmpeg_available():
+    try:
+        import imageio_ffmpeg
+        return bool(imageio_ffmpeg.get_ffmpeg_exe())
+    except Exception:
+        return False
+
+
+class TestAreaAt(unittest.TestCase):
+    """Test time ranges and keyframe interpolation"""
+
+    def setUp(self):
+        self.area = {'x': 10, 'y': 10, 'width': 20, 'height': 20, 'method': 'solid', 'start': 1.0, 'end': 2.0}
+
+    def test_active_only_inside_range(self):
+        self.assertIsNone(area_at(self.area, 0.9))
+        self.assertIsNotNone(area_at(self.area, 1.0))
+        self.assertIsNotNone(area_at(self.area, 2.0))
+        self.assertIsNone(area_at(self.area, 2.1))
+
+    def test_open_bounds(self):
+        self.assertIsNotNone(area_at({'x': 0, 'y': 0, 'width': 5, 'height': 5, 'end': 3}, 0))
+        self.assertEqual(active_areas([{'x': 0, 'y': 0, 'width': 5, 'height': 5, 'start': 3}], 10)[0]['x'], 0)
+
+    def test_keyframes_are_interpolated_and_held(self):
+        area = dict(self.area, start=0, end=10, keyframes=[
+            {'t': 2, 'x': 0, 'y': 0, 'width': 10, 'height': 10},
+            {'t': 4, 'x': 100, 'y': 50, 'width': 30, 'height': 10},
+        ])
+        mid = area_at(area, 3)
+        self.assertEqual((mid['x'], mid['y'], mid['width'], mid['height']), (50, 25, 20, 10))
+        self.assertEqual(area_at(area, 0)['x'], 0)
+        self.assertEqual(area_at(area, 9)['x'], 100)
+        self.assertEqual(mid['method'], 'solid')
+
+    def test_has_time_ranges(self):
+        self.assertFalse(has_time_ranges([{'x': 0, 'y': 0, 'width': 5, 'height': 5}]))
+        self.assertTrue(has_time_ranges([{'x': 0, 'y': 0, 'width': 5, 'height': 5, 'start': 0}]))
+
+
+@unittest.skipUnless(_ffmpeg_available(), 'ffmpeg not available')
+class TestRenderVideo(unittest.TestCase):
+    """Test that areas are drawn into exactly the frames of their range"""
+
+    def setUp(self):
+        import imageio
+
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.input_path = self.temp_dir / 'in.mp4'
+        writer = imageio.get_writer(str(self.input_path), format='FFMPEG', mode='I', fps=10, codec='libx264',
+                                    quality=10, macro_block_size=16)
+        for _ in range(20):
+            writer.append_data(np.full((64, 96, 3), 200, dtype=np.uint8))
+        writer.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_area_only_in_range(self):
+        import imageio
+
+        areas = [{'x': 16, 'y': 16, 'width': 32, 'height': 32, 'method': 'solid', 'start': 0.5, 'end': 0.95}]
+        output_path = self.temp_dir / 'in_manual.mp4'
+        result = render_video(self.input_path, output_path, areas)
+        self.assertTrue(result['success'])
+        self.assertEqual((result['frames'], result['frames_changed']), (20, 5))
+
+        reader = imageio.get_reader(str(output_path))
+        centres = [int(frame[32, 32].mean()) for frame in reader.iter_data()]
+        reader.close()
+        self.assertEqual(len(centres), 20)
+        self.assertTrue(all(c < 40 for c in centres[5:10]))
+        self.assertTrue(all(c > 160 for c in centres[:5] + centres[10:]))
+
+    def test_output_may_replace_input(self):
+        areas = [{'x': 0, 'y': 0, 'width': 16, 'height': 16, 'method': 'mosaic', 'start': 0}]
+        result = render_video(self.input_path, self.input_path, areas)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['frames_changed'], 20)
+        self.assertEqual(list(self.temp_dir.iterdir()), [self.input_path])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Unit tests for media converter output paths (duplicate suffixes, parallel reservation)
+"""
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from app.utils import get_media_output_path, release_media_output_path, reserve_media_output_path
+
+
+class TestMediaOutputPath(unittest.TestCase):
+    """Test that reserved output paths are never shared"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.input_dir = self.temp_dir / 'input'
+        self.output_dir = self.temp_dir / 'output'
+        (self.input_dir / 'folder').mkdir(parents=True)
+        patcher = mock.patch('config.INPUT_FOLDER', self.input_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_same_stem_inputs_in_parallel(self):
+        inputs = [self.input_dir / 'folder' / name for name in ('IMG.PNG', 'IMG.JPG', 'IMG.jpeg', 'IMG.png')] * 4
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outputs = list(pool.map(lambda p: reserve_media_output_path(p, self.output_dir, '.jpg'), inputs))
+        self.assertEqual(len(set(outputs)), len(inputs))
+        self.assertTrue(all(p.parent == self.output_dir / 'folder' for p in outputs))
+        self.assertIn(self.output_dir / 'folder' / 'IMG.jpg', outputs)
+
+    def test_check_only_and_release(self):
+        outside = self.temp_dir / 'elsewhere' / 'clip.mov'
+        first = reserve_media_output_path(outside, self.output_dir, '.mp4')
+        self.assertEqual(first, self.output_dir / 'clip.mp4')
+        # Checked, not claimed: the next free name
+        self.assertEqual(get_media_output_path(outside, self.output_dir, '.mp4'), self.output_dir / 'clip_1.mp4')
+
+        release_media_output_path(first)
+        self.assertFalse(first.exists())
+        written = reserve_media_output_path(outside, self.output_dir, '.mp4')
+        written.write_bytes(b'video')
+        release_media_output_path(written)
+        self.assertTrue(written.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
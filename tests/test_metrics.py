@@ -0,0 +1,115 @@
+"""
+Unit tests for the Prometheus metrics registry and /metrics endpoint
+"""
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from app import metrics
+from app.metrics import Counter, Histogram, record_cache, render, snapshot, subprocess_timer
+
+
+def sample(text, line_prefix):
+    """Value of the first exposition line starting with line_prefix"""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class TestRender(unittest.TestCase):
+    """Test the text exposition format and adding up worker snapshots"""
+
+    def setUp(self):
+        self.counter = Counter('test_jobs_total', 'Jobs', ('kind',))
+        self.histogram = Histogram('test_job_seconds', 'Job time', ('kind',), buckets=(0.1, 1))
+        self.addCleanup(lambda: [metrics._registry.remove(m) for m in (self.counter, self.histogram)])
+
+    def test_counter_and_histogram_lines(self):
+        self.counter.inc(kind='a "quoted"\\path')
+        for value in (0.05, 0.5, 5):
+            self.histogram.observe(value, kind='x')
+        text = render([snapshot()])
+
+        self.assertIn('# TYPE test_jobs_total counter', text)
+        self.assertIn('test_jobs_total{kind="a \\"quoted\\"\\\\path"} 1', text)
+        self.assertIn('# TYPE test_job_seconds histogram', text)
+        self.assertIn('test_job_seconds_bucket{kind="x",le="0.1"} 1', text)
+        self.assertIn('test_job_seconds_bucket{kind="x",le="1"} 2', text)
+        self.assertIn('test_job_seconds_bucket{kind="x",le="+Inf"} 3', text)
+        self.assertIn('test_job_seconds_count{kind="x"} 3', text)
+        self.assertEqual(sample(text, 'test_job_seconds_sum{kind="x"}'), 5.55)
+        with self.assertRaises(ValueError):
+            self.counter.inc(other='label')
+
+    def test_snapshots_add_up(self):
+        self.counter.inc(2, kind='a')
+        self.histogram.observe(0.5, kind='x')
+        text = render([snapshot(), snapshot()])
+        self.assertIn('test_jobs_total{kind="a"} 4', text)
+        self.assertIn('test_job_seconds_bucket{kind="x",le="1"} 2', text)
+
+    def test_other_workers_published_files(self):
+        temp_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.counter.inc(kind='a')
+        with mock.patch.object(metrics, 'SHARED_JOB_STATE', True), \
+                mock.patch.object(metrics, '_METRICS_DIR', temp_dir), \
+                mock.patch('os.getpid', return_value=999999999):
+            metrics._publish()  # a "worker" whose pid does not exist any more
+        with mock.patch.object(metrics, 'SHARED_JOB_STATE', True), \
+                mock.patch.object(metrics, '_METRICS_DIR', temp_dir):
+            self.assertEqual(metrics._other_workers(), [])
+            self.assertFalse((temp_dir / '999999999.json').exists())
+            metrics._publish()  # this process: read live, not from its file
+            self.assertEqual(metrics._other_workers(), [])
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Test request, subprocess and cache instrumentation"""
+
+    def test_requests_counted_per_endpoint(self):
+        from app.routes import bp
+        app = Flask(__name__)
+        app.register_blueprint(bp, url_prefix='/v2p-formatter')
+        client = app.test_client()
+
+        client.get('/v2p-formatter/no-such-route')
+        r = client.get('/v2p-formatter/metrics')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.content_type.startswith('text/plain; version=0.0.4'))
+        text = r.get_data(as_text=True)
+        self.assertGreaterEqual(
+            sample(text, 'v2p_http_requests_total{endpoint="unmatched",method="GET",status="404"}'), 1)
+        # The scrape itself is in flight while it renders
+        self.assertGreaterEqual(sample(text, 'v2p_http_requests_in_flight{endpoint="v2p_formatter.metrics"}'), 1)
+
+        text = client.get('/v2p-formatter/metrics').get_data(as_text=True)
+        self.assertGreaterEqual(
+            sample(text, 'v2p_http_request_duration_seconds_count{endpoint="v2p_formatter.metrics",method="GET"}'), 1)
+        self.assertEqual(sample(text, 'v2p_http_requests_in_flight{endpoint="unmatched"}'), 0)
+
+    def test_subprocess_timer_and_cache(self):
+        with subprocess_timer('testtool', 'ok'):
+            pass
+        with self.assertRaises(FileNotFoundError):
+            with subprocess_timer('testtool', 'missing'):
+                raise FileNotFoundError('testtool')
+        record_cache('testcache', hit=True)
+        record_cache('testcache', hit=False)
+        record_cache('testcache', hit=False)
+
+        text = render([snapshot()])
+        self.assertEqual(sample(text, 'v2p_subprocess_duration_seconds_count{tool="testtool",operation="ok"}'), 1)
+        self.assertEqual(sample(text, 'v2p_subprocess_errors_total{tool="testtool",operation="missing"}'), 1)
+        self.assertIsNone(sample(text, 'v2p_subprocess_errors_total{tool="testtool",operation="ok"}'))
+        self.assertEqual(sample(text, 'v2p_cache_requests_total{cache="testcache",result="hit"}'), 1)
+        self.assertEqual(sample(text, 'v2p_cache_requests_total{cache="testcache",result="miss"}'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
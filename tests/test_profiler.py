@@ -0,0 +1,155 @@
+"""
+Unit tests for opt-in request profiling
+"""
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from app import profiler
+from app.profiler import RequestProfiler, list_profiles, profile_path, prune_profiles, should_profile
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        patcher = mock.patch.object(profiler, 'PROFILE_DIR', self.temp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+
+class TestShouldProfile(unittest.TestCase):
+    """Test which requests are profiled"""
+
+    def test_off_by_default_and_admin_token(self):
+        self.assertFalse(should_profile('v2p_formatter.apply_deface', '/v2p-formatter/apply_deface'))
+        with mock.patch.object(profiler, 'PROFILE_ADMIN_TOKEN', 'secret'):
+            self.assertTrue(should_profile('v2p_formatter.index', '/v2p-formatter/', token='secret'))
+            self.assertFalse(should_profile('v2p_formatter.index', '/v2p-formatter/', token='wrong'))
+        self.assertFalse(should_profile('v2p_formatter.index', '/v2p-formatter/', token=''))
+
+    def test_route_pattern_and_sample_rate(self):
+        with mock.patch.object(profiler, 'PROFILE_REQUESTS', True), \
+                mock.patch.object(profiler, 'PROFILE_ROUTE_PATTERN', r'apply_deface$|generate_docx'):
+            self.assertTrue(should_profile('v2p_formatter.apply_deface', '/v2p-formatter/apply_deface'))
+            self.assertTrue(should_profile(None, '/v2p-formatter/generate_docx'))
+            self.assertFalse(should_profile('v2p_formatter.index', '/v2p-formatter/'))
+            with mock.patch.object(profiler, 'PROFILE_SAMPLE_RATE', 1.0):
+                self.assertTrue(should_profile('v2p_formatter.index', '/v2p-formatter/'))
+
+
+class TestRequestProfiler(ProfilerTestCase):
+    """Test both profile formats and the profile directory"""
+
+    def test_sample_mode_includes_threads_started_during_request(self):
+        def job():
+            pool_worker = threading.Thread(target=busy_wait, args=(0.2,), name='pool-worker')
+            pool_worker.start()
+            busy_wait(0.2)
+            pool_worker.join()
+
+        def other_request():
+            # Another request's thread, starting a thread of its own while this one is profiled
+            time.sleep(0.05)
+            other_job = threading.Thread(target=busy_wait, args=(0.2,), name='other-job')
+            other_job.start()
+            busy_wait(0.3)
+            other_job.join()
+
+        other = threading.Thread(target=other_request, name='other-request')
+        other.start()
+        prof = RequestProfiler('sample')
+        prof.start()
+        worker = threading.Thread(target=job, name='deface-worker')
+        worker.start()
+        busy_wait(0.2)
+        worker.join()
+        prof.stop()
+        other.join()
+        name = prof.save('v2p_formatter.apply_deface')
+
+        self.assertTrue(name.endswith('.collapsed'))
+        lines = (self.temp_dir / name).read_text().splitlines()
+        self.assertTrue(lines)
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        self.assertTrue(any(s.startswith('MainThread;') and 'busy_wait (test_profiler.py' in s for s in stacks))
+        self.assertTrue(any(s.startswith('deface-worker;') for s in stacks))
+        self.assertTrue(any(s.startswith('pool-worker;') for s in stacks))
+        self.assertFalse(any(s.startswith(('other-request;', 'other-job;')) for s in stacks))
+        self.assertTrue(all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines))
+
+    def test_cprofile_mode_writes_pstats(self):
+        prof = RequestProfiler('cprofile')
+        prof.start()
+        busy_wait(0.05)
+        prof.stop()
+        name = prof.save('v2p_formatter.generate_docx')
+
+        self.assertTrue(name.endswith('.prof'))
+        stats = pstats.Stats(str(self.temp_dir / name))
+        self.assertTrue(any(func[2] == 'busy_wait' for func in stats.stats))
+
+    def test_list_prune_and_lookup(self):
+        for i in range(3):
+            (self.temp_dir / f'20260101T00000{i}_v2p_formatter.index_{i}ms_0000000{i}.prof').write_bytes(b'x')
+        (self.temp_dir / 'notes.txt').write_text('ignored')
+
+        profiles = list_profiles()
+        self.assertEqual([p['duration_ms'] for p in profiles], [2, 1, 0])
+        self.assertEqual(profiles[0]['endpoint'], 'v2p_formatter.index')
+        self.assertEqual(profiles[0]['format'], 'pstats')
+        self.assertIsNotNone(profile_path(profiles[0]['name']))
+        self.assertIsNone(profile_path('notes.txt'))
+        self.assertIsNone(profile_path('../config.py'))
+
+        prune_profiles(keep=1)
+        self.assertEqual([p['duration_ms'] for p in list_profiles()], [2])
+
+
+class TestProfileRoutes(ProfilerTestCase):
+    """Test profiling through the blueprint and the admin endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        from app.routes import bp
+        app = Flask(__name__)
+        app.register_blueprint(bp, url_prefix='/v2p-formatter')
+        self.client = app.test_client()
+
+    def test_endpoints_need_token(self):
+        self.assertEqual(self.client.get('/v2p-formatter/profiles').status_code, 403)
+        with mock.patch.object(profiler, 'PROFILE_ADMIN_TOKEN', 'secret'), \
+                mock.patch('app.routes.profiles.PROFILE_ADMIN_TOKEN', 'secret'):
+            self.assertEqual(self.client.get('/v2p-formatter/profiles?token=wrong').status_code, 403)
+
+            # A request carrying the token is profiled
+            self.client.get('/v2p-formatter/metrics', headers={'X-Profile-Token': 'secret'})
+            r = self.client.get('/v2p-formatter/profiles', headers={'X-Profile-Token': 'secret'})
+            self.assertEqual(r.status_code, 200)
+            profiles = r.get_json()['profiles']
+            self.assertEqual([p['endpoint'] for p in profiles], ['v2p_formatter.metrics'])
+
+            r = self.client.get(f"/v2p-formatter/profiles/{profiles[0]['name']}?token=secret")
+            self.assertEqual(r.status_code, 200)
+            self.assertIn('attachment', r.headers['Content-Disposition'])
+            self.assertEqual(self.client.get('/v2p-formatter/profiles/missing.prof?token=secret').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Unit tests for streaming Range responses and X-Accel-Redirect offload
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from app import range_response
+from app.range_response import parse_byte_ranges, send_file_range, x_accel_response
+
+
+class TestParseByteRanges(unittest.TestCase):
+    """Test Range header parsing"""
+
+    def test_ranges(self):
+        self.assertEqual(parse_byte_ranges('bytes=0-', 100), [(0, 99)])
+        self.assertEqual(parse_byte_ranges('bytes=10-19, 50-', 100), [(10, 19), (50, 99)])
+        self.assertEqual(parse_byte_ranges('bytes=-10', 100), [(90, 99)])
+        self.assertEqual(parse_byte_ranges('bytes=90-500', 100), [(90, 99)])
+
+    def test_unsatisfiable_and_invalid(self):
+        self.assertEqual(parse_byte_ranges('bytes=100-', 100), [])
+        self.assertEqual(parse_byte_ranges('bytes=-10', 0), [])
+        self.assertEqual(parse_byte_ranges('bytes=0-', 0), [])
+        self.assertIsNone(parse_byte_ranges(None, 100))
+        self.assertIsNone(parse_byte_ranges('items=0-1', 100))
+        self.assertIsNone(parse_byte_ranges('bytes=5-1', 100))
+        self.assertIsNone(parse_byte_ranges('bytes=a-b', 100))
+
+
+class TestSendFileRange(unittest.TestCase):
+    """Test responses served through a minimal app"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.data = bytes(range(256)) * 40
+        self.path = self.temp_dir / 'clip.mp4'
+        self.path.write_bytes(self.data)
+        app = Flask(__name__)
+        app.add_url_rule('/clip', 'clip', lambda: send_file_range(self.path, 'video/mp4', chunk_size=1000))
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_whole_file(self):
+        r = self.client.get('/clip')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data, self.data)
+        self.assertEqual(r.headers['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', r.headers)
+        self.assertIn('Last-Modified', r.headers)
+
+    def test_single_range_is_streamed(self):
+        r = self.client.get('/clip', headers={'Range': 'bytes=100-2599'}, buffered=False)
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.headers['Content-Range'], f'bytes 100-2599/{len(self.data)}')
+        self.assertEqual(r.headers['Content-Length'], '2500')
+        chunks = list(r.response)
+        self.assertEqual([len(c) for c in chunks], [1000, 1000, 500])
+        self.assertEqual(b''.join(chunks), self.data[100:2600])
+        r.close()
+
+    def test_multiple_ranges(self):
+        r = self.client.get('/clip', headers={'Range': 'bytes=0-9,-5'})
+        self.assertEqual(r.status_code, 206)
+        self.assertTrue(r.headers['Content-Type'].startswith('multipart/byteranges; boundary='))
+        self.assertEqual(int(r.headers['Content-Length']), len(r.data))
+        boundary = r.headers['Content-Type'].split('boundary=')[1]
+        parts = r.data.split(f'--{boundary}'.encode())
+        self.assertEqual(len(parts), 4)
+        self.assertIn(f'Content-Range: bytes 0-9/{len(self.data)}'.encode(), parts[1])
+        self.assertTrue(parts[1].endswith(b'\r\n\r\n' + self.data[:10] + b'\r\n'))
+        self.assertTrue(parts[2].endswith(self.data[-5:] + b'\r\n'))
+
+    def test_unsatisfiable_range(self):
+        r = self.client.get('/clip', headers={'Range': f'bytes={len(self.data)}-'})
+        self.assertEqual(r.status_code, 416)
+        self.assertEqual(r.headers['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_empty_file_is_sent_whole(self):
+        self.path.write_bytes(b'')
+        for header in ('bytes=-10', 'bytes=0-', 'bytes=0-9'):
+            r = self.client.get('/clip', headers={'Range': header})
+            self.assertEqual((r.status_code, r.data), (200, b''), header)
+            self.assertNotIn('Content-Range', r.headers)
+
+    def test_conditional_and_if_range(self):
+        etag = self.client.get('/clip').headers['ETag']
+        self.assertEqual(self.client.get('/clip', headers={'If-None-Match': etag}).status_code, 304)
+
+        r = self.client.get('/clip', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        self.assertEqual((r.status_code, r.data), (206, self.data[:10]))
+
+        # File changed since the client's copy: the whole file, not a stale range
+        os.utime(self.path, ns=(1, 1))
+        r = self.client.get('/clip', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+        self.assertEqual((r.status_code, len(r.data)), (200, len(self.data)))
+
+
+class TestXAccelRedirect(unittest.TestCase):
+    """Test handing validated files to nginx"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.path = self.temp_dir / 'out dir' / 'clip 1.mp4'
+        self.path.parent.mkdir()
+        self.path.write_bytes(b'video')
+        self.app = Flask(__name__)
+        patcher = mock.patch.object(range_response, 'MEDIA_X_ACCEL_LOCATIONS',
+                                    {'/v2p-internal/output/': self.temp_dir})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_off_by_default(self):
+        with mock.patch.object(range_response, 'MEDIA_X_ACCEL_REDIRECT', False):
+            self.assertIsNone(x_accel_response(self.path, 'video/mp4'))
+
+    def test_redirect_to_internal_location(self):
+        with mock.patch.object(range_response, 'MEDIA_X_ACCEL_REDIRECT', True), self.app.test_request_context():
+            r = x_accel_response(self.path, 'video/mp4', download_name='clip 1.mp4')
+            self.assertEqual(r.headers['X-Accel-Redirect'], '/v2p-internal/output/out%20dir/clip%201.mp4')
+            self.assertEqual(r.headers['Content-Type'], 'video/mp4')
+            self.assertIn("filename*=UTF-8''clip%201.mp4", r.headers['Content-Disposition'])
+            self.assertEqual(r.get_data(), b'')
+            # Outside every internal root: the caller sends the file itself
+            self.assertIsNone(x_accel_response(Path(tempfile.gettempdir()).parent / 'elsewhere.mp4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Unit tests for thumbnail versions, ETags and 304 handling
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+
+from app import create_app
+from app.thumbnail_generator import (get_thumbnail_cache_path, invalidate_thumbnail_cache, thumbnail_etag,
+                                     thumbnail_version)
+
+
+class TestThumbnailVersion(unittest.TestCase):
+    """Test that the version follows the source file and nothing else"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.path = self.temp_dir / 'photo.jpg'
+        self.path.write_bytes(b'jpeg')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_stable_digest(self):
+        version = thumbnail_version(self.path)
+        # Same value as a fresh interpreter would compute (no salted hash())
+        self.assertRegex(version, r'^[0-9a-f]{16}$')
+        self.assertEqual(thumbnail_version(self.path, self.path.stat()), version)
+        self.assertEqual(thumbnail_etag(version, (640, 480)), f'{version}-640x480')
+
+    def test_changes_with_file(self):
+        version = thumbnail_version(self.path)
+        cache_path = get_thumbnail_cache_path(self.path, (120, 90))
+        os.utime(self.path, ns=(1, 1))
+        self.assertNotEqual(thumbnail_version(self.path), version)
+        self.assertNotEqual(get_thumbnail_cache_path(self.path, (120, 90)), cache_path)
+
+
+class TestThumbnailRoutes(unittest.TestCase):
+    """Test conditional requests on both thumbnail routes"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp()).resolve()
+        self.image = self.temp_dir / 'photo.jpg'
+        Image.new('RGB', (32, 24), (0, 128, 255)).save(self.image, 'JPEG')
+        for target in ('config.OUTPUT_FOLDER', 'app.routes.frames.OUTPUT_FOLDER'):
+            patcher = mock.patch(target, self.temp_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = create_app().test_client()
+        self.version = thumbnail_version(self.image)
+
+    def tearDown(self):
+        invalidate_thumbnail_cache(self.image)
+        shutil.rmtree(self.temp_dir)
+
+    def _url(self, route, **params):
+        query = '&'.join(f'{k}={v}' for k, v in params.items())
+        return f'/v2p-formatter/{route}?path={self.image}&size=120x90' + (f'&{query}' if query else '')
+
+    def test_not_modified_without_generating(self):
+        for route in ('thumbnail', 'media-converter/thumbnail'):
+            with self.subTest(route=route):
+                r = self.client.get(self._url(route))
+                self.assertEqual(r.status_code, 200)
+                self.assertEqual(r.mimetype, 'image/jpeg')
+                self.assertEqual(r.headers['ETag'], f'"{self.version}-120x90"')
+                self.assertEqual(r.headers['Cache-Control'], 'no-cache')
+
+                with mock.patch('app.thumbnail_generator.get_thumbnail') as get_thumbnail:
+                    r = self.client.get(self._url(route), headers={'If-None-Match': r.headers['ETag']})
+                self.assertEqual(r.status_code, 304)
+                get_thumbnail.assert_not_called()
+
+    def test_versioned_url_is_immutable(self):
+        r = self.client.get(self._url('media-converter/thumbnail', v=self.version))
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('immutable', r.headers['Cache-Control'])
+
+        # A stale version is served, but must be revalidated
+        r = self.client.get(self._url('media-converter/thumbnail', v='0' * 16))
+        self.assertEqual(r.headers['Cache-Control'], 'no-cache')
+
+    def test_modified_file_gets_new_etag(self):
+        etag = self.client.get(self._url('thumbnail')).headers['ETag']
+        Image.new('RGB', (32, 24), (255, 0, 0)).save(self.image, 'JPEG')
+        os.utime(self.image, ns=(2_000_000_000, 2_000_000_000))
+        r = self.client.get(self._url('thumbnail'), headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.headers['ETag'], etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
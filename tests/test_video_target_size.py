@@ -0,0 +1,54 @@
+"""
+Unit tests for target-size (two-pass) video encoding
+"""
+import unittest
+
+from app.video_converter import compute_target_bitrate, parse_bitrate_kbps
+from config import VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS, VIDEO_QUALITY_PRESETS
+
+
+class TestComputeTargetBitrate(unittest.TestCase):
+    """Test bitrate budgeting from duration and size limit"""
+
+    def test_bitrate_fits_target(self):
+        """Video + audio at the computed bitrate fits inside the target size"""
+        target_mb, duration, audio_kbps = 50, 300, 128
+        video_kbps = compute_target_bitrate(target_mb, duration, audio_kbps)
+        total_bytes = (video_kbps + audio_kbps) * 1000 / 8 * duration
+        self.assertLessEqual(total_bytes, target_mb * 1024 * 1024)
+        self.assertGreater(total_bytes, target_mb * 1024 * 1024 * 0.9)
+
+    def test_longer_video_gets_lower_bitrate(self):
+        """The same budget spread over more seconds lowers the bitrate"""
+        self.assertGreater(compute_target_bitrate(50, 60), compute_target_bitrate(50, 600))
+
+    def test_bitrate_floor(self):
+        """Impossible targets are clamped to the minimum bitrate"""
+        self.assertEqual(compute_target_bitrate(1, 3600), VIDEO_TARGET_SIZE_MIN_VIDEO_KBPS)
+
+    def test_zero_duration_rejected(self):
+        """A duration is required to budget bits"""
+        with self.assertRaises(ValueError):
+            compute_target_bitrate(50, 0)
+
+    def test_target_size_preset_exists(self):
+        """The target_size preset carries a default size"""
+        self.assertIn('target_size_mb', VIDEO_QUALITY_PRESETS['target_size'])
+
+
+
+class TestParseBitrate(unittest.TestCase):
+    """Test audio bitrate settings in the forms FFmpeg accepts"""
+
+    def test_suffixes_and_plain_bps(self):
+        for value, kbps in (('128k', 128), ('128 k', 128), ('96K', 96), ('1.5M', 1500), ('192kbps', 192),
+                            ('128000', 128), (64000, 64)):
+            self.assertEqual(parse_bitrate_kbps(value), kbps, value)
+
+    def test_invalid_falls_back_to_default(self):
+        for value in ('', 'abc', '-5k', None, '0', 'nan', 'infk'):
+            self.assertEqual(parse_bitrate_kbps(value, default=96), 96, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Unit tests for the trim_video fast path (keyframe planning and smart cut)
+"""
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from app import video_converter
+from app.video_converter import _plan_fast_trim, trim_video
+
+
+class TestPlanFastTrim(unittest.TestCase):
+    """Test how fast trims choose between stream copy, smart cut and re-encode"""
+
+    def setUp(self):
+        self.input_path = Path('/tmp/input.mp4')
+        self.h264_info = {'codec': 'h264', 'duration': 1800.0}
+
+    def _plan(self, keyframes, start, end, frame_accurate=False, info=None):
+        with patch.object(video_converter, 'get_keyframe_times', return_value=keyframes):
+            return _plan_fast_trim(self.input_path, start, end, frame_accurate, info or self.h264_info)
+
+    def test_start_on_keyframe_uses_copy(self):
+        """A start point on a keyframe is stream-copied even when accuracy is required"""
+        plan = self._plan([0.0, 2.0, 4.0, 6.0], 4.0, 60.0, frame_accurate=True)
+        self.assertEqual(plan['mode'], 'copy')
+        self.assertEqual(plan['start'], 4.0)
+
+    def test_start_near_keyframe_snaps(self):
+        """A start within the tolerance snaps to the nearby keyframe"""
+        plan = self._plan([0.0, 2.0, 4.0, 6.0], 4.1, 60.0, frame_accurate=True)
+        self.assertEqual(plan['mode'], 'copy')
+        self.assertEqual(plan['start'], 4.0)
+
+    def test_not_frame_accurate_snaps_to_previous_keyframe(self):
+        """Without frame accuracy the start snaps back to the previous keyframe"""
+        plan = self._plan([0.0, 2.0, 4.0, 6.0], 5.0, 60.0)
+        self.assertEqual(plan['mode'], 'copy')
+        self.assertEqual(plan['start'], 4.0)
+
+    def test_frame_accurate_uses_smart_cut(self):
+        """Frame-accurate cuts between keyframes re-encode only the boundary GOPs"""
+        plan = self._plan([0.0, 2.0, 4.0, 6.0, 58.0, 60.0], 5.0, 59.0, frame_accurate=True)
+        self.assertEqual(plan['mode'], 'smart')
+        self.assertEqual(plan['first_keyframe'], 6.0)
+        self.assertEqual(plan['last_keyframe'], 58.0)
+
+    def test_smart_cut_requires_h264(self):
+        """Smart cut falls back to re-encode for sources libx264 cannot splice with"""
+        plan = self._plan([0.0, 2.0, 4.0, 6.0, 58.0], 5.0, 59.0, frame_accurate=True,
+                          info={'codec': 'hevc'})
+        self.assertEqual(plan['mode'], 'reencode')
+
+    def test_range_inside_single_gop_reencodes(self):
+        """Ranges shorter than a GOP are cheapest to re-encode outright"""
+        plan = self._plan([0.0, 10.0], 3.0, 7.0, frame_accurate=True)
+        self.assertEqual(plan['mode'], 'reencode')
+
+    def test_no_keyframes_reencodes(self):
+        """Missing keyframe information falls back to re-encode"""
+        plan = self._plan([], 3.0, 7.0)
+        self.assertEqual(plan['mode'], 'reencode')
+
+
+@unittest.skipUnless(shutil.which('ffmpeg') and shutil.which('ffprobe'), 'ffmpeg not available')
+class TestSmartCut(unittest.TestCase):
+    """Test that a smart cut keeps exactly the frames of the range"""
+
+    def setUp(self):
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.input_path = self.temp_dir / 'in.mp4'
+        # 6s at 25fps with a keyframe every second
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25:duration=6',
+            '-c:v', 'libx264', '-g', '25', '-keyint_min', '25', '-sc_threshold', '0', '-pix_fmt', 'yuv420p',
+            str(self.input_path)
+        ], check=True, capture_output=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _probe(self, path):
+        result = subprocess.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_frames',
+            '-show_entries', 'stream=nb_read_frames:format=duration', '-of', 'json', str(path)
+        ], check=True, capture_output=True, text=True)
+        data = json.loads(result.stdout)
+        return int(data['streams'][0]['nb_read_frames']), float(data['format']['duration'])
+
+    def test_smart_cut_frame_count_and_duration(self):
+        output_path = self.temp_dir / 'out.mp4'
+        result = trim_video(self.input_path, output_path, 0.52, 4.48, fast=True, frame_accurate=True)
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['mode'], 'smart')
+
+        frames, duration = self._probe(output_path)
+        self.assertEqual(frames, 99)  # 0.52s to 4.48s at 25fps, no GOP copied twice
+        self.assertAlmostEqual(duration, 3.96, delta=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()